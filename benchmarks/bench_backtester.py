@@ -0,0 +1,54 @@
+# benchmarks/bench_backtester.py
+# Backtester (utils.backtester) sobre años de velas sintéticas: M15 y H1,
+# varios símbolos, solo días hábiles (como los datos del broker). Un ciclo
+# del bot por cierre de vela; mide segundos por corrida y ciclos/s contra el
+# objetivo ("años de M15/H1 de varios símbolos en segundos").
+#
+#   py -3.11 benchmarks/bench_backtester.py [años] [símbolos] [objetivo_s]
+#   py -3.11 benchmarks/bench_backtester.py 2 4 30
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("MT5_BACKEND", "sim")
+
+from utils.backtester import Backtester  # noqa: E402
+from utils.sim_terminal import synthetic_bars  # noqa: E402
+
+UNIVERSE = ("EURUSD", "GBPUSD", "AUDUSD", "USDJPY", "USDCAD", "NZDUSD", "EURJPY", "XAUUSD")
+START = 1640995200          # 2022-01-01 UTC
+WARMUP_DAYS = 15            # 200 velas H1 para Mark3 antes de operar
+
+
+def weekday_bars(symbol, years, timeframe):
+    bars = synthetic_bars(symbol, START, START + int(years * 365 * 86400), timeframe, seed=3)
+    weekday = (bars["time"] // 86400 + 3) % 7      # 1970-01-01 fue jueves → lunes = 0
+    return bars[weekday < 5]
+
+
+def main():
+    years = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    n_symbols = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    target = float(sys.argv[3]) if len(sys.argv) > 3 else 30.0
+    symbols = UNIVERSE[:n_symbols]
+    start = START + WARMUP_DAYS * 86400
+
+    print(f"{years:g} años × {len(symbols)} símbolos, objetivo < {target:g} s por corrida")
+    print(f"{'bot':10s} {'tf':>4s} {'velas':>9s} {'ciclos':>8s} {'seg':>7s} {'ciclos/s':>9s} {'trades':>7s} {'':>6s}")
+    slow = 0
+    for tf, label in ((15, "M15"), (60, "H1")):
+        data = {sym: (weekday_bars(sym, years, 15), 15) for sym in symbols}   # base M15, H1 se arma
+        bars = sum(len(b) for b, _ in data.values())
+        for bot in ("mark2_ai", "mark3_ai"):
+            result = Backtester(bot, data, settings={"PAIRS": list(symbols), "TIMEFRAME": tf},
+                                start=start).run()
+            ok = result.elapsed < target
+            slow += not ok
+            print(f"{bot:10s} {label:>4s} {bars:9d} {result.cycles:8d} {result.elapsed:7.2f} "
+                  f"{result.cycles / max(result.elapsed, 1e-9):9.0f} {len(result.trades):7d} "
+                  f"{'OK' if ok else 'LENTO':>6s}")
+    return 1 if slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+# benchmarks/bench_bot_cycles.py
+# Prueba de carga de los bucles de los bots contra el terminal simulado
+# (utils.sim_terminal): N símbolos con velas M1 sintéticas, reloj manual,
+# run_cycle() a velocidad de CPU. Mide ciclos/s y µs por símbolo y ciclo.
+#
+#   py -3.11 benchmarks/bench_bot_cycles.py [dias] [simbolos...]
+#   py -3.11 benchmarks/bench_bot_cycles.py 5 1 4 16
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("MT5_BACKEND", "sim")
+
+from utils.backtester import Backtester  # noqa: E402
+from utils.sim_terminal import synthetic_bars  # noqa: E402
+
+UNIVERSE = ("EURUSD", "GBPUSD", "AUDUSD", "NZDUSD", "USDCAD", "USDCHF", "USDJPY", "EURJPY",
+            "GBPJPY", "EURGBP", "EURAUD", "AUDJPY", "XAUUSD", "CADJPY", "EURCHF", "GBPCHF")
+START = 1704067200          # 2024-01-01 UTC
+CYCLE_SECONDS = 60          # un ciclo por minuto simulado
+
+
+def synthetic_data(n_symbols, days):
+    symbols = [UNIVERSE[i % len(UNIVERSE)] + ("" if i < len(UNIVERSE) else f".{i // len(UNIVERSE)}")
+               for i in range(n_symbols)]
+    end = START + days * 86400
+    return {sym: (synthetic_bars(sym, START, end, 1, seed=1), 1) for sym in symbols}
+
+
+def main():
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    sizes = [int(x) for x in sys.argv[2:]] or [1, 4, 16]
+    warmup = START + 4 * 86400      # las 200 velas H1 de Mark3
+
+    print(f"{'bot':10s} {'símbolos':>8s} {'ciclos':>8s} {'seg':>7s} {'ciclos/s':>9s} {'µs/sím·ciclo':>13s} {'trades':>7s}")
+    for bot in ("mark2_ai", "mark3_ai"):
+        for n in sizes:
+            data = synthetic_data(n, days + 4)
+            result = Backtester(bot, data, settings={"PAIRS": list(data)}, start=warmup,
+                                cycle_seconds=CYCLE_SECONDS).run()
+            per_cycle = result.elapsed / max(result.cycles, 1)
+            print(f"{bot:10s} {n:8d} {result.cycles:8d} {result.elapsed:7.2f} "
+                  f"{1 / per_cycle:9.0f} {per_cycle / n * 1e6:13.1f} {len(result.trades):7d}")
+
+
+if __name__ == "__main__":
+    main()
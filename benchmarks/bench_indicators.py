@@ -0,0 +1,116 @@
+# benchmarks/bench_indicators.py
+# utils.indicators por lotes contra las versiones pandas (ema/atr de Mark3,
+# rolling max/min para Donchian) y contra el modo incremental: tiempo por
+# serie completa y diferencia máxima entre resultados.
+#
+#   py -3.11 benchmarks/bench_indicators.py [velas] [simbolos]
+#   py -3.11 benchmarks/bench_indicators.py 10000 100
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from utils import indicators as ind  # noqa: E402
+
+
+# ---------- versiones pandas (las de bots/mark3_ai.py) ----------
+def pd_ema(series, period):
+    return series.ewm(span=period, adjust=False).mean()
+
+
+def pd_atr(df, n=14):
+    high = df['high']; low = df['low']; close = df['close']
+    tr = pd.concat([high-low, (high-close.shift()).abs(), (low-close.shift()).abs()], axis=1).max(axis=1)
+    return tr.rolling(n).mean()
+
+
+def pd_donchian(df, n):
+    return df['high'].rolling(n, min_periods=1).max(), df['low'].rolling(n, min_periods=1).min()
+
+
+def synthetic(n_symbols, n, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 1.1 + np.cumsum(rng.normal(0, 0.0006, (n_symbols, n)), axis=1)
+    open_ = np.concatenate([np.full((n_symbols, 1), 1.1), close[:, :-1]], axis=1)
+    high = np.maximum(open_, close) + np.abs(rng.normal(0, 0.0004, (n_symbols, n)))
+    low = np.minimum(open_, close) - np.abs(rng.normal(0, 0.0004, (n_symbols, n)))
+    return high, low, close
+
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def streaming(make, rows):
+    obj = make()
+    return np.array([np.nan if v is None else v for v in (obj.update(*r) for r in rows)])
+
+
+def maxdiff(a, b):
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    same_nan = np.array_equal(np.isnan(a), np.isnan(b))
+    return np.nanmax(np.abs(a - b)) if same_nan else float("nan")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    n_symbols = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    high, low, close = synthetic(n_symbols, n)
+    h, l, c = high[0], low[0], close[0]
+    df = pd.DataFrame({"high": h, "low": l, "close": c})
+
+    print(f"1 serie de {n} velas (tiempo de la serie completa, mejor de 5)")
+    print(f"{'indicador':12s} {'pandas ms':>10s} {'lotes ms':>9s} {'x':>6s} {'incr. ms':>9s} {'dif. pandas':>12s} {'dif. incr.':>11s}")
+    rows_c = [(x,) for x in c]
+    rows_hlc = list(zip(h, l, c))
+    rows_hl = list(zip(h, l))
+    cases = (
+        ("ema20", lambda: pd_ema(df['close'], 20).to_numpy(), lambda: ind.ema(c, 20),
+         lambda: ind.StreamingEMA(20), rows_c),
+        ("ema200", lambda: pd_ema(df['close'], 200).to_numpy(), lambda: ind.ema(c, 200),
+         lambda: ind.StreamingEMA(200), rows_c),
+        ("atr14", lambda: pd_atr(df, 14).to_numpy(), lambda: ind.atr(h, l, c, 14),
+         lambda: ind.StreamingATR(14), rows_hlc),
+        ("donchian20", lambda: pd_donchian(df, 20)[0].to_numpy(), lambda: ind.donchian(h, l, 20)[0],
+         lambda: _DonchianHigh(20), rows_hl),
+        ("adx14", None, lambda: ind.adx(h, l, c, 14)[0], lambda: ind.StreamingADX(14), rows_hlc),
+    )
+    for name, pd_fn, batch_fn, make, rows in cases:
+        t_batch, out_batch = timed(batch_fn)
+        t0 = time.perf_counter()
+        out_stream = streaming(make, rows)
+        t_stream = time.perf_counter() - t0
+        if pd_fn is not None:
+            t_pd, out_pd = timed(pd_fn)
+            pd_cols = f"{t_pd * 1e3:10.3f} {t_batch * 1e3:9.3f} {t_pd / t_batch:6.1f}"
+            diff_pd = f"{maxdiff(out_batch, out_pd):12.1e}"
+        else:
+            pd_cols = f"{'-':>10s} {t_batch * 1e3:9.3f} {'-':>6s}"
+            diff_pd = f"{'-':>12s}"
+        print(f"{name:12s} {pd_cols} {t_stream * 1e3:9.2f} {diff_pd} {maxdiff(out_batch, out_stream):11.1e}")
+
+    # ---- símbolos × velas: una llamada contra un bucle pandas por símbolo ----
+    print(f"\n{n_symbols} símbolos × {n} velas")
+    frames = [pd.DataFrame({"high": high[i], "low": low[i], "close": close[i]}) for i in range(n_symbols)]
+    t_pd, _ = timed(lambda: [(pd_ema(f['close'], 20), pd_atr(f, 14), pd_donchian(f, 20)) for f in frames], 2)
+    t_np, _ = timed(lambda: (ind.ema(close, 20), ind.atr(high, low, close, 14), ind.donchian(high, low, 20)), 2)
+    print(f"ema20 + atr14 + donchian20: pandas {t_pd * 1e3:.1f} ms | lotes 2-D {t_np * 1e3:.1f} ms | x{t_pd / t_np:.1f}")
+    t_adx, _ = timed(lambda: ind.adx(high, low, close, 14), 2)
+    print(f"adx14: lotes 2-D {t_adx * 1e3:.1f} ms")
+
+
+class _DonchianHigh(ind.StreamingDonchian):
+    def update(self, high, low):
+        return super().update(high, low)[0]
+
+
+if __name__ == "__main__":
+    main()
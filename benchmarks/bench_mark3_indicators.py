@@ -0,0 +1,89 @@
+# benchmarks/bench_mark3_indicators.py
+# Compara, por vela cerrada nueva, la ruta pandas anterior de
+# Mark3Pro.analyze_and_trade (200 velas: copy + to_numeric + ema/atr + rango)
+# contra el estado incremental de utils.indicators.BarIndicators.
+#
+#   py -3.11 benchmarks/bench_mark3_indicators.py [n_velas]
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from utils.indicators import BarIndicators  # noqa: E402
+
+WINDOW = 200
+
+
+def ema(series, period):
+    return series.ewm(span=period, adjust=False).mean()
+
+
+def atr(df, n=14):
+    high = df['high']; low = df['low']; close = df['close']
+    tr = pd.concat([high-low, (high-close.shift()).abs(), (low-close.shift()).abs()], axis=1).max(axis=1)
+    return tr.rolling(n).mean()
+
+
+def pandas_path(df):
+    """Lo que hacía Mark3 en cada pasada con las 200 velas."""
+    df = df.copy()
+    for c in ["open", "high", "low", "close"]:
+        df[c] = pd.to_numeric(df[c], errors="coerce")
+    df = df.dropna()
+    df['ema20'] = ema(df['close'], 20)
+    df['ema50'] = ema(df['close'], 50)
+    df['atr'] = atr(df, 14)
+    last = df.iloc[-2]
+    recent_high = df['high'].iloc[-10:-2].max()
+    recent_low = df['low'].iloc[-10:-2].min()
+    return last['ema20'], last['ema50'], last['atr'], recent_high, recent_low
+
+
+def synthetic_bars(n, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 1.1 + np.cumsum(rng.normal(0, 0.0006, n))
+    open_ = np.r_[1.1, close[:-1]]
+    high = np.maximum(open_, close) + np.abs(rng.normal(0, 0.0004, n))
+    low = np.minimum(open_, close) - np.abs(rng.normal(0, 0.0004, n))
+    times = pd.date_range("2024-01-01", periods=n, freq="h")
+    return pd.DataFrame({"time": times, "open": open_, "high": high, "low": low, "close": close})
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    bars = synthetic_bars(n + WINDOW)
+
+    # ---- ruta pandas: una ventana de 200 velas por vela nueva ----
+    t0 = time.perf_counter()
+    for i in range(WINDOW, WINDOW + n):
+        pd_vals = pandas_path(bars.iloc[i - WINDOW + 1:i + 1])
+    t_pandas = (time.perf_counter() - t0) / n
+
+    # ---- ruta incremental: sembrar con la primera ventana y avanzar 1 vela ----
+    t_arr = bars["time"].to_numpy()
+    h, l, c = (bars[k].to_numpy() for k in ("high", "low", "close"))
+    ind = BarIndicators(20, 50, 14, 8)
+    for j in range(0, WINDOW - 1):
+        ind.update(t_arr[j], h[j], l[j], c[j])
+    t0 = time.perf_counter()
+    for i in range(WINDOW, WINDOW + n):
+        ind.update(t_arr[i - 1], h[i - 1], l[i - 1], c[i - 1])   # vela cerrada = i-1
+    t_inc = (time.perf_counter() - t0) / n
+
+    inc_vals = (ind.ema_fast.value, ind.ema_slow.value, ind.atr.value, ind.channel.high, ind.channel.low)
+    print(f"velas nuevas: {n}")
+    print(f"pandas (ventana {WINDOW}): {t_pandas * 1e6:10.1f} µs/vela")
+    print(f"incremental:             {t_inc * 1e6:10.1f} µs/vela")
+    print(f"speedup:                 {t_pandas / t_inc:10.0f}x")
+    # ATR y rango son exactos; la EMA incremental no se reinicia con la ventana
+    # (historia completa), así que difiere en el arrastre de la semilla
+    names = ("ema20", "ema50", "atr", "recent_high", "recent_low")
+    for name, a, b in zip(names, pd_vals, inc_vals):
+        print(f"  {name:12s} pandas {a:.6f} | incremental {b:.6f} | diff {abs(a - b):.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/bench_parallel_eval.py
+# Tiempo de una evaluación completa (todas las PAIRS) según el nº de símbolos:
+# secuencial (EVAL_WORKERS=1) contra el pool de 8 hilos, con el gateway todo
+# serializado (MT5_GATEWAY_READERS=1) y con 8 lecturas a la vez. El terminal
+# simulado tiene una latencia fija por lectura (IPC del terminal).
+#
+#   py -3.11 benchmarks/bench_parallel_eval.py [latencia_us] [simbolos...]
+#   py -3.11 benchmarks/bench_parallel_eval.py 200 2 16 64 120
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("MT5_BACKEND", "sim")
+
+import bots.mark2_ai as mark2  # noqa: E402
+import bots.mark3_ai as mark3  # noqa: E402
+import utils.feed_selector as feed_selector  # noqa: E402
+import utils.mt5_connector as mt5_connector  # noqa: E402
+import utils.symbol_catalog as symbol_catalog  # noqa: E402
+from utils.allowed_symbols import ALLOWED_SYMBOLS  # noqa: E402
+from utils.broker import BrokerGateway  # noqa: E402
+from utils.feed_selector import Feed  # noqa: E402
+from utils.sim_terminal import SimTerminal, synthetic_bars  # noqa: E402
+from utils.stats_store import StatsStore  # noqa: E402
+
+START = 1704067200          # 2024-01-01 UTC
+DAYS = 12
+ROUNDS = 20
+
+
+class SlowTerminal(SimTerminal):
+    latency = 0.0002
+
+    def symbol_info_tick(self, symbol):
+        time.sleep(self.latency)
+        return super().symbol_info_tick(symbol)
+
+    def copy_rates_range(self, *args):
+        time.sleep(self.latency)
+        return super().copy_rates_range(*args)
+
+
+def measure(module, cls, terminal, symbols, workers):
+    settings = {"PAIRS": symbols, "EVAL_WORKERS": workers, "MAX_POSITIONS": 10 ** 6, "TIMEFRAME": 15}
+    bot = cls(settings=settings, feed=Feed(settings), stats=StatsStore())
+    evaluate = bot.open_new_orders if hasattr(bot, "open_new_orders") else bot.analyze_and_trade
+    module.send_order = lambda *a, **k: None               # solo señales
+    evaluate(symbols)                                      # carga inicial de velas
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        evaluate(symbols)
+    bot.evaluator.shutdown()
+    return (time.perf_counter() - t0) / ROUNDS
+
+
+def main():
+    SlowTerminal.latency = (int(sys.argv[1]) if len(sys.argv) > 1 else 200) / 1e6
+    sizes = [int(x) for x in sys.argv[2:]] or [2, 16, 64, 120]
+    universe = sorted(ALLOWED_SYMBOLS)[:max(sizes)]       # hasta ~120 símbolos de la lista blanca
+    data = {sym: (synthetic_bars(sym, START, START + DAYS * 86400, 15, seed=i), 15)
+            for i, sym in enumerate(universe)}
+    terminal = SlowTerminal(data, start=START + DAYS * 86400 - 3600)
+    for module in (mark2, mark3):
+        for name in dir(module):
+            if name.startswith("notify_"):
+                setattr(module, name, lambda *a, **k: None)
+    mark2.logger.disabled = mark3.logger.disabled = True
+
+    print(f"latencia broker {SlowTerminal.latency * 1e6:.0f} µs/llamada")
+    print(f"{'bot':6s} {'lectores':>8s} {'símbolos':>8s} {'secuencial ms':>14s} {'pool(8) ms':>11s} {'x':>6s}")
+    for readers in (1, 8):
+        gateway = BrokerGateway(terminal, readers=readers)
+        for module in (mark2, mark3, feed_selector, mt5_connector, symbol_catalog):
+            module.mt5 = gateway
+        for name, module, cls in (("mark2", mark2, mark2.Mark2AIPro), ("mark3", mark3, mark3.Mark3Pro)):
+            for n in sizes:
+                symbols = list(data)[:n]
+                seq = measure(module, cls, terminal, symbols, 1)
+                par = measure(module, cls, terminal, symbols, 8)
+                print(f"{name:6s} {readers:8d} {n:8d} {seq * 1e3:14.2f} {par * 1e3:11.2f} {seq / par:6.2f}")
+
+
+if __name__ == "__main__":
+    main()
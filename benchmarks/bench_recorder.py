@@ -0,0 +1,61 @@
+# benchmarks/bench_recorder.py
+# utils.recorder: coste de grabar en el ciclo del bot (tick() / bars(), solo
+# encolan), rendimiento del hilo escritor y lectura zero-copy con memmap.
+#
+#   py -3.11 benchmarks/bench_recorder.py [ticks] [simbolos]
+#   py -3.11 benchmarks/bench_recorder.py 200000 10
+import os
+import sys
+import time
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from utils.recorder import MarketRecorder, open_recording  # noqa: E402
+from utils.candle_cache import CANDLE_DTYPE  # noqa: E402
+
+
+def main():
+    n_ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    n_symbols = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    symbols = [f"SYM{i:02d}" for i in range(n_symbols)]
+    start_ms = 1_767_225_600_000                    # 2026-01-01 00:00 UTC
+
+    with tempfile.TemporaryDirectory() as root:
+        rec = MarketRecorder(root, flush_seconds=3600)   # el flush se mide aparte
+
+        t0 = time.perf_counter()
+        for i in range(n_ticks):
+            rec.tick(symbols[i % n_symbols], 1.1 + i * 1e-7, 1.1001 + i * 1e-7, start_ms + i * 250)
+        t_tick = time.perf_counter() - t0
+
+        bars = np.zeros(1441, dtype=CANDLE_DTYPE)       # un día de M1 + la vela en formación
+        bars["time"] = start_ms // 1000 + np.arange(len(bars)) * 60
+        bars["close"] = 1.1
+        t0 = time.perf_counter()
+        for symbol in symbols:
+            rec.bars(symbol, 1, bars)
+        t_bars = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        rec.flush()
+        t_flush = time.perf_counter() - t0
+        rec.close()
+
+        t0 = time.perf_counter()
+        total = 0
+        for day in sorted(os.listdir(root)):
+            for name in os.listdir(os.path.join(root, day)):
+                total += len(open_recording(os.path.join(root, day, name)))
+        t_open = time.perf_counter() - t0
+
+        print(f"{n_ticks} ticks, {n_symbols} símbolos")
+        print(f"tick():  {t_tick / n_ticks * 1e6:.2f} µs por llamada (camino caliente)")
+        print(f"bars():  {t_bars / n_symbols * 1e6:.2f} µs por llamada")
+        print(f"flush:   {t_flush:.3f}s → {rec.stats()}")
+        print(f"memmap:  {t_open * 1e3:.2f} ms para abrir {total} registros")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# benchmarks/bench_signals.py
+# utils.signals sobre una matriz símbolos × velas sintética (por defecto 30
+# símbolos × 10 años de M15): tiempo de las señales de Mark2/Mark3, de la
+# resolución de trades y comprobación de que 2-D da lo mismo que símbolo a
+# símbolo.
+#
+#   py -3.11 benchmarks/bench_signals.py [simbolos] [años]
+#   py -3.11 benchmarks/bench_signals.py 30 10
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from utils import signals as sg  # noqa: E402
+
+BARS_PER_YEAR = 252 * 96          # M15, días hábiles
+
+
+def synthetic(n_symbols, n, seed=11):
+    rng = np.random.default_rng(seed)
+    close = 1.1 + np.cumsum(rng.normal(0, 0.0006, (n_symbols, n)), axis=1)
+    open_ = np.concatenate([np.full((n_symbols, 1), 1.1), close[:, :-1]], axis=1)
+    high = np.maximum(open_, close) + np.abs(rng.normal(0, 0.0004, (n_symbols, n)))
+    low = np.minimum(open_, close) - np.abs(rng.normal(0, 0.0004, (n_symbols, n)))
+    return open_, high, low, close
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - t0, out
+
+
+def main():
+    n_symbols = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    years = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    n = int(BARS_PER_YEAR * years)
+    o, h, l, c = synthetic(n_symbols, n)
+    point, spread = 0.00001, 10
+    print(f"{n_symbols} símbolos × {n} velas M15 ({years:g} años) = {n_symbols * n / 1e6:.1f} M velas")
+
+    rules = (
+        ("mark2", lambda: sg.mark2_signals(o, h, l, point, pips=2.6, sl_pips=40, tp_pips=80, spread=spread)),
+        ("mark3", lambda: sg.mark3_signals(o, h, l, c, point, spread=spread)),
+    )
+    for name, fn in rules:
+        t_sig, signals = timed(fn)
+        t_sim, trades = timed(lambda: sg.simulate(signals, o, h, l, c, point, spread=spread))
+        stats = sg.summary(trades)
+        print(f"{name}: señales {t_sig:.2f}s ({(signals.direction != 0).sum()}) | trades {t_sim:.2f}s | {stats}")
+
+    # 2-D contra símbolo a símbolo (3 primeros)
+    for i in range(min(3, n_symbols)):
+        one = sg.mark3_signals(o[i], h[i], l[i], c[i], point, spread=spread)
+        both = sg.mark3_signals(o[:3], h[:3], l[:3], c[:3], point, spread=spread)
+        same = all(np.array_equal(a, b[i], equal_nan=True) for a, b in zip(one, both))
+        print(f"símbolo {i}: 1-D == 2-D → {same}")
+
+
+if __name__ == "__main__":
+    main()
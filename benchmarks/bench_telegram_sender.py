@@ -0,0 +1,91 @@
+# benchmarks/bench_telegram_sender.py
+# TelegramSender contra un "Telegram" HTTP local (lento y con un 429):
+# cuánto bloquea al bucle cada notificación, cuántos POST llegan realmente
+# (ráfagas juntadas) y los contadores de la cola.
+#
+#   py -3.11 benchmarks/bench_telegram_sender.py [notificaciones] [latencia_ms]
+import os
+import sys
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("MT5_BACKEND", "sim")
+from utils.telegram_notifier import TelegramSender  # noqa: E402
+
+
+class FakeTelegram(BaseHTTPRequestHandler):
+    latency = 0.2
+    received = []
+    throttled = False
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.latency)
+        if not FakeTelegram.throttled:          # primer envío → 429 como Telegram
+            FakeTelegram.throttled = True
+            self._reply(429, {"ok": False, "error_code": 429, "parameters": {"retry_after": 1}})
+            return
+        FakeTelegram.received.append(body["text"])
+        self._reply(200, {"ok": True, "result": {}})
+
+    def _reply(self, code, data):
+        raw = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, *args):
+        pass
+
+
+def close_msg(i):
+    return f"<b>💰 TRADE CERRADO</b>\n\n📊 <b>Par:</b> EURUSD\n🟢 <b>Profit:</b> ${i:.2f}\n🎫 <b>Ticket:</b> #{i}"
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    FakeTelegram.latency = (int(sys.argv[2]) if len(sys.argv) > 2 else 200) / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeTelegram)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_url = f"http://127.0.0.1:{server.server_port}"
+
+    # ---- antes: requests.post bloqueante, conexión nueva cada vez ----
+    FakeTelegram.throttled = True
+    t0 = time.perf_counter()
+    for i in range(5):
+        requests.post(f"{api_url}/botTOKEN/sendMessage", json={"chat_id": 1, "text": close_msg(i)}, timeout=10)
+    t_block = (time.perf_counter() - t0) / 5
+    FakeTelegram.received.clear()
+    FakeTelegram.throttled = False
+
+    # ---- ahora: encolar (ráfagas de 5 cierres por "ciclo") ----
+    sender = TelegramSender("TOKEN", 1, api_url=api_url, maxsize=50, min_interval=0.2)
+    total = worst = 0.0
+    for i in range(n):
+        t1 = time.perf_counter()
+        sender.send(close_msg(i))
+        spent = time.perf_counter() - t1
+        total += spent
+        worst = max(worst, spent)
+        if i % 5 == 4:
+            time.sleep(0.05)                     # resto del ciclo del bot
+    t_enqueue = total / n
+    sender.flush(30)
+
+    print(f"bloqueante:  {t_block * 1e3:8.1f} ms/notificación (latencia servidor {FakeTelegram.latency * 1e3:.0f} ms)")
+    print(f"encolado:    {t_enqueue * 1e6:8.1f} µs/notificación (peor {worst * 1e6:.0f} µs)")
+    print(f"notificaciones {n} → POST recibidos {len(FakeTelegram.received)}")
+    print("contadores:", sender.stats())
+    sender.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
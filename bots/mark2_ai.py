@@ -1,24 +1,30 @@
 # bots/mark2_ai.py → VERSIÓN INMORTAL DEFINITIVA – 25 nov 2025 (anti-rango + filtro duro)
 import time
-import json
 import os
-import csv
 import logging
 import threading
 from datetime import datetime
 
-import MetaTrader5 as mt5
+from utils.broker import mt5
 import requests
 import pandas as pd
 
-from utils.mt5_connector import mt5_connect, send_order, close_position, get_positions
+from utils.mt5_connector import send_order, close_position
 from utils.feed_selector import get_feed
 from utils.telegram_notifier import (
-    notify_bot_started, notify_open_positions, notify_status, notify_trade, notify_close,
-    notify_error, notify_stopped, handle_telegram_command
+    notify_bot_started, notify_trade, notify_close,
+    notify_error, notify_stopped, register_bot, unregister_bot
 )
 from utils.settings_manager import get_settings
-from utils.telegram_notifier import BOT_COMMANDS_ENABLED
+from utils.stats_store import StatsStore
+from utils.trade_journal import get_journal
+from utils.symbol_catalog import get_catalog
+from utils.scheduler import BarScheduler
+from utils.evaluator import SymbolEvaluator
+from utils.log_pipeline import get_logger, EvaluationLog
+from utils.metrics import get_metrics, start_exporters
+from utils.session import get_session
+from utils.positions import get_position_book
 from utils.allowed_symbols import is_symbol_allowed
 
 TIMEFRAME_MAP = {
@@ -28,32 +34,36 @@ TIMEFRAME_MAP = {
 
 BASE_DIR = os.path.dirname(__file__) or "."
 DATA_FILE = os.path.join(BASE_DIR, "data", "stats.json")
-LOG_FILE = os.path.join(BASE_DIR, "logs", "mark2_trades.csv")
 APP_LOG = os.path.join(BASE_DIR, "logs", "mark2.log")
+EVAL_LOG = os.path.join(BASE_DIR, "logs", "mark2_eval.jsonl")   # una línea JSON por evaluación
+# Uno distinto por bot: las posiciones de cada bot se reconocen por su magic.
+# 234567 era el fijo de antes (lo compartían Mark2 y Mark3).
+MAGIC_NUMBER = 234568
+# Las posiciones que siguen abiertas con 234567 las adopta solo Mark2 (un solo
+# dueño: un solo cierre, un solo registro); Mark3 no adopta ninguna.
+LEGACY_MAGICS = (234567,)
 os.makedirs("logs", exist_ok=True)
 os.makedirs("data", exist_ok=True)
 
-logger = logging.getLogger("mark2")
-logger.setLevel(logging.DEBUG)
-fmt = logging.Formatter("%(asctime)s %(levelname)s: %(message)s")
-fh = logging.FileHandler(APP_LOG, encoding="utf-8")
-fh.setFormatter(fmt)
-fh.setLevel(logging.DEBUG)
-sh = logging.StreamHandler()
-sh.setFormatter(fmt)
-sh.setLevel(logging.INFO)
-logger.addHandler(fh)
-logger.addHandler(sh)
+# Logger: cola + hilo escritor, rotación con .gz (utils.log_pipeline)
+logger = get_logger("mark2", APP_LOG)
 
 
 class Mark2AIPro:
-    def __init__(self):
-        self.settings = get_settings("settings_mark2.json")
-        self.feed = get_feed(self.settings)
-        self.stats = self.load_stats()
+    def __init__(self, settings=None, feed=None, stats=None):
+        # settings/feed/stats inyectables (backtester); por defecto los de siempre
+        self.settings = settings or get_settings("settings_mark2.json")
+        self.feed = feed or get_feed(self.settings)
+        self._own_feed = feed is None      # un feed ajeno (supervisor, backtester) lo detiene su dueño
+        # contadores + journal (sin reescribir todo en cada cierre)
+        self.stats = stats if stats is not None else StatsStore(DATA_FILE)
+        self.journal = get_journal()         # SQLite compartido (bots/data/trades.db)
+        self.catalog = get_catalog()
 
         tf_raw = int(self.settings.get("TIMEFRAME", 15))
         self.timeframe = TIMEFRAME_MAP.get(tf_raw, mt5.TIMEFRAME_M15)
+        self.bar_seconds = (tf_raw if tf_raw in TIMEFRAME_MAP else 15) * 60
+        self.scheduler = None
 
         self.pairs = [p for p in self.settings.get("PAIRS", ["EURUSD"]) if is_symbol_allowed(p)]
         if not self.pairs:
@@ -61,22 +71,18 @@ class Mark2AIPro:
 
         self.running = True
         self.last_close_time = {}
-
-    def load_stats(self):
-        if os.path.exists(DATA_FILE):
-            try:
-                with open(DATA_FILE, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.warning("Error cargando stats.json: %s", e)
-        return {"trades": [], "win_rate": 0.0, "total_profit": 0.0, "last_update": None}
-
-    def save_stats(self):
-        try:
-            with open(DATA_FILE, "w", encoding="utf-8") as f:
-                json.dump(self.stats, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            logger.error("Error guardando stats: %s", e)
+        self.evaluator = SymbolEvaluator(int(self.settings.get("EVAL_WORKERS", 1)), "mark2-eval")
+        self.metrics = get_metrics()       # latencias por etapa (utils.metrics)
+        self.magic = int(self.settings.get("MAGIC_NUMBER") or MAGIC_NUMBER)
+        # las posiciones abiertas con el magic fijo de antes siguen siendo del bot
+        # (se vigilan y cuentan para MAX_POSITIONS) hasta que se cierren
+        legacy = (int(m) for m in self.settings.get("LEGACY_MAGICS", LEGACY_MAGICS))
+        self.magics = (self.magic, *(m for m in legacy if m != self.magic))
+        self.session = get_session()       # conexión MT5 compartida (latido + backoff)
+        self.book = get_position_book()    # foto de posiciones del ciclo (utils.positions)
+        self.eval_log = EvaluationLog("mark2", EVAL_LOG, float(self.settings.get("EVAL_LOG_SECONDS", 300)))
+        self.snapshot = {"balance": 0.0, "positions": (), "time": None}
+        self._snapshot_at = float("-inf")
 
     def calculate_lot_size(self, symbol):
         # ←←← TAL CUAL LO QUERÍAS: 0.01 fijo y la línea comentada sin tocar
@@ -88,48 +94,43 @@ class Mark2AIPro:
 
     def log_trade(self, symbol, direction=None, ticket=None, lot_size=None,
                   entry_price=None, exit_price=None, sl=None, tp=None,
-                  profit=None, reason="OPEN", duration_min=None):
-        try:
-            point = mt5.symbol_info(symbol).point if mt5.symbol_info(symbol) else 0.00001
-        except:
-            point = 0.00001
-
-        profit_pips = ""
-        if entry_price and exit_price and direction and point:
-            diff = (exit_price - entry_price) if direction == "BUY" else (entry_price - exit_price)
-            profit_pips = round(diff / point, 1)
-
-        file_exists = os.path.isfile(LOG_FILE)
-        try:
-            with open(LOG_FILE, "a", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                if not file_exists:
-                    writer.writerow(["timestamp","symbol","direction","ticket","lot_size",
-                                     "entry_price","exit_price","sl","tp","profit_usd","profit_pips","reason","duration_min"])
-                writer.writerow([
-                    datetime.now().strftime("%Y-%m-%d %H:%M:%S"), symbol, direction or "?",
-                    ticket or "?", f"{lot_size:.2f}" if lot_size else "",
-                    f"{entry_price:.5f}" if entry_price else "", f"{exit_price:.5f}" if exit_price else "",
-                    f"{sl:.5f}" if sl else "", f"{tp:.5f}" if tp else "",
-                    f"{profit:.2f}" if profit is not None else "", profit_pips, reason,
-                    f"{duration_min:.1f}" if duration_min else ""
-                ])
-        except Exception:
-            logger.exception("Error escribiendo CSV")
+                  profit=None, reason="OPEN", point=None):
+        """Apertura (reason="OPEN") o cierre en el diario de operaciones (solo encola)."""
+        if not ticket:
+            return
+        if reason == "OPEN":
+            self.journal.log_open("mark2", ticket, symbol, direction, lot_size, entry_price, sl, tp, point=point)
+        else:
+            self.journal.log_close("mark2", ticket, symbol, exit_price, profit, reason,
+                                   direction=direction, lots=lot_size, entry_price=entry_price)
 
     def update_stats(self, symbol, profit, reason):
-        trade = {"symbol": symbol, "profit": float(profit), "reason": reason, "time": datetime.now().isoformat()}
-        self.stats.setdefault("trades", []).append(trade)
-        self.stats["total_profit"] = round(self.stats.get("total_profit", 0) + float(profit), 2)
-        wins = sum(1 for t in self.stats["trades"] if t["profit"] > 0)
-        total = len(self.stats["trades"])
-        self.stats["win_rate"] = round((wins / total * 100), 2) if total > 0 else 0.0
-        self.stats["last_update"] = datetime.now().isoformat()
-        self.save_stats()
+        self.stats.record(symbol, profit, reason)
+
+    # ---------- snapshot para Telegram (lo lee el hilo de comandos, sin tocar el broker) ----------
+    def _refresh_snapshot(self, force=False):
+        # como mucho cada 2 s: /status no necesita más; las posiciones salen de la foto del ciclo
+        if not force and time.monotonic() - self._snapshot_at < 2:
+            return
+        self._snapshot_at = time.monotonic()
+        account = mt5.account_info()
+        self.snapshot = {
+            "balance": account.balance if account else self.snapshot["balance"],
+            "positions": self.book.snapshot().of(self.magics, self.pairs),
+            "time": datetime.now(),
+        }
+
+    def telegram_status(self):
+        return (self.snapshot["balance"] or 0, self.stats.win_rate,
+                self.stats.total_profit, self.stats.total_trades)
+
+    def stop(self):
+        self.running = False
+        if self._own_feed:
+            self.feed.stop()
 
     def get_open_positions_report(self):
-        positions = get_positions() or []
-        mark2_pos = [p for p in positions if p.symbol in self.pairs]
+        mark2_pos = self.snapshot["positions"]
         if not mark2_pos:
             return "MARK2: No hay posiciones abiertas."
         lines = [f"MARK2 - Posiciones abiertas ({len(mark2_pos)}):"]
@@ -144,123 +145,183 @@ class Mark2AIPro:
 
     def get_signal(self, symbol):
         try:
-            if not mt5.symbol_select(symbol, True):
+            spec = self.catalog.get(symbol)      # point/digits... cacheados (antes symbol_select + symbol_info)
+            if spec is None:
                 return None
 
-            candles = self.feed.get_candles(symbol, self.timeframe, 100)
-            if candles is None or len(candles) < 3:
+            t0 = time.perf_counter()
+            candles = self.feed.get_rates(symbol, self.timeframe, 100)
+            self.metrics.stage("candles", time.perf_counter() - t0, "mark2")
+            if candles is None or len(candles["time"]) < 3:
                 return None
 
-            prev = candles.iloc[-2]
+            prev_high, prev_low = candles["high"][-2], candles["low"][-2]   # vela cerrada
+            t0 = time.perf_counter()
             bid, ask = self.feed.get_current_price(symbol)
+            self.metrics.stage("tick", time.perf_counter() - t0, "mark2")
             if not bid or not ask:
                 return None
 
-            point = mt5.symbol_info(symbol).point
+            point = spec.point
             pips = float(self.settings.get("SUBIDA_PIPS", 1.4))  # ← AHORA 1.4 POR DEFECTO
 
             # === FILTRO ANTI-RANGO BRUTAL (la clave de todo) ===
-            rates = mt5.copy_rates_from_pos(symbol, mt5.TIMEFRAME_M15, 0, 20)
+            # M15 sale del feed (armado con la serie base), sin otra llamada al broker
+            range_pips = None
+            t0 = time.perf_counter()
+            rates = self.feed.get_rates(symbol, mt5.TIMEFRAME_M15, 20)
+            self.metrics.stage("candles", time.perf_counter() - t0, "mark2")
             if rates is not None:
-                high = max([r['high'] for r in rates])
-                low  = min([r['low']  for r in rates])
+                high = rates['high'].max()
+                low  = rates['low'].min()
                 range_pips = (high - low) / point
-                if range_pips < 48:  # Mercado muerto → NO OPERAR
-                    logger.info("FILTRO RANGO: %s solo %g pips en 20 velas M15 → NO OPERAR", symbol, range_pips)
-                    return None
             # ==================================================
 
-            sell_level = prev["low"]  + pips * point
-            buy_level  = prev["high"] - pips * point
-
-            if bid >= sell_level:
-                logger.info("SEÑAL SELL %s → bid %.5f ≥ %.5f (+%.1f pips)", symbol, bid, sell_level, pips)
-                return "SELL"
-            if ask <= buy_level:
-                logger.info("SEÑAL BUY %s → ask %.5f ≤ %.5f (+%.1f pips)", symbol, ask, buy_level, pips)
-                return "BUY"
-
-            return None
+            sell_level = prev_low  + pips * point
+            buy_level  = prev_high - pips * point
+
+            if range_pips is not None and range_pips < 48:  # Mercado muerto → NO OPERAR
+                signal = None
+            elif bid >= sell_level:
+                signal = "SELL"
+            elif ask <= buy_level:
+                signal = "BUY"
+            else:
+                signal = None
+
+            # un registro JSON por evaluación (muestreado), no una línea de texto por ciclo
+            if self.eval_log.wants(symbol, signal):
+                self.eval_log.record(symbol, signal, bid=bid, ask=ask, sell_level=sell_level,
+                                     buy_level=buy_level, pips=pips, range_pips=range_pips,
+                                     range_filter=range_pips is not None and range_pips < 48)
+            return signal
 
         except Exception as e:
             logger.error(f"Error get_signal({symbol}): {e}", exc_info=True)
             return None
 
+    def run_cycle(self):
+        """Una pasada completa: cierres TP/SL + nuevas órdenes (backtester)."""
+        snapshot = self.book.refresh()
+        self.monitor_closes(snapshot)
+        self.open_new_orders(snapshot=snapshot)     # la foto de antes de los cierres, como siempre
+        self._refresh_snapshot()
+
+    def monitor_closes(self, snapshot=None):
+        """Cierre TP/SL (igual). Solo las posiciones de este bot (magics + pares)."""
+        if snapshot is None:
+            snapshot = self.book.refresh()
+        for pos in snapshot.of(self.magics, self.pairs):
+            bid, ask = self.feed.get_current_price(pos.symbol)
+            if not bid or not ask: continue
+            price = ask if pos.type == mt5.ORDER_TYPE_BUY else bid
+            reason = None
+            if pos.tp and ((pos.type == mt5.ORDER_TYPE_BUY and price >= pos.tp) or
+                           (pos.type == mt5.ORDER_TYPE_SELL and price <= pos.tp)):
+                reason = "Take Profit"
+            elif pos.sl and ((pos.type == mt5.ORDER_TYPE_BUY and price <= pos.sl) or
+                             (pos.type == mt5.ORDER_TYPE_SELL and price >= pos.sl)):
+                reason = "Stop Loss"
+            if reason:
+                if not close_position(pos.ticket, pos, (bid, ask)):
+                    continue        # sigue abierta: se reintenta en el próximo chequeo, sin contarla
+                profit = pos.profit or 0
+                dir_str = "BUY" if pos.type == mt5.ORDER_TYPE_BUY else "SELL"
+                notify_close(pos.symbol, profit, reason, pos.ticket)
+                self.update_stats(pos.symbol, profit, reason)
+                self.log_trade(pos.symbol, dir_str, pos.ticket, pos.volume, pos.price_open, price,
+                               pos.sl, pos.tp, profit, reason)
+                self.last_close_time[pos.symbol] = datetime.now()
+
+    def open_new_orders(self, symbols=None, snapshot=None):
+        """Nuevas órdenes en `symbols` (por defecto todos los pares)."""
+        if snapshot is None:
+            snapshot = self.book.snapshot()        # la del chequeo de salidas si es reciente
+        own = snapshot.of(self.magics, self.pairs)     # límite: las de este bot (magics + pares)
+        open_symbols = snapshot.symbols                 # cualquier posición de la cuenta bloquea el símbolo
+        if len(own) < int(self.settings.get("MAX_POSITIONS", 2)):
+            # señales en paralelo; órdenes de una en una y en el orden de PAIRS
+            # símbolos con la historia cargándose en segundo plano se saltan (no bloquean)
+            candidates = [sym for sym in (symbols or self.pairs)
+                          if sym not in open_symbols and self.feed.available(sym)]
+            with self.feed.market_snapshot(candidates):        # precios en una llamada, velas una vez
+                signals = self.evaluator.map(self.get_signal, candidates)
+            for sym, signal in signals:
+                if not signal: continue
+
+                lot = self.calculate_lot_size(sym)  # ← 0.01 fijo
+                bid, ask = self.feed.get_current_price(sym)
+                price = ask if signal == "BUY" else bid
+                point = self.catalog.point(sym)
+
+                sl_pips = float(self.settings.get("STOP_LOSS_PIPS", 35))
+                tp_pips = float(self.settings.get("STOP_WIN_PIPS", 60))
+                sl = price - sl_pips * point if signal == "BUY" else price + sl_pips * point
+                tp = price + tp_pips * point if signal == "BUY" else price - tp_pips * point
+
+                ticket = send_order(sym, mt5.ORDER_TYPE_BUY if signal=="BUY" else mt5.ORDER_TYPE_SELL, lot, price, sl, tp, magic=self.magic)
+                if ticket:
+                    notify_trade(sym, signal, price, sl, tp, ticket, lot)
+                    self.log_trade(sym, signal, ticket, lot, price, sl=sl, tp=tp, reason="OPEN", point=point)
+                    logger.info("ABIERTA → %s %s %.2f lotes | ticket %s", sym, signal, lot, ticket)
+
+    def _exit_check(self):
+        self.monitor_closes()
+        self._refresh_snapshot()
+
     def run_forever(self):
         logger.info("MARK2 INMORTAL INICIADO – VERSIÓN ANTI-RANGO 100%")
+        start_exporters("mark2")           # /metrics + bots/logs/metrics_mark2.prom
+
+        # Una sola sesión con latido y reconexión propia (utils.session): aquí
+        # solo se espera a que esté arriba, sin volver a llamar a initialize()
+        self.session.start()
+        self.session.watch(self.pairs)
+        if not self._wait_session():
+            return
+        balance = mt5.account_info().balance or 0
+        notify_bot_started(balance, self.settings.get("STOP_WIN_PIPS", 60),
+                           self.settings.get("STOP_LOSS_PIPS", 35), self.pairs, "MARK2")
+        register_bot("mark2", self)     # /status /posiciones /stop
+        self.feed.sync_history(self.pairs, [self.timeframe, mt5.TIMEFRAME_M15])   # histórico local al día (utils.history_store)
 
         while self.running:
             try:
-                if not mt5_connect():
-                    time.sleep(15)
-                    continue
-
-                balance = mt5.account_info().balance or 0
-                notify_bot_started(balance, self.settings.get("STOP_WIN_PIPS", 60),
-                                   self.settings.get("STOP_LOSS_PIPS", 35), self.pairs, "MARK2")
-
-                # ... (el resto del bucle principal igual que antes) ...
-                # (no lo repito para no hacer el mensaje eterno, pero TODO lo demás queda IGUAL)
-
-                while self.running:
-                    positions_all = get_positions() or []
-                    open_symbols = {p.symbol for p in positions_all if p.symbol in self.pairs}
-
-                    # Cierre TP/SL (igual)
-                    for pos in positions_all:
-                        if pos.symbol not in self.pairs: continue
-                        bid, ask = self.feed.get_current_price(pos.symbol)
-                        if not bid or not ask: continue
-                        price = ask if pos.type == mt5.ORDER_TYPE_BUY else bid
-                        reason = None
-                        if pos.tp and ((pos.type == mt5.ORDER_TYPE_BUY and price >= pos.tp) or
-                                       (pos.type == mt5.ORDER_TYPE_SELL and price <= pos.tp)):
-                            reason = "Take Profit"
-                        elif pos.sl and ((pos.type == mt5.ORDER_TYPE_BUY and price <= pos.sl) or
-                                         (pos.type == mt5.ORDER_TYPE_SELL and price >= pos.sl)):
-                            reason = "Stop Loss"
-                        if reason:
-                            close_position(pos.ticket)
-                            profit = pos.profit or 0
-                            dir_str = "BUY" if pos.type == mt5.ORDER_TYPE_BUY else "SELL"
-                            notify_close(pos.symbol, profit, reason, pos.ticket)
-                            self.update_stats(pos.symbol, profit, reason)
-                            self.log_trade(pos.symbol, dir_str, pos.ticket, pos.volume, pos.price_open, price,
-                                           pos.sl, pos.tp, profit, reason)
-                            self.last_close_time[pos.symbol] = datetime.now()
-
-                    # Nuevas órdenes
-                    if len([p for p in positions_all if p.symbol in self.pairs]) < int(self.settings.get("MAX_POSITIONS", 2)):
-                        for sym in self.pairs:
-                            if sym in open_symbols: continue
-                            signal = self.get_signal(sym)
-                            if not signal: continue
-
-                            lot = self.calculate_lot_size(sym)  # ← 0.01 fijo
-                            bid, ask = self.feed.get_current_price(sym)
-                            price = ask if signal == "BUY" else bid
-                            point = mt5.symbol_info(sym).point
-
-                            sl_pips = float(self.settings.get("STOP_LOSS_PIPS", 35))
-                            tp_pips = float(self.settings.get("STOP_WIN_PIPS", 60))
-                            sl = price - sl_pips * point if signal == "BUY" else price + sl_pips * point
-                            tp = price + tp_pips * point if signal == "BUY" else price - tp_pips * point
-
-                            ticket = send_order(sym, mt5.ORDER_TYPE_BUY if signal=="BUY" else mt5.ORDER_TYPE_SELL, lot, price, sl, tp)
-                            if ticket:
-                                notify_trade(sym, signal, price, sl, tp, ticket, lot)
-                                self.log_trade(sym, signal, ticket, lot, price, sl=sl, tp=tp, reason="OPEN")
-                                logger.info("ABIERTA → %s %s %.2f lotes | ticket %s", sym, signal, lot, ticket)
-
-                    time.sleep(int(self.settings.get("MAIN_LOOP_DELAY", 15)))
+                if not self._wait_session():
+                    break
+                self._refresh_snapshot(force=True)
+
+                # Entradas al cerrar cada vela y, como la señal depende del precio
+                # actual, también cada ENTRY_CHECK_SECONDS; salidas cada EXIT_CHECK_SECONDS
+                scheduler = BarScheduler(
+                    {sym: self.bar_seconds for sym in self.pairs},
+                    evaluate=self.open_new_orders,
+                    monitor=self._exit_check,
+                    exit_seconds=float(self.settings.get("EXIT_CHECK_SECONDS", 5)),
+                    entry_seconds=float(self.settings.get("ENTRY_CHECK_SECONDS", self.settings.get("MAIN_LOOP_DELAY", 15))),
+                    logger=logger,
+                    clock=self.feed.clock,      # BROKER=replay → reloj del día reproducido
+                    sleep=self.feed.sleep,
+                )
+                self.scheduler = scheduler
+                # si la sesión se cae, el planificador se detiene hasta que vuelva
+                scheduler.run(lambda: self.running and self.session.connected.is_set())
 
             except Exception as e:
                 logger.error("ERROR → %s", e)
                 time.sleep(10)
 
+        unregister_bot("mark2")
         logger.info("MARK2 DETENIDO")
         notify_stopped()
 
+    def _wait_session(self):
+        """Bloquea hasta que haya sesión MT5; False si antes se detuvo el bot."""
+        while self.running:
+            if self.session.wait(5):
+                return True
+        return False
+
 
 def run():
     bot = Mark2AIPro()
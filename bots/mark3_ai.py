@@ -3,53 +3,55 @@
 
 import os
 import time
-import json
-import csv
 import logging
-import threading
 from datetime import datetime, timedelta
 
-import MetaTrader5 as mt5
+from utils.broker import mt5
 import numpy as np
 import pandas as pd
-import requests
 
-from utils.mt5_connector import mt5_connect, send_order, close_position, get_positions
+from utils.mt5_connector import send_order, close_position
 from utils.feed_selector import get_feed
 from utils.telegram_notifier import (
-    notify_bot_started, notify_status, notify_trade, notify_close,
-    notify_error, notify_stopped, handle_telegram_command, notify_open_positions
+    notify_bot_started, notify_trade, notify_close,
+    notify_stopped, register_bot, unregister_bot
 )
 from utils.settings_manager import get_settings
-from utils.telegram_notifier import BOT_COMMANDS_ENABLED
+from utils.stats_store import StatsStore
+from utils.trade_journal import get_journal
+from utils.symbol_catalog import get_catalog
+from utils.scheduler import BarScheduler
+from utils.evaluator import SymbolEvaluator
+from utils.log_pipeline import get_logger, EvaluationLog
+from utils.metrics import get_metrics, start_exporters
+from utils.session import get_session
+from utils.positions import get_position_book
 from utils.allowed_symbols import is_symbol_allowed
+from utils.indicators import BarIndicators
 
 BASE_DIR = os.path.dirname(__file__) or "."
 DATA_FILE = os.path.join(BASE_DIR, "data", "mark3_stats.json")
-LOG_FILE = os.path.join(BASE_DIR, "logs", "mark3_trades.csv")
 APP_LOG = os.path.join(BASE_DIR, "logs", "mark3.log")
+EVAL_LOG = os.path.join(BASE_DIR, "logs", "mark3_eval.jsonl")   # una línea JSON por evaluación
+# Uno distinto por bot: las posiciones de cada bot se reconocen por su magic.
+# 234567 era el fijo de antes (lo compartían Mark2 y Mark3).
+MAGIC_NUMBER = 234569
+LEGACY_MAGICS = ()       # las de 234567 las adopta Mark2 (ver bots/mark2_ai.py)
 os.makedirs("logs", exist_ok=True)
 os.makedirs("data", exist_ok=True)
 
-# Logger
-logger = logging.getLogger("mark3")
-logger.setLevel(logging.DEBUG)
-fmt = logging.Formatter("%(asctime)s %(levelname)s: %(message)s")
-fh = logging.FileHandler(APP_LOG, encoding="utf-8")
-fh.setFormatter(fmt)
-fh.setLevel(logging.DEBUG)
-sh = logging.StreamHandler()
-sh.setFormatter(fmt)
-sh.setLevel(logging.INFO)
-logger.addHandler(fh)
-logger.addHandler(sh)
+# Logger: cola + hilo escritor, rotación con .gz (utils.log_pipeline)
+logger = get_logger("mark3", APP_LOG)
 
 TIMEFRAME_MAP = {
     1: mt5.TIMEFRAME_M1, 5: mt5.TIMEFRAME_M5, 15: mt5.TIMEFRAME_M15,
     30: mt5.TIMEFRAME_M30, 60: mt5.TIMEFRAME_H1, 240: mt5.TIMEFRAME_H4, 1440: mt5.TIMEFRAME_D1
 }
 
-# ---------- indicadores ----------
+# velas cerradas (antes de la última) que forman el rango de ruptura
+BREAKOUT_BARS = 8
+
+# ---------- indicadores (versión pandas; el bot usa utils.indicators) ----------
 def ema(series, period): 
     return series.ewm(span=period, adjust=False).mean()
 
@@ -59,16 +61,35 @@ def atr(df, n=14):
     return tr.rolling(n).mean()
 
 class Mark3Pro:
-    def __init__(self):
-        self.settings = get_settings("settings_mark3.json")
+    def __init__(self, settings=None, feed=None, stats=None):
+        # settings/feed/stats inyectables (backtester); por defecto los de siempre
+        self.settings = settings or get_settings("settings_mark3.json")
         tf_raw = int(self.settings.get("TIMEFRAME", 60))
         self.timeframe = TIMEFRAME_MAP.get(tf_raw, mt5.TIMEFRAME_H1)
+        self.bar_seconds = (tf_raw if tf_raw in TIMEFRAME_MAP else 60) * 60
+        self.scheduler = None
         self.pairs = [p for p in self.settings.get("PAIRS", ["EURUSD.sml"]) if is_symbol_allowed(p)]
-        self.feed = get_feed(self.settings)
-        self.stats = self._load_stats()
+        self.feed = feed or get_feed(self.settings)
+        self._own_feed = feed is None      # un feed ajeno (supervisor, backtester) lo detiene su dueño
+        # contadores + journal (sin reescribir todo en cada cierre)
+        self.stats = stats if stats is not None else StatsStore(DATA_FILE)
+        self.journal = get_journal()         # SQLite compartido (bots/data/trades.db)
+        self.catalog = get_catalog()
         self.running = True
-        self.telegram_thread = None
+        self.snapshot = {"balance": 0.0, "positions": (), "time": None}
+        self._snapshot_at = float("-inf")
         self.last_close_time = {}  # cooldown 15 min tras cierre
+        self.indicators = {}       # símbolo → BarIndicators
+        self.evaluator = SymbolEvaluator(int(self.settings.get("EVAL_WORKERS", 1)), "mark3-eval")
+        self.metrics = get_metrics()       # latencias por etapa (utils.metrics)
+        self.magic = int(self.settings.get("MAGIC_NUMBER") or MAGIC_NUMBER)
+        # las posiciones abiertas con el magic fijo de antes siguen siendo del bot
+        # (se vigilan y cuentan para MAX_POSITIONS) hasta que se cierren
+        legacy = (int(m) for m in self.settings.get("LEGACY_MAGICS", LEGACY_MAGICS))
+        self.magics = (self.magic, *(m for m in legacy if m != self.magic))
+        self.session = get_session()       # conexión MT5 compartida (latido + backoff)
+        self.book = get_position_book()    # foto de posiciones del ciclo (utils.positions)
+        self.eval_log = EvaluationLog("mark3", EVAL_LOG, float(self.settings.get("EVAL_LOG_SECONDS", 300)))
 
         # parámetros
         self.RISK_PCT = float(self.settings.get("RISK_PCT", 1.0)) / 100.0
@@ -78,39 +99,24 @@ class Mark3Pro:
         self.ATR_MULT_SL = float(self.settings.get("ATR_MULT_SL", 1.2))
         self.ATR_MULT_TP = float(self.settings.get("ATR_MULT_TP", 2.5))
 
-    def _load_stats(self):
-        if os.path.exists(DATA_FILE):
-            try:
-                with open(DATA_FILE, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            except: pass
-        return {"trades": [], "total_profit": 0.0, "win_rate": 0.0}
-
-    def _save_stats(self):
-        try:
-            with open(DATA_FILE, "w", encoding="utf-8") as f:
-                json.dump(self.stats, f, indent=2, ensure_ascii=False)
-        except: pass
-
     def _log_trade(self, **kwargs):
-        row = [datetime.now().strftime("%Y-%m-%d %H:%M:%S"), kwargs.get("symbol",""), kwargs.get("dir",""),
-               kwargs.get("ticket",""), kwargs.get("lots",""), kwargs.get("entry",""), kwargs.get("exit",""),
-               kwargs.get("sl",""), kwargs.get("tp",""), kwargs.get("profit",""), kwargs.get("pips",""),
-               kwargs.get("reason",""), kwargs.get("duration","")]
-        file_exists = os.path.isfile(LOG_FILE)
-        try:
-            with open(LOG_FILE, "a", newline="", encoding="utf-8") as f:
-                w = csv.writer(f)
-                if not file_exists:
-                    w.writerow(["timestamp","symbol","direction","ticket","lots","entry","exit","sl","tp","profit","pips","reason","duration"])
-                w.writerow(row)
-        except: pass
+        """Apertura (sin profit) o cierre (con profit) en el diario de operaciones (solo encola)."""
+        if not kwargs.get("ticket"):
+            return
+        if kwargs.get("profit") is None:
+            self.journal.log_open("mark3", kwargs["ticket"], kwargs.get("symbol"), kwargs.get("dir"),
+                                  kwargs.get("lots"), kwargs.get("entry"), kwargs.get("sl"), kwargs.get("tp"),
+                                  point=kwargs.get("point"), reason=kwargs.get("reason", "OPEN"))
+        else:
+            self.journal.log_close("mark3", kwargs["ticket"], kwargs.get("symbol"), kwargs.get("exit"),
+                                   kwargs["profit"], kwargs.get("reason"), direction=kwargs.get("dir"),
+                                   lots=kwargs.get("lots"), entry_price=kwargs.get("entry"))
 
     def _calc_lots(self, symbol, sl_pips):
         info = mt5.account_info()
         balance = info.balance if info else 1000
         risk = balance * self.RISK_PCT
-        si = mt5.symbol_info(symbol)
+        si = self.catalog.get(symbol)
         if not si: return 0.01
         point = si.point
         value_per_pip = 10 if "USD" in symbol else 9
@@ -118,12 +124,35 @@ class Mark3Pro:
         lots = round(max(0.01, min(lots, 2.0)), 2)
         return lots
 
+    # =========================================
+    # SNAPSHOT PARA TELEGRAM (lo lee el hilo de comandos, sin tocar el broker)
+    # =========================================
+    def _refresh_snapshot(self, force=False):
+        # como mucho cada 2 s: /status no necesita más; las posiciones salen de la foto del ciclo
+        if not force and time.monotonic() - self._snapshot_at < 2:
+            return
+        self._snapshot_at = time.monotonic()
+        account = mt5.account_info()
+        self.snapshot = {
+            "balance": account.balance if account else self.snapshot["balance"],
+            "positions": self.book.snapshot().of(self.magics, self.pairs),
+            "time": datetime.now(),
+        }
+
+    def telegram_status(self):
+        return (self.snapshot["balance"] or 0, self.stats.win_rate,
+                self.stats.total_profit, self.stats.total_trades)
+
+    def stop(self):
+        self.running = False
+        if self._own_feed:
+            self.feed.stop()
+
     # =========================================
     # REPORTE /posiciones
     # =========================================
     def get_open_positions_report(self):
-        positions = get_positions() or []
-        mark3_pos = [p for p in positions if p.symbol in self.pairs]
+        mark3_pos = self.snapshot["positions"]
         if not mark3_pos:
             return "MARK3: No hay posiciones abiertas."
         lines = [f"MARK3 - Posiciones abiertas ({len(mark3_pos)}):"]
@@ -137,127 +166,135 @@ class Mark3Pro:
         return "\n".join(lines)
 
     # =========================================
-    # Telegram commands
+    # INDICADORES INCREMENTALES (solo avanzan con vela cerrada nueva)
     # =========================================
-    def _telegram_fix(self):
-        if not BOT_COMMANDS_ENABLED: return
-        try:
-            token = os.getenv('TELEGRAM_BOT_TOKEN') or self.settings.get("TELEGRAM_BOT_TOKEN")
-            if not token: return
-            url = f"https://api.telegram.org/bot{token}/getUpdates?offset=-1&limit=5&timeout=1"
-            r = requests.get(url, timeout=6)
-            if r.status_code != 200: return
-            for u in r.json().get("result", []):
-                if "message" not in u: continue
-                text = u["message"].get("text", "").strip()
-                if not text.startswith("/"): continue
-                res = handle_telegram_command(text)
-                if res == "stop":
-                    logger.info("COMANDO /stop → DETENIENDO MARK3")
-                    self.running = False
-                    notify_stopped()
-                elif res.startswith("status"):
-                    bal = mt5.account_info().balance or 0
-                    notify_status(bal, self.stats.get("win_rate",0), self.stats.get("total_profit",0), len(self.stats["trades"]))
-                elif res == "posiciones":
-                    report = self.get_open_positions_report()
-                    notify_open_positions(report)
-                upd_id = u.get("update_id")
-                if upd_id:
-                    requests.get(f"https://api.telegram.org/bot{token}/getUpdates?offset={upd_id+1}", timeout=3)
-        except: pass
+    def _update_indicators(self, symbol):
+        """Devuelve el BarIndicators del símbolo al día con la última vela cerrada.
+        Primera vez (o hueco): siembra con 200 velas. Después: pide 3 velas y
+        avanza solo las cerradas nuevas → O(1) por vela."""
+        ind = self.indicators.get(symbol)
+        t0 = time.perf_counter()
+        rates = self.feed.get_rates(symbol, self.timeframe, 200 if ind is None else 3)
+        self.metrics.stage("candles", time.perf_counter() - t0, "mark3")
+        if rates is None or len(rates['time']) < 3:
+            return None
+
+        # vistas NumPy del caché del feed, sin la vela en formación
+        times = rates['time'][:-1]
+        highs = rates['high'][:-1]
+        lows = rates['low'][:-1]
+        closes = rates['close'][:-1]
+
+        start = 0
+        if ind is not None:
+            if times[-1] == ind.last_time:
+                return ind
+            start = int(np.searchsorted(times, ind.last_time, side="right"))
+            if start == 0:
+                # se saltaron más velas de las pedidas → re-sembrar
+                self.indicators.pop(symbol, None)
+                return self._update_indicators(symbol)
+        elif len(rates['time']) < 50:
+            return None
+        else:
+            ind = BarIndicators(self.EMA_FAST, self.EMA_SLOW, 14, BREAKOUT_BARS)
+
+        t0 = time.perf_counter()
+        for i in range(start, len(times)):
+            ind.update(times[i], highs[i], lows[i], closes[i])
+        self.metrics.stage("indicators", time.perf_counter() - t0, "mark3")
+        self.indicators[symbol] = ind
+        return ind
 
     # =========================================
     # ANÁLISIS + DEBUG COMPLETO
     # =========================================
-    def analyze_and_trade(self):
-        positions_all = get_positions() or []
-        open_symbols = {p.symbol for p in positions_all}
-
-        for symbol in self.pairs:
-            # límite posiciones + cooldown
-            if len([p for p in positions_all if p.symbol in self.pairs]) >= self.MAX_POSITIONS:
-                break
-            if symbol in open_symbols: continue
-            if self.last_close_time.get(symbol) and (datetime.now() - self.last_close_time[symbol]).total_seconds() < 900:
-                continue
+    def analyze_and_trade(self, symbols=None):
+        # foto del chequeo de salidas (ya sin lo que se cerró) si es reciente
+        snapshot = self.book.snapshot()
+        open_symbols = snapshot.symbols           # cualquier posición de la cuenta bloquea el símbolo
 
+        # límite posiciones (las de este bot: magics + pares)
+        if len(snapshot.of(self.magics, self.pairs)) >= self.MAX_POSITIONS:
+            return
+        # cooldown 15 min tras cierre
+        candidates = [s for s in (symbols or self.pairs)
+                      if s not in open_symbols and not (self.last_close_time.get(s) and
+                      (datetime.now() - self.last_close_time[s]).total_seconds() < 900)]
+        # historia todavía cargándose en segundo plano (o fallida) → se salta, sin bloquear
+        candidates = [s for s in candidates if self.feed.available(s)]
+
+        # evaluación en paralelo; órdenes de una en una y en el orden de PAIRS
+        with self.feed.market_snapshot(candidates):            # precios en una llamada, velas una vez
+            entries = self.evaluator.map(self._evaluate_symbol, candidates)
+        for symbol, entry in entries:
+            if entry is None:
+                continue
             try:
-                if not mt5.symbol_select(symbol, True): continue
-
-                df = self.feed.get_candles(symbol, self.timeframe, 200)
-                if df is None or len(df) < 50: continue
-
-                df = df.copy()
-                for c in ["open","high","low","close"]:
-                    df[c] = pd.to_numeric(df[c], errors="coerce")
-                df = df.dropna()
-
-                df['ema20'] = ema(df['close'], 20)
-                df['ema50'] = ema(df['close'], 50)
-                df['atr'] = atr(df, 14)
-
-                last = df.iloc[-2]  # vela cerrada
-                curr_bid, curr_ask = self.feed.get_current_price(symbol)
-                if not curr_bid or not curr_ask: continue
-
-                # ==================== DEBUG POTENTE ====================
-                logger.info("")
-                logger.info("DEBUG %s | %s", symbol, datetime.now().strftime("%H:%M:%S"))
-                logger.info("EMA20 %.5f | EMA50 %.5f → %s", 
-                            last['ema20'], last['ema50'], "ALCISTA" if last['ema20']>last['ema50'] else "BAJISTA")
-                logger.info("Vela cerrada → Close %.5f | High %.5f | Low %.5f", last['close'], last['high'], last['low'])
-                recent_high = df['high'].iloc[-10:-2].max()   # solo 9 velas cerradas
-                recent_low  = df['low'].iloc[-10:-2].min()
-                logger.info("Rango 19 velas → High %.5f | Low %.5f", recent_high, recent_low)
-                logger.info("Precio actual → Ask %.5f | Bid %.5f", curr_ask, curr_bid)
-                logger.info("Cond. COMPRA → Close>High19: %s | Ask>HighVela: %s", 
-                            last['close'] > recent_high, curr_ask > last['high'])
-                logger.info("Cond. VENTA  → Close<Low19: %s | Bid<LowVela: %s", 
-                            last['close'] < recent_low, curr_bid < last['low'])
-                logger.info("ATR %.5f → SL %.5f | TP %.5f", last['atr'], last['atr']*self.ATR_MULT_SL, last['atr']*self.ATR_MULT_TP)
-                logger.info("════════════════════════════════════════════════")
-                # ========================================================
-
-                trend_up = last['ema20'] > last['ema50']
-                atr_val = max(last['atr'], 0.0001)
-                point = mt5.symbol_info(symbol).point
-                sl_distance = atr_val * self.ATR_MULT_SL
-                tp_distance = atr_val * self.ATR_MULT_TP
-                sl_pips = sl_distance / point
-
-                # lots = self._calc_lots(symbol, sl_pips)   # ← descomenta cuando quieras lote dinámico
-                lots = 0.01  # ← lote fijo para pruebas
-
-                recent_high = df['high'].iloc[-10:-2].max()   # solo 9 velas cerradas
-                recent_low  = df['low'].iloc[-10:-2].min()
-
-                # ENTRADAS ORIGINALES (muy estrictas)
-                if trend_up and last['close'] > recent_high and curr_ask > last['high']:
-                    sl = curr_ask - sl_distance
-                    tp = curr_ask + tp_distance
-                    ticket = send_order(symbol, mt5.ORDER_TYPE_BUY, lots, curr_ask, sl, tp)
-                    if ticket:
-                        notify_trade(symbol, "BUY", curr_ask, sl, tp, ticket, lots)
-                        self._log_trade(symbol=symbol, dir="BUY", ticket=ticket, lots=lots, entry=curr_ask, sl=sl, tp=tp, reason="BREAKOUT")
-                        logger.info("MARK3 COMPRA ABIERTA %s - Ticket %d", symbol, ticket)
-
-                elif not trend_up and last['close'] < recent_low and curr_bid < last['low']:
-                    sl = curr_bid + sl_distance
-                    tp = curr_bid - tp_distance
-                    ticket = send_order(symbol, mt5.ORDER_TYPE_SELL, lots, curr_bid, sl, tp)
-                    if ticket:
-                        notify_trade(symbol, "SELL", curr_bid, sl, tp, ticket, lots)
-                        self._log_trade(symbol=symbol, dir="SELL", ticket=ticket, lots=lots, entry=curr_bid, sl=sl, tp=tp, reason="BREAKOUT")
-                        logger.info("MARK3 VENTA ABIERTA %s - Ticket %d", symbol, ticket)
-
+                direction, price, sl, tp, lots, point = entry
+                order_type = mt5.ORDER_TYPE_BUY if direction == "BUY" else mt5.ORDER_TYPE_SELL
+                ticket = send_order(symbol, order_type, lots, price, sl, tp, comment="Mark3_AI", magic=self.magic)
+                if ticket:
+                    notify_trade(symbol, direction, price, sl, tp, ticket, lots)
+                    self._log_trade(symbol=symbol, dir=direction, ticket=ticket, lots=lots, entry=price, sl=sl, tp=tp, point=point, reason="BREAKOUT")
+                    logger.info("MARK3 %s ABIERTA %s - Ticket %d", "COMPRA" if direction == "BUY" else "VENTA", symbol, ticket)
             except Exception as e:
                 logger.error("Error en %s: %s", symbol, e, exc_info=True)
 
+    def _evaluate_symbol(self, symbol):
+        """Señal de un símbolo (corre en el pool): None o (dir, precio, sl, tp, lotes, point)."""
+        spec = self.catalog.get(symbol)      # antes symbol_select + symbol_info en cada pasada
+        if spec is None: return None
+
+        ind = self._update_indicators(symbol)
+        if ind is None or ind.atr.value is None: return None
+
+        t0 = time.perf_counter()
+        curr_bid, curr_ask = self.feed.get_current_price(symbol)
+        self.metrics.stage("tick", time.perf_counter() - t0, "mark3")
+        if not curr_bid or not curr_ask: return None
+
+        # vela cerrada + rango de las 8 velas anteriores (antes iloc[-10:-2])
+        last_close, last_high, last_low = ind.last_close, ind.last_high, ind.last_low
+        recent_high, recent_low = ind.channel.high, ind.channel.low
+        ema_fast, ema_slow, atr_now = ind.ema_fast.value, ind.ema_slow.value, ind.atr.value
+
+        trend_up = ema_fast > ema_slow
+        atr_val = max(atr_now, 0.0001)
+        point = spec.point
+        sl_distance = atr_val * self.ATR_MULT_SL
+        tp_distance = atr_val * self.ATR_MULT_TP
+        sl_pips = sl_distance / point
+
+        # lots = self._calc_lots(symbol, sl_pips)   # ← descomenta cuando quieras lote dinámico
+        lots = 0.01  # ← lote fijo para pruebas
+
+        # ENTRADAS ORIGINALES (muy estrictas)
+        buy_break, buy_trigger = last_close > recent_high, curr_ask > last_high
+        sell_break, sell_trigger = last_close < recent_low, curr_bid < last_low
+        entry = None
+        if trend_up and buy_break and buy_trigger:
+            entry = "BUY", curr_ask, curr_ask - sl_distance, curr_ask + tp_distance, lots, point
+        elif not trend_up and sell_break and sell_trigger:
+            entry = "SELL", curr_bid, curr_bid + sl_distance, curr_bid - tp_distance, lots, point
+
+        # ==================== DEBUG POTENTE ====================
+        # un registro JSON por evaluación (antes ~10 líneas de texto), muestreado
+        decision = entry[0] if entry else None
+        if self.eval_log.wants(symbol, decision):
+            self.eval_log.record(
+                symbol, decision, ema_fast=ema_fast, ema_slow=ema_slow,
+                trend="ALCISTA" if trend_up else "BAJISTA",
+                close=last_close, high=last_high, low=last_low,
+                range_high=recent_high, range_low=recent_low, ask=curr_ask, bid=curr_bid,
+                buy=[buy_break, buy_trigger], sell=[sell_break, sell_trigger],
+                atr=atr_now, sl_dist=sl_distance, tp_dist=tp_distance)
+        # ========================================================
+        return entry
+
     def monitor_closes(self):
-        positions_all = get_positions() or []
-        for pos in positions_all:
-            if pos.symbol not in self.pairs: continue
+        # una foto nueva por chequeo de salidas; la reusan entradas y /posiciones
+        for pos in self.book.refresh().of(self.magics, self.pairs):
             bid, ask = self.feed.get_current_price(pos.symbol)
             if not bid or not ask: continue
             price = ask if pos.type == mt5.ORDER_TYPE_BUY else bid
@@ -269,44 +306,74 @@ class Mark3Pro:
                              (pos.type == mt5.ORDER_TYPE_SELL and price >= pos.sl)):
                 reason = "Stop Loss"
             if reason:
-                close_position(pos.ticket)
+                if not close_position(pos.ticket, pos, (bid, ask)):
+                    continue        # sigue abierta: se reintenta en el próximo chequeo, sin contarla
                 profit = pos.profit or 0
                 notify_close(pos.symbol, profit, reason, pos.ticket)
-                self.stats["trades"].append({"profit": profit})
-                self.stats["total_profit"] = round(self.stats.get("total_profit",0) + profit, 2)
-                wins = sum(1 for t in self.stats["trades"] if t["profit"] > 0)
-                self.stats["win_rate"] = round(wins/len(self.stats["trades"])*100, 2) if self.stats["trades"] else 0
-                self._save_stats()
-                self._log_trade(symbol=pos.symbol, ticket=pos.ticket, profit=profit, reason=reason)
+                self.stats.record(pos.symbol, profit, reason)
+                self._log_trade(symbol=pos.symbol, ticket=pos.ticket, profit=profit, reason=reason,
+                                dir="BUY" if pos.type == mt5.ORDER_TYPE_BUY else "SELL",
+                                lots=pos.volume, entry=pos.price_open, exit=price)
                 self.last_close_time[pos.symbol] = datetime.now()
 
+    def _exit_check(self):
+        self.monitor_closes()
+        self._refresh_snapshot()
+
+    def run_cycle(self):
+        """Una pasada completa: cierres TP/SL + análisis de entradas (backtester)."""
+        self.monitor_closes()
+        self.analyze_and_trade()
+        self._refresh_snapshot()
+
     def run(self):
-        if not mt5_connect():
-            notify_error("No se pudo conectar a MT5")
+        # Sesión persistente (utils.session): latido + reconexión con backoff;
+        # el bot solo espera a que esté arriba
+        self.session.start()
+        self.session.watch(self.pairs)
+        if not self._wait_session():
             return
 
         balance = mt5.account_info().balance or 0
         notify_bot_started(balance, f"ATR x{self.ATR_MULT_TP}", f"ATR x{self.ATR_MULT_SL}", self.pairs, "MARK3 PRO + DEBUG")
         logger.info("MARK3 PRO + DEBUG INICIADO | Balance: $%.2f | Pares: %s", balance, self.pairs)
 
-        def tg_thread():
-            while self.running:
-                self._telegram_fix()
-                time.sleep(5)
-        self.telegram_thread = threading.Thread(target=tg_thread, daemon=True)
-        self.telegram_thread.start()
-
+        start_exporters("mark3")           # /metrics + bots/logs/metrics_mark3.prom
+        register_bot("mark3", self)     # /status /posiciones /stop
+        self.feed.sync_history(self.pairs, [self.timeframe])   # histórico local al día (utils.history_store)
+
+        # Análisis justo al cerrar cada vela (+ confirmación con precio actual cada
+        # ENTRY_CHECK_SECONDS, 0 = solo al cierre); salidas cada EXIT_CHECK_SECONDS
+        self.scheduler = BarScheduler(
+            {sym: self.bar_seconds for sym in self.pairs},
+            evaluate=self.analyze_and_trade,
+            monitor=self._exit_check,
+            exit_seconds=float(self.settings.get("EXIT_CHECK_SECONDS", 5)),
+            entry_seconds=float(self.settings.get("ENTRY_CHECK_SECONDS", self.settings.get("MAIN_LOOP_DELAY", 45))),
+            logger=logger,
+            clock=self.feed.clock,      # BROKER=replay → reloj del día reproducido
+            sleep=self.feed.sleep,
+        )
         try:
-            while self.running:
-                self.monitor_closes()
-                self.analyze_and_trade()
-                time.sleep(int(self.settings.get("MAIN_LOOP_DELAY", 45)))
+            # si la sesión se cae, el planificador se detiene y se retoma al volver
+            while self._wait_session():
+                self._refresh_snapshot(force=True)
+                self.scheduler.run(lambda: self.running and self.session.connected.is_set())
         except KeyboardInterrupt:
             logger.info("Detenido por usuario")
         finally:
-            self.running = False
+            self.stop()
+            unregister_bot("mark3")
+            notify_stopped()
             logger.info("MARK3 detenido correctamente")
 
+    def _wait_session(self):
+        """Bloquea hasta que haya sesión MT5; False si antes se detuvo el bot."""
+        while self.running:
+            if self.session.wait(5):
+                return True
+        return False
+
 # ==================================================================
 # LAS TRES FORMAS DE LANZAR EL BOT (para que nunca más dé error)
 # ==================================================================
@@ -37,13 +37,62 @@ def list_available_bots():
     ]
 
 
+def run_supervisor(bot_names):
+    """
+    Varios bots en un solo proceso: una sesión MT5, un feed y un Telegram
+    compartidos; cada bot en su hilo y relanzado si se cae.
+    """
+    from utils.supervisor import BOTS, BotSupervisor
+
+    if bot_names == ["all"]:
+        bot_names = list(BOTS)
+    try:
+        supervisor = BotSupervisor(bot_names)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    supervisor.run()
+
+
+def run_replay(bot_name):
+    """
+    Si el settings del bot pide BROKER/feed_source "replay", lo corre sobre el
+    día grabado (utils.replay) y devuelve True; si no, False y sigue en vivo.
+    """
+    from utils.supervisor import BOTS
+    from utils.settings_manager import get_settings
+    from utils.feed_selector import feed_source
+
+    if bot_name not in BOTS:
+        return False
+    settings = get_settings(BOTS[bot_name][2])
+    if feed_source(settings) != "replay":
+        return False
+
+    from utils.replay import ReplayRunner
+    try:
+        runner = ReplayRunner(bot_name, settings)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    runner.run()
+    return True
+
+
 def main():
     if len(sys.argv) < 2:
-        print("Uso: py main.py <botname>")
+        print("Uso: py main.py <botname> [<botname> ...] | all")
         print("Bots disponibles:", list_available_bots())
         sys.exit(1)
 
-    bot_name = sys.argv[1].lower()
+    bot_names = [name.lower() for name in sys.argv[1:]]
+    if len(bot_names) > 1 or bot_names == ["all"]:
+        run_supervisor(bot_names)
+        return
+
+    bot_name = bot_names[0]
+    if run_replay(bot_name):
+        return
 
     module = load_bot(bot_name)
     if module is None:
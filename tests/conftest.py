@@ -0,0 +1,31 @@
+# tests/conftest.py
+# Los tests corren sin terminal MT5: backend simulado y la raíz del repo en
+# sys.path (igual que los benchmarks).
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("MT5_BACKEND", "sim")
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def sim_backend():
+    """Pone un SimTerminal como backend de `mt5` durante el test y deja el
+    anterior al salir. Uso: terminal = sim_backend(data, start=...) o sim_backend(terminal)."""
+    from utils.broker import mt5
+    from utils.sim_terminal import SimTerminal
+    from utils.symbol_catalog import get_catalog
+
+    previous = mt5.backend
+
+    def use(data=None, **kwargs):
+        terminal = data if isinstance(data, SimTerminal) else SimTerminal(data, **kwargs)
+        mt5.use_backend(terminal)
+        get_catalog().invalidate()
+        return terminal
+
+    yield use
+    mt5.use_backend(previous)
+    get_catalog().invalidate()
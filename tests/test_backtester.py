@@ -0,0 +1,44 @@
+# tests/test_backtester.py
+# Backtester de Mark3 sobre una serie sintética fija: cantidad de trades,
+# motivo de cada cierre y el balance final cuadrando con la suma de los trades.
+from collections import Counter
+from datetime import datetime
+
+import pytest
+
+from utils.backtester import Backtester
+from utils.sim_terminal import synthetic_bars
+
+START = 1704067200          # 2024-01-01 00:00 UTC
+SYMBOLS = ["EURUSD", "GBPUSD"]
+SETTINGS = {"TIMEFRAME": 15, "PAIRS": SYMBOLS}
+
+
+@pytest.fixture(scope="module")
+def data():
+    return {s: (synthetic_bars(s, START, START + 300 * 900, 15, seed=11), 15) for s in SYMBOLS}
+
+
+def _run(data, end=None):
+    return Backtester("mark3_ai", data, dict(SETTINGS), start=START + 60 * 900, end=end, quiet=True).run()
+
+
+def test_trades_and_exit_reasons(data):
+    result = _run(data)
+    assert len(result.trades) == 5
+    assert [t["reason"] for t in result.trades] == ["SL", "SL", "SL", "TP", "SL"]
+    assert Counter(t["symbol"] for t in result.trades) == {"EURUSD": 2, "GBPUSD": 3}
+    assert all(t["direction"] == "BUY" and t["close_time"] > t["open_time"] for t in result.trades)
+    assert all((t["profit"] > 0) == (t["reason"] == "TP") for t in result.trades)
+    assert len(result.deals) == 2 * len(result.trades)
+    assert result.final_balance == pytest.approx(
+        result.initial_balance + sum(t["profit"] for t in result.trades))
+
+
+def test_positions_open_at_the_end_close_as_end(data):
+    end = START + 2 * 86400 + 15 * 3600                 # 2024-01-03 15:00, con un GBPUSD abierto
+    result = _run(data, end=end)
+    assert [t["reason"] for t in result.trades] == ["SL", "SL", "SL", "END"]
+    last = result.trades[-1]
+    assert last["symbol"] == "GBPUSD" and last["close_time"] == datetime(2024, 1, 3, 15, 0)
+    assert _run(data).trades[:3] == result.trades[:3]  # misma serie, mismos trades hasta el corte
@@ -0,0 +1,75 @@
+# tests/test_candle_cache.py
+# Ring de velas (doble escritura, vuelta completa, vela en formación) y
+# timeframes mayores armados desde la serie base.
+import numpy as np
+
+from utils.candle_cache import CANDLE_DTYPE, CandleCache, CandleRing, aggregate, can_aggregate
+from utils.sim_terminal import synthetic_bars
+
+START = 1704067200          # 2024-01-01 00:00 UTC
+
+
+def _rates(times, base=1.0):
+    rates = np.zeros(len(times), dtype=CANDLE_DTYPE)
+    rates["time"] = times
+    rates["open"] = rates["close"] = base + np.arange(len(times))
+    rates["high"] = rates["close"] + 0.5
+    rates["low"] = rates["close"] - 0.5
+    rates["tick_volume"] = 1
+    return rates
+
+
+def test_ring_wraps_and_keeps_contiguous_views():
+    ring = CandleRing(5)
+    ring.extend(_rates(START + 60 * np.arange(12)))
+    assert ring.size == 5
+    assert ring.first_time == START + 60 * 7 and ring.last_time == START + 60 * 11
+    view = ring.arrays(5)
+    np.testing.assert_array_equal(view["time"], START + 60 * np.arange(7, 12))
+    assert view["close"].base is ring.cols["close"]          # vista, sin copia
+    np.testing.assert_array_equal(ring.arrays(3)["close"], [10.0, 11.0, 12.0])
+    frame_times = ring.frame(2)["time"].to_numpy().astype("datetime64[s]").astype("int64")
+    assert list(frame_times) == [START + 600, START + 660]
+
+
+def test_ring_patches_forming_bar_and_skips_old_rows():
+    ring = CandleRing(4)
+    ring.extend(_rates(START + 60 * np.arange(3)))
+    delta = _rates(START + 60 * np.arange(1, 5), base=100.0)   # repite 1 y 2, trae 3 y 4
+    assert ring.extend(delta) == 2
+    np.testing.assert_array_equal(ring.arrays(4)["time"], START + 60 * np.arange(1, 5))
+    # la vela 1 ya no era la última → se queda; la 2 (en formación) se parchea
+    np.testing.assert_array_equal(ring.arrays(4)["close"], [2.0, 101.0, 102.0, 103.0])
+
+
+def test_ring_big_snapshot_keeps_only_capacity():
+    ring = CandleCache(3).reset("EURUSD", 1, _rates(START + 60 * np.arange(50)))
+    assert ring.size == 3 and ring.last_time == START + 60 * 49
+
+
+def test_aggregate_m1_to_m15_with_partial_last_bar():
+    m1 = synthetic_bars("EURUSD", START, START + 40 * 60, 1, seed=2)
+    bars = aggregate({name: m1[name] for name in m1.dtype.names}, 900)
+    np.testing.assert_array_equal(bars["time"], [START, START + 900, START + 1800])
+    first = m1[:15]
+    assert bars["open"][0] == first["open"][0] and bars["close"][0] == first["close"][-1]
+    assert bars["high"][0] == first["high"].max() and bars["low"][0] == first["low"].min()
+    assert bars["tick_volume"][0] == first["tick_volume"].sum()
+    assert bars["close"][2] == m1["close"][-1]                # la última sale parcial (10 de 15)
+    assert can_aggregate(1, 16385) and can_aggregate(15, 16385)
+    assert not can_aggregate(16385, 15) and not can_aggregate(20, 30)
+
+
+def test_feed_builds_higher_timeframes_from_base_series(sim_backend):
+    from utils.feed_selector import Feed
+
+    m1 = synthetic_bars("EURUSD", START, START + 3 * 86400, 1, seed=4)
+    terminal = sim_backend({"EURUSD": (m1, 1)}, start=START + 2 * 86400 + 7 * 60)
+    feed = Feed({"HISTORY_STORE": False, "CANDLE_CACHE_SIZE": 50})
+    for minutes in (0, 3, 11, 60):                             # delta de la base entre llamadas
+        terminal.advance_to((START + 2 * 86400 + (7 + minutes) * 60) * 1000)
+        for tf in (15, 16385):
+            got = feed.get_rates("EURUSD", tf, 20)
+            want = terminal.copy_rates_from_pos("EURUSD", tf, 0, 20)
+            for name in ("time", "open", "high", "low", "close", "tick_volume"):
+                np.testing.assert_array_equal(got[name], want[name], err_msg=f"{tf} {name} +{minutes}m")
@@ -0,0 +1,46 @@
+# tests/test_evaluator.py
+# SymbolEvaluator.map: resultados en el orden de los símbolos aunque el pool
+# termine en otro orden, y una excepción es None solo para ese símbolo.
+import time
+import threading
+
+import pytest
+
+from utils.evaluator import SymbolEvaluator
+
+SYMBOLS = ["EURUSD", "GBPUSD", "USDJPY", "AUDUSD", "XAUUSD"]
+
+
+@pytest.fixture(params=[1, 4], ids=["sequential", "pooled"])
+def evaluator(request):
+    evaluator = SymbolEvaluator(workers=request.param, name="test-eval")
+    yield evaluator
+    evaluator.shutdown()
+
+
+def test_results_follow_symbol_order(evaluator):
+    threads = set()
+
+    def fn(symbol):
+        threads.add(threading.current_thread().name)
+        time.sleep(0.01 * (len(SYMBOLS) - SYMBOLS.index(symbol)))   # los últimos terminan primero
+        return symbol.lower()
+
+    assert evaluator.map(fn, SYMBOLS) == [(s, s.lower()) for s in SYMBOLS]
+    assert evaluator.last_count == len(SYMBOLS)
+    if evaluator.workers == 1:
+        assert threads == {threading.current_thread().name}
+    else:
+        assert all(name.startswith("test-eval") for name in threads) and len(threads) > 1
+
+
+def test_exception_is_none_for_that_symbol_only(evaluator, caplog):
+    def fn(symbol):
+        if symbol == "USDJPY":
+            raise ValueError("sin velas")
+        return len(symbol)
+
+    results = evaluator.map(fn, SYMBOLS)
+    assert results == [(s, None if s == "USDJPY" else 6) for s in SYMBOLS]
+    assert "Error evaluando USDJPY" in caplog.text
+    assert evaluator.map(fn, iter(["EURUSD"])) == [("EURUSD", 6)]   # cualquier iterable, uno solo
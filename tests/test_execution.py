@@ -0,0 +1,115 @@
+# tests/test_execution.py
+# ExecutionEngine sobre el terminal simulado: filling aprendido por símbolo,
+# reenvío con tick nuevo ante recotización y registro de cada fill.
+import pytest
+
+from utils.execution import ExecutionEngine
+from utils.sim_terminal import SimTerminal, synthetic_bars
+
+START = 1704067200          # 2024-01-01 00:00 UTC
+SYMBOL = "EURUSD"
+
+
+class ScriptedTerminal(SimTerminal):
+    """SimTerminal que rechaza algunos modos de filling y puede responder
+    retcodes guionados antes de ejecutar de verdad."""
+
+    def __init__(self, *args, rejected_fillings=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rejected_fillings = set(rejected_fillings)
+        self.script = []            # retcodes a devolver en los próximos order_send
+        self.requests = []
+
+    def order_send(self, request):
+        self.requests.append(dict(request))
+        s = self._series(request["symbol"])
+        if request.get("type_filling") in self.rejected_fillings:
+            return self._result(self.TRADE_RETCODE_INVALID_FILL, request, "Unsupported filling mode", s=s)
+        if self.script:
+            return self._result(self.script.pop(0), request, "scripted", s=s)
+        return super().order_send(request)
+
+
+@pytest.fixture
+def terminal(sim_backend):
+    bars = synthetic_bars(SYMBOL, START, START + 2 * 86400, 1, seed=5)
+    return sim_backend(ScriptedTerminal({SYMBOL: (bars, 1)}, start=START + 86400,
+                                        rejected_fillings={SimTerminal.ORDER_FILLING_IOC}))
+
+
+def _buy(engine, terminal, offset=0.0, **kwargs):
+    ask = terminal.symbol_info_tick(SYMBOL).ask
+    price = ask + offset
+    return engine.open(SYMBOL, terminal.ORDER_TYPE_BUY, 0.1, price, price - 0.005, price + 0.005, **kwargs), price
+
+
+def test_filling_mode_is_learned_per_symbol(terminal):
+    engine = ExecutionEngine()
+    ticket, _ = _buy(engine, terminal)
+    assert ticket
+    assert [r["type_filling"] for r in terminal.requests] == [terminal.ORDER_FILLING_IOC, terminal.ORDER_FILLING_FOK]
+    assert engine.filling[SYMBOL] == terminal.ORDER_FILLING_FOK
+
+    terminal.requests.clear()
+    assert _buy(engine, terminal)[0]
+    assert [r["type_filling"] for r in terminal.requests] == [terminal.ORDER_FILLING_FOK]   # directo
+
+    engine.reset()
+    assert engine.filling == {} and not engine.fills
+
+
+def test_rejected_learned_mode_is_forgotten(terminal):
+    engine = ExecutionEngine()
+    _buy(engine, terminal)
+    terminal.rejected_fillings = {terminal.ORDER_FILLING_FOK}     # el broker cambió de idea
+    terminal.requests.clear()
+    assert _buy(engine, terminal)[0]
+    assert [r["type_filling"] for r in terminal.requests] == [terminal.ORDER_FILLING_FOK, terminal.ORDER_FILLING_IOC]
+    assert engine.filling[SYMBOL] == terminal.ORDER_FILLING_IOC
+
+
+def test_requote_resends_at_fresh_price_keeping_distances(terminal):
+    engine = ExecutionEngine(deviation=20)
+    ticket, stale = _buy(engine, terminal, offset=-0.0005)        # 50 points fuera de deviation
+    assert ticket
+    tries = [r for r in terminal.requests if r["type_filling"] == terminal.ORDER_FILLING_FOK]
+    assert len(tries) == 2
+    fresh = terminal.symbol_info_tick(SYMBOL).ask
+    assert tries[1]["price"] == fresh
+    assert tries[1]["sl"] == pytest.approx(fresh - 0.005) and tries[1]["tp"] == pytest.approx(fresh + 0.005)
+    (fill,) = engine.fills
+    assert fill["requotes"] == 1 and fill["requested"] == stale and fill["filled"] == fresh
+    assert fill["slippage_points"] == pytest.approx(50.0)                 # + = en contra
+    assert engine.stats()[SYMBOL]["requotes"] == 1
+
+
+def test_requote_retries_are_bounded(terminal):
+    engine = ExecutionEngine(requote_retries=2)
+    terminal.script = [terminal.TRADE_RETCODE_REQUOTE] * 3
+    assert _buy(engine, terminal)[0] is None
+    assert len([r for r in terminal.requests if r["type_filling"] == terminal.ORDER_FILLING_FOK]) == 3
+    assert not engine.fills
+
+
+def test_fill_record_and_close_with_snapshot_position(terminal):
+    engine = ExecutionEngine()
+    ticket, price = _buy(engine, terminal, magic=777, comment="Mark3_AI")
+    (pos,) = terminal.positions_get(ticket=ticket)
+    assert (pos.magic, pos.comment) == (777, "Mark3_AI")
+    fill = engine.fills[-1]
+    assert fill["side"] == "BUY" and not fill["close"] and fill["slippage_points"] == 0.0
+    assert fill["rtt_ms"] >= 0 and fill["filling"] == terminal.ORDER_FILLING_FOK
+
+    tick = terminal.symbol_info_tick(SYMBOL)
+    assert engine.close(ticket, position=pos, quote=(tick.bid, tick.ask))
+    assert terminal.positions_get(ticket=ticket) == ()
+    closing = engine.fills[-1]
+    assert closing["close"] and closing["side"] == "SELL" and closing["filled"] == tick.bid
+    assert terminal.requests[-1]["magic"] == 777                   # el magic de la posición
+    assert engine.stats()[SYMBOL]["orders"] == 2
+
+
+def test_default_magic_when_bot_does_not_pass_one(terminal):
+    engine = ExecutionEngine(magic=4242)
+    ticket, _ = _buy(engine, terminal)
+    assert terminal.positions_get(ticket=ticket)[0].magic == 4242
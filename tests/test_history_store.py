@@ -0,0 +1,109 @@
+# tests/test_history_store.py
+# HistoryStore: mezcla por mes (nuevas, repetidas y corregidas), lecturas,
+# huecos sin contar fines de semana, sync incremental contra el terminal
+# simulado y el hilo de sync del Feed que se detiene con stop().
+import numpy as np
+import pytest
+
+from utils.candle_cache import CANDLE_DTYPE
+from utils.history_store import HistoryStore
+from utils.sim_terminal import synthetic_bars
+
+M15 = 15
+MONDAY = 1706486400         # 2024-01-29 00:00 UTC (lunes)
+
+
+def _bars(start, count, step=900, price=1.1):
+    rates = np.zeros(count, dtype=CANDLE_DTYPE)
+    rates["time"] = start + step * np.arange(count)
+    rates["open"] = rates["high"] = rates["low"] = rates["close"] = price + 0.0001 * np.arange(count)
+    rates["tick_volume"] = 10
+    return rates
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path / "history"))
+
+
+def test_write_splits_months_and_reads_back(store):
+    rates = _bars(MONDAY + 2 * 86400, 200)              # 31 ene → 2 feb
+    assert store.write("EURUSD", M15, rates) == 200
+    assert store.partitions("EURUSD", M15) == ["2024-01", "2024-02"]
+    cols = store.read("EURUSD", M15)
+    np.testing.assert_array_equal(cols["time"], rates["time"])
+    np.testing.assert_array_equal(store.tail("EURUSD", M15, 5), rates[-5:])
+    assert store.last_time("EURUSD", M15) == int(rates["time"][-1])
+    part = store.read("EURUSD", M15, int(rates["time"][10]), int(rates["time"][20]))
+    np.testing.assert_array_equal(part["close"], rates["close"][10:20])
+
+
+def test_overlap_adds_only_new_bars(store):
+    rates = _bars(MONDAY, 100)
+    store.write("EURUSD", M15, rates[:60])
+    assert store.write("EURUSD", M15, rates[40:]) == 40
+    assert store.write("EURUSD", M15, rates[50:70]) == 0
+    np.testing.assert_array_equal(store.read("EURUSD", M15)["time"], rates["time"])
+
+
+def test_corrected_bars_replace_stored_ones(store):
+    rates = _bars(MONDAY, 50)
+    store.write("EURUSD", M15, rates)
+    fixed = rates[10:13].copy()
+    fixed["close"] += 0.01                               # el broker corrigió esas velas
+    assert store.write("EURUSD", M15, fixed) == 0        # ninguna nueva...
+    cols = store.read("EURUSD", M15)
+    np.testing.assert_array_equal(cols["close"][10:13], fixed["close"])   # ...pero quedan corregidas
+    np.testing.assert_array_equal(cols["close"][:10], rates["close"][:10])
+    assert len(cols["time"]) == 50
+
+
+def test_gaps_skip_weekends_and_known_holes(store, sim_backend):
+    week = _bars(MONDAY, 5 * 96)                         # lunes a viernes 23:45
+    next_week = _bars(MONDAY + 7 * 86400, 96)
+    hole_from, hole_to = MONDAY + 86400 + 10 * 3600, MONDAY + 86400 + 14 * 3600   # martes 10-14 h
+    week = week[(week["time"] < hole_from) | (week["time"] >= hole_to)]
+    store.write("EURUSD", M15, np.concatenate([week, next_week]))
+    assert store.gaps("EURUSD", M15) == [(hole_from, hole_to)]       # el fin de semana no cuenta
+
+    # el broker tampoco tiene esas velas → se anota y no se vuelve a pedir
+    sim_backend({"EURUSD": (np.concatenate([week, next_week]), M15)}, start=MONDAY + 9 * 86400)
+    assert store.backfill("EURUSD", M15) == (0, 1)
+    assert store.gaps("EURUSD", M15) == []
+
+
+def test_backfill_fills_gap_from_broker(store, sim_backend):
+    full = _bars(MONDAY, 300)
+    hole = (full["time"] >= full["time"][100]) & (full["time"] < full["time"][120])
+    store.write("EURUSD", M15, full[~hole])
+    sim_backend({"EURUSD": (full, M15)}, start=int(full["time"][-1]) + 900)
+    assert store.gaps("EURUSD", M15) == [(int(full["time"][100]), int(full["time"][120]))]
+    assert store.backfill("EURUSD", M15) == (20, 0)
+    np.testing.assert_array_equal(store.read("EURUSD", M15)["time"], full["time"])
+
+
+def test_sync_is_incremental_and_skips_forming_bar(store, sim_backend):
+    bars = synthetic_bars("EURUSD", MONDAY, MONDAY + 2 * 86400, 15, seed=1)
+    terminal = sim_backend({"EURUSD": (bars, M15)}, start=MONDAY + 86400)
+    first = store.sync("EURUSD", M15, initial_bars=50)
+    assert first == 49                                   # la vela en formación no se guarda
+    terminal.advance_to((MONDAY + 86400 + 3600) * 1000)
+    assert store.sync("EURUSD", M15) == 4
+    assert store.sync("EURUSD", M15) == 0
+    stored = store.read("EURUSD", M15)["time"]
+    assert np.all(np.diff(stored) == 900) and stored[-1] == MONDAY + 86400 + 2700
+
+
+def test_feed_sync_thread_stops(store, sim_backend, monkeypatch):
+    from utils import feed_selector
+
+    bars = synthetic_bars("EURUSD", MONDAY, MONDAY + 2 * 86400, 15, seed=1)
+    sim_backend({"EURUSD": (bars, M15)}, start=MONDAY + 86400)
+    monkeypatch.setattr(feed_selector, "get_store", lambda: store)
+    feed = feed_selector.Feed({"FEED_BASE_TIMEFRAME": M15})
+    feed.sync_history(["EURUSD"], [M15], minutes=60)
+    thread = feed._sync_thread
+    assert thread.is_alive()
+    feed.stop(timeout=5)
+    assert not thread.is_alive()
+    assert store.last_time("EURUSD", M15) is not None
@@ -0,0 +1,109 @@
+# tests/test_history_warmup.py
+# HistoryWarmup con reloj manual y los intentos corridos a mano (sin el hilo):
+# failed → cold pasado retry_failed, forget() en medio de un intento y el
+# estado por símbolo con la serie base de fallback.
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from utils import history_warmup as warmup_module
+from utils.history_warmup import COLD, FAILED, LOADING, READY, HistoryWarmup
+
+SYMBOL = "EURUSD"
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = float(now)
+
+    def __call__(self):
+        return self.now
+
+
+class Terminal:
+    """copy_rates_from_pos devuelve `rates` (None = sin historia todavía)."""
+
+    def __init__(self):
+        self.rates = None
+        self.ranges = 0
+        self.during = None           # se llama dentro de copy_rates_from_pos
+
+    def copy_rates_from_pos(self, symbol, timeframe, start, count):
+        if self.during:
+            self.during()
+        return self.rates
+
+    def copy_rates_range(self, symbol, timeframe, date_from, date_to):
+        self.ranges += 1
+
+
+@pytest.fixture
+def terminal(monkeypatch):
+    terminal = Terminal()
+    monkeypatch.setattr(warmup_module, "mt5", terminal)
+    return terminal
+
+
+def _warmup(clock, **kwargs):
+    warmup = HistoryWarmup(**{"attempts": 2, "interval": 5.0, "retry_failed": 60.0, "clock": clock, **kwargs})
+    warmup._thread = SimpleNamespace(is_alive=lambda: True)     # los intentos los corre el test
+    return warmup
+
+
+def _attempt(warmup, timeframe):
+    key = (SYMBOL, timeframe)
+    warmup._attempt(key, warmup._jobs[key])
+
+
+def test_failed_goes_cold_after_retry_failed(terminal):
+    clock = Clock()
+    warmup = _warmup(clock)
+    warmup.request(SYMBOL, 15, 100)
+    assert warmup.state_of(SYMBOL, 15) == LOADING
+
+    _attempt(warmup, 15)
+    assert warmup._jobs[(SYMBOL, 15)][1] == clock.now + 5.0       # reintento tras `interval`
+    _attempt(warmup, 15)
+    assert terminal.ranges == 2                                   # cada intento fallido pide el rango
+    assert warmup.state_of(SYMBOL, 15) == FAILED and not warmup._jobs
+
+    clock.now += 59.0
+    warmup.request(SYMBOL, 15, 100)                               # falló hace poco: no se reencola
+    assert warmup.state_of(SYMBOL, 15) == FAILED and not warmup._jobs
+
+    clock.now += 1.0
+    assert warmup.state_of(SYMBOL, 15) == COLD
+    warmup.request(SYMBOL, 15, 100)
+    assert warmup.state_of(SYMBOL, 15) == LOADING
+
+    terminal.rates = np.zeros(3)
+    _attempt(warmup, 15)
+    assert warmup.state_of(SYMBOL, 15) == READY
+    assert len(warmup.take(SYMBOL, 15)) == 3 and warmup.take(SYMBOL, 15) is None
+
+
+def test_forget_during_an_attempt_drops_the_result(terminal):
+    warmup = _warmup(Clock())
+    warmup.request(SYMBOL, 15, 100)
+    terminal.rates = np.zeros(3)
+    terminal.during = lambda: warmup.forget(SYMBOL, 15)
+    _attempt(warmup, 15)
+    assert warmup.take(SYMBOL, 15) is None
+    assert warmup.state_of(SYMBOL, 15) == COLD and warmup.symbols() == []
+
+
+def test_symbol_state_with_fallback(terminal):
+    warmup = _warmup(Clock())
+    warmup.request(SYMBOL, 1, 100)
+    _attempt(warmup, 1)
+    _attempt(warmup, 1)
+    assert warmup.state(SYMBOL) == FAILED
+    assert warmup.state(SYMBOL, fallback=1) == COLD               # solo falló la base
+
+    warmup.request(SYMBOL, 15, 100)
+    assert warmup.state(SYMBOL, fallback=1) == LOADING
+    warmup.mark_ready(SYMBOL, 15)
+    assert warmup.state(SYMBOL) == FAILED                         # el peor de sus timeframes
+    assert warmup.state(SYMBOL, fallback=1) == READY
+    assert warmup.state("GBPUSD") == COLD
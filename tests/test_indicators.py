@@ -0,0 +1,67 @@
+# tests/test_indicators.py
+# Incremental (Streaming*) contra lotes (NumPy): mismos valores vela a vela.
+import numpy as np
+import pytest
+
+from utils import indicators as ind
+
+
+def _bars(n=600, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 1.10 + np.cumsum(rng.normal(0, 0.0008, n))
+    high = close + rng.uniform(0, 0.0015, n)
+    low = close - rng.uniform(0, 0.0015, n)
+    return high, low, close
+
+
+def _stream(indicator, *columns):
+    out = [indicator.update(*row) for row in zip(*(c.tolist() for c in columns))]
+    return np.array([np.nan if v is None else v for v in out])
+
+
+@pytest.mark.parametrize("period", [5, 20, 200])
+def test_ema_streaming_equals_batch(period):
+    _, _, close = _bars()
+    np.testing.assert_allclose(_stream(ind.StreamingEMA(period), close), ind.ema(close, period), rtol=1e-12)
+
+
+def test_atr_streaming_equals_batch():
+    high, low, close = _bars()
+    np.testing.assert_array_equal(_stream(ind.StreamingATR(14), high, low, close), ind.atr(high, low, close, 14))
+
+
+def test_adx_streaming_equals_batch():
+    high, low, close = _bars()
+    adx = ind.StreamingADX(14)
+    stream = _stream(adx, high, low, close)
+    batch, plus_di, minus_di = ind.adx(high, low, close, 14)
+    np.testing.assert_allclose(stream, batch, rtol=1e-12, equal_nan=True)
+    assert adx.plus_di == pytest.approx(plus_di[-1], rel=1e-12)
+    assert adx.minus_di == pytest.approx(minus_di[-1], rel=1e-12)
+
+
+@pytest.mark.parametrize("n,shift", [(1, 0), (8, 1), (20, 0), (20, 3)])
+def test_donchian_streaming_equals_batch(n, shift):
+    high, low, _ = _bars()
+    channel = ind.StreamingDonchian(n, shift)
+    rows = [channel.update(h, l) for h, l in zip(high.tolist(), low.tolist())]
+    upper, lower = ind.donchian(high, low, n, shift)
+    assert all(r == (None, None) for r in rows[:shift])
+    np.testing.assert_array_equal([r[0] for r in rows[shift:]], upper[shift:])
+    np.testing.assert_array_equal([r[1] for r in rows[shift:]], lower[shift:])
+
+
+def test_donchian_window_with_repeated_extremes():
+    # máximos iguales y un máximo que sale de la ventana
+    channel = ind.StreamingDonchian(3)
+    highs = [5, 5, 1, 1, 1, 7, 2]
+    got = [channel.update(h, h - 1)[0] for h in highs]
+    assert got == [5, 5, 5, 5, 1, 7, 7]
+
+
+def test_batch_2d_matches_rows():
+    rows = [_bars(seed=s) for s in range(3)]
+    high, low, close = (np.vstack(col) for col in zip(*rows))
+    np.testing.assert_array_equal(ind.atr(high, low, close, 14)[1], ind.atr(*rows[1], 14))
+    np.testing.assert_array_equal(ind.donchian(high, low, 20, 1)[0][2], ind.donchian(rows[2][0], rows[2][1], 20, 1)[0])
+    np.testing.assert_allclose(ind.ema(close, 50)[0], ind.ema(rows[0][2], 50), rtol=1e-15)
@@ -0,0 +1,19 @@
+# tests/test_log_pipeline.py
+# El registro de evaluaciones no crea su archivo hasta el primer registro.
+import json
+import os
+
+from utils import log_pipeline
+from utils.log_pipeline import EvaluationLog
+
+
+def test_eval_log_file_opens_on_first_record(tmp_path):
+    path = str(tmp_path / "logs" / "test_eval.jsonl")
+    log = EvaluationLog("pipeline-test", path, interval=0)
+    assert not os.path.exists(path)                 # crear el bot no deja archivos vacíos
+
+    log.record("EURUSD", "BUY", rsi=71.5)
+    log_pipeline.shutdown()                         # vacía la cola y cierra el archivo
+    with open(path, encoding="utf-8") as f:
+        line = json.loads(f.readline())
+    assert line["symbol"] == "EURUSD" and line["decision"] == "BUY"
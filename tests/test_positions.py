@@ -0,0 +1,46 @@
+# tests/test_positions.py
+# PositionSnapshot: índice magic → símbolo (con magics de antes), cambios
+# respecto de la foto anterior y cierres propios descontados con without().
+from collections import namedtuple
+
+from utils.positions import PositionSnapshot
+
+Position = namedtuple("Position", "ticket symbol magic sl tp volume profit")
+
+MARK2, LEGACY = 234568, 234567
+
+
+def _pos(ticket, symbol="EURUSD", magic=MARK2, sl=1.0, tp=2.0, volume=0.1, profit=0.0):
+    return Position(ticket, symbol, magic, sl, tp, volume, profit)
+
+
+def test_of_filters_by_magic_and_symbols_including_legacy_magics():
+    snap = PositionSnapshot([_pos(1), _pos(2, "GBPUSD"), _pos(3, magic=LEGACY),
+                             _pos(4, magic=234569), _pos(5, "USDJPY")])
+    assert [p.ticket for p in snap.of(MARK2)] == [1, 2, 5]
+    assert [p.ticket for p in snap.of(MARK2, ["EURUSD", "GBPUSD"])] == [1, 2]
+    assert [p.ticket for p in snap.of((MARK2, LEGACY), ["EURUSD"])] == [1, 3]
+    assert snap.of(999) == ()
+    assert snap.symbols == {"EURUSD", "GBPUSD", "USDJPY"}
+
+
+def test_opened_closed_and_modified_against_previous_snapshot():
+    before = PositionSnapshot([_pos(1), _pos(2), _pos(3)])
+    after = PositionSnapshot([_pos(1, profit=5.0),            # solo cambia el profit
+                              _pos(2, sl=1.5),                 # SL movido
+                              _pos(4)], before)
+    assert [p.ticket for p in after.opened] == [4]
+    assert [p.ticket for p in after.closed] == [3]
+    assert [p.ticket for p in after.modified] == [2]
+    assert [p.ticket for p in before.opened] == [1, 2, 3]      # sin foto anterior todo es nuevo
+
+
+def test_without_drops_ticket_and_keeps_it_as_closed():
+    before = PositionSnapshot([_pos(1), _pos(2), _pos(3)])
+    snap = PositionSnapshot([_pos(1, tp=2.5), _pos(2), _pos(4)], before, taken_at=10.0)
+    trimmed = snap.without(1)
+    assert trimmed.get(1) is None and len(trimmed) == 2
+    assert trimmed.of(MARK2) == (snap.get(2), snap.get(4))
+    assert [p.ticket for p in trimmed.closed] == [3, 1]
+    assert trimmed.modified == ()
+    assert trimmed.opened == snap.opened and trimmed.taken_at == 10.0
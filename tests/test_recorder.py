@@ -0,0 +1,104 @@
+# tests/test_recorder.py
+# MarketRecorder con flush a mano: ticks repetidos fuera, velas ya en disco
+# saltadas tras un reinicio, registro a medio escribir recortado, y
+# load_recording sin repetidos entre días.
+import os
+
+import numpy as np
+import pytest
+
+from utils.candle_cache import CANDLE_DTYPE
+from utils.recorder import TICK_DTYPE, MarketRecorder, load_recording, open_recording, recorded_days
+from utils.sim_terminal import synthetic_bars
+
+START = 1704067200          # 2024-01-01 00:00 UTC
+DAY = "20240101"
+SYMBOL = "EURUSD"
+
+
+@pytest.fixture
+def recorders(tmp_path):
+    opened = []
+
+    def make():
+        recorder = MarketRecorder(root=str(tmp_path), flush_seconds=3600)   # el hilo no llega a vaciar
+        opened.append(recorder)
+        return recorder
+
+    yield make
+    for recorder in opened:
+        recorder.close()
+
+
+def _bars(count, start=START):
+    return synthetic_bars(SYMBOL, start, start + count * 60, 1, seed=5)[:count]
+
+
+def test_repeated_ticks_are_written_once(recorders, tmp_path):
+    recorder = recorders()
+    ms = START * 1000
+    for time_msc, bid, ask in ((ms, 1.1, 1.2), (ms, 1.1, 1.2), (ms, 1.1, 1.3), (ms + 5, 1.1, 1.3)):
+        recorder.tick(SYMBOL, bid, ask, time_msc)
+    recorder.flush()
+    recorder.tick(SYMBOL, 1.1, 1.3, ms + 5)                   # el mismo que el último ya escrito
+    recorder.flush()
+
+    ticks = open_recording(str(tmp_path / DAY / f"{SYMBOL}_ticks.bin"))
+    assert ticks.dtype == TICK_DTYPE
+    assert ticks["time_msc"].tolist() == [ms, ms, ms + 5]
+    assert ticks["ask"].tolist() == [1.2, 1.3, 1.3]
+    assert recorder.stats() == {"ticks": 3, "bars": 0, "pending": 0}
+
+
+def test_restart_skips_bars_already_on_disk(recorders, tmp_path):
+    rates = _bars(8)
+    first = recorders()
+    first.bars(SYMBOL, 1, rates[:5])                          # 4 cerradas + la que se forma
+    first.bars(SYMBOL, 1, rates[:5])
+    first.flush()
+    assert first.bars_written == 4
+
+    second = recorders()                                      # bot reiniciado a mitad de día
+    second.bars(SYMBOL, 1, rates)
+    second.flush()
+    assert second.bars_written == 3
+
+    on_disk = open_recording(str(tmp_path / DAY / f"{SYMBOL}_1.bin"))
+    assert on_disk.dtype == CANDLE_DTYPE
+    np.testing.assert_array_equal(on_disk["time"], rates["time"][:7])
+
+
+def test_append_drops_a_torn_record(tmp_path):
+    path = str(tmp_path / DAY / f"{SYMBOL}_1.bin")
+    rates = _bars(3).astype(CANDLE_DTYPE)
+    MarketRecorder._append(path, rates[:1])
+    with open(path, "ab") as f:
+        f.write(rates[1:2].tobytes()[:10])                    # corte a mitad del registro
+    assert len(open_recording(path)) == 1                     # la lectura ya lo ignora
+
+    MarketRecorder._append(path, rates[1:])
+    assert os.path.getsize(path) == 3 * CANDLE_DTYPE.itemsize
+    np.testing.assert_array_equal(open_recording(path), rates)
+
+
+def test_load_recording_dedupes_bars_and_ticks(tmp_path):
+    rates = _bars(6).astype(CANDLE_DTYPE)
+    late = rates[3:5].copy()
+    late["close"] += 0.001                                    # la misma vela grabada otra vez, corregida
+    ticks = np.zeros(3, dtype=TICK_DTYPE)
+    ticks["time_msc"] = [START * 1000 + 2, START * 1000, START * 1000 + 1]
+    ticks["bid"], ticks["ask"] = 1.1, 1.2
+
+    for day, bars, tick_rows in (("20240101", rates[:5], ticks), ("20240102", late, ticks[:2])):
+        MarketRecorder._append(str(tmp_path / day / f"{SYMBOL}_1.bin"), bars)
+        MarketRecorder._append(str(tmp_path / day / f"{SYMBOL}_ticks.bin"), tick_rows)
+        MarketRecorder._append(str(tmp_path / day / f"{SYMBOL}_15.bin"), bars[:1])
+
+    days = recorded_days(str(tmp_path))
+    assert days == ["20240101", "20240102"]
+    loaded, timeframe, quotes = load_recording(SYMBOL, days, root=str(tmp_path))
+    assert timeframe == 1                                     # el timeframe más chico grabado
+    np.testing.assert_array_equal(loaded["time"], rates["time"][:5])
+    np.testing.assert_array_equal(loaded["close"][3:], late["close"])   # repetida → la última grabada
+    assert quotes["time_msc"].tolist() == [START * 1000, START * 1000 + 1, START * 1000 + 2]
+    assert load_recording("GBPUSD", days, root=str(tmp_path)) is None
@@ -0,0 +1,73 @@
+# tests/test_replay.py
+# Replay de un día grabado: el ReplayFeed no toca el proceso, ReplayRunner
+# instala backend y reloj solo mientras corre el bot, y get_feed cae al feed en
+# vivo con cualquier feed_source que no sea replay.
+from datetime import datetime, timezone
+
+import pytest
+
+from utils import replay
+from utils.broker import mt5
+from utils.feed_selector import Feed, ReplayFeed, feed_source, get_feed
+from utils.positions import get_position_book
+from utils.sim_terminal import SimTerminal, synthetic_bars
+
+START = 1704067200          # 2024-01-01 00:00 UTC
+SYMBOL = "EURUSD"
+REAL_DATETIME = datetime
+SETTINGS = {"HISTORY_STORE": False, "REPLAY_SPEED": 0, "PAIRS": [SYMBOL]}
+
+
+def _terminal():
+    bars = synthetic_bars(SYMBOL, START, START + 86400, 1, seed=3)
+    return SimTerminal({SYMBOL: (bars, 1)}, start=START + 3600)
+
+
+class FakeBot:
+    """Lo que ve un bot dentro del replay."""
+    seen = {}
+
+    def __init__(self, settings=None, feed=None):
+        self.feed = feed
+        self.stopped = False
+
+    def run(self):
+        FakeBot.seen = {"backend": mt5.backend, "now": datetime.now(), "clock": get_position_book().clock}
+
+    def stop(self):
+        self.stopped = True
+
+
+def test_replay_feed_does_not_touch_the_process():
+    previous, book_clock = mt5.backend, get_position_book().clock
+    feed = ReplayFeed(SETTINGS, _terminal())
+    assert mt5.backend is previous
+    assert get_position_book().clock is book_clock
+    assert feed.clock() == START + 3600
+
+
+def test_runner_installs_backend_and_clock_and_restores_them(monkeypatch):
+    monkeypatch.setitem(replay.BOTS, "fake", (__name__, "FakeBot", None))
+    previous, book_clock = mt5.backend, get_position_book().clock
+    runner = replay.ReplayRunner("fake", dict(SETTINGS), _terminal())
+    runner.run()
+
+    assert FakeBot.seen["backend"] is runner.feed.terminal
+    assert FakeBot.seen["now"] == datetime.fromtimestamp(START + 3600, timezone.utc).replace(tzinfo=None)
+    assert FakeBot.seen["clock"] == runner.feed.clock
+    assert runner.bot.stopped
+    assert mt5.backend is previous
+    assert get_position_book().clock is book_clock
+    assert datetime is REAL_DATETIME
+
+
+def test_feed_source_and_live_fallback(caplog):
+    assert feed_source({"BROKER": "replay", "feed_source": "mt5"}) == "replay"
+    assert feed_source({"feed_source": "replay"}) == "replay"
+    assert feed_source({}) == "mt5"
+    assert isinstance(get_feed({"HISTORY_STORE": False}), Feed)
+    feed = get_feed({"HISTORY_STORE": False, "feed_source": "ctrader"})
+    assert type(feed) is Feed
+    assert "ctrader" in caplog.text
+    with pytest.raises(RuntimeError):
+        get_feed({"HISTORY_STORE": False, "BROKER": "replay"})
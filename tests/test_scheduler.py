@@ -0,0 +1,94 @@
+# tests/test_scheduler.py
+# BarScheduler con reloj manual: evaluación al cierre + grace, velas saltadas,
+# cadencia de entradas y desfase con la hora del servidor.
+from types import SimpleNamespace
+
+import pytest
+
+from utils import scheduler as scheduler_module
+from utils.scheduler import BarScheduler
+
+BAR = 900
+CLOSE = 1704068100          # 2024-01-01 00:15 UTC, primer cierre tras T0
+T0 = CLOSE - BAR + 100
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = float(now)
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock(T0)
+    # el último tick del "servidor" es la hora local: desfase 0
+    monkeypatch.setattr(scheduler_module, "mt5", SimpleNamespace(
+        symbol_info_tick=lambda symbol: SimpleNamespace(time=clock.now)))
+    return clock
+
+
+def _scheduler(clock, calls, **kwargs):
+    kwargs = {"exit_seconds": 5.0, "grace": 1.0, **kwargs}
+    sched = BarScheduler({"EURUSD": BAR, "GBPUSD": BAR}, evaluate=calls.append,
+                         monitor=lambda: None, clock=clock, sleep=lambda s: None, **kwargs)
+    sched.start()
+    return sched
+
+
+def test_bar_close_fires_after_grace(clock):
+    calls = []
+    sched = _scheduler(clock, calls)
+    assert sched.next_close[BAR] == CLOSE
+    assert sched.poll() == 5.0                        # próxima salida antes que el cierre
+    clock.now = CLOSE + 0.5
+    assert sched.poll() == pytest.approx(0.5)         # duerme hasta cierre + grace
+    assert calls == []
+
+    clock.now = CLOSE + 1.0
+    sched.poll()
+    assert calls == [["EURUSD", "GBPUSD"]]
+    assert sched.lag_stats()["last"] == 1.0 and sched.bar_evaluations == 1
+    assert sched.next_close[BAR] == CLOSE + BAR
+    sched.poll()
+    assert len(calls) == 1                            # la misma vela no se evalúa dos veces
+
+
+def test_missed_bars_are_counted_once(clock):
+    calls = []
+    sched = _scheduler(clock, calls)
+    clock.now = CLOSE + 2 * BAR + 5                   # el proceso estuvo parado dos velas
+    sched.poll()
+    assert calls == [["EURUSD", "GBPUSD"]]
+    assert sched.skipped_bars == 2
+    assert sched.next_close[BAR] == CLOSE + 3 * BAR
+    assert sched.lag_stats()["skipped_bars"] == 2
+
+
+def test_entry_cadence_restarts_after_bar_evaluation(clock):
+    calls = []
+    sched = _scheduler(clock, calls, entry_seconds=30.0)
+    sched.poll()                                      # primera pasada de entradas
+    assert calls == [["EURUSD", "GBPUSD"]]
+
+    clock.now = CLOSE + 1.0                           # cierre y entradas vencidas a la vez
+    sched.poll()
+    assert len(calls) == 2                            # una sola evaluación, la del cierre
+    assert sched.next_entry == CLOSE + 31.0
+
+    clock.now = CLOSE + 30.0
+    sched.poll()
+    assert len(calls) == 2
+    clock.now = CLOSE + 31.0
+    sched.poll()
+    assert len(calls) == 3
+
+
+def test_sync_clock_rounds_and_ignores_stale_ticks(clock):
+    sched = _scheduler(clock, [])
+    assert sched.server_offset == 0.0
+    assert sched.sync_clock(clock.now + 2 * 3600 - 20) == 7200.0     # redondeado a 15 min
+    assert sched.sync_clock(clock.now - 15 * 3600) == 7200.0         # tick de hace 15 h: se ignora
+    assert sched.server_now() == clock.now + 7200.0
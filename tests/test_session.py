@@ -0,0 +1,122 @@
+# tests/test_session.py
+# SessionManager contra un SimTerminal que se puede "caer": backoff con
+# jitter acotado y las transiciones caída → reconexión (contador, catálogo,
+# evento `connected`, avisos).
+import pytest
+
+from utils import session as session_module
+from utils.session import SessionManager
+from utils.sim_terminal import SimTerminal, synthetic_bars
+
+START = 1704067200          # 2024-01-01 00:00 UTC
+
+
+class FlakyTerminal(SimTerminal):
+    """terminal_info() → None mientras `down` (terminal cerrado o colgado)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.down = False
+        self.initializations = 0
+
+    def terminal_info(self):
+        return None if self.down else super().terminal_info()
+
+    def initialize(self, *args, **kwargs):
+        self.initializations += 1
+        return not self.down
+
+
+class CatalogSpy:
+    def __init__(self):
+        self.calls = []
+
+    def invalidate(self, symbol=None):
+        self.calls.append(("invalidate", symbol))
+
+    def preload(self, symbols):
+        self.calls.append(("preload", list(symbols)))
+
+
+@pytest.fixture
+def terminal(sim_backend):
+    bars = synthetic_bars("EURUSD", START, START + 86400, 1, seed=1)
+    return sim_backend(FlakyTerminal({"EURUSD": (bars, 1)}, start=START + 3600))
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    spy = CatalogSpy()
+    monkeypatch.setattr(session_module, "get_catalog", lambda: spy)
+    return spy
+
+
+def test_backoff_grows_to_the_cap_with_jitter():
+    session = SessionManager(backoff_min=1, backoff_max=60)
+    for failures, full in ((1, 1), (2, 2), (3, 4), (6, 32), (7, 60), (40, 60)):
+        session.failures = failures
+        delays = [session._backoff() for _ in range(200)]
+        assert all(full * 0.5 <= d <= full for d in delays), failures
+        assert max(delays) - min(delays) > 0            # jitter: no todos iguales
+
+
+def test_lost_and_restored_transitions(terminal, catalog):
+    sent = []
+    session = SessionManager(notify=sent.append)
+    session.watch(["EURUSD", "GBPUSD"])
+    assert catalog.calls == []                          # sin sesión no se preselecciona nada
+
+    assert session._connect()
+    session._restored()                                 # primera conexión: no cuenta como reconexión
+    assert session.connected.is_set() and session.reconnects == 0 and sent == []
+    assert catalog.calls == [("invalidate", None), ("preload", ["EURUSD", "GBPUSD"])]
+
+    terminal.down = True
+    assert not session._alive()
+    session._lost()
+    assert not session.connected.is_set() and session.down_since is not None
+    assert "DESCONECTADO" in sent[-1]
+    assert not session._connect()                       # initialize falla mientras está caído
+    assert terminal.initializations == 1
+
+    terminal.down = False
+    catalog.calls.clear()
+    session.failures = 3
+    assert session._connect()
+    session._restored()
+    assert session.connected.is_set()
+    assert session.reconnects == 1 and session.failures == 0 and session.down_since is None
+    assert "RECONECTADO" in sent[-1]
+    assert catalog.calls == [("invalidate", None), ("preload", ["EURUSD", "GBPUSD"])]
+    assert session.status()["down_seconds"] == 0.0
+
+
+def test_watch_preloads_new_symbols_when_connected(terminal, catalog):
+    session = SessionManager(notify=lambda text: None)
+    assert session._connect()
+    session._restored()
+    catalog.calls.clear()
+    session.watch(["EURUSD", "USDJPY"])
+    session.watch(["EURUSD"])                           # ya vigilado: nada
+    assert catalog.calls == [("preload", ["EURUSD", "USDJPY"])]
+
+
+def test_thread_reconnects_after_a_drop(terminal, catalog):
+    sent = []
+    session = SessionManager(heartbeat=0.01, backoff_min=0.01, backoff_max=0.02, notify=sent.append)
+    try:
+        session.start()
+        assert session.wait(2)
+        terminal.down = True
+        for _ in range(200):                            # el latido detecta la caída
+            if not session.connected.is_set():
+                break
+            session._stop.wait(0.01)
+        assert not session.connected.is_set()
+        terminal.down = False
+        assert session.wait(2)
+        assert session.reconnects == 1
+    finally:
+        session.stop()
+    assert not session.connected.is_set()
+    assert [m.split("</b>")[0] for m in sent] == ["<b>⚠️ MT5 DESCONECTADO", "<b>✅ MT5 RECONECTADO"]
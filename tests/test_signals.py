@@ -0,0 +1,131 @@
+# tests/test_signals.py
+# Las reglas por lotes (utils.signals) contra los bots de verdad corriendo en
+# el backtester sobre la misma serie sintética (SimTerminal, M15, un ciclo por
+# tick para que el bot vea cada toque de nivel dentro de la vela).
+#
+# Entrada a entrada solo coinciden donde las dos cosas modelan lo mismo: el
+# bot llena al precio del tick (el SimTerminal sintético salta de extremo a
+# extremo) y revisa SL/TP dentro de la misma vela, las señales no. Por eso:
+#   - decisiones: órdenes sin fill → el bot evalúa cada vela y la primera
+#     orden de cada vela tiene que ser una señal, y viceversa
+#   - trades: stops lejos → la primera entrada de cada símbolo, con simulate
+import importlib
+from datetime import timezone
+
+import numpy as np
+import pytest
+
+from utils import signals as sg
+from utils.backtester import Backtester
+from utils.sim_terminal import default_symbol_spec, synthetic_bars
+
+START = 1704067200          # 2024-01-01 00:00 UTC
+BARS = 400
+SKIP = 25                   # el backtest arranca aquí: el filtro de rango de Mark2 ya tiene 20 velas
+SYMBOLS = ["EURUSD", "GBPUSD", "AUDUSD", "NZDUSD", "USDCAD", "USDCHF"]
+SETTINGS = {"TIMEFRAME": 15, "MAX_POSITIONS": len(SYMBOLS), "SUBIDA_PIPS": 1.4,
+            "EMA_FAST": 20, "EMA_SLOW": 50}
+WIDE = 20000                # points: ningún SL/TP se toca en la serie
+
+
+@pytest.fixture(scope="module")
+def market():
+    data = {s: (synthetic_bars(s, START, START + BARS * 900, 15, seed=7), 15) for s in SYMBOLS}
+    o, h, l, c = (np.stack([data[s][0][col] for s in SYMBOLS]) for col in ("open", "high", "low", "close"))
+    specs = [default_symbol_spec(s) for s in SYMBOLS]
+    point = [spec["point"] for spec in specs]
+    spread = [spec["spread_points"] for spec in specs]
+    return data, (o, h, l, c), point, spread
+
+
+def _signals(bot_name, bars, point, spread, wide=False):
+    o, h, l, c = bars
+    if bot_name == "mark2_ai":
+        stops = {"sl_pips": WIDE, "tp_pips": WIDE} if wide else {}
+        signals = sg.mark2_signals(o, h, l, point, pips=1.4, spread=spread, **stops)
+    else:
+        stops = {"atr_mult_sl": 200.0, "atr_mult_tp": 200.0} if wide else {}
+        signals = sg.mark3_signals(o, h, l, c, point, spread=spread, **stops)
+    signals.direction[:, :SKIP] = 0
+    return signals
+
+
+def _backtest(bot_name, data, **settings):
+    return Backtester(bot_name, data, {**SETTINGS, "PAIRS": SYMBOLS, **settings},
+                      start=START + SKIP * 900, cycle_seconds=1).run()
+
+
+@pytest.mark.parametrize("bot_name", ["mark2_ai", "mark3_ai"])
+def test_signals_match_bot_decisions_bar_by_bar(bot_name, market, monkeypatch):
+    data, bars, point, spread = market
+    module = importlib.import_module(f"bots.{bot_name}")
+    first = {}
+
+    def send_order(symbol, order_type, *args, **kwargs):
+        bar = (module.mt5.now_msc // 1000 - START) // 900
+        first.setdefault((SYMBOLS.index(symbol), bar), 1 if order_type == module.mt5.ORDER_TYPE_BUY else -1)
+        return None                                # sin fill: el bot sigue evaluando el símbolo
+
+    monkeypatch.setattr(module, "send_order", send_order)
+    _backtest(bot_name, data)
+
+    signals = _signals(bot_name, bars, point, spread)
+    rows, cols = np.nonzero(signals.direction)
+    expected = {(int(r), int(c)): int(signals.direction[r, c]) for r, c in zip(rows, cols)}
+    assert len(expected) > 20
+    assert first == expected
+
+
+@pytest.mark.parametrize("bot_name", ["mark2_ai", "mark3_ai"])
+def test_simulate_matches_backtester_entries(bot_name, market):
+    data, bars, point, spread = market
+    result = _backtest(bot_name, data, STOP_LOSS_PIPS=WIDE, STOP_WIN_PIPS=WIDE,
+                       ATR_MULT_SL=200.0, ATR_MULT_TP=200.0)
+    got = sorted((SYMBOLS.index(t["symbol"]),
+                  (int(t["open_time"].replace(tzinfo=timezone.utc).timestamp()) - START) // 900,
+                  1 if t["direction"] == "BUY" else -1) for t in result.trades)
+
+    o, h, l, c = bars
+    trades = sg.simulate(_signals(bot_name, bars, point, spread, wide=True), o, h, l, c, point, spread=spread)
+    want = sorted((int(t["symbol"]), int(t["entry_bar"]), int(t["direction"])) for t in trades)
+    assert len(want) == len(SYMBOLS)
+    assert got == want
+    assert set(trades["reason"].tolist()) == {sg.EXIT_END}
+
+
+def test_one_dim_rows_equal_matrix_rows(market):
+    _, (o, h, l, c), point, spread = market
+    both = sg.mark3_signals(o, h, l, c, point, spread=spread)
+    both_trades = sg.simulate(both, o, h, l, c, point, spread=spread)
+    for i in range(len(SYMBOLS)):
+        one = sg.mark3_signals(o[i], h[i], l[i], c[i], point[i], spread=spread[i])
+        for a, b in zip(one, both):
+            np.testing.assert_array_equal(a, b[i])
+        trades = sg.simulate(one, o[i], h[i], l[i], c[i], point[i], spread=spread[i])
+        row = both_trades[both_trades["symbol"] == i]
+        assert (trades["symbol"] == 0).all()
+        for name in ("entry_bar", "exit_bar", "direction", "entry", "exit", "profit", "reason"):
+            np.testing.assert_array_equal(trades[name], row[name])
+
+    one = sg.mark2_signals(o[0], h[0], l[0], point[0])
+    assert one.direction.ndim == 1
+    np.testing.assert_array_equal(one.direction, sg.mark2_signals(o, h, l, point).direction[0])
+
+
+def test_summary_edge_cases():
+    assert sg.summary(np.empty(0, dtype=sg.TRADE_DTYPE)) == {
+        "trades": 0, "win_rate": 0.0, "profit": 0.0, "max_drawdown": 0.0,
+        "profit_factor": 0.0, "avg_points": 0.0}
+
+    winners = np.zeros(3, dtype=sg.TRADE_DTYPE)
+    winners["profit"] = [1.0, 2.5, 0.5]
+    winners["points"] = [10.0, 25.0, 5.0]
+    s = sg.summary(winners)
+    assert s["trades"] == 3 and s["win_rate"] == 100.0 and s["profit"] == 4.0
+    assert s["max_drawdown"] == 0.0 and s["profit_factor"] == float("inf")
+    assert s["avg_points"] == round(40.0 / 3, 2)
+
+    mixed = np.zeros(3, dtype=sg.TRADE_DTYPE)
+    mixed["profit"] = [3.0, -2.0, -2.0]
+    s = sg.summary(mixed)
+    assert s["max_drawdown"] == 4.0 and s["profit_factor"] == 0.75 and s["win_rate"] == 33.33
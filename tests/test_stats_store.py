@@ -0,0 +1,111 @@
+# tests/test_stats_store.py
+# StatsStore: contadores en memoria, journal que se relee al arrancar,
+# compactación en el snapshot y migración del stats.json anterior.
+import json
+
+from utils.stats_store import StatsStore
+
+TRADES = [("EURUSD", 12.5, "Take Profit"), ("GBPUSD", -7.25, "Stop Loss"),
+          ("EURUSD", -3.0, "Stop Loss"), ("EURUSD", 4.0, "Take Profit")]
+
+
+def _fill(store, trades=TRADES):
+    for i, (symbol, profit, reason) in enumerate(trades):
+        store.record(symbol, profit, reason, when=f"2025-11-17T10:0{i}:00")
+
+
+def _snapshot(store):
+    return store.as_dict()
+
+
+def test_counters_in_memory():
+    store = StatsStore()
+    _fill(store)
+    assert store.total_trades == 4
+    assert store.win_rate == 50.0
+    assert store.total_profit == 6.25
+    assert store.symbol_stats("EURUSD") == {"total": 3, "wins": 2, "profit": 13.5, "win_rate": 66.67}
+    assert store.by_reason == {"Take Profit": 2, "Stop Loss": 2}
+    assert store.totals["gross_win"] == 16.5 and store.totals["gross_loss"] == 10.25
+
+
+def test_journal_is_replayed_after_a_crash(tmp_path):
+    path = str(tmp_path / "stats.json")
+    store = StatsStore(path)
+    _fill(store)
+    store.flush()
+    expected = _snapshot(store)
+    # sin close(): el proceso "se cae" → no hay snapshot, solo journal
+    assert not (tmp_path / "stats.json").exists()
+    with open(store.journal_path, "a", encoding="utf-8") as f:
+        f.write('{"seq": 5, "sym')                 # última línea a medio escribir
+    reloaded = StatsStore(path)
+    assert _snapshot(reloaded) == expected
+    assert reloaded.seq == 4
+
+
+def test_compaction_folds_journal_into_snapshot(tmp_path):
+    path = str(tmp_path / "stats.json")
+    store = StatsStore(path, compact_every=3)
+    _fill(store)
+    # 3 trades plegados en el snapshot, el 4º en el journal
+    snapshot = json.loads((tmp_path / "stats.json").read_text(encoding="utf-8"))
+    assert snapshot["seq"] == 3 and snapshot["totals"]["total"] == 3
+    journal = (tmp_path / "stats.journal.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["seq"] for line in journal] == [4]
+    store.flush()
+    assert _snapshot(StatsStore(path)) == _snapshot(store)
+
+
+def test_journal_entries_already_in_snapshot_are_ignored(tmp_path):
+    path = str(tmp_path / "stats.json")
+    store = StatsStore(path)
+    _fill(store)
+    store.flush()
+    journal = (tmp_path / "stats.journal.jsonl").read_text(encoding="utf-8")
+    store.close()                                  # snapshot con seq 4, journal vacío
+    # corte entre os.replace del snapshot y el vaciado del journal
+    (tmp_path / "stats.journal.jsonl").write_text(journal, encoding="utf-8")
+    reloaded = StatsStore(path)
+    assert reloaded.total_trades == 4 and reloaded.total_profit == 6.25
+
+
+def test_migrates_old_format(tmp_path):
+    old = {"trades": [{"symbol": s, "profit": p, "reason": r, "time": "2025-11-01T00:00:00"}
+                      for s, p, r in TRADES],
+           "win_rate": 50.0, "total_profit": 6.25, "last_update": "2025-11-01T00:00:00"}
+    path = tmp_path / "stats.json"
+    path.write_text(json.dumps(old), encoding="utf-8")
+    store = StatsStore(str(path))
+    assert store.total_trades == 4 and store.win_rate == 50.0 and store.total_profit == 6.25
+    assert store.symbol_stats("GBPUSD")["profit"] == -7.25
+    assert json.loads((tmp_path / "stats.json.v1.bak").read_text(encoding="utf-8")) == old
+    migrated = json.loads(path.read_text(encoding="utf-8"))      # reescrito en el formato nuevo
+    assert migrated["version"] == 2 and migrated["seq"] == 4 and "trades" not in migrated
+    store.record("USDJPY", 1.0, "Take Profit")
+    store.close()
+    assert StatsStore(str(path)).total_trades == 5
+
+
+def test_empty_snapshot_starts_empty(tmp_path):
+    path = tmp_path / "stats.json"
+    path.write_text("", encoding="utf-8")
+    store = StatsStore(str(path))
+    assert store.total_trades == 0
+    store.record("EURUSD", 1.0, "Take Profit")
+    store.close()
+    assert json.loads(path.read_text(encoding="utf-8"))["seq"] == 1
+
+
+def test_unreadable_snapshot_is_backed_up_and_never_overwritten(tmp_path):
+    path = tmp_path / "stats.json"
+    path.write_text("{no es json", encoding="utf-8")
+    store = StatsStore(str(path), compact_every=2)
+    assert store.total_trades == 0
+    _fill(store)                                   # pasaría por compactación dos veces
+    store.close()
+    assert path.read_text(encoding="utf-8") == "{no es json"
+    assert (tmp_path / "stats.json.v1.bak").read_text(encoding="utf-8") == "{no es json"
+    journal = (tmp_path / "stats.journal.jsonl").read_text(encoding="utf-8").splitlines()
+    assert len(journal) == 4                       # los trades nuevos siguen en el journal
+    assert StatsStore(str(path)).total_trades == 4
@@ -0,0 +1,32 @@
+# tests/test_supervisor.py
+import pytest
+
+from utils import supervisor
+
+
+def test_each_bot_needs_its_own_magic(monkeypatch):
+    magics = {"settings_mark2.json": {}, "settings_mark3.json": {}}
+    monkeypatch.setattr(supervisor, "get_settings", lambda filename: magics[filename])
+    supervisor.BotSupervisor(["mark2_ai", "mark3_ai"])          # los MAGIC_NUMBER de cada módulo
+
+    magics["settings_mark3.json"] = {"MAGIC_NUMBER": 234568}     # el mismo que Mark2
+    with pytest.raises(ValueError, match="MAGIC_NUMBER"):
+        supervisor.BotSupervisor(["mark2_ai", "mark3_ai"])
+
+    magics["settings_mark3.json"] = {"MAGIC_NUMBER": 234567}     # el fijo de antes: Mark2 lo adopta
+    with pytest.raises(ValueError, match="LEGACY_MAGICS"):
+        supervisor.BotSupervisor(["mark2_ai", "mark3_ai"])
+
+
+def test_legacy_magic_has_a_single_owner_per_pair(monkeypatch):
+    settings = {"settings_mark2.json": {"PAIRS": ["EURUSD", "GBPUSD"]},
+                "settings_mark3.json": {"PAIRS": ["EURUSD", "GBPUSD"]}}
+    monkeypatch.setattr(supervisor, "get_settings", lambda filename: settings[filename])
+    supervisor.BotSupervisor(["mark2_ai", "mark3_ai"])          # 234567 solo en Mark2 por defecto
+
+    settings["settings_mark3.json"]["LEGACY_MAGICS"] = [234567]    # los dos lo adoptan en EURUSD/GBPUSD
+    with pytest.raises(ValueError, match="234567"):
+        supervisor.BotSupervisor(["mark2_ai", "mark3_ai"])
+
+    settings["settings_mark3.json"]["PAIRS"] = ["USDJPY"]          # pares distintos: cada uno los suyos
+    supervisor.BotSupervisor(["mark2_ai", "mark3_ai"])
@@ -0,0 +1,141 @@
+# tests/test_telegram_sender.py
+# TelegramSender contra un "Telegram" HTTP local (como el benchmark): cola sin
+# bloqueo, ráfagas juntadas en un mensaje, cola llena, 429 y rate limit.
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.telegram_notifier import TELEGRAM_MAX_LENGTH, TelegramSender
+
+
+class FakeTelegram:
+    """Servidor local: guarda (instante, texto) de cada POST y responde lo que
+    haya en `replies` (por defecto 200). `hold` frena las respuestas."""
+
+    def __init__(self):
+        self.posts = []
+        self.replies = []
+        self.hold = threading.Event()
+        self.hold.set()
+        self.got_post = threading.Event()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                fake.posts.append((time.monotonic(), body["text"]))
+                fake.got_post.set()
+                fake.hold.wait(5)
+                code, data = fake.replies.pop(0) if fake.replies else (200, {"ok": True, "result": {}})
+                raw = json.dumps(data).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def texts(self):
+        return [text for _, text in self.posts]
+
+
+@pytest.fixture
+def telegram():
+    fake = FakeTelegram()
+    senders = []
+
+    def sender(**kwargs):
+        kwargs = {"min_interval": 0.05, "coalesce_window": 0.05, "timeout": 5, **kwargs}
+        s = TelegramSender("TOKEN", 1, api_url=fake.url, **kwargs)
+        senders.append(s)
+        return s
+
+    fake.sender = sender
+    yield fake
+    fake.hold.set()
+    for s in senders:
+        s.close(1)
+    fake.server.shutdown()
+    fake.server.server_close()
+
+
+def test_send_does_not_wait_for_the_network(telegram):
+    telegram.hold.clear()                        # Telegram colgado
+    sender = telegram.sender()
+    t0 = time.perf_counter()
+    assert sender.send("hola")
+    assert time.perf_counter() - t0 < 0.05
+    telegram.hold.set()
+    assert sender.flush(5)
+    assert telegram.texts == ["hola"]
+
+
+def test_burst_is_coalesced_into_one_message(telegram):
+    sender = telegram.sender(coalesce_window=0.2)
+    for i in range(5):
+        sender.send(f"cierre {i}")
+    assert sender.flush(5)
+    assert telegram.texts == ["\n\n".join(f"cierre {i}" for i in range(5))]
+    assert sender.stats() == {"queued": 0, "sent": 1, "delivered": 5, "merged": 4, "dropped": 0, "failed": 0}
+
+
+def test_message_that_does_not_fit_goes_first_in_the_next_one(telegram):
+    sender = telegram.sender(coalesce_window=0.2)
+    big = "x" * (TELEGRAM_MAX_LENGTH - 2)          # + "\n\n" + "a" ya no cabe
+    for text in (big, "a", "b"):
+        sender.send(text)
+    assert sender.flush(5)
+    assert telegram.texts == [big, "a\n\nb"]
+
+
+def test_full_queue_drops_and_counts(telegram):
+    telegram.hold.clear()
+    sender = telegram.sender(maxsize=2)
+    sender.send("primero")
+    assert telegram.got_post.wait(5)             # el hilo está esperando a Telegram
+    assert sender.send("a") and sender.send("b")
+    assert not sender.send("c")
+    telegram.hold.set()
+    assert sender.flush(5)
+    assert telegram.texts == ["primero", "a\n\nb"]
+    assert sender.stats()["dropped"] == 1
+
+
+def test_429_waits_retry_after_and_resends(telegram):
+    telegram.replies.append((429, {"ok": False, "error_code": 429, "parameters": {"retry_after": 0.3}}))
+    sender = telegram.sender()
+    sender.send("hola")
+    assert sender.flush(5)
+    (t_first, _), (t_retry, text) = telegram.posts
+    assert text == "hola"
+    assert t_retry - t_first >= 0.3
+    assert sender.stats()["sent"] == 1 and sender.stats()["failed"] == 0
+
+
+def test_min_interval_between_messages(telegram):
+    sender = telegram.sender(min_interval=0.3, coalesce_window=0.0)
+    sender.send("uno")
+    assert sender.flush(5)
+    sender.send("dos")
+    assert sender.flush(5)
+    (t1, _), (t2, _) = telegram.posts
+    assert t2 - t1 >= 0.3
+
+
+def test_rejected_message_is_not_retried(telegram):
+    telegram.replies.append((400, {"ok": False, "description": "Bad Request"}))
+    sender = telegram.sender()
+    sender.send("<b>roto")
+    assert sender.flush(5)
+    assert len(telegram.posts) == 1
+    assert sender.stats()["failed"] == 1 and sender.stats()["sent"] == 0
@@ -0,0 +1,101 @@
+# tests/test_trade_journal.py
+# TradeJournal: una fila por ticket (UPSERT en apertura y cierre, en cualquier
+# orden), pips/duración calculados en el cierre, e import de los CSV viejos.
+import csv
+from datetime import datetime
+
+import pytest
+
+from utils.trade_journal import TradeJournal
+
+OPEN = datetime(2025, 11, 17, 10, 0, 0)
+CLOSE = datetime(2025, 11, 17, 10, 45, 0)
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return TradeJournal(str(tmp_path / "trades.db"), flush_seconds=0.01)
+
+
+def test_open_then_close_is_one_row(journal):
+    journal.log_open("mark3", 1001, "EURUSD", "BUY", 0.10, 1.10000, sl=1.09800, tp=1.10400,
+                     point=0.00001, reason="BREAKOUT", when=OPEN)
+    journal.log_close("mark3", 1001, "EURUSD", 1.10250, 25.0, "Take Profit", when=CLOSE)
+    assert journal.flush()
+    (row,) = journal.trades()
+    assert row["ticket"] == 1001 and row["bot"] == "mark3"
+    assert (row["entry_price"], row["exit_price"], row["sl"], row["tp"]) == (1.1, 1.1025, 1.098, 1.104)
+    assert row["profit"] == 25.0 and row["profit_pips"] == 250.0
+    assert row["duration_min"] == 45.0
+    assert (row["open_reason"], row["close_reason"]) == ("BREAKOUT", "Take Profit")
+
+
+def test_sell_pips_and_repeated_open_updates_in_place(journal):
+    journal.log_open("mark2", 7, "USDJPY", "SELL", 0.2, 150.000, point=0.001, when=OPEN)
+    journal.log_open("mark2", 7, "USDJPY", "SELL", 0.2, 150.010, point=0.001, when=OPEN)   # reintento
+    journal.log_close("mark2", 7, "USDJPY", 149.900, 13.3, "Take Profit", when=CLOSE)
+    journal.flush()
+    (row,) = journal.trades(symbol="USDJPY")
+    assert row["entry_price"] == 150.01
+    assert row["profit_pips"] == 110.0
+
+
+def test_close_without_open_keeps_what_it_knows(journal):
+    journal.log_close("mark2", 9, "GBPUSD", 1.25, -8.0, "Stop Loss", direction="BUY", lots=0.05,
+                      entry_price=1.2516, when=CLOSE)
+    journal.flush()
+    row = journal.get(9)
+    assert row["direction"] == "BUY" and row["lots"] == 0.05 and row["entry_price"] == 1.2516
+    assert row["profit_pips"] is None and row["duration_min"] is None     # sin point ni apertura
+    assert journal.trades(closed_only=True) == [row]
+
+
+def test_queries_and_daily_summary(journal):
+    for i, (symbol, profit) in enumerate((("EURUSD", 5.0), ("EURUSD", -2.0), ("GBPUSD", 1.5))):
+        journal.log_open("mark3", i, symbol, "BUY", 0.1, 1.0, point=0.00001, when=OPEN)
+        journal.log_close("mark3", i, symbol, 1.0, profit, "x", when=CLOSE)
+    journal.flush()
+    assert [r["ticket"] for r in journal.trades(symbol="EURUSD")] == [0, 1]
+    assert journal.trades(bot="mark2") == []
+    assert journal.trades(date_from=CLOSE) == []
+    assert journal.daily_summary() == [{"day": "2025-11-17", "trades": 3, "wins": 2, "profit": 4.5}]
+
+
+def test_import_old_mark2_csv_and_export(journal, tmp_path):
+    old = tmp_path / "mark2_trades.csv"
+    with open(old, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["timestamp", "symbol", "direction", "ticket", "lot_size", "entry_price", "exit_price",
+                    "sl", "tp", "profit_usd", "profit_pips", "reason", "duration_min"])
+        w.writerow(["2025-11-17 10:00:00", "EURUSD", "BUY", "55", "0.10", "1.10000", "", "1.09900",
+                    "1.10200", "", "", "OPEN", ""])
+        w.writerow(["2025-11-17 10:30:00", "EURUSD", "BUY", "55", "0.10", "1.10000", "1.10200", "", "",
+                    "20.00", "200.0", "Take Profit", ""])
+        w.writerow(["2025-11-17 11:00:00", "EURUSD", "?", "?", "", "", "", "", "", "", "", "OPEN", ""])
+    assert journal.import_csv(str(old), "mark2") == 2
+    row = journal.get(55)
+    assert row["bot"] == "mark2" and row["sl"] == 1.099 and row["exit_price"] == 1.102
+    assert row["profit"] == 20.0 and row["duration_min"] == 30.0
+
+    out = tmp_path / "export.csv"
+    assert journal.export_csv(str(out)) == 1
+    with open(out, newline="", encoding="utf-8") as f:
+        (exported,) = list(csv.DictReader(f))
+    assert exported["ticket"] == "55" and exported["close_reason"] == "Take Profit"
+    assert exported["open_time"] == "2025-11-17 10:00:00"
+
+
+def test_import_old_mark3_csv(journal, tmp_path):
+    old = tmp_path / "mark3_trades.csv"
+    with open(old, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["timestamp", "symbol", "direction", "ticket", "lots", "entry", "exit", "sl", "tp",
+                    "profit", "pips", "reason", "duration"])
+        w.writerow(["2025-11-17 09:00:00", "GBPUSD", "SELL", "77", "0.05", "1.26000", "", "1.26300",
+                    "1.25500", "", "", "OPEN", ""])
+        w.writerow(["2025-11-17 09:20:00", "GBPUSD", "SELL", "77", "0.05", "", "1.26300", "", "",
+                    "-15.00", "", "Stop Loss", ""])
+    journal.import_csv(str(old), "mark3")
+    row = journal.get(77)
+    assert (row["direction"], row["lots"], row["entry_price"], row["exit_price"]) == ("SELL", 0.05, 1.26, 1.263)
+    assert row["profit"] == -15.0 and row["close_reason"] == "Stop Loss" and row["duration_min"] == 20.0
@@ -0,0 +1,389 @@
+# utils/backtester.py
+# Backtester por eventos: reproduce Mark2AIPro / Mark3Pro SIN tocar su lógica
+# sobre velas (y ticks) guardados, a velocidad de CPU (nada de MAIN_LOOP_DELAY).
+#
+# Cómo funciona:
+#   - utils.sim_terminal.SimTerminal imita la API de MetaTrader5 que usan los
+#     bots (symbol_info_tick, copy_rates_from_pos, order_send, positions_get,
+#     account_info...) sobre los datos históricos, con un reloj manual.
+#   - Durante la corrida se sustituye el `mt5` de los bots, de
+#     utils.mt5_connector y de utils.feed_selector por el terminal, así que
+#     send_order / close_position / get_positions son los de siempre.
+#   - BacktestFeed es el reemplazo de utils.feed_selector.Feed (sin reintentos
+#     ni sleeps).
+#   - Un ciclo del bot (run_cycle) por cierre de vela de su TIMEFRAME, como el
+#     planificador en vivo; entre ciclos el terminal resuelve SL/TP solo.
+#     --cycle-seconds N da ciclos más seguidos (p. ej. 60 con datos M1).
+#
+# Fills: con velas sin ticks el camino dentro de cada vela es inventado y, si
+# SL y TP caen en la misma vela, se asume el SL (ver utils.sim_terminal). Con
+# datos M1 en --data la resolución es minuto a minuto aunque el bot opere M15/H1.
+#
+# Uso:
+#   py -3.11 -m utils.backtester mark3_ai --data historico/ --from 2023-01-01
+#   py -3.11 -m utils.backtester mark2_ai --data historico/ --set SUBIDA_PIPS=3
+#   py -3.11 -m utils.backtester export EURUSD M15 2022-01-01 2025-01-01 historico/
+#
+# En --data cada archivo es <SIMBOLO>_<TF>.csv o .npy (p. ej. EURUSD_M15.csv).
+# Por símbolo se usa el timeframe más bajo como serie base; los superiores se
+# construyen a partir de ella.
+
+import os
+import sys
+import csv
+import time
+import logging
+import argparse
+import importlib
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+# Los bots importan `mt5` de utils.broker: aquí nunca hace falta el terminal real
+os.environ.setdefault("MT5_BACKEND", "sim")
+
+from utils.sim_terminal import (  # noqa: E402
+    SimTerminal, TIMEFRAME_LABELS, _to_epoch, load_data_dir, save_bars, sim_datetime,
+)
+from utils.feed_selector import Feed  # noqa: E402
+from utils.stats_store import StatsStore  # noqa: E402
+from utils.symbol_catalog import get_catalog  # noqa: E402
+from utils.execution import get_execution  # noqa: E402
+from utils.positions import get_position_book  # noqa: E402
+from utils.supervisor import BOTS  # noqa: E402
+
+logger = logging.getLogger("backtester")
+
+
+# ======================================================================
+# EXPORT DESDE EL TERMINAL REAL
+# ======================================================================
+def export_bars(symbol, timeframe, date_from, date_to, out_dir):
+    """Descarga velas del terminal real (Windows) y las guarda en out_dir."""
+    import MetaTrader5 as real_mt5
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    tf = TIMEFRAME_LABELS[timeframe.upper()] if isinstance(timeframe, str) else timeframe
+    label = next(k for k, v in TIMEFRAME_LABELS.items() if v == tf)
+    if not real_mt5.initialize(login=int(os.getenv("LOGIN", "0")), password=os.getenv("PASSWORD"),
+                               server=os.getenv("SERVER")):
+        raise RuntimeError(f"No se pudo conectar a MT5: {real_mt5.last_error()}")
+    real_mt5.symbol_select(symbol, True)
+    rates = real_mt5.copy_rates_range(symbol, tf,
+                                      datetime.fromtimestamp(_to_epoch(date_from), timezone.utc),
+                                      datetime.fromtimestamp(_to_epoch(date_to), timezone.utc))
+    if rates is None or len(rates) == 0:
+        raise RuntimeError(f"Sin velas para {symbol} {label}: {real_mt5.last_error()}")
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{symbol}_{label}.npy")
+    save_bars(path, rates)
+    return path
+
+
+# ======================================================================
+# FEED DE BACKTEST (reemplazo de utils.feed_selector.Feed)
+# ======================================================================
+
+class BacktestFeed(Feed):
+    """Mismo interfaz que Feed, leyendo del terminal de backtest sin reintentos
+    ni sleeps. Las velas salen directo de los arrays del terminal (una copia de
+    `count` filas): sin ring ni deltas, que en vivo ahorran llamadas al broker
+    y aquí solo cuestan tiempo por ciclo."""
+
+    def __init__(self, settings, terminal):
+        super().__init__(settings)
+        self.terminal = terminal
+        self.recorder = None                      # el backtest no graba mercado
+        self.store = None                         # ni lee/escribe el histórico local
+
+    def get_current_price(self, symbol):
+        cached = self._prices.get(symbol)          # market_snapshot() del bot
+        if cached:
+            return cached
+        tick = self.terminal.symbol_info_tick(symbol)
+        if tick is None:
+            return None, None
+        return tick.bid, tick.ask
+
+    def prefetch_prices(self, symbols):
+        prices = {}
+        for symbol in symbols:
+            tick = self.terminal.symbol_info_tick(symbol)
+            if tick is not None:
+                prices[symbol] = (tick.bid, tick.ask)
+        return prices
+
+    def get_rates(self, symbol, timeframe, count=500):
+        rates = self.terminal.copy_rates_from_pos(symbol, timeframe, 0, count)
+        if rates is None or len(rates) == 0:
+            return None
+        return {name: rates[name] for name in rates.dtype.names}
+
+    def get_candles(self, symbol, timeframe, count=500):
+        arrays = self.get_rates(symbol, timeframe, count)
+        if arrays is None:
+            return None
+        arrays["time"] = arrays["time"].astype("datetime64[s]")
+        return pd.DataFrame(arrays)
+
+    def is_market_open(self, symbol):
+        info = self.terminal.symbol_info(symbol)
+        return bool(info and info.visible and info.trade_mode != self.terminal.SYMBOL_TRADE_MODE_DISABLED)
+
+    def _base_for(self, symbol):
+        # serie base = el timeframe de los datos cargados de ese símbolo
+        series = self.terminal._series(symbol)
+        return series.tf if series is not None else None
+
+
+# ======================================================================
+# MOTOR
+# ======================================================================
+# Módulos cuyo `mt5` se sustituye durante la corrida
+PATCHED_MODULES = ("utils.mt5_connector", "utils.feed_selector", "utils.symbol_catalog", "utils.execution",
+                   "utils.positions")
+
+# Métodos del bot que escriben a disco (CSV) → se anulan en backtest
+SIDE_EFFECT_METHODS = ("log_trade", "_log_trade")
+
+
+class _Patch:
+    """Sustituye atributos y los restaura al salir."""
+
+    def __init__(self):
+        self._saved = []
+
+    def set(self, obj, name, value):
+        self._saved.append((obj, name, getattr(obj, name)))
+        setattr(obj, name, value)
+
+    def restore(self):
+        for obj, name, value in reversed(self._saved):
+            setattr(obj, name, value)
+        self._saved.clear()
+
+
+class BacktestResult:
+    def __init__(self, bot_name, terminal, cycles, events, elapsed):
+        self.bot_name = bot_name
+        # velas sin ticks → SL/TP en la misma vela se resuelven a favor del SL
+        self.fill_model = ("velas (SL primero si SL y TP caen en la misma vela)"
+                           if any(s.synthetic_path for s in terminal.series.values()) else "ticks")
+        self.initial_balance = terminal.initial_balance
+        self.final_balance = terminal.balance
+        self.deals = list(terminal.deals)
+        self.cycles = cycles
+        self.events = events
+        self.elapsed = elapsed
+        self.trades = self._build_trades(terminal)
+
+    @staticmethod
+    def _build_trades(terminal):
+        opens = {d.position_id: d for d in terminal.deals if d.entry == terminal.DEAL_ENTRY_IN}
+        reasons = {terminal.DEAL_REASON_SL: "SL", terminal.DEAL_REASON_TP: "TP",
+                   terminal.DEAL_REASON_EXPERT: "BOT", terminal.DEAL_REASON_CLIENT: "END"}
+        trades = []
+        for d in terminal.deals:
+            if d.entry != terminal.DEAL_ENTRY_OUT:
+                continue
+            o = opens.get(d.position_id)
+            trades.append({
+                "ticket": d.position_id, "symbol": d.symbol,
+                "direction": "BUY" if o and o.type == terminal.DEAL_TYPE_BUY else "SELL",
+                "open_time": datetime.fromtimestamp(o.time, timezone.utc).replace(tzinfo=None) if o else None,
+                "close_time": datetime.fromtimestamp(d.time, timezone.utc).replace(tzinfo=None),
+                "volume": d.volume, "entry": o.price if o else None, "exit": d.price,
+                "profit": d.profit, "reason": reasons.get(d.reason, str(d.reason)),
+            })
+        return trades
+
+    def summary(self):
+        profits = np.array([t["profit"] for t in self.trades], dtype=float)
+        equity = self.initial_balance + np.cumsum(profits) if len(profits) else np.array([self.initial_balance])
+        peak = np.maximum.accumulate(np.r_[self.initial_balance, equity])
+        drawdown = float((peak - np.r_[self.initial_balance, equity]).max())
+        wins = int((profits > 0).sum())
+        gross_win = float(profits[profits > 0].sum())
+        gross_loss = float(-profits[profits < 0].sum())
+        return {
+            "bot": self.bot_name,
+            "trades": len(profits),
+            "wins": wins,
+            "win_rate": round(wins / len(profits) * 100, 2) if len(profits) else 0.0,
+            "net_profit": round(float(profits.sum()), 2),
+            "profit_factor": round(gross_win / gross_loss, 2) if gross_loss else float("inf") if gross_win else 0.0,
+            "max_drawdown": round(drawdown, 2),
+            "final_balance": round(self.final_balance, 2),
+            "events": self.events,
+            "cycles": self.cycles,
+            "elapsed_s": round(self.elapsed, 2),
+            "fill_model": self.fill_model,
+        }
+
+    def to_csv(self, path):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=["ticket", "symbol", "direction", "open_time", "close_time",
+                                              "volume", "entry", "exit", "profit", "reason"])
+            w.writeheader()
+            w.writerows(self.trades)
+
+    def __str__(self):
+        s = self.summary()
+        return (f"{s['bot']}: {s['trades']} trades | Win rate {s['win_rate']:.1f}% | "
+                f"Profit {s['net_profit']:+.2f} | PF {s['profit_factor']} | "
+                f"Max DD {s['max_drawdown']:.2f} | Balance final {s['final_balance']:.2f} | "
+                f"{s['events']} eventos, {s['cycles']} ciclos en {s['elapsed_s']:.2f}s | "
+                f"fills: {s['fill_model']}")
+
+
+class Backtester:
+    """Reproduce un bot sobre datos históricos usando su propio run_cycle()."""
+
+    def __init__(self, bot_name, data, settings=None, balance=10000.0, start=None, end=None,
+                 cycle_seconds=None, specs=None, ticks=None, quiet=True):
+        """
+        bot_name:      "mark2_ai" | "mark3_ai"
+        data:          {símbolo: (velas, timeframe_mt5)} (ver load_data_dir)
+        settings:      overrides sobre el settings_*.json del bot
+        cycle_seconds: None → un ciclo por cierre de vela del TIMEFRAME del bot;
+                       N → un ciclo cada N segundos simulados (alineados)
+        """
+        if bot_name not in BOTS:
+            raise ValueError(f"Bot no soportado: {bot_name} (disponibles: {list(BOTS)})")
+        self.bot_name = bot_name
+        self.data = data
+        self.overrides = settings or {}
+        self.balance = balance
+        self.start = start
+        self.end = end
+        self.cycle_seconds = cycle_seconds
+        self.specs = specs
+        self.ticks = ticks
+        self.quiet = quiet
+
+    def _make_bot(self, terminal):
+        from utils.settings_manager import get_settings
+
+        module_name, class_name, settings_file = BOTS[self.bot_name]
+        module = importlib.import_module(module_name)
+        settings = {**get_settings(settings_file), **self.overrides}
+        if "PAIRS" not in self.overrides:
+            # los PAIRS del settings que tengan datos; si ninguno, todos los símbolos cargados
+            settings["PAIRS"] = [p for p in settings.get("PAIRS", []) if p in self.data] or list(self.data)
+        missing = [p for p in settings["PAIRS"] if p not in self.data]
+        if missing:
+            raise ValueError(f"Sin datos para {missing} (hay: {list(self.data)})")
+
+        bot = getattr(module, class_name)(settings=settings, feed=BacktestFeed(settings, terminal),
+                                          stats=StatsStore())   # stats solo en memoria
+        for name in SIDE_EFFECT_METHODS:
+            if hasattr(bot, name):
+                setattr(bot, name, lambda *a, **k: None)
+        return module, bot
+
+    def run(self):
+        terminal = SimTerminal(self.data, balance=self.balance, specs=self.specs, ticks=self.ticks)
+        patch = _Patch()
+        try:
+            module = importlib.import_module(BOTS[self.bot_name][0])
+            for target in (module, *(importlib.import_module(m) for m in PATCHED_MODULES)):
+                if hasattr(target, "mt5"):
+                    patch.set(target, "mt5", terminal)
+            for name in dir(module):
+                if name.startswith("notify_"):
+                    patch.set(module, name, lambda *a, **k: None)
+            if isinstance(getattr(module, "datetime", None), type):
+                patch.set(module, "datetime", sim_datetime(terminal))
+            if self.quiet:
+                for name in ("mark2", "mark3", "mark2.eval", "mark3.eval", "utils.execution", "utils.positions"):
+                    patch.set(logging.getLogger(name), "disabled", True)
+
+            get_catalog().invalidate()          # specs del terminal de esta corrida
+            get_execution().reset()             # filling aprendido con otro terminal
+            get_position_book().reset()         # foto de posiciones de otra corrida
+            _, bot = self._make_bot(terminal)
+            times = terminal.event_times(self.start, self.end)
+            # primer evento de cada período = cierre de la vela anterior; entre
+            # ciclos advance_to revisa los SL/TP de todos los eventos de una vez
+            step_ms = int((self.cycle_seconds or bot.bar_seconds) * 1000)
+            period = times // step_ms
+            cycle_times = times[np.r_[True, period[1:] != period[:-1]]] if len(times) else times
+            t0 = time.perf_counter()
+            for t in cycle_times.tolist():
+                terminal.advance_to(t)
+                bot.run_cycle()
+            if len(times):
+                terminal.advance_to(int(times[-1]))
+            cycles = len(cycle_times)
+            terminal.close_all("Fin backtest")
+            elapsed = time.perf_counter() - t0
+        finally:
+            patch.restore()
+            get_catalog().invalidate()
+        result = BacktestResult(self.bot_name, terminal, cycles, len(times), elapsed)
+        logger.info("%s", result)
+        return result
+
+
+# ======================================================================
+# CLI
+# ======================================================================
+def _parse_value(raw):
+    for cast in (int, float):
+        try:
+            return cast(raw)
+        except ValueError:
+            pass
+    if raw.lower() in ("true", "false"):
+        return raw.lower() == "true"
+    if "," in raw:
+        return [x.strip() for x in raw.split(",") if x.strip()]
+    return raw
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "export":
+        p = argparse.ArgumentParser(prog="backtester export")
+        p.add_argument("symbol")
+        p.add_argument("timeframe")
+        p.add_argument("date_from")
+        p.add_argument("date_to")
+        p.add_argument("out_dir")
+        a = p.parse_args(argv[1:])
+        print(export_bars(a.symbol, a.timeframe, a.date_from, a.date_to, a.out_dir))
+        return
+
+    p = argparse.ArgumentParser(prog="backtester", description="Backtest de Mark2/Mark3 sobre histórico")
+    p.add_argument("bot", choices=sorted(BOTS))
+    p.add_argument("--data", required=True, help="carpeta con <SIMBOLO>_<TF>.csv|npy")
+    p.add_argument("--symbols", nargs="*", help="por defecto los PAIRS del settings")
+    p.add_argument("--from", dest="start")
+    p.add_argument("--to", dest="end")
+    p.add_argument("--balance", type=float, default=10000.0)
+    p.add_argument("--cycle-seconds", type=float, default=None,
+                   help="segundos entre ciclos del bot (defecto: uno por vela de su TIMEFRAME)")
+    p.add_argument("--set", action="append", default=[], metavar="CLAVE=VALOR")
+    p.add_argument("--trades", help="CSV de salida con los trades")
+    a = p.parse_args(argv)
+
+    overrides = {}
+    for item in a.set:
+        key, _, raw = item.partition("=")
+        overrides[key.strip()] = _parse_value(raw.strip())
+    if a.symbols:
+        overrides["PAIRS"] = a.symbols
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    data = load_data_dir(a.data, a.symbols)
+    if not data:
+        sys.exit(f"No hay datos en {a.data}")
+    result = Backtester(a.bot, data, overrides, a.balance, a.start, a.end, a.cycle_seconds).run()
+    if a.trades:
+        result.to_csv(a.trades)
+
+
+if __name__ == "__main__":
+    main()
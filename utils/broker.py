@@ -0,0 +1,122 @@
+# utils/broker.py
+# Backend del broker: todos los módulos hacen `from utils.broker import mt5`
+# en lugar de `import MetaTrader5 as mt5`.
+#
+#   MT5_BACKEND=mt5   (defecto) terminal real, solo Windows
+#   MT5_BACKEND=sim   terminal simulado local (utils.sim_terminal), cualquier SO
+#
+# `mt5` es un BrokerGateway: la librería MetaTrader5 no promete ser segura
+# entre hilos, así que las llamadas de los hilos del supervisor y del pool de
+# evaluación pasan por él. Lecturas de mercado (velas, ticks, specs) admiten
+# hasta MT5_GATEWAY_READERS a la vez (1 = todo serializado, el defecto); lo
+# demás (órdenes, posiciones, cuenta, conexión) va siempre de una en una y sin
+# lecturas en curso. Constantes y tipos se devuelven tal cual.
+#
+# Cada llamada se mide (markll_broker_call_seconds, incluye la espera del
+# gateway) y las que devuelven None o lanzan cuentan como error.
+import os
+import time
+import logging
+import threading
+
+from dotenv import load_dotenv
+
+from utils.metrics import get_metrics
+
+load_dotenv()
+
+logger = logging.getLogger("broker")
+
+BACKENDS = ("mt5", "sim")
+
+
+def load_backend(name=None):
+    """Devuelve el objeto con la API de MetaTrader5 para el backend pedido."""
+    name = (name or os.getenv("MT5_BACKEND", "mt5")).strip().lower()
+    if name == "mt5":
+        try:
+            import MetaTrader5
+        except ImportError as e:
+            raise ImportError("No se pudo importar MetaTrader5 (solo Windows). "
+                              "Para correr sin terminal usa MT5_BACKEND=sim") from e
+        return MetaTrader5
+    if name == "sim":
+        from utils.sim_terminal import SimTerminal
+        return SimTerminal.from_env()
+    raise ValueError(f"MT5_BACKEND desconocido: {name} (opciones: {', '.join(BACKENDS)})")
+
+
+# Llamadas que pueden ir en paralelo si MT5_GATEWAY_READERS > 1
+READ_CALLS = frozenset((
+    "copy_rates_from", "copy_rates_from_pos", "copy_rates_range",
+    "copy_ticks_from", "copy_ticks_range", "symbol_info", "symbol_info_tick", "symbols_get",
+))
+
+# Llamadas para las que None no es un error
+NONE_OK = frozenset(("shutdown",))
+
+
+class BrokerGateway:
+    """Envuelve el backend y ordena el acceso concurrente (lecturas / exclusivo)."""
+
+    def __init__(self, backend, readers=None):
+        self._backend = backend
+        self.readers = max(1, int(readers or os.getenv("MT5_GATEWAY_READERS", "1")))
+        self._slots = threading.BoundedSemaphore(self.readers)
+        self._exclusive = threading.RLock()
+
+    @property
+    def backend(self):
+        return self._backend
+
+    def use_backend(self, backend):
+        """Cambia el backend en caliente (utils.replay.ReplayRunner). Las llamadas ya cacheadas
+        apuntan al anterior, así que se descartan."""
+        with self._exclusive:
+            self._backend = backend
+            for name, value in list(self.__dict__.items()):
+                if callable(value) and getattr(value, "__name__", None) == name:
+                    del self.__dict__[name]
+
+    def __getattr__(self, name):
+        attr = getattr(self._backend, name)
+        if not callable(attr) or isinstance(attr, type):
+            return attr
+
+        if name in READ_CALLS and self.readers > 1:
+            def guarded(*args, **kwargs):
+                with self._slots:
+                    return attr(*args, **kwargs)
+        else:
+            def guarded(*args, **kwargs):
+                with self._exclusive:
+                    # todos los cupos de lectura: nadie lee mientras se opera
+                    for _ in range(self.readers):
+                        self._slots.acquire()
+                    try:
+                        return attr(*args, **kwargs)
+                    finally:
+                        for _ in range(self.readers):
+                            self._slots.release()
+
+        metrics = get_metrics()
+
+        def call(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                result = guarded(*args, **kwargs)
+            except Exception:
+                metrics.inc("broker_errors_total", call=name, code="exception")
+                raise
+            finally:
+                metrics.observe("broker_call_seconds", time.perf_counter() - t0, call=name)
+            if result is None and name not in NONE_OK:
+                metrics.inc("broker_errors_total", call=name, code="none")
+            return result
+
+        call.__name__ = name
+        self.__dict__[name] = call          # la próxima vez ni pasa por __getattr__
+        return call
+
+
+mt5 = BrokerGateway(load_backend())
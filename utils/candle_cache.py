@@ -0,0 +1,158 @@
+# utils/candle_cache.py
+# Caché de velas por (símbolo, timeframe) en buffers circulares NumPy.
+#
+# Cada columna se guarda DOS veces seguidas (posición p y p + capacidad), así
+# cualquier ventana de las últimas N velas es un slice contiguo → se entregan
+# vistas sin copiar, también como DataFrame (copy=False).
+# Ojo: la vista es válida hasta el siguiente update del mismo símbolo/timeframe
+# (la vela en formación se parchea en el sitio).
+#
+# aggregate() arma velas de un timeframe mayor a partir de las de uno menor
+# (M1 → M5/M15/H1/H4/D1), alineadas a múltiplos del periodo en hora servidor
+# como las del terminal.
+import numpy as np
+import pandas as pd
+
+# Mismas columnas y tipos que mt5.copy_rates_*
+CANDLE_COLUMNS = (
+    ("time", np.int64), ("open", np.float64), ("high", np.float64), ("low", np.float64),
+    ("close", np.float64), ("tick_volume", np.uint64), ("spread", np.int32), ("real_volume", np.uint64),
+)
+CANDLE_DTYPE = np.dtype(list(CANDLE_COLUMNS))
+
+# Códigos MT5 de timeframe → segundos
+TIMEFRAME_SECONDS = {
+    1: 60, 2: 120, 3: 180, 4: 240, 5: 300, 6: 360, 10: 600, 12: 720, 15: 900, 20: 1200, 30: 1800,
+    16385: 3600, 16386: 7200, 16387: 10800, 16388: 14400, 16390: 21600, 16392: 28800,
+    16396: 43200, 16408: 86400,
+}
+
+
+def can_aggregate(base_timeframe, timeframe):
+    """True si las velas de `timeframe` se pueden armar con velas de `base_timeframe`."""
+    base, target = TIMEFRAME_SECONDS.get(base_timeframe), TIMEFRAME_SECONDS.get(timeframe)
+    return bool(base and target and target > base and target % base == 0)
+
+
+def aggregate(arrays, tf_seconds):
+    """{columna: array} de velas base (ordenadas) → array estructurado de velas de
+    `tf_seconds`. La última sale parcial si su periodo no ha terminado."""
+    times = arrays["time"]
+    if not len(times):
+        return np.zeros(0, dtype=CANDLE_DTYPE)
+    buckets = times - times % tf_seconds
+    if buckets[0] == buckets[-1]:                # caso típico: solo la vela en formación
+        starts, ends = np.zeros(1, dtype=np.intp), np.array([len(times) - 1])
+    else:
+        starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+        ends = np.append(starts[1:], len(times)) - 1
+    out = np.zeros(len(starts), dtype=CANDLE_DTYPE)
+    out["time"] = buckets[starts]
+    out["open"] = arrays["open"][starts]
+    out["high"] = np.maximum.reduceat(arrays["high"], starts)
+    out["low"] = np.minimum.reduceat(arrays["low"], starts)
+    out["close"] = arrays["close"][ends]
+    out["tick_volume"] = np.add.reduceat(arrays["tick_volume"], starts)
+    out["spread"] = arrays["spread"][ends]
+    out["real_volume"] = np.add.reduceat(arrays["real_volume"], starts)
+    return out
+
+
+class CandleRing:
+    """Buffer circular de velas con doble escritura (ventanas contiguas sin copia)."""
+
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self.cols = {name: np.zeros(2 * self.capacity, dtype=dt) for name, dt in CANDLE_COLUMNS}
+        self.size = 0
+        self.head = 0          # posición donde entra la próxima vela
+        self.version = 0       # sube con cada escritura (para saber si cambió)
+        self.folded = None     # ring derivado: versión de la base con la que se armó
+
+    @property
+    def last_time(self):
+        if not self.size:
+            return None
+        return int(self.cols["time"][(self.head - 1) % self.capacity])
+
+    @property
+    def first_time(self):
+        if not self.size:
+            return None
+        return int(self.cols["time"][(self.head - self.size) % self.capacity])
+
+    def _write(self, pos, row):
+        self.version += 1
+        for name, _ in CANDLE_COLUMNS:
+            value = row[name]
+            col = self.cols[name]
+            col[pos] = value
+            col[pos + self.capacity] = value
+
+    def append(self, row):
+        self._write(self.head, row)
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def patch_last(self, row):
+        """Reemplaza la última vela (la que está en formación)."""
+        self._write((self.head - 1) % self.capacity, row)
+
+    def extend(self, rates):
+        """Agrega velas ordenadas por tiempo: parchea la última si coincide, añade las nuevas."""
+        if rates is None or not len(rates):
+            return 0
+        last = self.last_time
+        times = rates["time"]
+        added = 0
+        if len(rates) >= self.capacity and (last is None or int(times[0]) > last):
+            rates = rates[-self.capacity:]
+            times = rates["time"]
+        for i in range(len(rates)):
+            t = int(times[i])
+            if last is not None and t < last:
+                continue
+            if last is not None and t == last:
+                self.patch_last(rates[i])
+            else:
+                self.append(rates[i])
+                added += 1
+            last = t
+        return added
+
+    def arrays(self, count):
+        """{columna: vista} de las últimas `count` velas (sin copia)."""
+        count = min(int(count), self.size)
+        end = (self.head - 1) % self.capacity + self.capacity + 1
+        return {name: col[end - count:end] for name, col in self.cols.items()}
+
+    def frame(self, count):
+        """DataFrame (copy=False) de las últimas `count` velas; time como datetime64[s]."""
+        arrays = self.arrays(count)
+        arrays["time"] = arrays["time"].view("datetime64[s]")
+        return pd.DataFrame(arrays, copy=False)
+
+
+class CandleCache:
+    """Rings por (símbolo, timeframe)."""
+
+    def __init__(self, capacity=500):
+        self.capacity = int(capacity)
+        self.rings = {}
+
+    def get(self, symbol, timeframe):
+        return self.rings.get((symbol, timeframe))
+
+    def reset(self, symbol, timeframe, rates, capacity=None):
+        """Crea (o recrea) el ring con un snapshot completo."""
+        ring = CandleRing(max(capacity or 0, self.capacity))
+        ring.extend(rates)
+        self.rings[(symbol, timeframe)] = ring
+        return ring
+
+    def drop(self, symbol=None):
+        if symbol is None:
+            self.rings.clear()
+            return
+        for key in [k for k in self.rings if k[0] == symbol]:
+            del self.rings[key]
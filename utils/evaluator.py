@@ -0,0 +1,61 @@
+# utils/evaluator.py
+# Evaluación de señales en paralelo por símbolo.
+#
+# Cada símbolo se evalúa en un hilo del pool (velas, indicadores, condiciones);
+# lo que va al terminal pasa por el BrokerGateway (utils.broker), que serializa
+# las llamadas. Los resultados vuelven en el MISMO orden que la lista de
+# símbolos, así el límite MAX_POSITIONS y el envío de órdenes (que siguen en
+# el hilo del bot, de uno en uno) se aplican siempre igual.
+#
+# Hilos y no procesos: el trabajo por símbolo es NumPy + espera del broker
+# (ambos sueltan el GIL) y el estado de los indicadores vive en el bot.
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.metrics import get_metrics
+
+logger = logging.getLogger("evaluator")
+
+
+class SymbolEvaluator:
+    """map(fn, símbolos) → [(símbolo, resultado)] en orden; workers<=1 → secuencial."""
+
+    def __init__(self, workers=4, name="eval"):
+        self.workers = max(1, int(workers or 1))
+        self.name = name
+        self.bot = name.rsplit("-eval", 1)[0]      # etiqueta de las métricas ("mark3-eval" → "mark3")
+        self.metrics = get_metrics()
+        self._pool = None
+        self.last_seconds = 0.0      # duración de la última evaluación
+        self.last_count = 0
+
+    def map(self, fn, symbols):
+        symbols = list(symbols)
+        t0 = time.perf_counter()
+        if self.workers == 1 or len(symbols) < 2:
+            results = [(symbol, self._call(fn, symbol)) for symbol in symbols]
+        else:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix=self.name)
+            futures = [self._pool.submit(self._call, fn, symbol) for symbol in symbols]
+            results = [(symbol, future.result()) for symbol, future in zip(symbols, futures)]
+        self.last_seconds = time.perf_counter() - t0
+        self.last_count = len(symbols)
+        return results
+
+    def _call(self, fn, symbol):
+        t0 = time.perf_counter()
+        try:
+            return fn(symbol)
+        except Exception as e:
+            logger.error("Error evaluando %s: %s", symbol, e, exc_info=True)
+            return None
+        finally:
+            self.metrics.stage("evaluate", time.perf_counter() - t0, self.bot)
+            self.metrics.inc("symbol_evaluations_total", bot=self.bot, symbol=symbol)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
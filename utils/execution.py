@@ -0,0 +1,234 @@
+# utils/execution.py
+# Motor de ejecución detrás de send_order / close_position (utils.mt5_connector):
+#
+#   - Filling por símbolo: se sacan los modos permitidos de symbol_info
+#     (filling_mode: FOK=1, IOC=2) y se recuerda el primero que el broker
+#     acepta; las órdenes siguientes van directas con ese modo (antes: IOC,
+#     y si fallaba FOK, en CADA orden). Si el broker lo rechaza
+#     (INVALID_FILL) se olvida y se prueba el siguiente.
+#   - Recotización (REQUOTE / PRICE_CHANGED / PRICE_OFF): se pide un tick
+#     nuevo y se reenvía a ese precio, moviendo SL/TP lo mismo para mantener
+#     las distancias, hasta ORDER_REQUOTE_RETRIES veces.
+#   - Por orden: deslizamiento (precio ejecutado - pedido, en points, + = en
+#     contra) y tiempo de ida y vuelta de order_send → log, fills y métricas.
+#   - magic: el que pase el bot (MAGIC_NUMBER, uno distinto por bot); al
+#     cerrar, el de la posición.
+#   - Cierre: la posición y el precio vienen de la foto del ciclo
+#     (utils.positions) y del feed; lo cerrado se descuenta de la foto.
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+from utils.broker import mt5
+from utils.symbol_catalog import get_catalog
+from utils.metrics import get_metrics
+from utils.positions import get_position_book
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAGIC = 234567            # el fijo de antes, para quien no pase magic (scripts sueltos)
+DEFAULT_DEVIATION = 20            # points
+ORDER_REQUOTE_RETRIES = int(os.getenv("ORDER_REQUOTE_RETRIES", "3"))
+
+TRADE_RETCODE_DONE_PARTIAL = 10010
+
+
+class ExecutionEngine:
+    """order_send con filling aprendido, recotizaciones y medición de cada fill."""
+
+    def __init__(self, deviation=DEFAULT_DEVIATION, requote_retries=ORDER_REQUOTE_RETRIES,
+                 magic=DEFAULT_MAGIC, history=500):
+        self.deviation = deviation
+        self.requote_retries = requote_retries
+        self.magic = magic
+        self.filling = {}                  # símbolo → modo ORDER_FILLING_* que funcionó
+        self.fills = deque(maxlen=history)
+        self.metrics = get_metrics()
+        self._lock = threading.Lock()
+
+    # ---------- API ----------
+    def open(self, symbol, order_type, volume, price, sl, tp, comment="Mark2_AI", magic=None):
+        """Abre a mercado → ticket de la orden o None."""
+        spec = get_catalog().get(symbol)          # select + info una vez por sesión
+        if spec is None:
+            logger.error("No se encontró información del símbolo %s", symbol)
+            return None
+        request = {
+            "action": mt5.TRADE_ACTION_DEAL,
+            "symbol": symbol,
+            "volume": volume,
+            "type": order_type,
+            "price": price,
+            "sl": sl,
+            "tp": tp,
+            "deviation": self.deviation,
+            "magic": int(magic or self.magic),
+            "comment": comment,
+            "type_time": mt5.ORDER_TIME_GTC,
+        }
+        result = self._execute(request, spec)
+        if result is None or result.retcode not in self._done():
+            get_catalog().invalidate(symbol)      # la spec se vuelve a pedir la próxima vez
+            logger.error("ERROR FINAL enviando orden %s: %s - %s", symbol,
+                         getattr(result, "retcode", None), getattr(result, "comment", mt5.last_error()))
+            return None
+        return result.order
+
+    def close(self, ticket, comment="Cierre Mark2", position=None, quote=None):
+        """Cierra una posición por ticket → True/False. Con `position` (de la
+        foto de utils.positions) y `quote` (bid, ask) recién leídos no se vuelve
+        a preguntar al broker antes del order_send."""
+        pos = position
+        if pos is None:
+            positions = mt5.positions_get(ticket=ticket)
+            if not positions:
+                logger.warning("Posición #%s no encontrada", ticket)
+                return False
+            pos = positions[0]
+        if quote is None or not all(quote):
+            tick = mt5.symbol_info_tick(pos.symbol)
+            if not tick:
+                logger.error("No se pudo obtener precio actual para cerrar %s", pos.symbol)
+                return False
+            quote = tick.bid, tick.ask
+        spec = get_catalog().get(pos.symbol)
+        buy = pos.type == mt5.ORDER_TYPE_BUY
+        request = {
+            "action": mt5.TRADE_ACTION_DEAL,
+            "symbol": pos.symbol,
+            "volume": pos.volume,
+            "type": mt5.ORDER_TYPE_SELL if buy else mt5.ORDER_TYPE_BUY,
+            "position": ticket,
+            "price": quote[0] if buy else quote[1],
+            "deviation": self.deviation,
+            "magic": getattr(pos, "magic", 0) or self.magic,
+            "comment": comment,
+            "type_time": mt5.ORDER_TIME_GTC,
+        }
+        result = self._execute(request, spec)
+        if result is not None and result.retcode in self._done():
+            get_position_book().discard(ticket)
+            logger.info("Posición cerrada #%s | Profit: $%.2f", ticket, pos.profit)
+            return True
+        logger.error("Error cerrando #%s: %s - %s", ticket, getattr(result, "retcode", None),
+                     getattr(result, "comment", mt5.last_error()))
+        return False
+
+    def stats(self):
+        """Por símbolo: órdenes, deslizamiento medio (points) y RTT medio (ms)."""
+        out = {}
+        for fill in list(self.fills):
+            s = out.setdefault(fill["symbol"], {"orders": 0, "slippage": 0.0, "rtt_ms": 0.0, "requotes": 0})
+            s["orders"] += 1
+            s["slippage"] += fill["slippage_points"]
+            s["rtt_ms"] += fill["rtt_ms"]
+            s["requotes"] += fill["requotes"]
+        for s in out.values():
+            s["slippage"] = round(s["slippage"] / s["orders"], 2)
+            s["rtt_ms"] = round(s["rtt_ms"] / s["orders"], 2)
+        return out
+
+    def reset(self):
+        with self._lock:
+            self.filling.clear()
+        self.fills.clear()
+
+    # ---------- envío ----------
+    @staticmethod
+    def _done():
+        return (mt5.TRADE_RETCODE_DONE, getattr(mt5, "TRADE_RETCODE_DONE_PARTIAL", TRADE_RETCODE_DONE_PARTIAL))
+
+    def _candidates(self, symbol, spec):
+        """Modos de filling a probar, el aprendido primero."""
+        flags = getattr(spec, "filling_mode", 0) or 0
+        modes = []
+        if flags & mt5.SYMBOL_FILLING_IOC:
+            modes.append(mt5.ORDER_FILLING_IOC)
+        if flags & mt5.SYMBOL_FILLING_FOK:
+            modes.append(mt5.ORDER_FILLING_FOK)
+        if not modes:                      # sin metadatos: el orden de antes + RETURN
+            modes = [mt5.ORDER_FILLING_IOC, mt5.ORDER_FILLING_FOK, mt5.ORDER_FILLING_RETURN]
+        learned = self.filling.get(symbol)
+        if learned is not None:
+            modes = [learned] + [m for m in modes if m != learned]
+        return modes
+
+    def _execute(self, request, spec):
+        symbol = request["symbol"]
+        buy = request["type"] == mt5.ORDER_TYPE_BUY
+        requested = request["price"]
+        point = getattr(spec, "point", None) or 0.0
+        requote_codes = (mt5.TRADE_RETCODE_REQUOTE, mt5.TRADE_RETCODE_PRICE_CHANGED, mt5.TRADE_RETCODE_PRICE_OFF)
+
+        modes = self._candidates(symbol, spec)
+        requotes = 0
+        result = None
+        rtt = 0.0
+        while modes:
+            request["type_filling"] = modes[0]
+            t0 = time.perf_counter()
+            result = mt5.order_send(request)
+            rtt = time.perf_counter() - t0
+            self.metrics.stage("order_rtt", rtt)
+            if result is None:
+                return None
+            code = result.retcode
+            if code in self._done():
+                with self._lock:
+                    self.filling[symbol] = modes[0]
+                self._record(symbol, buy, requested, result, point, rtt, requotes, modes[0],
+                             closing="position" in request)
+                return result
+            self.metrics.inc("broker_errors_total", call="order_send", code=code)
+            if code == mt5.TRADE_RETCODE_INVALID_FILL:
+                logger.warning("Filling %s rechazado en %s, pruebo el siguiente", modes[0], symbol)
+                with self._lock:
+                    if self.filling.get(symbol) == modes[0]:
+                        del self.filling[symbol]
+                modes = modes[1:]
+                continue
+            if code in requote_codes and requotes < self.requote_retries:
+                tick = mt5.symbol_info_tick(symbol)
+                if not tick:
+                    return result
+                requotes += 1
+                self.metrics.inc("order_requotes_total", symbol=symbol)
+                fresh = tick.ask if buy else tick.bid
+                shift = fresh - request["price"]
+                request["price"] = fresh
+                for key in ("sl", "tp"):
+                    if request.get(key):
+                        request[key] += shift      # mismas distancias que pidió el bot
+                logger.warning("Recotización %s en %s (%s): reintento a %.5f", code, symbol, result.comment, fresh)
+                continue
+            return result
+        return result
+
+    def _record(self, symbol, buy, requested, result, point, rtt, requotes, filling, closing):
+        filled = result.price or requested
+        slippage = ((filled - requested) if buy else (requested - filled)) / point if point else 0.0
+        fill = {"symbol": symbol, "side": "BUY" if buy else "SELL", "close": closing,
+                "requested": requested, "filled": filled, "slippage_points": round(slippage, 1),
+                "rtt_ms": round(rtt * 1e3, 2), "requotes": requotes, "filling": filling,
+                "order": result.order, "time": time.time()}
+        self.fills.append(fill)
+        self.metrics.observe("order_slippage_points", slippage, symbol=symbol)
+        if not closing:
+            logger.info("ORDEN ABIERTA OK → %s | %s | Vol: %.2f | Pedido %.5f → Ejecutado %.5f (%+.1f pts) | "
+                        "RTT %.1f ms | Ticket: %s", symbol, fill["side"], result.volume or 0.0, requested,
+                        filled, slippage, rtt * 1e3, result.order)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_execution():
+    """Motor compartido del proceso (el filling aprendido vale para todos los bots)."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = ExecutionEngine()
+        return _engine
@@ -1,44 +1,482 @@
 # utils/feed_selector.py → VERSIÓN FINAL 100% ESTABLE (noviembre 2025)
-import MetaTrader5 as mt5
+from utils.broker import mt5
+import numpy as np
 import pandas as pd
 import time
-from datetime import datetime, timedelta
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from utils.candle_cache import CandleCache, TIMEFRAME_SECONDS, aggregate, can_aggregate
+from utils.symbol_catalog import get_catalog
+from utils.history_warmup import HistoryWarmup, COLD, READY, FAILED
+from utils.recorder import get_recorder, recorded_days, load_recording, MARKET_RECORDER_DIR
+from utils.history_store import get_store
+
+logger = logging.getLogger(__name__)
 
 class Feed:
+    """Velas y precios para los bots.
+
+    Por símbolo se sigue UNA serie base (FEED_BASE_TIMEFRAME, M1 por defecto)
+    y los timeframes mayores se arman en local a partir de ella: al broker solo
+    se le pide la historia de cada timeframe la primera vez; después, solo el
+    delta de la serie base, pida el bot los timeframes que pida."""
+
     def __init__(self, settings):
         self.settings = settings
+        # (símbolo, timeframe) → ring de velas; solo se piden al broker las velas nuevas
+        self.cache = CandleCache(int(settings.get("CANDLE_CACHE_SIZE", 500)))
+        self.base_timeframe = int(settings.get("FEED_BASE_TIMEFRAME", 1))
+        self._no_base = set()      # símbolos sin serie base → cada timeframe directo del broker
+        self._prices = {}          # precios de market_snapshot() mientras dura el bloque
+        self._pass = None          # series ya actualizadas en el bloque de market_snapshot()
+        self.warmup = HistoryWarmup()   # historia que falta → se carga en segundo plano
+        self.recorder = get_recorder()  # MARKET_RECORDER=1 → ticks y velas a disco (utils.recorder)
+        # histórico local: la historia sale del disco y al broker solo se le pide el delta
+        self.store = get_store() if settings.get("HISTORY_STORE", True) else None
+        self._sync_thread = None
+        self._sync_pairs = set()
+        self._sync_stop = threading.Event()   # stop() del bot dueño del feed o del supervisor
 
     def get_current_price(self, symbol):
+        cached = self._prices.get(symbol)
+        if cached:
+            return cached
         tick = mt5.symbol_info_tick(symbol)
         if tick is None:
             return None, None
+        if self.recorder is not None:
+            self.recorder.tick(symbol, tick.bid, tick.ask, tick.time_msc)
         return tick.bid, tick.ask
 
+    def prefetch_prices(self, symbols):
+        """{símbolo: (bid, ask)} de varios símbolos en UNA llamada al broker
+        (symbols_get con group) en lugar de un symbol_info_tick por símbolo."""
+        wanted = set(symbols)
+        infos = mt5.symbols_get(group=",".join(wanted)) or ()
+        prices = {i.name: (i.bid, i.ask) for i in infos if i.name in wanted and i.bid and i.ask}
+        if self.recorder is not None:
+            for info in infos:
+                if info.name in prices:
+                    self.recorder.tick(info.name, info.bid, info.ask, info.time * 1000 if info.time else None)
+        return prices
+
+    @contextmanager
+    def market_snapshot(self, symbols):
+        """Una pasada de evaluación ve el mercado en un instante: durante el bloque
+        get_current_price sirve los precios de una sola llamada y cada serie de
+        velas se actualiza como mucho una vez."""
+        symbols = list(symbols)
+        self._prices = self.prefetch_prices(symbols) if len(symbols) > 1 else {}
+        self._pass = set()
+        try:
+            yield self._prices
+        finally:
+            self._prices = {}
+            self._pass = None
+
     def is_market_open(self, symbol):
         """Ya NO usa copy_rates_from_pos → nunca más falla"""
-        info = mt5.symbol_info(symbol)
-        if info is None:
-            return False
-        # Solo miramos si el símbolo está habilitado para trading
-        return info.visible and info.trade_mode != mt5.SYMBOL_TRADE_MODE_DISABLED
+        # Solo miramos si el símbolo está habilitado para trading (catálogo, sin ir al broker)
+        return get_catalog().is_tradeable(symbol)
+
+    # ---------- reloj (el de pared; ReplayFeed usa el del día reproducido) ----------
+    def clock(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    # ---------- disponibilidad (warm-up en segundo plano) ----------
+    def available(self, symbol):
+        """¿Se puede evaluar sin esperar historia? False mientras carga o si falló."""
+        return self.warmup.state(symbol, self._base_for(symbol)) in (COLD, READY)
+
+    def readiness(self):
+        """{símbolo: cold|loading|ready|failed} de los símbolos ya pedidos."""
+        return {symbol: self.warmup.state(symbol, self._base_for(symbol)) for symbol in self.warmup.symbols()}
 
     def get_candles(self, symbol, timeframe, count=500):
-        """Blindada contra el error de .sml"""
-        for intento in range(10):
-            rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, count)
-            if rates is not None and len(rates) > 0:
-                df = pd.DataFrame(rates)
-                df['time'] = pd.to_datetime(df['time'], unit='s')
-                return df
-
-            print(f"   [Feed] Cargando velas {symbol}... intento {intento + 1}/10")
-            to_time = datetime.now()
-            from_time = to_time - timedelta(days=10)
-            mt5.copy_rates_range(symbol, timeframe, from_time, to_time)
-            time.sleep(2.5)
-
-        print(f"ERROR: No se cargaron velas de {symbol} tras 10 intentos")
+        """Últimas `count` velas como DataFrame (vistas del caché, sin copia).
+        Válido hasta la siguiente llamada con el mismo símbolo/timeframe."""
+        ring = self._update(symbol, timeframe, count)
+        if ring is None:
+            return None
+        return ring.frame(count)
+
+    def get_rates(self, symbol, timeframe, count=500):
+        """Igual que get_candles pero {columna: array NumPy} (sin pandas)."""
+        ring = self._update(symbol, timeframe, count)
+        if ring is None:
+            return None
+        return ring.arrays(count)
+
+    def _base_for(self, symbol):
+        """Timeframe de la serie base del símbolo (None → no se deriva)."""
+        return None if symbol in self._no_base else self.base_timeframe
+
+    def _update(self, symbol, timeframe, count):
+        base_tf = self._base_for(symbol)
+        if base_tf is None or not can_aggregate(base_tf, timeframe):
+            return self._refresh(symbol, timeframe, count)
+
+        # la serie base tiene que cubrir entera la vela en formación del timeframe pedido
+        tf_seconds = TIMEFRAME_SECONDS[timeframe]
+        base = self._refresh(symbol, base_tf, tf_seconds // TIMEFRAME_SECONDS[base_tf] + 1)
+        if base is None:
+            if not self._base_missing(symbol, base_tf):
+                return None                     # la base se está cargando en segundo plano
+            self.warmup.forget(symbol, base_tf)
+            self._no_base.add(symbol)
+            logger.warning("%s sin velas base, pido cada timeframe al broker", symbol)
+            return self._refresh(symbol, timeframe, count)
+
+        ring = self.cache.get(symbol, timeframe)
+        # la base ya no cubre la última vela armada en local (p. ej. sin llamadas
+        # durante más velas base que la capacidad del ring) → quedaría a medias
+        stale = ring is not None and ring.folded is not None and base.first_time > ring.last_time
+        if ring is None or count > ring.capacity or stale:
+            ring = self._load_full(symbol, timeframe, count)   # historia: una vez (o tras un hueco)
+            if ring is None:
+                return None
+        self._fold(ring, base, tf_seconds)
+        return ring
+
+    def _fold(self, ring, base, tf_seconds):
+        """Rehace la vela en formación y agrega las nuevas con las velas base."""
+        if ring.folded == (id(base), base.version):
+            return                              # la base no cambió desde la última vez
+        ring.folded = (id(base), base.version)
+        last = ring.last_time
+        arrays = base.arrays(base.size)
+        start = int(np.searchsorted(arrays["time"], last, side="left"))
+        rows = aggregate({name: col[start:] for name, col in arrays.items()}, tf_seconds)
+        if base.first_time > last:
+            rows = rows[rows["time"] > last]   # la base no cubre esa vela entera: queda la del broker
+        ring.extend(rows)
+
+    def _refresh(self, symbol, timeframe, count):
+        """Ring de (símbolo, timeframe) al día pidiendo al broker solo el delta."""
+        ring = self.cache.get(symbol, timeframe)
+        if ring is None or count > ring.capacity:
+            ring = self._load_full(symbol, timeframe, count)
+            self._mark_fresh(symbol, timeframe, ring)
+            return ring
+        if self._pass is not None and (symbol, timeframe) in self._pass:
+            return ring
+
+        # Delta: solo velas desde la última guardada (incluida, para parchear la vela en formación)
+        from_time = datetime.fromtimestamp(ring.last_time, timezone.utc)
+        to_time = datetime.now(timezone.utc) + timedelta(days=2)   # hora servidor va adelantada a UTC
+        rates = mt5.copy_rates_range(symbol, timeframe, from_time, to_time)
+        if rates is None or len(rates) == 0:
+            ring = self._load_full(symbol, timeframe, count)
+        else:
+            ring.extend(rates)
+            if self.recorder is not None:
+                self.recorder.bars(symbol, timeframe, rates)
+        self._mark_fresh(symbol, timeframe, ring)
+        return ring
+
+    def _mark_fresh(self, symbol, timeframe, ring):
+        if self._pass is not None and ring is not None:
+            self._pass.add((symbol, timeframe))
+
+    def _base_missing(self, symbol, base_tf):
+        """La serie base no existe (el warm-up se rindió) → timeframes directos."""
+        return self.warmup.state_of(symbol, base_tf) == FAILED
+
+    def _load_full(self, symbol, timeframe, count):
+        """Un solo intento sin esperas; si el terminal aún no tiene velas (.sml
+        recién seleccionados) la descarga sigue en segundo plano (HistoryWarmup)
+        y mientras tanto se devuelve None."""
+        capacity = max(count, self.cache.capacity)
+        rates = self.warmup.take(symbol, timeframe)       # lo que dejó el warm-up
+        if rates is None and self.store is not None:
+            rates = self._from_store(symbol, timeframe, capacity)
+        if rates is None:
+            rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, capacity)
+        if rates is not None and len(rates) > 0:
+            self.warmup.mark_ready(symbol, timeframe)
+            if self.recorder is not None:
+                self.recorder.bars(symbol, timeframe, rates)
+            return self.cache.reset(symbol, timeframe, rates, capacity)
+        self.warmup.request(symbol, timeframe, capacity)
         return None
 
+    # ---------- histórico local (utils.history_store) ----------
+    def _from_store(self, symbol, timeframe, capacity):
+        """Últimas velas del disco + delta del broker desde la última guardada,
+        o None si no hay histórico (o está tan viejo que no sirve)."""
+        try:
+            last = self.store.last_time(symbol, timeframe)
+        except (OSError, ValueError) as e:
+            logger.warning("Histórico de %s ilegible: %s", symbol, e)
+            return None
+        if last is None or time.time() - last > capacity * TIMEFRAME_SECONDS.get(timeframe, 60):
+            return None
+        to_time = datetime.now(timezone.utc) + timedelta(days=2)   # hora servidor va adelantada a UTC
+        delta = mt5.copy_rates_range(symbol, timeframe, datetime.fromtimestamp(last, timezone.utc), to_time)
+        if delta is None or len(delta) == 0:
+            return None
+        if len(delta) >= capacity:
+            return delta
+        disk = self.store.tail(symbol, timeframe, capacity - len(delta) + 1)
+        disk = disk[disk["time"] < delta["time"][0]]
+        return np.concatenate([disk, np.asarray(delta).astype(disk.dtype)])
+
+    def sync_history(self, symbols, timeframes, minutes=None):
+        """Mantiene al día (incremental) el histórico de esos símbolos/timeframes
+        y de la serie base, en un hilo, cada `minutes` (HISTORY_SYNC_MINUTES)."""
+        minutes = float(self.settings.get("HISTORY_SYNC_MINUTES", 60) if minutes is None else minutes)
+        if self.store is None or minutes <= 0:
+            return
+        timeframes = list(dict.fromkeys(list(timeframes) + [self.base_timeframe]))
+        self._sync_pairs.update((s, tf) for s in symbols for tf in timeframes)   # varios bots, un hilo
+        if self._sync_thread is not None and self._sync_thread.is_alive():
+            return
+        stop = self._sync_stop
+        stop.clear()
+
+        def loop():
+            while not stop.is_set():
+                for symbol, tf in sorted(self._sync_pairs):
+                    if stop.is_set():
+                        return
+                    try:
+                        self.store.sync(symbol, tf)
+                    except Exception as e:            # el histórico nunca tumba al bot
+                        logger.warning("Sync de histórico %s (tf %s): %s", symbol, tf, e)
+                stop.wait(minutes * 60)
+
+        self._sync_thread = threading.Thread(target=loop, name="history-sync", daemon=True)
+        self._sync_thread.start()
+
+    def stop(self, timeout=5.0):
+        """Detiene el sync del histórico (espera como mucho `timeout` s a que
+        termine la serie en curso)."""
+        self._sync_stop.set()
+        if self._sync_thread is not None:
+            self._sync_thread.join(timeout)
+
+
+class SharedFeed(Feed):
+    """Feed para varios bots en el mismo proceso (supervisor).
+
+    Un solo caché de velas/ticks: si dos bots piden el mismo símbolo (aunque sea
+    en timeframes distintos, salen de la misma serie base) dentro de
+    `refresh_seconds`, o el mismo tick dentro de `tick_ttl`, solo el primero
+    va al broker. Entrega copias, porque otro hilo puede actualizar
+    el ring mientras el bot las usa."""
+
+    def __init__(self, settings=None, refresh_seconds=1.0, tick_ttl=0.5):
+        super().__init__(settings or {})
+        self.refresh_seconds = refresh_seconds
+        self.tick_ttl = tick_ttl
+        self.updated_at = {}          # (símbolo, timeframe) → monotonic del último update
+        self.ticks = {}               # símbolo → (bid, ask, monotonic)
+        self.broker_calls = 0
+        self.hits = 0
+        self._lock = threading.RLock()
+
+    def get_current_price(self, symbol):
+        now = time.monotonic()
+        with self._lock:
+            cached = self.ticks.get(symbol)
+            if cached and now - cached[2] < self.tick_ttl:
+                self.hits += 1
+                return cached[0], cached[1]
+            self.broker_calls += 1
+            bid, ask = super().get_current_price(symbol)
+            if bid is not None:
+                self.ticks[symbol] = (bid, ask, now)
+            return bid, ask
+
+    @contextmanager
+    def market_snapshot(self, symbols):
+        """Compartido entre bots: los precios entran al caché de ticks (con su TTL)."""
+        symbols = [s for s in symbols if s not in self.ticks or
+                   time.monotonic() - self.ticks[s][2] >= self.tick_ttl]
+        if len(symbols) > 1:
+            with self._lock:
+                self.broker_calls += 1
+                now = time.monotonic()
+                for symbol, (bid, ask) in self.prefetch_prices(symbols).items():
+                    self.ticks[symbol] = (bid, ask, now)
+        yield {}
+
+    def get_candles(self, symbol, timeframe, count=500):
+        with self._lock:
+            ring = self._update(symbol, timeframe, count)
+            if ring is None:
+                return None
+            return ring.frame(count).copy()
+
+    def get_rates(self, symbol, timeframe, count=500):
+        with self._lock:
+            ring = self._update(symbol, timeframe, count)
+            if ring is None:
+                return None
+            return {name: col.copy() for name, col in ring.arrays(count).items()}
+
+    def _refresh(self, symbol, timeframe, count):
+        key = (symbol, timeframe)
+        ring = self.cache.get(symbol, timeframe)
+        now = time.monotonic()
+        if ring is not None and count <= ring.capacity and now - self.updated_at.get(key, 0) < self.refresh_seconds:
+            self.hits += 1
+            return ring
+        self.broker_calls += 1
+        ring = super()._refresh(symbol, timeframe, count)
+        if ring is not None:
+            self.updated_at[key] = time.monotonic()
+        return ring
+
+    def stats(self):
+        return {"broker_calls": self.broker_calls, "hits": self.hits,
+                "series": len(self.cache.rings), "symbols": len(self.ticks)}
+
+
+class ReplayFeed(Feed):
+    """Reproduce un día grabado por utils.recorder, sin broker (BROKER=replay).
+
+    Velas y ticks grabados (más la historia previa del histórico local para los
+    indicadores) se cargan en un SimTerminal. Construir el feed no toca nada del
+    proceso: es utils.replay.ReplayRunner el que instala ese terminal como
+    backend de `mt5` (velas, precios, órdenes, posiciones y cuenta salen de ahí
+    y nada llega al broker) y el reloj del replay en el bot, y lo deja todo como
+    estaba al salir. El bot corre igual que en vivo (planificador, cooldowns,
+    logs) con el reloj del día grabado:
+
+      REPLAY_SPEED = 1    tiempo real
+      REPLAY_SPEED = N    N veces más rápido
+      REPLAY_SPEED = 0    lo más rápido posible: cada espera del planificador
+                          adelanta el reloj simulado en lugar de dormir
+
+    Un bot por proceso (py main.py <bot> o py -m utils.replay <bot>); el
+    supervisor usa su SharedFeed."""
+
+    def __init__(self, settings, terminal=None):
+        super().__init__(settings)
+        history, self.store = self.store, None   # la historia ya va dentro del terminal
+        self.recorder = None                     # no se vuelve a grabar lo que se reproduce
+        speed = float(settings.get("REPLAY_SPEED", 1))
+        self.terminal = terminal or self._load(settings, history, speed if speed > 0 else None)
+        self.end_msc = max(int(s.ev_time[-1]) for s in self.terminal.series.values() if len(s.ev_time))
+        self.finished = False
+        print(f"   [Feed] Replay desde {datetime.fromtimestamp(self.terminal.now(), timezone.utc):%Y-%m-%d %H:%M} UTC, "
+              f"{len(self.terminal.series)} símbolos, velocidad {'máxima' if self.terminal.speed is None else f'x{speed:g}'}")
+
+    def _load(self, settings, history, speed):
+        """SimTerminal con lo grabado de REPLAY_DATE (REPLAY_DAYS días) + historia."""
+        from utils.sim_terminal import SimTerminal
+        days = recorded_days()
+        if not days:
+            raise ValueError(f"No hay grabaciones en {MARKET_RECORDER_DIR} (grabar con MARKET_RECORDER=1)")
+        first = datetime.strptime(str(settings.get("REPLAY_DATE") or days[-1]).replace("-", ""), "%Y%m%d")
+        first = first.replace(tzinfo=timezone.utc)
+        wanted = [(first + timedelta(days=i)).strftime("%Y%m%d") for i in range(int(settings.get("REPLAY_DAYS", 1)))]
+        day_start = int(first.timestamp())
+        history_seconds = int(float(settings.get("REPLAY_HISTORY_DAYS", 30)) * 86400)
+
+        data, ticks, starts = {}, {}, []
+        for symbol in settings.get("PAIRS", []):
+            recording = load_recording(symbol, wanted)
+            if recording is None:
+                print(f"   [Feed] {symbol} sin grabación del {wanted[0]}: no se reproduce")
+                continue
+            rates, timeframe, quotes = recording
+            starts.append(int(quotes["time_msc"][0]) // 1000 if len(quotes) else int(rates["time"][0]))
+            # historia anterior: días grabados antes y, si hay, el histórico local
+            before = [d for d in days if d < wanted[0]]
+            older = load_recording(symbol, before[max(0, len(before) - int(history_seconds // 86400)):],
+                                   timeframe=timeframe) if history_seconds >= 86400 else None
+            parts = [older[0]] if older is not None else []
+            if history is not None:
+                cols = history.read(symbol, timeframe, day_start - history_seconds, int(rates["time"][0]))
+                stored = np.zeros(len(cols["time"]), dtype=rates.dtype)
+                for name in rates.dtype.names:
+                    stored[name] = cols[name]
+                parts.append(stored)
+            if parts:
+                earlier = np.concatenate(parts)
+                earlier = earlier[earlier["time"] < rates["time"][0]]
+                _, first_seen = np.unique(earlier["time"], return_index=True)
+                earlier = earlier[first_seen]
+                rates = np.concatenate([earlier, rates])
+            data[symbol] = (rates, timeframe)
+            ticks[symbol] = self._fill_ticks(symbol, rates, timeframe, quotes, starts[-1])
+        if not data:
+            raise ValueError(f"Ningún par de PAIRS tiene grabación del {wanted[0]}")
+        start = max(day_start, min(starts))
+        return SimTerminal(data, balance=float(settings.get("REPLAY_BALANCE", 10000)), ticks=ticks,
+                           speed=speed, start=start)
+
+    @staticmethod
+    def _fill_ticks(symbol, rates, timeframe, quotes, since):
+        """Ticks grabados + 4 sintéticos (O, L/H, H/L, C, como el SimTerminal) por
+        cada vela desde `since` sin ninguno: el grabador solo guarda los precios
+        que pidió el bot, y entre ellos el replay igual tiene que moverse."""
+        from utils.sim_terminal import SYNTH_TICK_OFFSETS, default_symbol_spec
+        bars = rates[rates["time"] >= since // TIMEFRAME_SECONDS[timeframe] * TIMEFRAME_SECONDS[timeframe]]
+        covered = np.isin(bars["time"], quotes["time_msc"] // 1000 // TIMEFRAME_SECONDS[timeframe]
+                          * TIMEFRAME_SECONDS[timeframe])
+        bars = bars[~covered]
+        bull = bars["close"] >= bars["open"]
+        prices = np.stack([bars["open"], np.where(bull, bars["low"], bars["high"]),
+                           np.where(bull, bars["high"], bars["low"]), bars["close"]], axis=1)
+        offsets = (np.array(SYNTH_TICK_OFFSETS) * TIMEFRAME_SECONDS[timeframe] * 1000).astype(np.int64)
+        spec = default_symbol_spec(symbol)
+        spread = np.where(bars["spread"] > 0, bars["spread"], spec["spread_points"]) * spec["point"]
+        synth = np.zeros(prices.size, dtype=quotes.dtype)
+        synth["time_msc"] = ((bars["time"].astype(np.int64) * 1000)[:, None] + offsets[None, :]).ravel()
+        synth["bid"] = prices.ravel()
+        synth["ask"] = (prices + spread[:, None]).ravel()
+        return np.sort(np.concatenate([quotes, synth]), order="time_msc")
+
+    # ---------- reloj del replay ----------
+    def clock(self):
+        self.terminal._sync()
+        if self.terminal.now_msc >= self.end_msc:
+            self._finish()
+        return self.terminal.now_msc / 1000.0
+
+    def sleep(self, seconds):
+        if self.terminal.speed is not None:
+            time.sleep(seconds / self.terminal.speed)
+        elif not self.finished:
+            self.terminal.advance_to(min(self.terminal.now_msc + int(seconds * 1000), self.end_msc))
+        else:
+            time.sleep(seconds)                  # día terminado: no quemar CPU
+
+    def _finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        t = self.terminal
+        print(f"   [Feed] Replay terminado: {len(t.deals)} deals, balance {t.balance:.2f} "
+              f"(inicial {t.initial_balance:.2f}), {len(t.positions)} posiciones abiertas. Ctrl+C para salir")
+
+
+def feed_source(settings):
+    """"replay" si los settings piden reproducir un día grabado (feed_source o
+    BROKER), "mt5" para todo lo demás."""
+    for key in ("feed_source", "BROKER"):
+        if str(settings.get(key) or "").lower() == "replay":
+            return "replay"
+    return "mt5"
+
+
 def get_feed(settings):
-    return Feed(settings)
\ No newline at end of file
+    """Feed en vivo según feed_source (o BROKER); un valor desconocido cae al
+    feed de MT5 con un aviso, como antes de existir el replay."""
+    source = str(settings.get("feed_source") or settings.get("BROKER") or "mt5").lower()
+    if feed_source(settings) == "replay":
+        # el ReplayFeed lo arma utils.replay.ReplayRunner, que es quien cambia el backend
+        raise RuntimeError("feed_source/BROKER=replay: lanzar el bot con py main.py <bot> "
+                           "o py -m utils.replay <bot>")
+    if source != "mt5":
+        logger.warning("feed_source %r desconocido: uso el feed en vivo de MT5", source)
+    return Feed(settings)
@@ -0,0 +1,411 @@
+# utils/history_store.py
+# Histórico local de velas, particionado y columnar:
+#
+#   <HISTORY_STORE_DIR>/<SIMBOLO>/<TF>/<AAAA-MM>/<columna>.npy
+#
+# Una partición por mes con un .npy por columna (time, open, high, low, close,
+# tick_volume, spread, real_volume, mismos tipos que copy_rates). Solo velas
+# cerradas. Las lecturas usan mmap: un rango dentro de un mes es una vista
+# sin copia; varios meses, una concatenación.
+#
+#   - sync: incremental desde la última vela guardada (copy_rates_range); la
+#     primera vez trae HISTORY_INITIAL_BARS con copy_rates_from_pos.
+#   - gaps / backfill: huecos entre velas guardadas (sin contar fines de
+#     semana) que se vuelven a pedir al broker; los que el broker tampoco
+#     tiene (feriados, símbolo cerrado) quedan anotados en meta.json y no se
+#     vuelven a pedir.
+#   - Feed: al arrancar arma el caché de velas con las últimas del disco + el
+#     delta del broker, en lugar de pedir toda la historia.
+#
+#   py -3.11 -m utils.history_store sync EURUSD.sml GBPUSD --tf M1 M15 H1
+#   py -3.11 -m utils.history_store gaps EURUSD.sml --tf M15 [--backfill]
+#   py -3.11 -m utils.history_store query EURUSD.sml --tf H1 --from 2025-01-01 --to 2025-03-01 [--csv out.csv]
+#   py -3.11 -m utils.history_store info
+#
+#   HISTORY_STORE_DIR=bots/data/history
+#   HISTORY_INITIAL_BARS=100000
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from utils.broker import mt5
+from utils.candle_cache import CANDLE_COLUMNS, CANDLE_DTYPE, TIMEFRAME_SECONDS
+
+logger = logging.getLogger("history_store")
+
+HISTORY_STORE_DIR = os.getenv("HISTORY_STORE_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bots", "data", "history")
+HISTORY_INITIAL_BARS = int(os.getenv("HISTORY_INITIAL_BARS", "100000"))
+GAP_MIN_SECONDS = 3600          # huecos menores son normales (minutos sin ticks)
+
+# Códigos MT5 ↔ nombres de carpeta
+TIMEFRAME_NAMES = {1: "M1", 5: "M5", 15: "M15", 30: "M30", 16385: "H1", 16388: "H4", 16408: "D1"}
+TIMEFRAME_CODES = {name: code for code, name in TIMEFRAME_NAMES.items()}
+
+
+def timeframe_code(value):
+    """'M15' / '15' / 15 → código MT5."""
+    if isinstance(value, str):
+        value = value.strip().upper()
+        if value in TIMEFRAME_CODES:
+            return TIMEFRAME_CODES[value]
+        value = int(value)
+    if value not in TIMEFRAME_SECONDS:
+        raise ValueError(f"Timeframe desconocido: {value}")
+    return value
+
+
+class HistoryStore:
+    """Velas cerradas por símbolo/timeframe/mes en .npy por columna."""
+
+    def __init__(self, root=HISTORY_STORE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._last = {}          # (símbolo, tf) → time de la última vela guardada
+
+    # ---------- rutas ----------
+    def _series_dir(self, symbol, timeframe):
+        return os.path.join(self.root, symbol, TIMEFRAME_NAMES.get(timeframe, str(timeframe)))
+
+    def partitions(self, symbol, timeframe):
+        """Meses guardados ('AAAA-MM'), ordenados."""
+        path = self._series_dir(symbol, timeframe)
+        if not os.path.isdir(path):
+            return []
+        return sorted(name for name in os.listdir(path) if len(name) == 7 and name[4] == "-")
+
+    def series(self):
+        """[(símbolo, tf)] con algo guardado."""
+        out = []
+        if not os.path.isdir(self.root):
+            return out
+        for symbol in sorted(os.listdir(self.root)):
+            for tf_name in sorted(os.listdir(os.path.join(self.root, symbol))):
+                tf = TIMEFRAME_CODES.get(tf_name) or (int(tf_name) if tf_name.isdigit() else None)
+                if tf and self.partitions(symbol, tf):
+                    out.append((symbol, tf))
+        return out
+
+    # ---------- lectura ----------
+    def _load_partition(self, symbol, timeframe, month, mmap=True):
+        path = os.path.join(self._series_dir(symbol, timeframe), month)
+        mode = "r" if mmap else None
+        cols = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name, _ in CANDLE_COLUMNS}
+        n = min(len(col) for col in cols.values())      # por si una escritura quedó a medias
+        return {name: col[:n] for name, col in cols.items()}
+
+    def read(self, symbol, timeframe, start=None, end=None):
+        """{columna: array} de las velas con start <= time < end (epoch s o datetime).
+        Dentro de un solo mes son vistas del mmap, sin copia."""
+        start, end = _epoch(start), _epoch(end)
+        months = self.partitions(symbol, timeframe)
+        if start is not None:
+            months = [m for m in months if m >= _month(start)]
+        if end is not None:
+            months = [m for m in months if m <= _month(end - 1)]
+        parts = []
+        for month in months:
+            cols = self._load_partition(symbol, timeframe, month)
+            times = cols["time"]
+            lo = 0 if start is None else int(np.searchsorted(times, start, side="left"))
+            hi = len(times) if end is None else int(np.searchsorted(times, end, side="left"))
+            if hi > lo:
+                parts.append({name: col[lo:hi] for name, col in cols.items()})
+        if not parts:
+            return {name: np.zeros(0, dtype=dt) for name, dt in CANDLE_COLUMNS}
+        if len(parts) == 1:
+            return parts[0]
+        return {name: np.concatenate([p[name] for p in parts]) for name, _ in CANDLE_COLUMNS}
+
+    def tail(self, symbol, timeframe, count):
+        """Últimas `count` velas como array estructurado (como copy_rates), o None."""
+        months = self.partitions(symbol, timeframe)
+        parts, have = [], 0
+        for month in reversed(months):
+            cols = self._load_partition(symbol, timeframe, month)
+            parts.append(cols)
+            have += len(cols["time"])
+            if have >= count:
+                break
+        if not have:
+            return None
+        out = np.zeros(min(have, count), dtype=CANDLE_DTYPE)
+        pos = len(out)
+        for cols in parts:                       # del mes más nuevo al más viejo
+            take = min(pos, len(cols["time"]))
+            for name, _ in CANDLE_COLUMNS:
+                out[name][pos - take:pos] = cols[name][len(cols["time"]) - take:]
+            pos -= take
+            if not pos:
+                break
+        return out
+
+    def last_time(self, symbol, timeframe):
+        key = (symbol, timeframe)
+        if key not in self._last:
+            months = self.partitions(symbol, timeframe)
+            times = self._load_partition(symbol, timeframe, months[-1])["time"] if months else ()
+            self._last[key] = int(times[-1]) if len(times) else None
+        return self._last[key]
+
+    # ---------- escritura ----------
+    def write(self, symbol, timeframe, rates):
+        """Mezcla velas (array estructurado, ordenadas) en sus meses: las de time
+        repetido reemplazan a las guardadas. Devuelve cuántas había nuevas."""
+        if rates is None or not len(rates):
+            return 0
+        rates = np.asarray(rates)
+        if rates.dtype != CANDLE_DTYPE:
+            rates = rates.astype(CANDLE_DTYPE)
+        added = 0
+        with self._lock:
+            months = np.array([_month(t) for t in rates["time"][[0, -1]]])
+            if months[0] == months[1]:
+                groups = [(months[0], rates)]
+            else:
+                labels = np.array([_month(t) for t in rates["time"]])
+                groups = [(m, rates[labels == m]) for m in dict.fromkeys(labels)]
+            for month, chunk in groups:
+                added += self._merge(symbol, timeframe, month, chunk)
+            self._last.pop((symbol, timeframe), None)
+        return added
+
+    def _merge(self, symbol, timeframe, month, chunk):
+        path = os.path.join(self._series_dir(symbol, timeframe), month)
+        if os.path.isdir(path):
+            # sin mmap: en Windows un archivo mapeado no se puede reemplazar
+            old = self._load_partition(symbol, timeframe, month, mmap=False)
+            old_times = old["time"]
+            keep = ~np.isin(old_times, chunk["time"])
+            merged = np.zeros(int(keep.sum()) + len(chunk), dtype=CANDLE_DTYPE)
+            for name, _ in CANDLE_COLUMNS:
+                merged[name] = np.concatenate([old[name][keep], chunk[name]])
+            merged = merged[np.argsort(merged["time"], kind="stable")]
+            added = len(merged) - len(old_times)
+            if not added and not self._changed(old, chunk):
+                return 0                        # nada nuevo ni corregido: no se reescribe
+        else:
+            merged, added = chunk, len(chunk)
+        tmp = path + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name, _ in CANDLE_COLUMNS:
+            np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(merged[name]))
+        # cambio de partición casi atómico: quien lea ve la vieja o la nueva entera
+        old_dir = path + ".old"
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if os.path.isdir(path):
+            os.replace(path, old_dir)
+        os.replace(tmp, path)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        return added
+
+    @staticmethod
+    def _changed(old, chunk):
+        """¿Alguna vela de `chunk` ya guardada en `old` viene distinta (corregida por el broker)?"""
+        old_times = old["time"]
+        if not len(old_times):
+            return False
+        pos = np.minimum(np.searchsorted(old_times, chunk["time"]), len(old_times) - 1)
+        same = old_times[pos] == chunk["time"]
+        return any(not np.array_equal(old[name][pos[same]], chunk[name][same]) for name, _ in CANDLE_COLUMNS)
+
+    # ---------- sincronización con el broker ----------
+    def sync(self, symbol, timeframe, initial_bars=HISTORY_INITIAL_BARS):
+        """Trae del broker lo que falta desde la última vela guardada → velas nuevas."""
+        last = self.last_time(symbol, timeframe)
+        if last is None:
+            rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, int(initial_bars))
+        else:
+            to_time = datetime.now(timezone.utc) + timedelta(days=2)   # hora servidor va adelantada a UTC
+            rates = mt5.copy_rates_range(symbol, timeframe, datetime.fromtimestamp(last, timezone.utc), to_time)
+        if rates is None or len(rates) < 2:
+            return 0
+        added = self.write(symbol, timeframe, rates[:-1])             # la última sigue formándose
+        if added:
+            logger.info("%s %s: +%d velas (hasta %s)", symbol, TIMEFRAME_NAMES.get(timeframe, timeframe),
+                        added, _fmt(int(rates["time"][-2])))
+        return added
+
+    def gaps(self, symbol, timeframe, min_seconds=None):
+        """[(desde, hasta)] huecos entre velas guardadas que no son fin de semana
+        ni están ya anotados como vacíos en el broker."""
+        tf = TIMEFRAME_SECONDS[timeframe]
+        min_seconds = max(2 * tf, GAP_MIN_SECONDS) if min_seconds is None else min_seconds
+        times = self.read(symbol, timeframe)["time"]
+        if len(times) < 2:
+            return []
+        diffs = np.diff(times)
+        idx = np.flatnonzero(diffs > min_seconds)
+        known = {tuple(h) for h in self._meta(symbol, timeframe).get("holes", [])}
+        out = []
+        for i in idx:
+            start, end = int(times[i]) + tf, int(times[i + 1])
+            if (start, end) in known or _weekday_seconds(start, end) <= min_seconds:
+                continue
+            out.append((start, end))
+        return out
+
+    def backfill(self, symbol, timeframe):
+        """Pide al broker cada hueco → (velas recuperadas, huecos que siguen)."""
+        filled, holes = 0, []
+        for start, end in self.gaps(symbol, timeframe):
+            rates = mt5.copy_rates_range(symbol, timeframe, datetime.fromtimestamp(start, timezone.utc),
+                                         datetime.fromtimestamp(end - 1, timezone.utc))
+            added = self.write(symbol, timeframe, rates) if rates is not None and len(rates) else 0
+            filled += added
+            if not added:
+                holes.append([start, end])
+        if holes:
+            meta = self._meta(symbol, timeframe)
+            meta["holes"] = sorted({tuple(h) for h in meta.get("holes", [])} | {tuple(h) for h in holes})
+            self._save_meta(symbol, timeframe, meta)
+        return filled, len(holes)
+
+    def _meta(self, symbol, timeframe):
+        path = os.path.join(self._series_dir(symbol, timeframe), "meta.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_meta(self, symbol, timeframe, meta):
+        path = os.path.join(self._series_dir(symbol, timeframe), "meta.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(path + ".tmp", path)
+
+
+def _epoch(value):
+    if value is None or isinstance(value, (int, np.integer)):
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def _month(seconds):
+    return datetime.fromtimestamp(int(seconds), timezone.utc).strftime("%Y-%m")
+
+
+def _fmt(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime("%Y-%m-%d %H:%M")
+
+
+def _weekday_seconds(start, end):
+    """Segundos de [start, end) que caen de lunes a viernes (hora servidor):
+    lo que cae en sábado/domingo es mercado cerrado, no un hueco."""
+    total = 0
+    day = start - start % 86400
+    while day < end:
+        if datetime.fromtimestamp(day, timezone.utc).weekday() < 5:
+            total += min(end, day + 86400) - max(start, day)
+        day += 86400
+    return total
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Histórico compartido del proceso."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore()
+        return _store
+
+
+# ======================================================================
+# CLI
+# ======================================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.history_store",
+                                     description="Histórico local de velas (particionado por mes, .npy por columna)")
+    parser.add_argument("--dir", default=HISTORY_STORE_DIR)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("sync", help="sincroniza incrementalmente desde el broker")
+    p.add_argument("symbols", nargs="+")
+    p.add_argument("--tf", nargs="+", default=["M15"])
+    p.add_argument("--initial", type=int, default=HISTORY_INITIAL_BARS)
+    p.add_argument("--backfill", action="store_true", help="además, rellena huecos")
+
+    p = sub.add_parser("gaps", help="lista huecos (y opcionalmente los rellena)")
+    p.add_argument("symbols", nargs="+")
+    p.add_argument("--tf", nargs="+", default=["M15"])
+    p.add_argument("--backfill", action="store_true")
+
+    p = sub.add_parser("query", help="velas de un rango")
+    p.add_argument("symbol")
+    p.add_argument("--tf", default="M15")
+    p.add_argument("--from", dest="start")
+    p.add_argument("--to", dest="end")
+    p.add_argument("--csv")
+
+    sub.add_parser("info", help="series guardadas")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    store = HistoryStore(args.dir)
+
+    if args.cmd == "info":
+        for symbol, tf in store.series():
+            months = store.partitions(symbol, tf)
+            n = sum(len(store._load_partition(symbol, tf, m)["time"]) for m in months)
+            print(f"{symbol:14} {TIMEFRAME_NAMES.get(tf, tf):4} {n:>9} velas  {months[0]} → {months[-1]}  "
+                  f"(última {_fmt(store.last_time(symbol, tf))})")
+        return 0
+
+    if args.cmd == "query":
+        tf = timeframe_code(args.tf)
+        cols = store.read(args.symbol, tf, args.start, args.end)
+        print(f"{args.symbol} {TIMEFRAME_NAMES.get(tf, tf)}: {len(cols['time'])} velas")
+        if args.csv:
+            import pandas as pd
+            frame = pd.DataFrame({name: np.asarray(col) for name, col in cols.items()})
+            frame["time"] = pd.to_datetime(frame["time"], unit="s")
+            frame.to_csv(args.csv, index=False)
+            print(f"→ {args.csv}")
+        return 0
+
+    if not mt5.initialize():
+        print(f"No se pudo conectar a MT5: {mt5.last_error()}", file=sys.stderr)
+        return 1
+    try:
+        for symbol in args.symbols:
+            if not mt5.symbol_select(symbol, True):
+                print(f"{symbol}: no se pudo seleccionar", file=sys.stderr)
+                continue
+            for tf_name in args.tf:
+                tf = timeframe_code(tf_name)
+                label = f"{symbol} {TIMEFRAME_NAMES.get(tf, tf)}"
+                if args.cmd == "sync":
+                    added = store.sync(symbol, tf, args.initial)
+                    print(f"{label}: +{added} velas")
+                if args.cmd == "gaps" or args.backfill:
+                    gaps = store.gaps(symbol, tf)
+                    print(f"{label}: {len(gaps)} huecos")
+                    for start, end in gaps[:20]:
+                        print(f"   {_fmt(start)} → {_fmt(end)}")
+                    if args.backfill and gaps:
+                        filled, left = store.backfill(symbol, tf)
+                        print(f"{label}: backfill +{filled} velas, {left} huecos sin datos en el broker")
+    finally:
+        mt5.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+# utils/history_warmup.py
+# Carga de historia en segundo plano para el Feed.
+#
+# Antes, si el terminal no tenía velas de un símbolo (típico de los .sml
+# recién seleccionados), Feed._load_full reintentaba 10 veces con
+# sleep(2.5) DENTRO del ciclo del bot: un símbolo frío congelaba 25 s todo,
+# incluida la vigilancia de TP/SL del resto. Ahora el feed hace un solo
+# intento; si no hay velas, deja el pedido aquí y devuelve None. Un hilo
+# reintenta (copy_rates_range para que el terminal descargue +
+# copy_rates_from_pos) intercalando los símbolos pendientes, y deja las velas
+# listas para el siguiente get_candles.
+#
+# Estado por símbolo:
+#   cold     sin pedir todavía (el primer intento del feed es directo)
+#   loading  descargando en segundo plano → las estrategias lo saltan
+#   ready    con velas
+#   failed   agotó los intentos → se salta hasta WARMUP_RETRY_FAILED_SECONDS
+#
+#   WARMUP_ATTEMPTS=10
+#   WARMUP_INTERVAL=2.5              segundos entre intentos del mismo símbolo
+#   WARMUP_RETRY_FAILED_SECONDS=300
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from utils.broker import mt5
+
+logger = logging.getLogger(__name__)
+
+COLD, LOADING, READY, FAILED = "cold", "loading", "ready", "failed"
+
+WARMUP_ATTEMPTS = int(os.getenv("WARMUP_ATTEMPTS", "10"))
+WARMUP_INTERVAL = float(os.getenv("WARMUP_INTERVAL", "2.5"))
+WARMUP_RETRY_FAILED_SECONDS = float(os.getenv("WARMUP_RETRY_FAILED_SECONDS", "300"))
+
+
+class HistoryWarmup:
+    """Pedidos (símbolo, timeframe) pendientes + hilo que los reintenta."""
+
+    def __init__(self, attempts=WARMUP_ATTEMPTS, interval=WARMUP_INTERVAL,
+                 retry_failed=WARMUP_RETRY_FAILED_SECONDS, clock=time.monotonic):
+        self.attempts = int(attempts)
+        self.interval = float(interval)
+        self.retry_failed = float(retry_failed)
+        self.clock = clock
+        self.status = {}          # (símbolo, timeframe) → (estado, instante)
+        self.loaded = {}          # (símbolo, timeframe) → velas listas para el feed
+        self._jobs = {}           # (símbolo, timeframe) → [intento, próximo instante, cantidad]
+        self._cond = threading.Condition()
+        self._thread = None
+
+    # ---------- lado del feed ----------
+    def request(self, symbol, timeframe, count):
+        """Encola la descarga (no hace nada si ya está en curso o falló hace poco)."""
+        key = (symbol, timeframe)
+        with self._cond:
+            state, since = self.status.get(key, (COLD, 0.0))
+            if state == LOADING or (state == FAILED and self.clock() - since < self.retry_failed):
+                return
+            self.status[key] = (LOADING, self.clock())
+            self._jobs[key] = [0, self.clock(), count]
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="history-warmup", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        logger.info("Historia de %s (tf %s) no disponible: se carga en segundo plano", symbol, timeframe)
+
+    def take(self, symbol, timeframe):
+        """Velas que dejó el hilo para (símbolo, timeframe), o None."""
+        return self.loaded.pop((symbol, timeframe), None)
+
+    def mark_ready(self, symbol, timeframe):
+        with self._cond:
+            self.status[(symbol, timeframe)] = (READY, self.clock())
+
+    def forget(self, symbol, timeframe):
+        with self._cond:
+            self.status.pop((symbol, timeframe), None)
+            self._jobs.pop((symbol, timeframe), None)
+            self.loaded.pop((symbol, timeframe), None)
+
+    def state_of(self, symbol, timeframe):
+        state, since = self.status.get((symbol, timeframe), (COLD, 0.0))
+        if state == FAILED and self.clock() - since >= self.retry_failed:
+            return COLD
+        return state
+
+    def state(self, symbol, fallback=None):
+        """Estado del símbolo (el peor de sus timeframes). Un fallo en `fallback`
+        (la serie base del feed) no cuenta: el feed pasa a pedir cada timeframe."""
+        states = {self.state_of(s, tf) for s, tf in list(self.status) if s == symbol}
+        if fallback is not None and self.state_of(symbol, fallback) == FAILED:
+            states = {self.state_of(s, tf) for s, tf in list(self.status) if s == symbol and tf != fallback}
+        for state in (LOADING, FAILED, READY):
+            if state in states:
+                return state
+        return COLD
+
+    def symbols(self):
+        return sorted({s for s, _ in list(self.status)})
+
+    # ---------- hilo ----------
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._jobs:
+                    self._cond.wait()
+                key, job = min(self._jobs.items(), key=lambda item: item[1][1])
+                pause = job[1] - self.clock()
+                if pause > 0:
+                    self._cond.wait(pause)       # otro pedido puede llegar antes
+                    continue
+            self._attempt(key, job)
+
+    def _attempt(self, key, job):
+        symbol, timeframe = key
+        job[0] += 1
+        try:
+            rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, job[2])
+            if rates is None or len(rates) == 0:
+                # pedir un rango fuerza al terminal a descargar la historia
+                to_time = datetime.now()
+                mt5.copy_rates_range(symbol, timeframe, to_time - timedelta(days=10), to_time)
+                rates = None
+        except Exception as e:
+            logger.warning("Warm-up de %s: %s", symbol, e)
+            rates = None
+
+        with self._cond:
+            if key not in self._jobs:            # forget() mientras tanto
+                return
+            if rates is not None:
+                del self._jobs[key]
+                self.loaded[key] = rates
+                self.status[key] = (READY, self.clock())
+                logger.info("Historia de %s (tf %s) cargada tras %d intento(s)", symbol, timeframe, job[0])
+            elif job[0] >= self.attempts:
+                del self._jobs[key]
+                self.status[key] = (FAILED, self.clock())
+                logger.error("No se cargaron velas de %s tras %d intentos (reintento en %.0fs)",
+                             symbol, job[0], self.retry_failed)
+            else:
+                job[1] = self.clock() + self.interval
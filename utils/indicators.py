@@ -0,0 +1,338 @@
+# utils/indicators.py
+# Indicadores en dos modos con los mismos resultados:
+#
+#   - incremental (Streaming*): update() por vela cerrada, O(1) (o O(n) con n
+#     fijo y chico), para los bots en vivo
+#   - por lotes (ema, atr, adx, donchian, range_width): NumPy sobre toda la
+#     historia; aceptan 1-D (velas) o 2-D (símbolos × velas, el tiempo en el
+#     último eje) para backtests e investigación
+#
+# ATR, Donchian y ancho de rango dan exactamente lo mismo en los dos modos.
+# EMA y ADX (recursivos) se calculan por bloques en forma cerrada: iguales al
+# incremental salvo redondeo (< 1e-12 relativo).
+#
+# Las primeras velas sin datos suficientes son None (incremental) o NaN (lotes).
+from collections import deque
+
+import numpy as np
+
+# e**EMA_BLOCK_RANGE = máximo crecimiento de los pesos dentro de un bloque de la
+# recursión en forma cerrada (muy por debajo del overflow de float64)
+EMA_BLOCK_RANGE = 200.0
+
+
+class StreamingEMA:
+    """EMA igual que pandas ewm(span=period, adjust=False): arranca en el primer valor."""
+
+    def __init__(self, period):
+        self.period = period
+        self.alpha = 2.0 / (period + 1)
+        self.value = None
+
+    def update(self, x):
+        if self.value is None:
+            self.value = x
+        else:
+            self.value += self.alpha * (x - self.value)
+        return self.value
+
+
+class StreamingATR:
+    """ATR como el atr() de Mark3: media simple de las últimas n TR (None hasta tener n)."""
+
+    def __init__(self, n=14):
+        self.n = n
+        self.trs = deque(maxlen=n)
+        self.prev_close = None
+        self.value = None
+
+    def update(self, high, low, close):
+        tr = high - low
+        if self.prev_close is not None:
+            tr = max(tr, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.prev_close = close
+        self.trs.append(tr)
+        # sum() de n elementos fijos: O(1) por vela y sin deriva numérica
+        self.value = sum(self.trs) / self.n if len(self.trs) == self.n else None
+        return self.value
+
+
+class StreamingDonchian:
+    """Canal de Donchian: máximo/mínimo de las últimas n velas, saltando las
+    `shift` más recientes (shift=1 → las n ANTERIORES a la última cerrada).
+    Mientras no hay n velas usa las que haya.
+
+    Máximo y mínimo con deques monótonas de (índice, valor): O(1) amortizado
+    por vela, sin recorrer la ventana."""
+
+    def __init__(self, n, shift=0):
+        self.n = n
+        self.shift = shift
+        self.pending = deque()           # las `shift` velas que aún no entran
+        self.count = 0                   # velas que ya entraron a la ventana
+        self._max = deque()              # valores decrecientes: el primero es el máximo
+        self._min = deque()              # valores crecientes: el primero es el mínimo
+        self.high = None
+        self.low = None
+
+    @property
+    def width(self):
+        return None if self.high is None else self.high - self.low
+
+    def update(self, high, low):
+        self.pending.append((high, low))
+        if len(self.pending) > self.shift:
+            high, low = self.pending.popleft()
+            i = self.count
+            self.count += 1
+            while self._max and self._max[-1][1] <= high:
+                self._max.pop()
+            self._max.append((i, high))
+            while self._min and self._min[-1][1] >= low:
+                self._min.pop()
+            self._min.append((i, low))
+            # fuera de la ventana: índices <= i - n
+            if self._max[0][0] <= i - self.n:
+                self._max.popleft()
+            if self._min[0][0] <= i - self.n:
+                self._min.popleft()
+            self.high = self._max[0][1]
+            self.low = self._min[0][1]
+        return self.high, self.low
+
+
+class RollingHighLow(StreamingDonchian):
+    """Máximo/mínimo de las n velas ANTERIORES a la última cerrada (ventana de ruptura)."""
+
+    def __init__(self, n):
+        super().__init__(n, shift=1)
+
+
+class StreamingADX:
+    """ADX de Wilder (como TA-Lib): DM/TR suavizados con suma de Wilder desde la
+    vela n, DX y ADX = media de Wilder de DX desde la vela 2n-1."""
+
+    def __init__(self, n=14):
+        self.n = n
+        self.prev = None                 # (high, low, close) de la vela anterior
+        self.count = 0                   # velas con DM/TR (desde la segunda)
+        self.tr_sum = self.plus_sum = self.minus_sum = 0.0
+        self.dx_sum = 0.0
+        self.plus_di = self.minus_di = None
+        self.value = None
+
+    def update(self, high, low, close):
+        if self.prev is None:
+            self.prev = (high, low, close)
+            return None
+        prev_high, prev_low, prev_close = self.prev
+        self.prev = (high, low, close)
+        up, down = high - prev_high, prev_low - low
+        plus_dm = up if up > down and up > 0 else 0.0
+        minus_dm = down if down > up and down > 0 else 0.0
+        tr = max(high - low, abs(high - prev_close), abs(low - prev_close))
+
+        n = self.n
+        self.count += 1
+        if self.count <= n:              # primeros n: suma simple
+            self.tr_sum += tr
+            self.plus_sum += plus_dm
+            self.minus_sum += minus_dm
+            if self.count < n:
+                return None
+        else:                            # después: suavizado de Wilder
+            self.tr_sum = self.tr_sum * (1.0 - 1.0 / n) + tr
+            self.plus_sum = self.plus_sum * (1.0 - 1.0 / n) + plus_dm
+            self.minus_sum = self.minus_sum * (1.0 - 1.0 / n) + minus_dm
+
+        dx = _dx(self.plus_sum, self.minus_sum, self.tr_sum)
+        self.plus_di, self.minus_di = dx[1], dx[2]
+        k = self.count - n               # DX número k (desde 0)
+        if k < n - 1:
+            self.dx_sum += dx[0]
+        elif k == n - 1:
+            self.value = (self.dx_sum + dx[0]) / n
+        else:
+            self.value = (self.value * (n - 1) + dx[0]) / n
+        return self.value
+
+
+def _dx(plus_sum, minus_sum, tr_sum):
+    """(DX, +DI, -DI) a partir de las sumas suavizadas."""
+    plus_di = 100.0 * plus_sum / tr_sum if tr_sum else 0.0
+    minus_di = 100.0 * minus_sum / tr_sum if tr_sum else 0.0
+    total = plus_di + minus_di
+    return (100.0 * abs(plus_di - minus_di) / total if total else 0.0), plus_di, minus_di
+
+
+class BarIndicators:
+    """Estado por símbolo: EMA rápida/lenta, ATR y canal de ruptura sobre velas cerradas."""
+
+    def __init__(self, ema_fast=20, ema_slow=50, atr_period=14, channel=8):
+        self.ema_fast = StreamingEMA(ema_fast)
+        self.ema_slow = StreamingEMA(ema_slow)
+        self.atr = StreamingATR(atr_period)
+        self.channel = RollingHighLow(channel)
+        self.last_time = None
+        self.last_high = self.last_low = self.last_close = None
+        self.bars = 0
+
+    def update(self, time, high, low, close):
+        """Avanza una vela cerrada (ignora velas repetidas o con NaN)."""
+        if self.last_time is not None and time <= self.last_time:
+            return False
+        if high != high or low != low or close != close:   # NaN
+            return False
+        self.ema_fast.update(close)
+        self.ema_slow.update(close)
+        self.atr.update(high, low, close)
+        self.channel.update(high, low)
+        self.last_time = time
+        self.last_high, self.last_low, self.last_close = high, low, close
+        self.bars += 1
+        return True
+
+
+# ======================================================================
+# POR LOTES (NumPy): toda la historia de una vez, 1-D o símbolos × velas
+# ======================================================================
+def _as_float(values):
+    return np.asarray(values, dtype=np.float64)
+
+
+def _recurrence(x, beta, gain, start, y0):
+    """y[t] = beta*y[t-1] + gain*x[t] para t > start, con y[start] = y0.
+
+    Forma cerrada por bloques: dentro de un bloque de L velas
+        y[s+j] = beta**j * (beta*y[s-1] + gain*cumsum(x[s+k] * beta**-k))
+    con L tal que beta**-L <= e**EMA_BLOCK_RANGE. Lo de antes de `start` queda NaN."""
+    n = x.shape[-1]
+    out = np.full(x.shape, np.nan)
+    if start >= n:
+        return out
+    out[..., start] = y0
+    if beta <= 0.0:
+        out[..., start + 1:] = gain * x[..., start + 1:]
+        return out
+    block = max(1, min(n, int(EMA_BLOCK_RANGE / -np.log(beta)) if beta < 1.0 else n))
+    j = np.arange(block)
+    grow, decay = beta ** -j.astype(np.float64), beta ** j.astype(np.float64)
+    prev = out[..., start]
+    for s in range(start + 1, n, block):
+        e = min(s + block, n)
+        length = e - s
+        acc = np.cumsum(x[..., s:e] * grow[:length], axis=-1) * gain
+        acc += (beta * prev)[..., None]
+        acc *= decay[:length]
+        out[..., s:e] = acc
+        prev = acc[..., -1]
+    return out
+
+
+def ema(values, period):
+    """EMA como pandas ewm(span=period, adjust=False) y StreamingEMA."""
+    x = _as_float(values)
+    if not x.shape[-1]:
+        return x.copy()
+    alpha = 2.0 / (period + 1)
+    return _recurrence(x, 1.0 - alpha, alpha, 0, x[..., 0])
+
+
+def true_range(high, low, close):
+    """TR por vela; la primera es high - low."""
+    high, low, close = _as_float(high), _as_float(low), _as_float(close)
+    tr = high - low
+    prev_close = close[..., :-1]
+    tr[..., 1:] = np.maximum(np.maximum(tr[..., 1:], np.abs(high[..., 1:] - prev_close)),
+                             np.abs(low[..., 1:] - prev_close))
+    return tr
+
+
+def _rolling_sum(x, n):
+    """Suma de ventanas de n en el mismo orden que sum() de Python (resultado idéntico)."""
+    m = x.shape[-1] - n + 1
+    out = np.full(x.shape, np.nan)
+    if m <= 0:
+        return out
+    acc = x[..., 0:m].copy()
+    for k in range(1, n):
+        acc += x[..., k:k + m]
+    out[..., n - 1:] = acc
+    return out
+
+
+def atr(high, low, close, n=14):
+    """ATR = media simple de las últimas n TR (el atr() de Mark3 y StreamingATR)."""
+    return _rolling_sum(true_range(high, low, close), n) / n
+
+
+def _rolling_extreme(x, n, op):
+    """op (np.maximum/np.minimum) de cada ventana de n: duplicando el tramo,
+    O(velas · log n) en lugar de O(velas · n)."""
+    acc, span = x, 1
+    while span * 2 <= n:
+        acc = op(acc[..., :-span], acc[..., span:])      # acc[i] = op(x[i:i+2·span])
+        span *= 2
+    if span < n:
+        acc = op(acc[..., :span - n], acc[..., n - span:])
+    return acc
+
+
+def donchian(high, low, n, shift=0):
+    """(máximos, mínimos) de las últimas n velas saltando las `shift` más
+    recientes; al principio usa las velas que haya (como StreamingDonchian)."""
+    high, low = _as_float(high), _as_float(low)
+    upper = np.full(high.shape, np.nan)
+    lower = np.full(low.shape, np.nan)
+    size = high.shape[-1]
+    if size <= shift:
+        return upper, lower
+    pad = [(0, 0)] * (high.ndim - 1) + [(n - 1, 0)]
+    hp = np.pad(high, pad, constant_values=-np.inf)
+    lp = np.pad(low, pad, constant_values=np.inf)
+    upper[..., shift:] = _rolling_extreme(hp, n, np.maximum)[..., :size - shift]
+    lower[..., shift:] = _rolling_extreme(lp, n, np.minimum)[..., :size - shift]
+    return upper, lower
+
+
+def range_width(high, low, n, shift=0):
+    """Ancho del canal de Donchian (máximo - mínimo de la ventana), en precio."""
+    upper, lower = donchian(high, low, n, shift)
+    return upper - lower
+
+
+def adx(high, low, close, n=14):
+    """(ADX, +DI, -DI) de Wilder, como StreamingADX."""
+    high, low, close = _as_float(high), _as_float(low), _as_float(close)
+    size = high.shape[-1]
+    nan = np.full(high.shape, np.nan)
+    if size <= n:
+        return nan, nan.copy(), nan.copy()
+
+    up = np.zeros(high.shape)
+    down = np.zeros(high.shape)
+    up[..., 1:] = high[..., 1:] - high[..., :-1]
+    down[..., 1:] = low[..., :-1] - low[..., 1:]
+    plus_dm = np.where((up > down) & (up > 0), up, 0.0)
+    minus_dm = np.where((down > up) & (down > 0), down, 0.0)
+    tr = true_range(high, low, close)
+    tr[..., 0] = 0.0
+
+    beta = 1.0 - 1.0 / n
+    sums = []
+    for x in (tr, plus_dm, minus_dm):
+        seed = x[..., 1:n + 1].sum(axis=-1)
+        sums.append(_recurrence(x, beta, 1.0, n, seed))
+    tr_s, plus_s, minus_s = sums
+    with np.errstate(invalid="ignore", divide="ignore"):
+        plus_di = np.where(tr_s > 0, 100.0 * plus_s / tr_s, 0.0)
+        minus_di = np.where(tr_s > 0, 100.0 * minus_s / tr_s, 0.0)
+        total = plus_di + minus_di
+        dx = np.where(total > 0, 100.0 * np.abs(plus_di - minus_di) / total, 0.0)
+    plus_di[..., :n] = minus_di[..., :n] = dx[..., :n] = np.nan
+
+    first = 2 * n - 1
+    if size <= first:
+        return nan, plus_di, minus_di
+    seed = dx[..., n:first + 1].mean(axis=-1)
+    return _recurrence(dx, beta, 1.0 / n, first, seed), plus_di, minus_di
@@ -0,0 +1,176 @@
+# utils/log_pipeline.py
+# Logging fuera del hilo de trading:
+#
+#   - get_logger(nombre, archivo): el logger del bot solo mete el registro en
+#     una cola (QueueHandler); un hilo QueueListener por archivo hace el
+#     formateo y la escritura a disco/consola.
+#   - El archivo rota por tamaño Y por tiempo (lo que llegue antes) y los
+#     respaldos se comprimen en .gz (también en el hilo del listener).
+#   - EvaluationLog: un registro JSON por evaluación de símbolo (en lugar del
+#     bloque de ~10 líneas de texto), en su propio .jsonl, con muestreo: por
+#     símbolo se escribe si cambia la decisión o si pasaron `interval`
+#     segundos desde el último; las señales se escriben siempre.
+#
+# Variables de entorno (opcionales):
+#   LOG_MAX_MB=10          tamaño máximo antes de rotar
+#   LOG_ROTATE_HOURS=24    rotación por tiempo (0 = solo por tamaño)
+#   LOG_BACKUPS=10         respaldos .gz que se conservan
+import os
+import gzip
+import json
+import time
+import queue
+import atexit
+import shutil
+import logging
+import threading
+import logging.handlers
+
+LOG_FORMAT = "%(asctime)s %(levelname)s: %(message)s"
+MAX_BYTES = int(float(os.getenv("LOG_MAX_MB", "10")) * 1024 * 1024)
+ROTATE_SECONDS = float(os.getenv("LOG_ROTATE_HOURS", "24")) * 3600
+BACKUP_COUNT = int(os.getenv("LOG_BACKUPS", "10"))
+
+_listeners = {}          # archivo → QueueListener
+_lock = threading.Lock()
+
+
+class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler que además rota cada `interval` segundos y deja los
+    respaldos como <archivo>.1.gz, <archivo>.2.gz..."""
+
+    def __init__(self, filename, max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT,
+                 interval=ROTATE_SECONDS, encoding="utf-8", delay=True):
+        # delay: el archivo se abre con el primer registro; crear el bot
+        # (backtester, replay, benchmarks) no deja archivos vacíos
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding,
+                         delay=delay)
+        self.interval = float(interval or 0)
+        self.namer = lambda name: name + ".gz"
+        self.rotator = self._compress
+        self.next_rollover = self._next_time()
+
+    def _next_time(self):
+        return time.time() + self.interval if self.interval > 0 else float("inf")
+
+    def shouldRollover(self, record):
+        if time.time() >= self.next_rollover:
+            if self.stream is None:
+                self.stream = self._open()
+            return self.stream.tell() > 0      # vacío → nada que rotar
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.next_rollover = self._next_time()
+
+    @staticmethod
+    def _compress(source, dest):
+        with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(source)
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro: ts, level, logger, msg + record.fields."""
+
+    def format(self, record):
+        data = {"ts": round(record.created, 3), "level": record.levelname,
+                "logger": record.name, "msg": record.getMessage()}
+        data.update(getattr(record, "fields", None) or {})
+        return json.dumps(data, ensure_ascii=False, default=_plain)
+
+
+def _plain(value):
+    """Escalares NumPy (float64, bool_) → Python; lo demás como texto."""
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+def _listen(path, make_handlers):
+    """Un QueueListener por archivo (idempotente) → su QueueHandler."""
+    with _lock:
+        listener = _listeners.get(path)
+        if listener is None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            listener = logging.handlers.QueueListener(queue.SimpleQueue(), *make_handlers(),
+                                                      respect_handler_level=True)
+            listener.start()
+            _listeners[path] = listener
+        handler = logging.handlers.QueueHandler(listener.queue)
+        handler._pipeline = path
+        return handler
+
+
+def get_logger(name, path, console=True, file_level=logging.DEBUG, console_level=logging.INFO):
+    """Logger de bot: archivo rotado+comprimido (DEBUG) y consola (INFO), ambos
+    escritos por el listener. Llamarlo dos veces no duplica handlers."""
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.DEBUG)
+    if any(getattr(h, "_pipeline", None) == path for h in logger.handlers):
+        return logger
+
+    def handlers():
+        fmt = logging.Formatter(LOG_FORMAT)
+        fh = CompressingRotatingFileHandler(path)
+        fh.setFormatter(fmt)
+        fh.setLevel(file_level)
+        if not console:
+            return [fh]
+        sh = logging.StreamHandler()
+        sh.setFormatter(fmt)
+        sh.setLevel(console_level)
+        return [fh, sh]
+
+    logger.addHandler(_listen(path, handlers))
+    return logger
+
+
+def _json_file(path):
+    fh = CompressingRotatingFileHandler(path)
+    fh.setFormatter(JsonFormatter())
+    return fh
+
+
+class EvaluationLog:
+    """Registros JSON por evaluación (logger `<bot>.eval`, sin propagar) con
+    muestreo por símbolo."""
+
+    def __init__(self, bot_name, path, interval=300.0, clock=time.monotonic):
+        self.logger = logging.getLogger(f"{bot_name}.eval")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False            # no llega al .log de texto ni a consola
+        if not any(getattr(h, "_pipeline", None) == path for h in self.logger.handlers):
+            self.logger.addHandler(_listen(path, lambda: [_json_file(path)]))
+        self.interval = float(interval)
+        self.clock = clock
+        self._last = {}                          # símbolo → (decisión, instante)
+        self.written = 0
+        self.sampled_out = 0
+
+    def wants(self, symbol, decision):
+        """¿Se escribe esta evaluación? Consultar ANTES de armar los campos."""
+        if not self.logger.isEnabledFor(logging.INFO):
+            return False
+        now = self.clock()
+        last = self._last.get(symbol)
+        if decision is None and last is not None and last[0] is None and now - last[1] < self.interval:
+            self.sampled_out += 1
+            return False
+        self._last[symbol] = (decision, now)
+        return True
+
+    def record(self, symbol, decision, **fields):
+        self.written += 1
+        self.logger.info("evaluacion", extra={"fields": {"symbol": symbol, "decision": decision, **fields}})
+
+
+@atexit.register
+def shutdown():
+    """Vacía las colas y cierra los archivos (también al salir del proceso)."""
+    with _lock:
+        listeners = list(_listeners.values())
+        _listeners.clear()
+    for listener in listeners:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
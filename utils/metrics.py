@@ -0,0 +1,286 @@
+# utils/metrics.py
+# Métricas de latencia del camino caliente, en formato texto de Prometheus:
+#
+#   markll_stage_seconds{bot,stage}          histograma por etapa (candles, tick,
+#                                            indicators, evaluate, cycle_*, order_send,
+#                                            close_position, telegram)
+#   markll_broker_call_seconds{call}         histograma por llamada al terminal
+#   markll_broker_errors_total{call,code}    llamadas que fallaron (None, excepción, retcode)
+#   markll_symbol_evaluations_total{bot,symbol}
+#
+# Se sirve en http://127.0.0.1:METRICS_PORT/metrics y se escribe cada
+# METRICS_FILE_SECONDS en bots/logs/metrics_<nombre>.prom (ambos solo cuando
+# corre un bot o el supervisor: start_exporters). Registrar cuesta ~1 µs
+# (perf_counter + lock + bisect), así que se deja siempre activo.
+#
+#   METRICS_PORT=9108          0 = sin HTTP
+#   METRICS_FILE_SECONDS=60    0 = sin archivo
+import os
+import time
+import bisect
+import functools
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("metrics")
+
+PREFIX = "markll_"
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# familias que no son segundos
+BUCKETS_BY_NAME = {
+    "order_slippage_points": (-20, -10, -5, -2, -1, 0, 1, 2, 5, 10, 20, 50),
+}
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+METRICS_FILE_SECONDS = float(os.getenv("METRICS_FILE_SECONDS", "60"))
+METRICS_DIR = os.path.join(os.path.dirname(__file__), "..", "bots", "logs")
+
+HELP = {
+    "stage_seconds": ("histogram", "Duración de cada etapa del ciclo"),
+    "broker_call_seconds": ("histogram", "Duración de cada llamada al terminal (incluye espera del gateway)"),
+    "broker_errors_total": ("counter", "Llamadas al terminal que fallaron"),
+    "symbol_evaluations_total": ("counter", "Evaluaciones de símbolo"),
+    "order_slippage_points": ("histogram", "Deslizamiento ejecutado - pedido en points (+ = en contra)"),
+    "order_requotes_total": ("counter", "Recotizaciones / precio cambiado reintentados con tick nuevo"),
+    "session_disconnects_total": ("counter", "Caídas de la sesión MT5 detectadas por el latido"),
+    "session_reconnects_total": ("counter", "Reconexiones MT5 completadas"),
+}
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)     # el último es +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Registro de histogramas y contadores con etiquetas (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}      # (nombre, etiquetas) → Histogram
+        self._counters = {}        # (nombre, etiquetas) → int
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(BUCKETS_BY_NAME.get(name, BUCKETS))
+            hist.observe(seconds)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def stage(self, stage, seconds, bot=""):
+        self.observe("stage_seconds", seconds, bot=bot, stage=stage)
+
+    @contextmanager
+    def timer(self, stage, bot=""):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage(stage, time.perf_counter() - t0, bot)
+
+    # ---------- lectura ----------
+    def snapshot(self):
+        """{stage: {count, avg_ms, p50_ms, p99_ms}} (aprox. por buckets) para /status y logs."""
+        out = {}
+        with self._lock:
+            items = [(dict(labels), h.counts[:], h.sum, h.count)
+                     for (name, labels), h in self._histograms.items() if name == "stage_seconds"]
+        for labels, counts, total, count in items:
+            if not count:
+                continue
+            key = "/".join(filter(None, (labels.get("bot"), labels.get("stage"))))
+            out[key] = {"count": count, "avg_ms": round(total / count * 1e3, 3),
+                        "p50_ms": _quantile(counts, count, 0.5), "p99_ms": _quantile(counts, count, 0.99)}
+        return out
+
+    def render(self):
+        """Texto de exposición de Prometheus."""
+        with self._lock:
+            hists = sorted((k, h.buckets, h.counts[:], h.sum, h.count) for k, h in self._histograms.items())
+            counters = sorted(self._counters.items())
+        lines = []
+        typed = set()
+        for (name, labels), buckets, counts, total, count in hists:
+            full = PREFIX + name
+            if name not in typed:
+                typed.add(name)
+                kind, text = HELP.get(name, ("histogram", name))
+                lines += [f"# HELP {full} {text}", f"# TYPE {full} {kind}"]
+            cumulative = 0
+            for bound, n in zip(buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{full}_bucket{_labels(labels, le=le)} {cumulative}")
+            lines.append(f"{full}_sum{_labels(labels)} {total:.6f}")
+            lines.append(f"{full}_count{_labels(labels)} {count}")
+        for (name, labels), value in counters:
+            full = PREFIX + name
+            if name not in typed:
+                typed.add(name)
+                kind, text = HELP.get(name, ("counter", name))
+                lines += [f"# HELP {full} {text}", f"# TYPE {full} {kind}"]
+            lines.append(f"{full}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+def timed(stage, bot=""):
+    """Decorador: mide cada llamada como etapa `stage`."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _metrics.stage(stage, time.perf_counter() - t0, bot)
+        return inner
+    return wrap
+
+
+def _labels(labels, **extra):
+    pairs = [(k, v) for k, v in labels if v != ""] + list(extra.items())
+    if not pairs:
+        return ""
+    body = ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _quantile(counts, count, q):
+    """Límite superior del bucket donde cae el cuantil (ms)."""
+    target = q * count
+    cumulative = 0
+    for bound, n in zip(BUCKETS + (float("inf"),), counts):
+        cumulative += n
+        if cumulative >= target:
+            return None if bound == float("inf") else round(bound * 1e3, 3)
+    return None
+
+
+# ======================================================================
+# EXPORTADORES (HTTP + archivo)
+# ======================================================================
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = get_metrics().render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):      # sin una línea por scrape en consola
+        pass
+
+
+class Exporters:
+    """Servidor HTTP local + volcado periódico a archivo."""
+
+    def __init__(self, metrics, port=METRICS_PORT, path=None, file_seconds=METRICS_FILE_SECONDS,
+                 host="127.0.0.1"):
+        self.metrics = metrics
+        self.port = int(port or 0)
+        self.path = path
+        self.file_seconds = float(file_seconds or 0)
+        self.host = host
+        self.server = None
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self.port:
+            try:
+                self.server = ThreadingHTTPServer((self.host, self.port), _Handler)
+                self.server.daemon_threads = True
+            except OSError as e:
+                logger.warning("Métricas: no se pudo abrir el puerto %s (%s); solo archivo", self.port, e)
+                self.server = None
+            else:
+                self._spawn(self.server.serve_forever, "metrics-http")
+                logger.info("Métricas en http://%s:%s/metrics", self.host, self.port)
+        if self.path and self.file_seconds > 0:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._spawn(self._write_loop, "metrics-file")
+        return self
+
+    def _spawn(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def write_file(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.metrics.render())
+        os.replace(tmp, self.path)            # quien lo lea nunca ve un archivo a medias
+
+    def _write_loop(self):
+        while not self._stop.wait(self.file_seconds):
+            try:
+                self.write_file()
+            except OSError as e:
+                logger.warning("Métricas: no se pudo escribir %s: %s", self.path, e)
+
+    def stop(self):
+        self._stop.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        if self.path and self.file_seconds > 0:
+            try:
+                self.write_file()
+            except OSError:
+                pass
+
+
+_metrics = Metrics()
+_exporters = None
+_exporters_lock = threading.Lock()
+
+
+def get_metrics():
+    return _metrics
+
+
+def start_exporters(name):
+    """Arranca HTTP + archivo una vez por proceso (el primero que llama pone el
+    nombre del archivo: el supervisor o el bot suelto)."""
+    global _exporters
+    with _exporters_lock:
+        if _exporters is None:
+            path = os.path.abspath(os.path.join(METRICS_DIR, f"metrics_{name}.prom"))
+            _exporters = Exporters(_metrics, path=path).start()
+        return _exporters
+
+
+def stop_exporters():
+    global _exporters
+    with _exporters_lock:
+        if _exporters is not None:
+            _exporters.stop()
+            _exporters = None
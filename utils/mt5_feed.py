@@ -1,6 +1,7 @@
 # utils/feed_selector.py
-import MetaTrader5 as mt5
+from utils.broker import mt5
 from utils.mt5_connector import is_market_open, get_candles
+from utils.symbol_catalog import get_catalog
 
 class MT5Feed:
     def get_candles(self, pair, timeframe, n):
@@ -18,7 +19,7 @@ class MT5Feed:
         return None, None
     
     def get_symbol_info(self, pair):
-        return mt5.symbol_info(pair)
+        return get_catalog().get(pair)
 
 def get_feed(settings):
     broker = settings.get("BROKER", "mt5").lower()
@@ -0,0 +1,156 @@
+# utils/positions.py
+# Foto de posiciones compartida por monitoreo, reportes y entradas.
+#
+# Antes cada consumidor pedía la cuenta entera al broker: get_positions() en
+# monitor_closes, otra vez en analyze_and_trade, otra por cada /posiciones,
+# y close_position volvía a pedir positions_get(ticket=...) por posición.
+# Ahora hay UNA foto por ciclo (un solo positions_get) que todos leen:
+#
+#   book = get_position_book()
+#   snap = book.refresh()                 # inicio del ciclo (salidas)
+#   snap = book.snapshot()                # el resto: la misma foto si es reciente
+#   snap.of(magic, pares)                 # posiciones del bot (índice magic → símbolo)
+#   snap.of((magic, 234567), pares)       # + las de otros magics que también son suyas
+#   snap.opened / closed / modified       # cambios respecto de la foto anterior
+#
+# Lo que cierra el propio bot se descuenta de la foto (discard) sin volver a
+# preguntar. Un positions_get fallido (None) no borra nada: se mantiene la
+# foto anterior, así no aparecen cierres falsos.
+#
+#   POSITIONS_MAX_AGE=1.0     segundos que una foto sirve sin pedir otra
+import os
+import time
+import logging
+import threading
+
+from utils.broker import mt5
+
+logger = logging.getLogger(__name__)
+
+POSITIONS_MAX_AGE = float(os.getenv("POSITIONS_MAX_AGE", "1.0"))
+
+# campos que el bot puede cambiar en una posición abierta (precio/profit cambian siempre)
+MODIFIABLE_FIELDS = ("sl", "tp", "volume")
+
+
+class PositionSnapshot:
+    """Posiciones de la cuenta en un instante, indexadas, con los cambios
+    respecto de la foto anterior."""
+
+    def __init__(self, positions=(), previous=None, taken_at=float("-inf")):
+        self.positions = tuple(positions)
+        self.taken_at = taken_at
+        self.by_ticket = {p.ticket: p for p in self.positions}
+        self.by_magic = {}                 # magic → {símbolo: (posiciones...)}
+        for p in self.positions:
+            self.by_magic.setdefault(getattr(p, "magic", 0), {}).setdefault(p.symbol, []).append(p)
+        for symbols in self.by_magic.values():
+            for symbol, items in symbols.items():
+                symbols[symbol] = tuple(items)
+        self.symbols = frozenset(p.symbol for p in self.positions)
+
+        before = previous.by_ticket if previous is not None else {}
+        self.opened = tuple(p for t, p in self.by_ticket.items() if t not in before)
+        self.closed = tuple(p for t, p in before.items() if t not in self.by_ticket)
+        self.modified = tuple(p for t, p in self.by_ticket.items()
+                              if t in before and _changed(before[t], p))
+
+    def of(self, magic, symbols=None):
+        """Posiciones de un bot: su MAGIC_NUMBER o varios (el suyo + los de
+        antes), solo de `symbols` si se pasan."""
+        magics = (magic,) if isinstance(magic, int) else tuple(magic)
+        found = []
+        for m in magics:
+            own = self.by_magic.get(m, {})
+            if symbols is None:
+                found.extend(p for items in own.values() for p in items)
+            else:
+                found.extend(p for symbol in symbols for p in own.get(symbol, ()))
+        return tuple(found)
+
+    def get(self, ticket):
+        return self.by_ticket.get(ticket)
+
+    def without(self, ticket):
+        """La misma foto sin `ticket` (lo acaba de cerrar el bot); queda en closed."""
+        snap = PositionSnapshot((p for p in self.positions if p.ticket != ticket), self, self.taken_at)
+        snap.opened = self.opened
+        snap.modified = tuple(p for p in self.modified if p.ticket != ticket)
+        snap.closed = self.closed + snap.closed
+        return snap
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __iter__(self):
+        return iter(self.positions)
+
+
+def _changed(old, new):
+    return any(getattr(old, f, None) != getattr(new, f, None) for f in MODIFIABLE_FIELDS)
+
+
+def _last_error_code():
+    try:
+        return mt5.last_error()[0]
+    except Exception:
+        return None
+
+
+class PositionBook:
+    """Última foto de posiciones del proceso (la comparten los bots del supervisor)."""
+
+    def __init__(self, max_age=POSITIONS_MAX_AGE, clock=time.monotonic):
+        self.max_age = float(max_age)
+        self.clock = clock
+        self.current = PositionSnapshot()
+        self.refreshes = 0
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Nueva foto (una llamada positions_get) con los cambios desde la anterior."""
+        with self._lock:
+            try:
+                positions = mt5.positions_get()
+            except Exception as e:
+                logger.error("Error obteniendo posiciones: %s", e)
+                positions = None
+            if positions is None:                 # error del broker ≠ cuenta vacía
+                if _last_error_code() != getattr(mt5, "RES_S_OK", 1):
+                    return self.current
+                positions = ()
+            self.current = PositionSnapshot(positions, self.current, self.clock())
+            self.refreshes += 1
+            return self.current
+
+    def snapshot(self, max_age=None):
+        """La foto actual si tiene menos de `max_age` s; si no, una nueva."""
+        max_age = self.max_age if max_age is None else max_age
+        snap = self.current
+        if self.clock() - snap.taken_at <= max_age:
+            return snap
+        return self.refresh()
+
+    def discard(self, ticket):
+        """El bot cerró `ticket`: fuera de la foto, sin volver al broker."""
+        with self._lock:
+            if ticket in self.current.by_ticket:
+                self.current = self.current.without(ticket)
+
+    def reset(self):
+        with self._lock:
+            self.current = PositionSnapshot()
+            self.refreshes = 0
+
+
+_book = None
+_book_lock = threading.Lock()
+
+
+def get_position_book():
+    """Foto compartida del proceso (un positions_get por ciclo para todos)."""
+    global _book
+    with _book_lock:
+        if _book is None:
+            _book = PositionBook()
+        return _book
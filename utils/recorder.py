@@ -0,0 +1,224 @@
+# utils/recorder.py
+# Grabador de mercado en vivo: todo tick y toda vela cerrada que el Feed ya
+# pidió al broker (symbol_info_tick, symbols_get, copy_rates_*) se guarda en
+# vez de tirarse.
+#
+#   <MARKET_RECORDER_DIR>/<AAAAMMDD>/<SIMBOLO>_ticks.bin     TICK_DTYPE
+#   <MARKET_RECORDER_DIR>/<AAAAMMDD>/<SIMBOLO>_<tf>.bin      CANDLE_DTYPE (como copy_rates)
+#
+# Registros de tamaño fijo, sin cabecera, uno tras otro (día = hora servidor):
+# se abren sin parsear y sin copiar con
+#
+#   np.memmap(ruta, dtype=TICK_DTYPE, mode="r")      # o open_recording(ruta)
+#
+# En el ciclo del bot grabar es un deque.append (~0,2 µs, sin E/S); un hilo
+# vacía la cola cada MARKET_RECORDER_FLUSH_SECONDS, descarta repetidos (el
+# mismo tick visto dos veces, velas ya escritas, la vela en formación) y
+# escribe en bloque.
+#
+# Para reproducir un día grabado sin broker: BROKER=replay (utils.replay con
+# el ReplayFeed de utils.feed_selector), que lee con recorded_days() / load_recording().
+#
+#   MARKET_RECORDER=1                      0 = apagado (defecto)
+#   MARKET_RECORDER_DIR=bots/data/recordings
+#   MARKET_RECORDER_FLUSH_SECONDS=1
+import os
+import time
+import atexit
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+import numpy as np
+
+from utils.candle_cache import CANDLE_DTYPE, TIMEFRAME_SECONDS
+
+logger = logging.getLogger("recorder")
+
+TICK_DTYPE = np.dtype([
+    ("time_msc", np.int64),      # hora del tick en el servidor (ms)
+    ("bid", np.float64),
+    ("ask", np.float64),
+    ("local_msc", np.int64),     # cuándo lo vio el bot (ms, reloj local)
+])
+
+MARKET_RECORDER = os.getenv("MARKET_RECORDER", "0").strip().lower() in ("1", "true", "yes", "si", "sí")
+MARKET_RECORDER_DIR = os.getenv("MARKET_RECORDER_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bots", "data", "recordings")
+MARKET_RECORDER_FLUSH_SECONDS = float(os.getenv("MARKET_RECORDER_FLUSH_SECONDS", "1"))
+
+
+class MarketRecorder:
+    """Cola en memoria + hilo escritor a archivos binarios por símbolo y día."""
+
+    def __init__(self, root=MARKET_RECORDER_DIR, flush_seconds=MARKET_RECORDER_FLUSH_SECONDS):
+        self.root = root
+        self.flush_seconds = float(flush_seconds)
+        self._queue = deque()            # append/popleft son thread-safe
+        self._last_tick = {}             # símbolo → (time_msc, bid, ask) del último escrito
+        self._last_bar = {}              # (símbolo, tf) → time de la última vela escrita
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        self.ticks_written = 0
+        self.bars_written = 0
+        self._thread = threading.Thread(target=self._run, name="market-recorder", daemon=True)
+        self._thread.start()
+
+    # ---------- camino caliente (hilos del bot) ----------
+    def tick(self, symbol, bid, ask, time_msc=None):
+        local = time.time_ns() // 1_000_000
+        self._queue.append((0, symbol, time_msc or local, bid, ask, local))
+
+    def bars(self, symbol, timeframe, rates):
+        """`rates` tal cual de copy_rates_* (la última se toma como vela en formación)."""
+        if rates is not None and len(rates) > 1:
+            self._queue.append((1, symbol, timeframe, rates))
+
+    # ---------- escritor ----------
+    def _run(self):
+        while not self._stop.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except Exception as e:                # grabar nunca tumba al bot
+                logger.warning("Grabador: %s", e)
+
+    def flush(self):
+        """Escribe lo encolado (lo llama el hilo; también al cerrar)."""
+        with self._flush_lock:
+            ticks = {}                            # (símbolo, día) → [filas]
+            bars = []
+            while self._queue:
+                item = self._queue.popleft()
+                if item[0] == 0:
+                    _, symbol, time_msc, bid, ask, local = item
+                    key = (time_msc, bid, ask)
+                    if self._last_tick.get(symbol) == key:
+                        continue
+                    self._last_tick[symbol] = key
+                    ticks.setdefault((symbol, _day(time_msc // 1000)), []).append((time_msc, bid, ask, local))
+                else:
+                    bars.append(item[1:])
+            for (symbol, day), rows in ticks.items():
+                self._append(self._path(day, f"{symbol}_ticks"), np.array(rows, dtype=TICK_DTYPE))
+                self.ticks_written += len(rows)
+            for symbol, timeframe, rates in bars:
+                self._write_bars(symbol, timeframe, rates)
+
+    def _write_bars(self, symbol, timeframe, rates):
+        closed = np.asarray(rates[:-1])           # la última sigue formándose
+        if closed.dtype != CANDLE_DTYPE:
+            closed = closed.astype(CANDLE_DTYPE)
+        key = (symbol, timeframe)
+        last = self._last_bar.get(key)
+        if last is None:
+            last = self._last_on_disk(symbol, timeframe, int(closed["time"][-1]))
+        closed = closed[closed["time"] > last]
+        if not len(closed):
+            return
+        days = closed["time"] // 86400
+        for day in np.unique(days):
+            chunk = closed[days == day]
+            self._append(self._path(_day(int(day) * 86400), f"{symbol}_{timeframe}"), chunk)
+        self._last_bar[key] = int(closed["time"][-1])
+        self.bars_written += len(closed)
+
+    def _last_on_disk(self, symbol, timeframe, when):
+        """time de la última vela ya grabada ese día (reinicio del bot a mitad de día)."""
+        path = self._path(_day(when), f"{symbol}_{timeframe}")
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size < CANDLE_DTYPE.itemsize:
+            return -1
+        with open(path, "rb") as f:
+            f.seek(size - size % CANDLE_DTYPE.itemsize - CANDLE_DTYPE.itemsize)
+            return int(np.frombuffer(f.read(CANDLE_DTYPE.itemsize), dtype=CANDLE_DTYPE)["time"][0])
+
+    def _path(self, day, name):
+        return os.path.join(self.root, day, f"{name.replace(os.sep, '_')}.bin")
+
+    @staticmethod
+    def _append(path, array):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "ab") as f:
+            torn = f.tell() % array.dtype.itemsize
+            if torn:                              # registro a medio escribir (corte) → fuera
+                f.truncate(f.tell() - torn)
+            f.write(array.tobytes())
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(self.flush_seconds + 5)
+        self.flush()
+
+    def stats(self):
+        return {"ticks": self.ticks_written, "bars": self.bars_written, "pending": len(self._queue)}
+
+
+def _day(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime("%Y%m%d")
+
+
+def open_recording(path, dtype=None, mode="r"):
+    """memmap de un archivo grabado (vista directa, sin copiar). El dtype sale
+    del nombre si no se pasa: *_ticks.bin → TICK_DTYPE, si no CANDLE_DTYPE."""
+    if dtype is None:
+        dtype = TICK_DTYPE if path.endswith("_ticks.bin") else CANDLE_DTYPE
+    size = os.path.getsize(path)
+    if size < dtype.itemsize:
+        return np.zeros(0, dtype=dtype)
+    # un registro a medio escribir (corte de luz) se ignora
+    return np.memmap(path, dtype=dtype, mode=mode, shape=(size // dtype.itemsize,))
+
+
+def recorded_days(root=MARKET_RECORDER_DIR):
+    """Días grabados (AAAAMMDD), en orden."""
+    if not os.path.isdir(root):
+        return []
+    return sorted(d for d in os.listdir(root) if len(d) == 8 and d.isdigit())
+
+
+def load_recording(symbol, days, root=MARKET_RECORDER_DIR, timeframe=None):
+    """(velas, timeframe, ticks) de `symbol` en esos días, copiados a memoria:
+    la serie de `timeframe` (por defecto la del más chico que se haya grabado)
+    y todos los ticks (ordenados, sin repetidos). None si no hay velas."""
+    prefix = symbol.replace(os.sep, "_") + "_"
+    bars, ticks = {}, []
+    for day in days:
+        folder = os.path.join(root, day)
+        if not os.path.isdir(folder):
+            continue
+        for name in os.listdir(folder):
+            kind = name[len(prefix):-4] if name.startswith(prefix) and name.endswith(".bin") else ""
+            if kind == "ticks":
+                ticks.append(np.array(open_recording(os.path.join(folder, name))))
+            elif kind.isdigit() and int(kind) in TIMEFRAME_SECONDS:
+                bars.setdefault(int(kind), []).append(np.array(open_recording(os.path.join(folder, name))))
+    if timeframe is None and bars:
+        timeframe = min(bars, key=TIMEFRAME_SECONDS.get)
+    if timeframe not in bars:
+        return None
+    rates = np.concatenate(bars[timeframe])
+    _, last = np.unique(rates["time"][::-1], return_index=True)    # repetida → la última grabada
+    rates = rates[::-1][last]
+    ticks = np.concatenate(ticks) if ticks else np.zeros(0, dtype=TICK_DTYPE)
+    quotes = np.zeros(len(ticks), dtype=[("time_msc", "<i8"), ("bid", "<f8"), ("ask", "<f8")])
+    for field in quotes.dtype.names:
+        quotes[field] = ticks[field]
+    return rates, timeframe, np.unique(quotes)                      # ordena por time_msc
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder():
+    """Grabador del proceso, o None si MARKET_RECORDER está apagado."""
+    global _recorder
+    if not MARKET_RECORDER:
+        return None
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = MarketRecorder()
+            atexit.register(_recorder.close)
+            logger.info("Grabando ticks y velas en %s", _recorder.root)
+        return _recorder
@@ -0,0 +1,104 @@
+# utils/replay.py
+# Reproduce un día grabado por utils.recorder con el bot tal cual corre en vivo
+# (planificador, sesión, cooldowns, logs), sin broker.
+#
+# ReplayRunner es el que cambia el proceso, igual que el Backtester con su
+# corrida: instala el SimTerminal del ReplayFeed como backend de `mt5`, pone el
+# reloj del replay en la foto de posiciones y en el `datetime` del bot, y al
+# salir (fin, Ctrl+C o excepción) deja todo como estaba. El ReplayFeed solo
+# carga lo grabado.
+#
+# Uso:
+#   settings del bot: "BROKER": "replay" (o "feed_source": "replay")
+#   py -3.11 main.py mark3_ai
+#   py -3.11 -m utils.replay mark3_ai --date 2025-11-20 --speed 0
+import sys
+import logging
+import argparse
+import importlib
+
+from utils.broker import mt5
+from utils.feed_selector import ReplayFeed
+from utils.sim_terminal import sim_datetime
+from utils.symbol_catalog import get_catalog
+from utils.execution import get_execution
+from utils.positions import get_position_book
+from utils.settings_manager import get_settings
+from utils.supervisor import BOTS
+
+logger = logging.getLogger(__name__)
+
+
+class ReplayRunner:
+    """Un bot de BOTS sobre un ReplayFeed, con el backend y el reloj cambiados
+    solo mientras dura run()."""
+
+    def __init__(self, bot_name, settings=None, terminal=None):
+        """
+        settings: los del bot ya cargados (por defecto su settings_*.json)
+        terminal: SimTerminal ya armado (por defecto el de las grabaciones)
+        """
+        if bot_name not in BOTS:
+            raise ValueError(f"Bot no soportado: {bot_name} (disponibles: {list(BOTS)})")
+        module_name, self.class_name, settings_file = BOTS[bot_name]
+        self.bot_name = bot_name
+        self.module = importlib.import_module(module_name)
+        self.settings = settings if settings is not None else get_settings(settings_file)
+        self.feed = ReplayFeed(self.settings, terminal)
+        self.bot = None
+
+    def run(self):
+        """Corre el bot hasta que se detenga (Ctrl+C con el día ya reproducido)."""
+        terminal = self.feed.terminal
+        book = get_position_book()
+        saved = [(mt5, "backend", mt5.backend), (book, "clock", book.clock)]
+        if isinstance(getattr(self.module, "datetime", None), type):
+            # cooldowns y horas de los trades con el reloj del replay
+            saved.append((self.module, "datetime", self.module.datetime))
+            self.module.datetime = sim_datetime(terminal)
+        mt5.use_backend(terminal)
+        self._reset()
+        book.clock = self.feed.clock             # la foto envejece con el reloj del replay
+        try:
+            self.bot = getattr(self.module, self.class_name)(settings=self.settings, feed=self.feed)
+            entry = getattr(self.bot, "run_forever", None) or self.bot.run
+            entry()
+        except KeyboardInterrupt:
+            logger.info("Replay de %s detenido por usuario", self.bot_name)
+        finally:
+            if self.bot is not None:
+                self.bot.stop()
+            self.feed.stop()
+            for obj, name, value in reversed(saved):
+                if name == "backend":
+                    mt5.use_backend(value)
+                else:
+                    setattr(obj, name, value)
+            self._reset()                        # nada del replay queda en los singletons
+        return terminal
+
+    @staticmethod
+    def _reset():
+        get_catalog().invalidate()               # specs del terminal en uso
+        get_execution().reset()                  # filling aprendido con otro terminal
+        get_position_book().reset()              # foto de posiciones del otro backend
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    p = argparse.ArgumentParser(prog="replay", description="Reproduce un día grabado con Mark2/Mark3")
+    p.add_argument("bot", choices=sorted(BOTS))
+    p.add_argument("--date", help="REPLAY_DATE (por defecto el último día grabado)")
+    p.add_argument("--days", type=int, help="REPLAY_DAYS")
+    p.add_argument("--speed", type=float, help="REPLAY_SPEED (0 = lo más rápido posible)")
+    a = p.parse_args(argv)
+
+    settings = dict(get_settings(BOTS[a.bot][2]))
+    for key, value in (("REPLAY_DATE", a.date), ("REPLAY_DAYS", a.days), ("REPLAY_SPEED", a.speed)):
+        if value is not None:
+            settings[key] = value
+    ReplayRunner(a.bot, settings).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# utils/scheduler.py
+# Planificador por cierre de vela: en lugar de sleep(MAIN_LOOP_DELAY) fijo,
+# sabe cuándo cierra la vela de cada símbolo (en hora del servidor) y lanza
+# la evaluación de la estrategia justo después, con tres cadencias:
+#
+#   - cierre de vela  → evaluate(símbolos_que_cerraron)   (siempre)
+#   - entradas        → evaluate(todos) cada entry_seconds (0 = solo al cierre),
+#                       para estrategias que confirman con el precio actual
+#   - salidas         → monitor() cada exit_seconds
+#
+# Cada evaluación de cierre registra el retraso real respecto al cierre de la
+# vela (lag), que se loguea y se resume en lag_stats().
+import time
+import logging
+from collections import deque
+from datetime import datetime, timezone
+
+from utils.broker import mt5
+from utils.metrics import get_metrics
+
+CLOCK_RESYNC_SECONDS = 600      # cada cuánto se recalcula el desfase con el servidor
+
+
+class BarScheduler:
+    """Dispara evaluate()/monitor() alineado con los cierres de vela de cada símbolo."""
+
+    def __init__(self, timeframes, evaluate, monitor, exit_seconds=5.0, entry_seconds=0.0,
+                 grace=1.0, max_sleep=5.0, logger=None, clock=time.time, sleep=time.sleep):
+        """
+        timeframes:    {símbolo: segundos_de_la_vela}
+        evaluate:      f(símbolos) → análisis/entradas
+        monitor:       f() → gestión de salidas
+        grace:         segundos tras el cierre antes de evaluar (que el broker cree la vela nueva)
+        """
+        self.groups = {}
+        for symbol, tf_seconds in timeframes.items():
+            self.groups.setdefault(int(tf_seconds), []).append(symbol)
+        self.evaluate = evaluate
+        self.monitor = monitor
+        self.exit_seconds = float(exit_seconds)
+        self.entry_seconds = float(entry_seconds or 0)
+        self.grace = float(grace)
+        self.max_sleep = float(max_sleep)
+        self.logger = logger or logging.getLogger("scheduler")
+        self.metrics = get_metrics()
+        self.bot = self.logger.name if logger else ""    # etiqueta de las métricas
+        self.clock = clock
+        self.sleep = sleep
+
+        self.server_offset = 0.0     # hora servidor - hora local (s)
+        self.next_close = {}         # timeframe → cierre (hora servidor) de la vela en curso
+        self.next_exit = 0.0
+        self.next_entry = 0.0
+        self._next_resync = 0.0
+        self.lags = deque(maxlen=500)
+        self.bar_evaluations = 0
+        self.skipped_bars = 0
+
+    # ---------- reloj del servidor ----------
+    def sync_clock(self, server_time=None):
+        """Desfase con el servidor a partir de la hora del último tick (redondeado a 15 min)."""
+        if server_time is None:
+            symbol = next(iter(next(iter(self.groups.values()), [])), None)
+            tick = mt5.symbol_info_tick(symbol) if symbol else None
+            server_time = tick.time if tick else None
+        if server_time is None:
+            return self.server_offset
+        diff = server_time - self.clock()
+        if abs(diff) < 14 * 3600:    # tick viejo (fin de semana) → nos quedamos con el anterior
+            self.server_offset = round(diff / 900.0) * 900.0
+        return self.server_offset
+
+    def server_now(self):
+        return self.clock() + self.server_offset
+
+    # ---------- planificación ----------
+    def start(self):
+        now = self.clock()
+        self.sync_clock()
+        self._next_resync = now + CLOCK_RESYNC_SECONDS
+        server_now = now + self.server_offset
+        for tf in self.groups:
+            self.next_close[tf] = (server_now // tf + 1) * tf
+        self.next_exit = now
+        self.next_entry = now if self.entry_seconds else float("inf")
+
+    def poll(self):
+        """Ejecuta lo que toque ahora; devuelve cuántos segundos dormir."""
+        now = self.clock()
+        if now >= self._next_resync:
+            self.sync_clock()
+            self._next_resync = now + CLOCK_RESYNC_SECONDS
+
+        if now >= self.next_exit:
+            with self.metrics.timer("cycle_monitor", self.bot):
+                self.monitor()
+            self.next_exit = now + self.exit_seconds
+
+        evaluated = False
+        for tf, symbols in self.groups.items():
+            close = self.next_close[tf]
+            server_now = self.clock() + self.server_offset
+            if server_now < close + self.grace:
+                continue
+            missed = int((server_now - close) // tf)
+            if missed:
+                self.skipped_bars += missed
+            lag = server_now - close
+            with self.metrics.timer("cycle_evaluate", self.bot):
+                self.evaluate(list(symbols))
+            self._record(tf, close, lag)
+            self.next_close[tf] = (server_now // tf + 1) * tf
+            evaluated = True
+
+        now = self.clock()
+        if evaluated:
+            self.next_entry = now + self.entry_seconds if self.entry_seconds else float("inf")
+        elif now >= self.next_entry:
+            with self.metrics.timer("cycle_evaluate", self.bot):
+                self.evaluate([s for symbols in self.groups.values() for s in symbols])
+            self.next_entry = now + self.entry_seconds
+
+        server_now = now + self.server_offset
+        wake = min([c + self.grace - server_now for c in self.next_close.values()] +
+                   [self.next_exit - now, self.next_entry - now, self.max_sleep])
+        return max(0.0, wake)
+
+    def run(self, running):
+        """Bucle principal mientras running() sea True."""
+        self.start()
+        while running():
+            pause = self.poll()
+            if pause and running():
+                self.sleep(pause)
+
+    # ---------- lag ----------
+    def _record(self, tf, close, lag):
+        self.lags.append(lag)
+        self.bar_evaluations += 1
+        label = datetime.fromtimestamp(close, timezone.utc).strftime("%Y-%m-%d %H:%M")
+        self.logger.info("Cierre de vela %s (%d min, hora servidor) → evaluación +%.2fs",
+                         label, tf // 60, lag)
+
+    def lag_stats(self):
+        """Retraso (s) entre el cierre de vela y el inicio de la evaluación."""
+        if not self.lags:
+            return {"count": 0, "last": None, "avg": None, "max": None}
+        lags = list(self.lags)
+        return {"count": self.bar_evaluations, "last": round(lags[-1], 3),
+                "avg": round(sum(lags) / len(lags), 3), "max": round(max(lags), 3),
+                "skipped_bars": self.skipped_bars}
@@ -0,0 +1,181 @@
+# utils/session.py
+# Sesión MT5 persistente: UNA conexión por proceso, vigilada por un hilo.
+#
+#   - initialize()+login solo al arrancar y cuando la sesión se cae (antes:
+#     mt5_connect() en cada vuelta del bucle de Mark2; Mark3 conectaba una
+#     vez y no se recuperaba nunca).
+#   - Latido barato cada SESSION_HEARTBEAT_SECONDS: terminal_info() (llamada
+#     local al terminal) y su campo `connected` (enlace terminal ↔ servidor).
+#   - Caída → `connected` (threading.Event) se apaga y se reintenta con
+#     backoff exponencial + jitter (SESSION_BACKOFF_MIN..SESSION_BACKOFF_MAX).
+#   - Al volver: catálogo de símbolos invalidado y symbol_select de todos los
+#     símbolos que pidieron los bots (watch), aviso por Telegram.
+#   - Los bots esperan con session.wait() en lugar de reintentar conectando.
+#
+#   SESSION_HEARTBEAT_SECONDS=5
+#   SESSION_BACKOFF_MIN=1
+#   SESSION_BACKOFF_MAX=60
+import os
+import time
+import random
+import logging
+import threading
+
+from dotenv import load_dotenv
+
+from utils.broker import mt5
+from utils.symbol_catalog import get_catalog
+from utils.metrics import get_metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = float(os.getenv("SESSION_HEARTBEAT_SECONDS", "5"))
+BACKOFF_MIN = float(os.getenv("SESSION_BACKOFF_MIN", "1"))
+BACKOFF_MAX = float(os.getenv("SESSION_BACKOFF_MAX", "60"))
+
+
+class SessionManager:
+    """Conexión única al terminal con latido y reconexión en segundo plano."""
+
+    def __init__(self, heartbeat=HEARTBEAT_SECONDS, backoff_min=BACKOFF_MIN, backoff_max=BACKOFF_MAX,
+                 notify=None):
+        self.heartbeat = float(heartbeat)
+        self.backoff_min = float(backoff_min)
+        self.backoff_max = float(backoff_max)
+        self.notify = notify                  # f(texto); por defecto Telegram
+        self.connected = threading.Event()
+        self.symbols = set()                  # se vuelven a seleccionar al reconectar
+        self.metrics = get_metrics()
+        self.reconnects = 0
+        self.failures = 0                     # intentos fallidos seguidos
+        self.down_since = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # ---------- API ----------
+    def start(self):
+        """Arranca el hilo (idempotente). El primer intento de conexión es inmediato."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="mt5-session", daemon=True)
+                self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        """True si hay sesión (esperando hasta `timeout` segundos)."""
+        return self.connected.wait(timeout)
+
+    def watch(self, symbols):
+        """Símbolos que hay que tener seleccionados (ahora y tras cada reconexión)."""
+        new = set(symbols) - self.symbols
+        self.symbols |= new
+        if new and self.connected.is_set():
+            get_catalog().preload(sorted(new))
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(self.heartbeat + 5)
+        self._thread = None
+        self.connected.clear()
+
+    def status(self):
+        return {"connected": self.connected.is_set(), "reconnects": self.reconnects,
+                "failures": self.failures,
+                "down_seconds": round(time.monotonic() - self.down_since, 1) if self.down_since else 0.0}
+
+    # ---------- hilo ----------
+    def _run(self):
+        while not self._stop.is_set():
+            if self.connected.is_set():
+                if not self._alive():
+                    self._lost()
+                    continue
+                self._stop.wait(self.heartbeat)
+                continue
+            if self._connect():
+                self._restored()
+                continue
+            self.failures += 1
+            self._stop.wait(self._backoff())
+
+    def _backoff(self):
+        """min(max, base·2^(n-1)) con jitter en [50 %, 100 %] (varios procesos no reintentan a la vez)."""
+        delay = min(self.backoff_max, self.backoff_min * 2 ** min(self.failures - 1, 16))
+        return delay * random.uniform(0.5, 1.0)
+
+    @staticmethod
+    def _alive():
+        try:
+            info = mt5.terminal_info()
+        except Exception as e:
+            logger.warning("Latido MT5 falló: %s", e)
+            return False
+        return info is not None and bool(getattr(info, "connected", True))
+
+    def _connect(self):
+        """initialize+login solo si el terminal no responde; si responde pero
+        está sin servidor, él mismo reconecta y aquí solo se espera."""
+        try:
+            if mt5.terminal_info() is None:
+                mt5.shutdown()
+                login = int(os.getenv("LOGIN", "0"))
+                if not mt5.initialize(login=login, password=os.getenv("PASSWORD"), server=os.getenv("SERVER")):
+                    logger.error("Error de conexión MT5: %s (reintento %d)", mt5.last_error(), self.failures + 1)
+                    return False
+        except Exception as e:
+            logger.error("Excepción conectando a MT5: %s", e)
+            return False
+        return self._alive()
+
+    def _lost(self):
+        self.connected.clear()
+        self.down_since = time.monotonic()
+        self.failures = 0
+        self.metrics.inc("session_disconnects_total")
+        logger.error("Conexión MT5 perdida; reconectando con backoff")
+        self._send("<b>⚠️ MT5 DESCONECTADO</b>\n<i>Reintentando con backoff...</i>")
+
+    def _restored(self):
+        catalog = get_catalog()
+        catalog.invalidate()                  # specs de la sesión anterior
+        catalog.preload(sorted(self.symbols))  # symbol_select de lo que usan los bots
+        if self.down_since is not None:
+            self.reconnects += 1
+            self.metrics.inc("session_reconnects_total")
+            down = time.monotonic() - self.down_since
+            logger.info("Conexión MT5 recuperada tras %.1fs (%d intentos fallidos)", down, self.failures)
+            self._send(f"<b>✅ MT5 RECONECTADO</b>\n<i>Caída de {down:.0f}s</i>")
+        else:
+            logger.info("Conectado a MT5 correctamente")
+        self.failures = 0
+        self.down_since = None
+        self.connected.set()
+
+    def _send(self, text):
+        try:
+            if self.notify is None:
+                from utils.telegram_notifier import send_telegram_message
+                send_telegram_message(text)
+            else:
+                self.notify(text)
+        except Exception as e:
+            logger.warning("No se pudo avisar del estado de la sesión: %s", e)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Sesión compartida del proceso (supervisor y bots sueltos)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = SessionManager()
+        return _session
@@ -20,12 +20,24 @@ def get_settings(filename="settings.json"):
 
     # ==== DEFAULTS que sirven para los dos bots (puedes ampliarlos) ====
     defaults = {
-        "BROKER": "mt5",
+        "BROKER": "mt5",                    # mt5 | replay (día grabado con MARKET_RECORDER=1, sin broker)
+        # BROKER=replay: REPLAY_DATE "2025-11-20" (defecto: el último grabado), REPLAY_DAYS 1, REPLAY_BALANCE 10000
+        "REPLAY_SPEED": 1,                  # 1 = tiempo real, N = N veces más rápido, 0 = lo más rápido posible
+        "REPLAY_HISTORY_DAYS": 30,          # historia previa (grabaciones + bots/data/history) para los indicadores
         "TIMEFRAME": 60,                    # ahora usamos número directo
         "PAIRS": ["EURUSD.sml", "GBPUSD.sml", "USDJPY.sml"],
         "MAX_POSITIONS": 3,
         "MAIN_LOOP_DELAY": 60,
-        "MAGIC_NUMBER": 20251117,
+        "EXIT_CHECK_SECONDS": 5,            # cadencia de gestión de salidas
+        # ENTRY_CHECK_SECONDS: re-chequeo de entradas dentro de la vela (defecto MAIN_LOOP_DELAY; 0 = solo al cierre)
+        "EVAL_WORKERS": 1,                  # hilos para evaluar símbolos (1 = secuencial; ver MT5_GATEWAY_READERS)
+        "CANDLE_CACHE_SIZE": 500,           # velas por símbolo/timeframe en el caché del feed
+        "FEED_BASE_TIMEFRAME": 1,           # serie base del feed (M1); M5/M15/H1/H4/D1 se arman con ella
+        "HISTORY_STORE": True,              # caché de velas desde bots/data/history (utils.history_store)
+        "HISTORY_SYNC_MINUTES": 60,         # sync incremental del histórico en segundo plano (0 = no)
+        "EVAL_LOG_SECONDS": 300,            # evaluación sin señal: 1 registro JSON por símbolo cada N s
+        # MAGIC_NUMBER: uno por bot (settings_markX.json o el MAGIC_NUMBER del módulo del bot)
+        # LEGACY_MAGICS: magics de antes que el bot sigue tomando como suyos (defecto: LEGACY_MAGICS del módulo; [] = ninguno)
         "LEARNING_ENABLED": True,
         "MIN_TRADES": 15,
         "MIN_WIN_RATE": 58.0,
@@ -0,0 +1,274 @@
+# utils/signals.py
+# Reglas de Mark2 y Mark3 como funciones puras sobre arrays (investigación):
+# toda la historia, o una matriz símbolos × velas, en una llamada.
+#
+#   señales = mark3_signals(o, h, l, c, point, ema_fast=20, ...)
+#   trades = simulate(señales, o, h, l, c, point)
+#   summary(trades) → trades, win rate, profit, drawdown
+#
+# Aproximación a nivel de vela (los bots miran el precio en vivo):
+#   - la regla se evalúa al cierre de la vela t con esa vela como "vela
+#     cerrada" y la entrada ocurre DENTRO de la vela t+1, cuando el precio
+#     toca el nivel (o en la apertura si ya abrió pasado)
+#   - SL/TP se revisan desde la vela siguiente a la entrada; si una vela toca
+#     los dos, cuenta el SL
+#   - una posición por símbolo (como los bots); sin cooldown ni MAX_POSITIONS
+#   - bid = precios de la serie; ask = bid + spread (en points)
+#
+# Arrays 1-D (velas) o 2-D (símbolos × velas); `point` escalar o uno por símbolo.
+from collections import namedtuple
+
+import numpy as np
+
+from utils import indicators as ind
+
+# direction: +1 BUY / -1 SELL / 0 nada, en la vela donde se abre la posición
+Signals = namedtuple("Signals", "direction price sl tp")
+
+TRADE_DTYPE = np.dtype([
+    ("symbol", "<i4"), ("entry_bar", "<i8"), ("exit_bar", "<i8"), ("direction", "<i1"),
+    ("entry", "<f8"), ("exit", "<f8"), ("sl", "<f8"), ("tp", "<f8"),
+    ("points", "<f8"), ("profit", "<f8"), ("reason", "<i1"),
+])
+EXIT_SL, EXIT_TP, EXIT_END = 0, 1, 2
+EXIT_REASONS = {EXIT_SL: "Stop Loss", EXIT_TP: "Take Profit", EXIT_END: "Fin de datos"}
+
+
+def _matrix(*arrays):
+    """Pasa todo a float64 2-D (símbolos × velas)."""
+    out = [np.asarray(a, dtype=np.float64) for a in arrays]
+    return [a[None, :] if a.ndim == 1 else a for a in out]
+
+
+def _per_symbol(value, rows):
+    """Escalar o un valor por símbolo → columna (símbolos, 1)."""
+    v = np.asarray(value, dtype=np.float64)
+    return np.broadcast_to(v.reshape(-1, 1) if v.ndim else v, (rows, 1))
+
+
+def _squeeze(signals, one_dim):
+    return Signals(*(a[0] for a in signals)) if one_dim else signals
+
+
+def _empty(shape):
+    return (np.zeros(shape, dtype=np.int8), np.full(shape, np.nan),
+            np.full(shape, np.nan), np.full(shape, np.nan))
+
+
+# ======================================================================
+# MARK2: toque de nivel sobre la vela cerrada + filtro anti-rango
+# ======================================================================
+def mark2_signals(open_, high, low, point, pips=1.4, sl_pips=35.0, tp_pips=70.0, spread=0.0,
+                  range_bars=20, min_range_pips=48.0):
+    """Mark2AIPro.get_signal por lotes.
+
+    Al cierre de t: SELL si el bid llega a low[t] + pips; BUY si el ask baja a
+    high[t] - pips; nada si el rango de las últimas `range_bars` velas (se
+    asume la serie en M15, como el filtro del bot) es menor que min_range_pips.
+    Si la vela t+1 abre ya pasado un nivel entra en la apertura (primero SELL,
+    como el bot); si no, la SELL se toma si high[t+1] la alcanza y si no la BUY."""
+    one_dim = np.ndim(high) == 1
+    open_, high, low = _matrix(open_, high, low)
+    rows, n = high.shape
+    point = _per_symbol(point, rows)
+    spr = _per_symbol(spread, rows) * point
+    direction, price, sl, tp = _empty(high.shape)
+    if n < 2:
+        return _squeeze(Signals(direction, price, sl, tp), one_dim)
+
+    width = ind.range_width(high, low, range_bars)
+    active = width / point >= min_range_pips            # NaN → False
+    sell_level = low + pips * point                      # bid ≥
+    buy_level = high - pips * point                      # ask ≤
+
+    o, h, l = open_[:, 1:], high[:, 1:], low[:, 1:]
+    sl_, bl = sell_level[:, :-1], buy_level[:, :-1]
+    on = active[:, :-1]
+    sell_open = on & (o >= sl_)
+    buy_open = on & ~sell_open & (o + spr <= bl)
+    sell_touch = on & ~sell_open & ~buy_open & (h >= sl_)
+    buy_touch = on & ~sell_open & ~buy_open & ~sell_touch & (l + spr <= bl)
+
+    d = direction[:, 1:]
+    p = price[:, 1:]
+    d[sell_open | sell_touch] = -1
+    d[buy_open | buy_touch] = 1
+    p[:] = np.where(sell_open, o, np.where(buy_open, o + spr, np.where(sell_touch, sl_,
+                    np.where(buy_touch, bl, np.nan))))
+    sl[:] = np.where(direction == 1, price - sl_pips * point, price + sl_pips * point)
+    tp[:] = np.where(direction == 1, price + tp_pips * point, price - tp_pips * point)
+    return _squeeze(Signals(direction, price, sl, tp), one_dim)
+
+
+# ======================================================================
+# MARK3: tendencia EMA + ruptura del canal de 8 velas + ATR para SL/TP
+# ======================================================================
+def mark3_signals(open_, high, low, close, point, ema_fast=20, ema_slow=50, atr_period=14,
+                  channel=8, atr_mult_sl=1.4, atr_mult_tp=2.8, spread=0.0):
+    """Mark3Pro.analyze_and_trade por lotes.
+
+    Al cierre de t (indicadores sobre velas cerradas hasta t):
+      BUY  si EMA rápida > lenta y close[t] > máximo de las `channel` velas
+           anteriores; entra en t+1 cuando el ask supera high[t]
+      SELL al revés con el bid bajo low[t]
+    SL/TP = entrada ∓/± max(ATR[t], 0.0001) × multiplicador.
+    Sin señales hasta tener ema_slow - 1 velas cerradas (el bot siembra con 50
+    velas contando la que se está formando)."""
+    one_dim = np.ndim(high) == 1
+    open_, high, low, close = _matrix(open_, high, low, close)
+    rows, n = high.shape
+    point = _per_symbol(point, rows)
+    spr = _per_symbol(spread, rows) * point
+    direction, price, sl, tp = _empty(high.shape)
+    if n < 2:
+        return _squeeze(Signals(direction, price, sl, tp), one_dim)
+
+    fast = ind.ema(close, ema_fast)
+    slow = ind.ema(close, ema_slow)
+    atr = ind.atr(high, low, close, atr_period)
+    upper, lower = ind.donchian(high, low, channel, shift=1)
+    ready = ~np.isnan(atr) & ~np.isnan(upper)
+    ready[:, :max(ema_slow, 2) - 2] = False
+    with np.errstate(invalid="ignore"):
+        buy_setup = ready & (fast > slow) & (close > upper)
+        sell_setup = ready & (fast <= slow) & (close < lower)
+
+    o, h, l = open_[:, 1:], high[:, 1:], low[:, 1:]
+    prev_h, prev_l = high[:, :-1], low[:, :-1]
+    buy = buy_setup[:, :-1] & (h + spr > prev_h)
+    sell = sell_setup[:, :-1] & (l < prev_l)
+
+    d = direction[:, 1:]
+    p = price[:, 1:]
+    d[buy] = 1
+    d[sell] = -1
+    p[:] = np.where(buy, np.maximum(o + spr, prev_h), np.where(sell, np.minimum(o, prev_l), np.nan))
+    atr_val = np.maximum(np.nan_to_num(atr[:, :-1]), 0.0001)
+    sl[:, 1:] = np.where(buy, p - atr_val * atr_mult_sl, np.where(sell, p + atr_val * atr_mult_sl, np.nan))
+    tp[:, 1:] = np.where(buy, p + atr_val * atr_mult_tp, np.where(sell, p - atr_val * atr_mult_tp, np.nan))
+    return _squeeze(Signals(direction, price, sl, tp), one_dim)
+
+
+# ======================================================================
+# RESOLUCIÓN DE TRADES (SL/TP) Y RESUMEN
+# ======================================================================
+def _first_exit(high, low, spr, start, direction, sl, tp):
+    """Primer índice ≥ start donde salta SL o TP → (índice, razón) o (None, None).
+    Busca en ventanas que se duplican: casi todos los trades cierran pronto."""
+    n = len(high)
+    window = 64
+    while start < n:
+        end = min(n, start + window)
+        h, l = high[start:end], low[start:end]
+        if direction > 0:                 # BUY cierra con bid
+            hit_sl, hit_tp = l <= sl, h >= tp
+        else:                             # SELL cierra con ask
+            hit_sl, hit_tp = h + spr >= sl, l + spr <= tp
+        hits = np.flatnonzero(hit_sl | hit_tp)
+        if len(hits):
+            k = hits[0]
+            return start + k, (EXIT_SL if hit_sl[k] else EXIT_TP)
+        start = end
+        window *= 2
+    return None, None
+
+
+def _exits(high, low, spr, rows, cols, direction, sl, tp, vector_min=256):
+    """Salida de TODAS las entradas candidatas a la vez (sin mirar si hay otra
+    posición abierta): se avanza vela a vela con las que siguen vivas y, cuando
+    quedan pocas, se termina una a una con _first_exit.
+    → (vela de salida o -1, razón)"""
+    n = high.shape[1]
+    exit_bar = np.full(len(rows), -1, dtype=np.int64)
+    reason = np.full(len(rows), EXIT_END, dtype=np.int8)
+    alive = np.arange(len(rows))
+    bar = cols + 1
+    while len(alive) >= vector_min:
+        alive = alive[bar[alive] < n]
+        r, b = rows[alive], bar[alive]
+        h, l = high[r, b], low[r, b]
+        buy = direction[alive] > 0
+        s = spr[r]
+        hit_sl = np.where(buy, l <= sl[alive], h + s >= sl[alive])
+        hit_tp = np.where(buy, h >= tp[alive], l + s <= tp[alive])
+        done = hit_sl | hit_tp
+        exit_bar[alive[done]] = b[done]
+        reason[alive[done]] = np.where(hit_sl[done], EXIT_SL, EXIT_TP)
+        alive = alive[~done]
+        bar[alive] += 1
+    for i in alive:
+        r = rows[i]
+        k, why = _first_exit(high[r], low[r], spr[r], bar[i], direction[i], sl[i], tp[i])
+        if k is not None:
+            exit_bar[i], reason[i] = k, why
+    return exit_bar, reason
+
+
+def simulate(signals, open_, high, low, close, point, spread=0.0, contract_size=100000.0, lots=0.01):
+    """Trades de las señales con una posición por símbolo → array TRADE_DTYPE
+    ordenado por vela de salida. profit = points × point × contract_size × lots
+    (moneda de cotización; USD en los XXXUSD)."""
+    one_dim = np.ndim(high) == 1
+    sig = Signals(*(np.atleast_2d(a) for a in signals)) if one_dim else signals
+    open_, high, low, close = _matrix(open_, high, low, close)
+    rows_n, n = high.shape
+    points = _per_symbol(point, rows_n)[:, 0]
+    spreads = _per_symbol(spread, rows_n)[:, 0] * points
+
+    rows, cols = np.nonzero(sig.direction)              # ordenadas por símbolo y vela
+    direction = sig.direction[rows, cols].astype(np.int8)
+    entry, sl, tp = sig.price[rows, cols], sig.sl[rows, cols], sig.tp[rows, cols]
+    exit_bar, reason = _exits(high, low, spreads, rows, cols, direction, sl, tp)
+    exit_bar[exit_bar < 0] = n - 1
+
+    # una posición por símbolo: de cada trade se salta a la primera entrada
+    # posterior a su salida (solo este encadenado es secuencial)
+    key = rows * (n + 1)
+    nxt = np.searchsorted(key + cols, key + exit_bar + 1).tolist()
+    taken = []
+    i, total = 0, len(rows)
+    while i < total:
+        taken.append(i)
+        i = nxt[i]
+    taken = np.asarray(taken, dtype=np.int64)
+
+    rows, cols, direction = rows[taken], cols[taken], direction[taken]
+    entry, sl, tp = entry[taken], sl[taken], tp[taken]
+    exit_bar, reason = exit_bar[taken], reason[taken]
+    ask = np.where(direction < 0, spreads[rows], 0.0)   # las SELL cierran con ask
+    level = np.where(reason == EXIT_SL, sl, tp)
+    bar_open = open_[rows, exit_bar] + ask
+    # hueco en la apertura: se sale al precio de apertura, no al nivel
+    worse = np.where(reason == EXIT_SL, direction, -direction) * (bar_open - level) < 0
+    exit_price = np.where(worse, bar_open, level)
+    end = reason == EXIT_END
+    exit_price[end] = close[rows[end], -1] + ask[end]
+
+    pts = (exit_price - entry) * direction / points[rows]
+    trades = np.empty(len(taken), dtype=TRADE_DTYPE)
+    for name, value in (("symbol", rows), ("entry_bar", cols), ("exit_bar", exit_bar),
+                        ("direction", direction), ("entry", entry), ("exit", exit_price),
+                        ("sl", sl), ("tp", tp), ("points", pts),
+                        ("profit", pts * points[rows] * contract_size * lots), ("reason", reason)):
+        trades[name] = value
+    return trades[np.lexsort((trades["symbol"], trades["exit_bar"]))]
+
+
+def summary(trades):
+    """Métricas de un array de trades (ordenado por salida)."""
+    if not len(trades):
+        return {"trades": 0, "win_rate": 0.0, "profit": 0.0, "max_drawdown": 0.0,
+                "profit_factor": 0.0, "avg_points": 0.0}
+    profit = trades["profit"]
+    equity = np.cumsum(profit)
+    drawdown = np.maximum.accumulate(np.maximum(equity, 0.0)) - equity
+    gross_win = profit[profit > 0].sum()
+    gross_loss = -profit[profit <= 0].sum()
+    return {
+        "trades": int(len(trades)),
+        "win_rate": round(float((profit > 0).mean() * 100), 2),
+        "profit": round(float(equity[-1]), 2),
+        "max_drawdown": round(float(drawdown.max()), 2),
+        "profit_factor": round(float(gross_win / gross_loss), 2) if gross_loss else float("inf"),
+        "avg_points": round(float(trades["points"].mean()), 2),
+    }
@@ -0,0 +1,889 @@
+# utils/sim_terminal.py
+# Terminal MetaTrader5 SIMULADO: misma API que usan los bots (symbol_info_tick,
+# copy_rates_*, order_send, positions_get, account_info...) pero local, sin
+# broker y determinista. Llena órdenes, lleva posiciones, SL/TP y balance.
+#
+# Cotizaciones:
+#   - grabadas: velas (y opcionalmente ticks) cargadas de disco
+#   - sintéticas: random walk reproducible por símbolo (se generan al pedirlas,
+#     con history_days de historia y future_days por delante del reloj)
+#
+# Reloj:
+#   - manual (speed=None): lo mueve quien lo usa con advance_to()/step()
+#     → backtests y pruebas de carga a velocidad de CPU
+#   - tiempo real (speed=N): avanza N× más rápido que el reloj de pared
+#     → MT5_BACKEND=sim py main.py mark3_ai
+#
+# Se activa como backend con MT5_BACKEND=sim (ver utils/broker.py) y
+# SimTerminal.from_env():
+#   MT5_SIM_DATA     carpeta con <SIMBOLO>_<TF>.csv|npy (si no, sintéticas)
+#   MT5_SIM_SPEED    multiplicador del reloj (defecto 1)
+#   MT5_SIM_BALANCE  balance inicial (defecto 10000)
+#   MT5_SIM_SEED     semilla de las series sintéticas (defecto 0)
+#
+# Límite del modelo con velas sin ticks: dentro de cada vela el precio hace
+# O → L → H → C (alcista) u O → H → L → C (bajista), un camino inventado. Si
+# el SL y el TP de una posición caen los dos dentro de la misma vela no se
+# sabe cuál llegó primero y se asume el SL (conservador). Para resolverlo de
+# verdad hay que dar velas M1 (la serie base; las mayores se arman con ella)
+# o ticks.
+
+import os
+import csv
+import time
+import zlib
+import fnmatch
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from utils.candle_cache import TIMEFRAME_SECONDS
+
+logger = logging.getLogger("sim_terminal")
+
+# Mismo layout que devuelve mt5.copy_rates_*
+RATES_DTYPE = np.dtype([
+    ("time", "<i8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"), ("close", "<f8"),
+    ("tick_volume", "<u8"), ("spread", "<i4"), ("real_volume", "<u8"),
+])
+
+# Ticks grabados: time_msc + bid + ask
+TICKS_DTYPE = np.dtype([("time_msc", "<i8"), ("bid", "<f8"), ("ask", "<f8")])
+
+TIMEFRAME_LABELS = {
+    "M1": 1, "M5": 5, "M15": 15, "M30": 30, "H1": 16385, "H4": 16388, "D1": 16408,
+}
+
+# Orden de los 4 ticks sintéticos dentro de cada vela (en fracciones de la vela)
+SYNTH_TICK_OFFSETS = (0.0, 0.25, 0.5, 0.75)
+
+Tick = namedtuple("Tick", "time bid ask last volume time_msc flags volume_real")
+SymbolInfo = namedtuple("SymbolInfo", [
+    "name", "visible", "select", "trade_mode", "digits", "point", "spread",
+    "trade_tick_value", "trade_tick_size", "trade_contract_size",
+    "volume_min", "volume_max", "volume_step", "filling_mode", "trade_stops_level",
+    "currency_base", "currency_profit", "currency_margin", "bid", "ask", "time",
+])
+TradePosition = namedtuple("TradePosition", [
+    "ticket", "time", "time_msc", "time_update", "time_update_msc", "type", "magic",
+    "identifier", "reason", "volume", "price_open", "sl", "tp", "price_current",
+    "swap", "profit", "symbol", "comment", "external_id",
+])
+TradeDeal = namedtuple("TradeDeal", [
+    "ticket", "order", "time", "time_msc", "type", "entry", "magic", "position_id",
+    "reason", "volume", "price", "commission", "swap", "profit", "fee", "symbol",
+    "comment", "external_id",
+])
+OrderSendResult = namedtuple("OrderSendResult", [
+    "retcode", "deal", "order", "volume", "price", "bid", "ask", "comment",
+    "request_id", "retcode_external", "request",
+])
+AccountInfo = namedtuple("AccountInfo", [
+    "login", "leverage", "balance", "credit", "profit", "equity", "margin",
+    "margin_free", "margin_level", "currency", "server", "name", "trade_allowed",
+])
+TerminalInfo = namedtuple("TerminalInfo", "connected trade_allowed name company path")
+
+
+def _to_epoch(value):
+    """datetime (naive = hora servidor/UTC), string o número → segundos epoch."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return int(value)
+    if isinstance(value, str):
+        value = pd.Timestamp(value).to_pydatetime()
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp())
+    raise TypeError(f"Fecha no soportada: {value!r}")
+
+
+def default_symbol_spec(symbol):
+    """Especificación razonable por nombre (forex, JPY, metales, índices/crypto)."""
+    base = symbol.split(".")[0].split("_")[0].upper()
+    spec = {
+        "digits": 5, "point": 0.00001, "contract_size": 100000.0,
+        "currency_base": base[:3], "currency_profit": base[3:6] or "USD",
+        "spread_points": 10, "volume_min": 0.01, "volume_max": 100.0, "volume_step": 0.01,
+        "filling_mode": 3,  # SYMBOL_FILLING_FOK | SYMBOL_FILLING_IOC
+        "trade_mode": 4,    # SYMBOL_TRADE_MODE_FULL
+        "stops_level": 0,
+    }
+    if base.startswith(("XAU", "XAG")):
+        spec.update(digits=2, point=0.01, contract_size=100.0, spread_points=30)
+    elif len(base) == 6 and base.isalpha():
+        if base.endswith("JPY"):
+            spec.update(digits=3, point=0.001)
+    else:
+        spec.update(digits=2, point=0.01, contract_size=1.0, spread_points=100,
+                    currency_base=base, currency_profit="USD")
+    return spec
+
+
+# ======================================================================
+# DATOS HISTÓRICOS
+# ======================================================================
+def load_bars(path):
+    """Carga velas desde .npy (RATES_DTYPE) o .csv (propio o export de MT5)."""
+    if path.endswith(".npy"):
+        return np.load(path).astype(RATES_DTYPE, copy=False)
+
+    with open(path, "r", encoding="utf-8") as f:
+        header = f.readline()
+    if "<DATE>" in header:
+        # Export del History Center de MT5 (tabulado)
+        df = pd.read_csv(path, sep="\t")
+        df.columns = [c.strip("<>").lower() for c in df.columns]
+        times = pd.to_datetime(df["date"] + " " + df.get("time", "00:00:00"))
+        df = df.rename(columns={"tickvol": "tick_volume", "vol": "real_volume"})
+    else:
+        df = pd.read_csv(path)
+        if np.issubdtype(df["time"].dtype, np.number):
+            times = pd.to_datetime(df["time"], unit="s")
+        else:
+            times = pd.to_datetime(df["time"])
+
+    rates = np.zeros(len(df), dtype=RATES_DTYPE)
+    rates["time"] = times.to_numpy(dtype="datetime64[s]").astype(np.int64)
+    for col in ("open", "high", "low", "close", "tick_volume", "spread", "real_volume"):
+        if col in df.columns:
+            rates[col] = df[col].to_numpy()
+    return rates
+
+
+def save_bars(path, rates):
+    """Guarda velas en .npy (rápido) o .csv (legible)."""
+    rates = np.asarray(rates).astype(RATES_DTYPE, copy=False)
+    if path.endswith(".npy"):
+        np.save(path, rates)
+        return
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(RATES_DTYPE.names)
+        w.writerows(rates.tolist())
+
+
+def load_data_dir(path, symbols=None):
+    """{símbolo: (velas_base, timeframe_base)} desde una carpeta <SIMBOLO>_<TF>.csv|npy."""
+    found = {}
+    for fname in sorted(os.listdir(path)):
+        stem, ext = os.path.splitext(fname)
+        if ext not in (".csv", ".npy") or "_" not in stem:
+            continue
+        symbol, tf_label = stem.rsplit("_", 1)
+        tf = TIMEFRAME_LABELS.get(tf_label.upper())
+        if tf is None or (symbols and symbol not in symbols):
+            continue
+        # Nos quedamos con el timeframe más bajo de cada símbolo
+        prev = found.get(symbol)
+        if prev is None or TIMEFRAME_SECONDS[tf] < TIMEFRAME_SECONDS[prev[1]]:
+            found[symbol] = (os.path.join(path, fname), tf)
+    return {sym: (load_bars(p), tf) for sym, (p, tf) in found.items()}
+
+
+def sim_datetime(terminal):
+    """datetime cuyo now() es el reloj del terminal (cooldowns, last_close_time...)."""
+    def now(cls, tz=None):
+        dt = datetime.fromtimestamp(terminal.now_msc / 1000.0, timezone.utc)
+        return dt.astimezone(tz) if tz else dt.replace(tzinfo=None)
+    return type("datetime", (datetime,), {"now": classmethod(now)})
+
+
+# ======================================================================
+# COTIZACIONES SINTÉTICAS
+# ======================================================================
+def _default_price(spec):
+    if spec["currency_base"] in ("XAU",):
+        return 2000.0
+    if spec["currency_base"] in ("XAG",):
+        return 25.0
+    if spec["contract_size"] == 1.0:
+        return 1000.0          # índices / crypto / CFDs
+    if spec["currency_profit"] == "JPY":
+        return 150.0
+    return 1.1
+
+
+def synthetic_bars(symbol, start, end, timeframe=1, seed=0, volatility=None, price=None, spec=None):
+    """Velas aleatorias reproducibles (random walk log-normal) en [start, end).
+    La misma (semilla, símbolo) da siempre la misma serie."""
+    spec = spec or default_symbol_spec(symbol)
+    tf_seconds = TIMEFRAME_SECONDS[timeframe]
+    times = np.arange(_to_epoch(start) // tf_seconds * tf_seconds, _to_epoch(end), tf_seconds)
+    n = len(times)
+    rng = np.random.default_rng([seed, zlib.crc32(symbol.encode())])
+    vol = volatility or 0.00025 * np.sqrt(tf_seconds / 60.0)   # retorno log por vela
+    price0 = price or _default_price(spec)
+
+    close = price0 * np.exp(np.cumsum(rng.normal(0.0, vol, n)))
+    open_ = np.r_[price0, close[:-1]]
+    wicks = np.abs(rng.normal(0.0, vol * 0.6, (2, n))) * close
+
+    rates = np.zeros(n, dtype=RATES_DTYPE)
+    rates["time"] = times
+    rates["open"] = np.round(open_, spec["digits"])
+    rates["close"] = np.round(close, spec["digits"])
+    rates["high"] = np.round(np.maximum(open_, close) + wicks[0], spec["digits"])
+    rates["low"] = np.round(np.minimum(open_, close) - wicks[1], spec["digits"])
+    rates["tick_volume"] = rng.integers(20, 400, n)
+    rates["spread"] = spec["spread_points"]
+    return rates
+
+
+class _SymbolSeries:
+    """Velas base + flujo de eventos (ticks) de un símbolo, todo en arrays NumPy."""
+
+    def __init__(self, name, bars, timeframe, spec, ticks=None):
+        self.name = name
+        self.spec = spec
+        self.tf = timeframe
+        self.tf_seconds = TIMEFRAME_SECONDS[timeframe]
+        self.bars = np.sort(np.asarray(bars).astype(RATES_DTYPE, copy=False), order="time")
+        self.bar_time = self.bars["time"]
+        self._derived = {}
+        self.cursor = -1            # índice del último evento visible
+        self.stop_cursor = -1       # hasta dónde se revisaron SL/TP
+        self.synthetic_path = ticks is None or not len(ticks)   # 4 ticks inventados por vela
+
+        if ticks is not None and len(ticks):
+            self._events_from_ticks(np.sort(np.asarray(ticks, dtype=TICKS_DTYPE), order="time_msc"))
+        else:
+            self._events_from_bars()
+
+    def _events_from_bars(self):
+        """4 ticks sintéticos por vela: O → L → H → C (alcista) u O → H → L → C (bajista)."""
+        b = self.bars
+        n = len(b)
+        bull = b["close"] >= b["open"]
+        prices = np.empty((n, 4))
+        prices[:, 0] = b["open"]
+        prices[:, 1] = np.where(bull, b["low"], b["high"])
+        prices[:, 2] = np.where(bull, b["high"], b["low"])
+        prices[:, 3] = b["close"]
+
+        offsets = (np.array(SYNTH_TICK_OFFSETS) * self.tf_seconds * 1000).astype(np.int64)
+        spread_pts = np.where(b["spread"] > 0, b["spread"], self.spec["spread_points"])
+
+        self.ev_time = ((b["time"] * 1000)[:, None] + offsets[None, :]).ravel()
+        self.ev_bid = prices.ravel()
+        self.ev_ask = (prices + (spread_pts * self.spec["point"])[:, None]).ravel()
+        self.ev_bar = np.repeat(np.arange(n), 4)
+        self.ev_high = np.maximum.accumulate(prices, axis=1).ravel()
+        self.ev_low = np.minimum.accumulate(prices, axis=1).ravel()
+        self.ev_count = np.tile(np.arange(1, 5), n)
+        # Entre ticks sintéticos el precio pasa por todos los niveles, salvo en
+        # la apertura de cada vela (posible gap)
+        self.ev_gap = np.zeros(n * 4, dtype=bool)
+        self.ev_gap[::4] = True
+
+    def _events_from_ticks(self, ticks):
+        self.ev_time = ticks["time_msc"]
+        self.ev_bid = ticks["bid"]
+        self.ev_ask = ticks["ask"]
+        bar = np.searchsorted(self.bar_time, ticks["time_msc"] // 1000, side="right") - 1
+        keep = bar >= 0
+        self.ev_time, self.ev_bid, self.ev_ask, bar = (
+            self.ev_time[keep], self.ev_bid[keep], self.ev_ask[keep], bar[keep])
+        self.ev_bar = bar
+        groups = pd.Series(self.ev_bid).groupby(bar)
+        self.ev_high = groups.cummax().to_numpy()
+        self.ev_low = groups.cummin().to_numpy()
+        self.ev_count = groups.cumcount().to_numpy() + 1
+        self.ev_gap = np.ones(len(self.ev_time), dtype=bool)
+
+    # ---------- timeframes superiores ----------
+    def _derived_tf(self, tf_seconds):
+        """Velas de un timeframe superior agregadas desde la serie base (cacheado)."""
+        cached = self._derived.get(tf_seconds)
+        if cached is not None:
+            return cached
+        b = self.bars
+        bucket = b["time"] // tf_seconds * tf_seconds
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        out = np.zeros(len(starts), dtype=RATES_DTYPE)
+        out["time"] = bucket[starts]
+        out["open"] = b["open"][starts]
+        out["high"] = np.maximum.reduceat(b["high"], starts)
+        out["low"] = np.minimum.reduceat(b["low"], starts)
+        out["close"] = b["close"][np.r_[starts[1:] - 1, len(b) - 1]]
+        out["tick_volume"] = np.add.reduceat(b["tick_volume"], starts)
+        out["spread"] = b["spread"][starts]
+        out["real_volume"] = np.add.reduceat(b["real_volume"], starts)
+
+        group = np.cumsum(np.r_[True, bucket[1:] != bucket[:-1]]) - 1
+        g = pd.Series(b["high"]).groupby(group)
+        # máximos/mínimos de las velas base ANTERIORES dentro del mismo bucket
+        prev_high = g.shift(1).groupby(group).cummax().to_numpy()
+        prev_low = pd.Series(b["low"]).groupby(group).shift(1).groupby(group).cummin().to_numpy()
+        prev_vol = (pd.Series(b["tick_volume"].astype(np.int64)).groupby(group).cumsum()
+                    - b["tick_volume"].astype(np.int64)).to_numpy()
+        cached = (out, group, prev_high, prev_low, prev_vol)
+        self._derived[tf_seconds] = cached
+        return cached
+
+    def rates_for(self, timeframe):
+        """(velas, índice_de_la_vela_en_formación, derivado|None) para el cursor actual."""
+        k = self.cursor
+        if k < 0:
+            return None, -1, None
+        tf_seconds = TIMEFRAME_SECONDS.get(timeframe)
+        if tf_seconds is None or tf_seconds < self.tf_seconds or tf_seconds % self.tf_seconds:
+            return None, -1, None
+        base_idx = int(self.ev_bar[k])
+        if tf_seconds == self.tf_seconds:
+            return self.bars, base_idx, None
+        derived = self._derived_tf(tf_seconds)
+        return derived[0], int(derived[1][base_idx]), derived
+
+    def forming_row(self, row, derived):
+        """Ajusta la vela en formación al estado del tick actual (sin mirar el futuro)."""
+        k = self.cursor
+        high, low, count = self.ev_high[k], self.ev_low[k], int(self.ev_count[k])
+        if derived is not None:
+            base_idx = int(self.ev_bar[k])
+            ph, pl = derived[2][base_idx], derived[3][base_idx]
+            if not np.isnan(ph):
+                high, low = max(high, ph), min(low, pl)
+            count += int(derived[4][base_idx])
+        row["high"] = high
+        row["low"] = low
+        row["close"] = self.ev_bid[k]
+        row["tick_volume"] = count
+
+
+# ======================================================================
+# TERMINAL SIMULADO (API compatible con MetaTrader5)
+# ======================================================================
+class SimTerminal:
+    """Imita el módulo MetaTrader5 sobre datos grabados/sintéticos y un reloj simulado."""
+
+    # ---- constantes MT5 que usan los bots ----
+    TIMEFRAME_M1, TIMEFRAME_M5, TIMEFRAME_M15, TIMEFRAME_M30 = 1, 5, 15, 30
+    TIMEFRAME_H1, TIMEFRAME_H4, TIMEFRAME_D1 = 16385, 16388, 16408
+    ORDER_TYPE_BUY, ORDER_TYPE_SELL = 0, 1
+    POSITION_TYPE_BUY, POSITION_TYPE_SELL = 0, 1
+    TRADE_ACTION_DEAL, TRADE_ACTION_SLTP = 1, 6
+    ORDER_TIME_GTC = 0
+    ORDER_FILLING_FOK, ORDER_FILLING_IOC, ORDER_FILLING_RETURN = 0, 1, 2
+    SYMBOL_FILLING_FOK, SYMBOL_FILLING_IOC = 1, 2
+    SYMBOL_TRADE_MODE_DISABLED, SYMBOL_TRADE_MODE_LONGONLY = 0, 1
+    SYMBOL_TRADE_MODE_SHORTONLY, SYMBOL_TRADE_MODE_CLOSEONLY, SYMBOL_TRADE_MODE_FULL = 2, 3, 4
+    DEAL_TYPE_BUY, DEAL_TYPE_SELL = 0, 1
+    DEAL_ENTRY_IN, DEAL_ENTRY_OUT = 0, 1
+    DEAL_REASON_CLIENT, DEAL_REASON_EXPERT, DEAL_REASON_SL, DEAL_REASON_TP = 0, 3, 4, 5
+    TRADE_RETCODE_REQUOTE = 10004
+    TRADE_RETCODE_REJECT = 10006
+    TRADE_RETCODE_DONE = 10009
+    TRADE_RETCODE_INVALID = 10013
+    TRADE_RETCODE_INVALID_VOLUME = 10014
+    TRADE_RETCODE_INVALID_STOPS = 10016
+    TRADE_RETCODE_TRADE_DISABLED = 10017
+    TRADE_RETCODE_MARKET_CLOSED = 10018
+    TRADE_RETCODE_NO_MONEY = 10019
+    TRADE_RETCODE_PRICE_CHANGED = 10020
+    TRADE_RETCODE_PRICE_OFF = 10021
+    TRADE_RETCODE_POSITION_CLOSED = 10036
+    TRADE_RETCODE_INVALID_FILL = 10030
+    RES_S_OK, RES_E_NOT_FOUND, RES_E_INVALID_PARAMS = 1, -4, -2
+
+    def __init__(self, data=None, balance=10000.0, leverage=100, specs=None, ticks=None, currency="USD",
+                 synthetic=False, seed=0, speed=None, start=None, history_days=30, future_days=30):
+        """
+        data:      {símbolo: (velas, timeframe_mt5)}
+        specs:     {símbolo: {...}} para sobreescribir default_symbol_spec
+        ticks:     {símbolo: array TICKS_DTYPE} opcional (si no, 4 ticks sintéticos por vela)
+        synthetic: símbolos desconocidos → serie M1 sintética (history_days antes de
+                   `start` y future_days después), creada la primera vez que se piden
+        speed:     None = reloj manual; N = tiempo real × N desde `start`
+        """
+        self.specs = specs or {}
+        ticks = ticks or {}
+        self.series = {}
+        for sym, (bars, tf) in (data or {}).items():
+            spec = {**default_symbol_spec(sym), **self.specs.get(sym, {})}
+            self.series[sym] = _SymbolSeries(sym, bars, tf, spec, ticks.get(sym))
+
+        self.synthetic = synthetic
+        self.seed = seed
+        self.history_days = history_days
+        self.future_days = future_days
+
+        self.currency = currency
+        self.leverage = leverage
+        self.balance = float(balance)
+        self.initial_balance = float(balance)
+        self.now_msc = 0
+        self.positions = {}     # ticket → dict
+        self.deals = []         # TradeDeal
+        self.selected = set()
+        self._next_ticket = 1000000
+        self._last_error = (self.RES_S_OK, "Success")
+        self._lock = threading.RLock()   # bot + hilo de Telegram en modo tiempo real
+
+        self.speed = speed
+        if start is None and speed is not None:
+            start = self._default_start()
+        self.start = _to_epoch(start)
+        if self.start is not None:
+            self.advance_to(self.start * 1000)
+        self._wall0 = time.monotonic()
+
+    @classmethod
+    def from_env(cls):
+        """Terminal configurado por variables MT5_SIM_* (ver cabecera del módulo)."""
+        data_dir = os.getenv("MT5_SIM_DATA")
+        data = load_data_dir(data_dir) if data_dir else {}
+        terminal = cls(data,
+                       balance=float(os.getenv("MT5_SIM_BALANCE", "10000")),
+                       synthetic=not data,
+                       seed=int(os.getenv("MT5_SIM_SEED", "0")),
+                       speed=float(os.getenv("MT5_SIM_SPEED", "1")))
+        logger.info("Terminal simulado: %s, reloj x%s desde %s",
+                    f"datos de {data_dir}" if data else "cotizaciones sintéticas",
+                    terminal.speed, datetime.fromtimestamp(terminal.start, timezone.utc))
+        return terminal
+
+    def _default_start(self):
+        """Con datos: tras unos días de historia (para las 200 velas de los bots). Sin datos: ahora."""
+        if not self.series:
+            return int(time.time()) // 60 * 60
+        first = min(int(s.ev_time[0]) for s in self.series.values() if len(s.ev_time)) // 1000
+        return first + 10 * 86400
+
+    def add_synthetic(self, symbol, timeframe=1):
+        """Crea la serie sintética de `symbol` alrededor del reloj actual."""
+        spec = {**default_symbol_spec(symbol), **self.specs.get(symbol, {})}
+        center = self.now() or int(time.time())
+        bars = synthetic_bars(symbol, center - self.history_days * 86400,
+                              center + self.future_days * 86400, timeframe, self.seed, spec=spec)
+        s = _SymbolSeries(symbol, bars, timeframe, spec)
+        s.cursor = s.stop_cursor = int(np.searchsorted(s.ev_time, self.now_msc, side="right")) - 1
+        self.series[symbol] = s
+        return s
+
+    # ---------- reloj ----------
+    def event_times(self, start=None, end=None):
+        """Instantes (ms) únicos de todos los eventos, en orden."""
+        times = np.unique(np.concatenate([s.ev_time for s in self.series.values()]))
+        if start is not None:
+            times = times[times >= _to_epoch(start) * 1000]
+        if end is not None:
+            times = times[times <= _to_epoch(end) * 1000]
+        return times
+
+    def advance_to(self, t_msc):
+        """Avanza el reloj y ejecuta los SL/TP que se tocaron en el camino."""
+        with self._lock:
+            self.now_msc = int(t_msc)
+            for s in self.series.values():
+                new = int(np.searchsorted(s.ev_time, self.now_msc, side="right")) - 1
+                if new != s.cursor:
+                    s.cursor = new
+                    if self.positions:
+                        self._check_stops(s)
+                    s.stop_cursor = new
+
+    def now(self):
+        return self.now_msc // 1000
+
+    def step(self):
+        """Avanza al siguiente evento de cualquier símbolo. False si no quedan."""
+        upcoming = [int(s.ev_time[s.cursor + 1]) for s in self.series.values() if s.cursor + 1 < len(s.ev_time)]
+        if not upcoming:
+            return False
+        self.advance_to(min(upcoming))
+        return True
+
+    def _sync(self):
+        """En modo tiempo real, lleva el reloj simulado al reloj de pared × speed."""
+        if self.speed is not None:
+            elapsed = (time.monotonic() - self._wall0) * self.speed
+            target = self.start * 1000 + int(elapsed * 1000)
+            if target > self.now_msc:
+                self.advance_to(target)
+
+    def _check_stops(self, s):
+        tickets = [t for t, p in self.positions.items() if p["symbol"] == s.name and (p["sl"] or p["tp"])]
+        if not tickets:
+            return
+        a, b = s.stop_cursor + 1, s.cursor + 1
+        if a >= b:
+            return
+        bids, asks, gaps = s.ev_bid[a:b], s.ev_ask[a:b], s.ev_gap[a:b]
+        for ticket in tickets:
+            p = self.positions[ticket]
+            is_buy = p["type"] == self.POSITION_TYPE_BUY
+            px = bids if is_buy else asks
+            sl, tp = p["sl"], p["tp"]
+            if is_buy:
+                hit_sl = px <= sl if sl else np.zeros(len(px), bool)
+                hit_tp = px >= tp if tp else np.zeros(len(px), bool)
+            else:
+                hit_sl = px >= sl if sl else np.zeros(len(px), bool)
+                hit_tp = px <= tp if tp else np.zeros(len(px), bool)
+            hits = np.flatnonzero(hit_sl | hit_tp)
+            if not len(hits):
+                continue
+            i = hits[0]
+            by_sl = bool(hit_sl[i])
+            if not by_sl and sl and s.synthetic_path and not gaps[i] and self._sl_in_bar(s, p, a + i):
+                by_sl = True                    # SL y TP en la misma vela → el SL primero
+            level = sl if by_sl else tp
+            # con gap (o ticks reales) se llena al precio del tick, si no al nivel
+            price = float(px[i]) if gaps[i] else level
+            reason = self.DEAL_REASON_SL if by_sl else self.DEAL_REASON_TP
+            comment = f"[{'sl' if by_sl else 'tp'} {level:.{s.spec['digits']}f}]"
+            self._close(ticket, p["volume"], price, reason, comment, int(s.ev_time[a + i]))
+
+    def _sl_in_bar(self, s, p, k):
+        """¿El SL de `p` también se toca en la vela del evento k (desde que se
+        abrió)? Con 4 ticks inventados por vela el orden entre SL y TP no dice
+        nada, así que se mira la vela entera, también lo que aún no se vio."""
+        bar = s.ev_bar[k]
+        lo = int(np.searchsorted(s.ev_bar, bar, side="left"))
+        hi = int(np.searchsorted(s.ev_bar, bar, side="right"))
+        after = s.ev_time[lo:hi] >= p["time_msc"]
+        if p["type"] == self.POSITION_TYPE_BUY:
+            hit = s.ev_bid[lo:hi] <= p["sl"]
+        else:
+            hit = s.ev_ask[lo:hi] >= p["sl"]
+        return bool((hit & after).any())
+
+    # ---------- helpers ----------
+    def _series(self, symbol):
+        self._sync()
+        s = self.series.get(symbol)
+        if s is None and self.synthetic and symbol:
+            s = self.add_synthetic(symbol)
+        if s is None:
+            self._last_error = (self.RES_E_NOT_FOUND, f"Unknown symbol {symbol}")
+        return s
+
+    def _quote(self, s):
+        if s.cursor < 0:
+            return None, None
+        return float(s.ev_bid[s.cursor]), float(s.ev_ask[s.cursor])
+
+    def _profit(self, s, ptype, volume, price_open, price_close):
+        diff = (price_close - price_open) if ptype == self.POSITION_TYPE_BUY else (price_open - price_close)
+        value = diff * volume * s.spec["contract_size"]
+        if s.spec["currency_profit"] != self.currency:
+            if s.spec["currency_base"] == self.currency and price_close:
+                value /= price_close     # USDJPY, USDCAD...
+        return round(value, 2)
+
+    def _result(self, retcode, request, comment, price=0.0, order=0, deal=0, volume=0.0, s=None):
+        bid, ask = self._quote(s) if s is not None else (0.0, 0.0)
+        return OrderSendResult(retcode, deal, order, volume, price, bid or 0.0, ask or 0.0,
+                               comment, 0, 0, request)
+
+    def _new_ticket(self):
+        self._next_ticket += 1
+        return self._next_ticket
+
+    def _add_deal(self, s, deal_type, entry, magic, position_id, reason, volume, price, profit, comment, t_msc):
+        ticket = self._new_ticket()
+        self.deals.append(TradeDeal(ticket, ticket, t_msc // 1000, t_msc, deal_type, entry, magic,
+                                    position_id, reason, volume, price, 0.0, 0.0, profit, 0.0,
+                                    s.name, comment, ""))
+        return ticket
+
+    def _close(self, ticket, volume, price, reason, comment, t_msc=None):
+        p = self.positions[ticket]
+        s = self.series[p["symbol"]]
+        t_msc = self.now_msc if t_msc is None else t_msc
+        volume = min(volume, p["volume"])
+        profit = self._profit(s, p["type"], volume, p["price_open"], price)
+        self.balance = round(self.balance + profit, 2)
+        deal_type = self.DEAL_TYPE_SELL if p["type"] == self.POSITION_TYPE_BUY else self.DEAL_TYPE_BUY
+        deal = self._add_deal(s, deal_type, self.DEAL_ENTRY_OUT, p["magic"], ticket, reason,
+                              volume, price, profit, comment, t_msc)
+        p["volume"] = round(p["volume"] - volume, 8)
+        if p["volume"] <= 0:
+            del self.positions[ticket]
+        return deal
+
+    def _position_tuple(self, p):
+        s = self.series[p["symbol"]]
+        bid, ask = self._quote(s)
+        current = bid if p["type"] == self.POSITION_TYPE_BUY else ask
+        profit = self._profit(s, p["type"], p["volume"], p["price_open"], current)
+        return TradePosition(p["ticket"], p["time_msc"] // 1000, p["time_msc"], p["time_msc"] // 1000,
+                             p["time_msc"], p["type"], p["magic"], p["ticket"], 3, p["volume"],
+                             p["price_open"], p["sl"], p["tp"], current, 0.0, profit, p["symbol"],
+                             p["comment"], "")
+
+    def _floating(self):
+        return round(sum(self._position_tuple(p).profit for p in self.positions.values()), 2)
+
+    # ---------- API MetaTrader5 ----------
+    def initialize(self, *args, **kwargs):
+        return True
+
+    def login(self, *args, **kwargs):
+        return True
+
+    def shutdown(self):
+        return None
+
+    def last_error(self):
+        return self._last_error
+
+    def version(self):
+        return (500, 0, "sim")
+
+    def terminal_info(self):
+        return TerminalInfo(True, True, "SimTerminal", "utils.sim_terminal", "")
+
+    def account_info(self):
+        self._sync()
+        with self._lock:
+            profit = self._floating()
+            margin = self._margin_used()
+        equity = round(self.balance + profit, 2)
+        return AccountInfo(0, self.leverage, self.balance, 0.0, profit, equity, margin,
+                           round(equity - margin, 2), round(equity / margin * 100, 2) if margin else 0.0,
+                           self.currency, "Sim", "Sim", True)
+
+    def _margin_used(self):
+        total = 0.0
+        for p in self.positions.values():
+            s = self.series[p["symbol"]]
+            total += self._margin(s, p["volume"], p["price_open"])
+        return round(total, 2)
+
+    def _margin(self, s, volume, price):
+        notional = volume * s.spec["contract_size"]
+        if s.spec["currency_base"] != self.currency:
+            notional *= price
+        return notional / self.leverage
+
+    def symbols_total(self):
+        return len(self.series)
+
+    def symbols_get(self, group=None):
+        """Como MT5: group = patrones separados por comas, '*' comodín y '!' excluye."""
+        names = list(self.series)
+        if group:
+            selected = []
+            for name in names:
+                keep = False
+                for pattern in (g.strip() for g in group.split(",") if g.strip()):
+                    if pattern.startswith("!"):
+                        if fnmatch.fnmatchcase(name, pattern[1:]):
+                            keep = False
+                    elif fnmatch.fnmatchcase(name, pattern):
+                        keep = True
+                if keep:
+                    selected.append(name)
+            names = selected
+        return tuple(self.symbol_info(name) for name in names)
+
+    def symbol_select(self, symbol, enable=True):
+        if self._series(symbol) is None:
+            return False
+        if enable:
+            self.selected.add(symbol)
+        else:
+            self.selected.discard(symbol)
+        return True
+
+    def symbol_info(self, symbol):
+        s = self._series(symbol)
+        if s is None:
+            return None
+        sp = s.spec
+        bid, ask = self._quote(s)
+        spread = int(round((ask - bid) / sp["point"])) if bid is not None else sp["spread_points"]
+        tick_value = sp["contract_size"] * sp["point"]
+        if sp["currency_profit"] != self.currency and sp["currency_base"] == self.currency and bid:
+            tick_value /= bid
+        return SymbolInfo(symbol, symbol in self.selected, symbol in self.selected, sp["trade_mode"],
+                          sp["digits"], sp["point"], spread, tick_value, sp["point"],
+                          sp["contract_size"], sp["volume_min"], sp["volume_max"], sp["volume_step"],
+                          sp["filling_mode"], sp["stops_level"], sp["currency_base"],
+                          sp["currency_profit"], sp["currency_base"], bid or 0.0, ask or 0.0, self.now())
+
+    def symbol_info_tick(self, symbol):
+        s = self._series(symbol)
+        if s is None or s.cursor < 0:
+            return None
+        k = s.cursor
+        t_msc = int(s.ev_time[k])
+        return Tick(t_msc // 1000, float(s.ev_bid[k]), float(s.ev_ask[k]), 0.0, 0, t_msc, 6, 0.0)
+
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        s = self._series(symbol)
+        if s is None:
+            return None
+        rates, cur, derived = s.rates_for(timeframe)
+        if rates is None:
+            self._last_error = (self.RES_E_INVALID_PARAMS, "Invalid timeframe or no data")
+            return None
+        end = cur - int(start_pos) + 1
+        if end <= 0:
+            return None
+        out = rates[max(0, end - int(count)):end].copy()
+        if start_pos == 0:
+            s.forming_row(out[-1], derived)
+        return out
+
+    def copy_rates_from(self, symbol, timeframe, date_from, count):
+        s = self._series(symbol)
+        if s is None:
+            return None
+        rates, cur, derived = s.rates_for(timeframe)
+        if rates is None:
+            return None
+        end = min(int(np.searchsorted(rates["time"], _to_epoch(date_from), side="right")), cur + 1)
+        if end <= 0:
+            return None
+        out = rates[max(0, end - int(count)):end].copy()
+        if end == cur + 1:
+            s.forming_row(out[-1], derived)
+        return out
+
+    def copy_rates_range(self, symbol, timeframe, date_from, date_to):
+        s = self._series(symbol)
+        if s is None:
+            return None
+        rates, cur, derived = s.rates_for(timeframe)
+        if rates is None:
+            return None
+        begin = int(np.searchsorted(rates["time"], _to_epoch(date_from), side="left"))
+        end = min(int(np.searchsorted(rates["time"], _to_epoch(date_to), side="right")), cur + 1)
+        out = rates[begin:max(begin, end)].copy()
+        if len(out) and end == cur + 1:
+            s.forming_row(out[-1], derived)
+        return out
+
+    def positions_total(self):
+        self._sync()
+        return len(self.positions)
+
+    def positions_get(self, symbol=None, group=None, ticket=None):
+        self._sync()
+        out = []
+        for p in list(self.positions.values()):
+            if symbol is not None and p["symbol"] != symbol:
+                continue
+            if ticket is not None and p["ticket"] != ticket:
+                continue
+            out.append(self._position_tuple(p))
+        return tuple(out)
+
+    def history_deals_get(self, date_from=None, date_to=None, group=None, ticket=None, position=None):
+        self._sync()
+        deals = self.deals
+        if ticket is not None:
+            deals = [d for d in deals if d.ticket == ticket]
+        if position is not None:
+            deals = [d for d in deals if d.position_id == position]
+        if date_from is not None:
+            deals = [d for d in deals if d.time >= _to_epoch(date_from)]
+        if date_to is not None:
+            deals = [d for d in deals if d.time <= _to_epoch(date_to)]
+        return tuple(deals)
+
+    def order_send(self, request):
+        with self._lock:
+            return self._order_send(request)
+
+    def _order_send(self, request):
+        action = request.get("action")
+        symbol = request.get("symbol")
+        s = self._series(symbol)
+        if s is None:
+            return self._result(self.TRADE_RETCODE_INVALID, request, "Unknown symbol")
+
+        if action == self.TRADE_ACTION_SLTP:
+            p = self.positions.get(request.get("position"))
+            if p is None:
+                return self._result(self.TRADE_RETCODE_POSITION_CLOSED, request, "Position not found", s=s)
+            p["sl"], p["tp"] = float(request.get("sl") or 0.0), float(request.get("tp") or 0.0)
+            return self._result(self.TRADE_RETCODE_DONE, request, "Request executed", s=s)
+
+        if action != self.TRADE_ACTION_DEAL:
+            return self._result(self.TRADE_RETCODE_INVALID, request, "Unsupported action", s=s)
+
+        bid, ask = self._quote(s)
+        if bid is None:
+            return self._result(self.TRADE_RETCODE_MARKET_CLOSED, request, "Market closed", s=s)
+        sp = s.spec
+        if sp["trade_mode"] == self.SYMBOL_TRADE_MODE_DISABLED:
+            return self._result(self.TRADE_RETCODE_TRADE_DISABLED, request, "Trade disabled", s=s)
+
+        filling = request.get("type_filling", self.ORDER_FILLING_FOK)
+        allowed = {self.ORDER_FILLING_FOK: self.SYMBOL_FILLING_FOK,
+                   self.ORDER_FILLING_IOC: self.SYMBOL_FILLING_IOC}.get(filling)
+        if allowed is not None and not sp["filling_mode"] & allowed:
+            return self._result(self.TRADE_RETCODE_INVALID_FILL, request, "Unsupported filling mode", s=s)
+
+        otype = request.get("type")
+        if otype not in (self.ORDER_TYPE_BUY, self.ORDER_TYPE_SELL):
+            return self._result(self.TRADE_RETCODE_INVALID, request, "Invalid order type", s=s)
+        market = ask if otype == self.ORDER_TYPE_BUY else bid
+
+        volume = float(request.get("volume", 0.0))
+        steps = round(volume / sp["volume_step"], 6)
+        if volume < sp["volume_min"] or volume > sp["volume_max"] or abs(steps - round(steps)) > 1e-6:
+            return self._result(self.TRADE_RETCODE_INVALID_VOLUME, request, "Invalid volume", s=s)
+
+        price = float(request.get("price") or market)
+        deviation = int(request.get("deviation", 0))
+        if abs(price - market) > deviation * sp["point"] + 1e-12:
+            return self._result(self.TRADE_RETCODE_REQUOTE, request, "Requote", s=s)
+
+        magic = int(request.get("magic", 0))
+        comment = request.get("comment", "")
+        deal_type = self.DEAL_TYPE_BUY if otype == self.ORDER_TYPE_BUY else self.DEAL_TYPE_SELL
+
+        # ---- cierre (request con "position") ----
+        ticket = request.get("position")
+        if ticket:
+            p = self.positions.get(ticket)
+            if p is None:
+                return self._result(self.TRADE_RETCODE_POSITION_CLOSED, request, "Position not found", s=s)
+            if p["type"] == otype:
+                return self._result(self.TRADE_RETCODE_INVALID, request, "Wrong close direction", s=s)
+            deal = self._close(ticket, volume, market, self.DEAL_REASON_EXPERT, comment)
+            return self._result(self.TRADE_RETCODE_DONE, request, "Request executed",
+                                price=market, order=self._next_ticket, deal=deal, volume=volume, s=s)
+
+        # ---- apertura ----
+        sl, tp = float(request.get("sl") or 0.0), float(request.get("tp") or 0.0)
+        if otype == self.ORDER_TYPE_BUY:
+            bad_stops = (sl and sl >= bid) or (tp and tp <= ask)
+        else:
+            bad_stops = (sl and sl <= ask) or (tp and tp >= bid)
+        if bad_stops:
+            return self._result(self.TRADE_RETCODE_INVALID_STOPS, request, "Invalid stops", s=s)
+
+        free = self.balance + self._floating() - self._margin_used()
+        if self._margin(s, volume, market) > free:
+            return self._result(self.TRADE_RETCODE_NO_MONEY, request, "No money", s=s)
+
+        ticket = self._new_ticket()
+        self.positions[ticket] = {
+            "ticket": ticket, "symbol": symbol, "type": otype, "volume": volume,
+            "price_open": market, "sl": sl, "tp": tp, "magic": magic,
+            "comment": comment, "time_msc": self.now_msc,
+        }
+        deal = self._add_deal(s, deal_type, self.DEAL_ENTRY_IN, magic, ticket, self.DEAL_REASON_EXPERT,
+                              volume, market, 0.0, comment, self.now_msc)
+        return self._result(self.TRADE_RETCODE_DONE, request, "Request executed",
+                            price=market, order=ticket, deal=deal, volume=volume, s=s)
+
+    def close_all(self, comment="Fin simulación"):
+        """Cierra todo a mercado (al final de la corrida)."""
+        for ticket in list(self.positions):
+            p = self.positions[ticket]
+            bid, ask = self._quote(self.series[p["symbol"]])
+            price = bid if p["type"] == self.POSITION_TYPE_BUY else ask
+            self._close(ticket, p["volume"], price, self.DEAL_REASON_CLIENT, comment)
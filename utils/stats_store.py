@@ -0,0 +1,230 @@
+# utils/stats_store.py
+# Estadísticas de un bot sin reescribir stats.json en cada cierre.
+#
+#   <nombre>.json           snapshot compacto: contadores + seq del último trade incluido
+#   <nombre>.journal.jsonl  un registro por trade (append-only) desde ese snapshot
+#
+# En memoria solo hay contadores (total, ganadoras, profit, por símbolo), así
+# que registrar un trade es O(1). El journal se escribe en cada trade pero el
+# fsync se hace por lotes (cada N trades o T segundos); cada `compact_every`
+# trades el journal se pliega en el snapshot y se vacía.
+#
+# Migra solo el formato anterior ({"trades": [...], "win_rate": ...}); antes de
+# reescribirlo lo copia a <nombre>.json.v1.bak. Un snapshot ilegible también se
+# copia ahí y nunca se compacta encima: los trades nuevos quedan en el journal.
+import os
+import json
+import time
+import atexit
+import shutil
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger("stats_store")
+
+
+def _empty_counters():
+    return {"total": 0, "wins": 0, "profit": 0.0, "gross_win": 0.0, "gross_loss": 0.0}
+
+
+class StatsStore:
+    """Contadores acumulados de trades cerrados respaldados por un journal.
+
+    path=None → solo memoria (backtests)."""
+
+    def __init__(self, path=None, fsync_every=20, fsync_seconds=5.0, compact_every=1000):
+        self.path = path
+        self.journal_path = os.path.splitext(path)[0] + ".journal.jsonl" if path else None
+        self.fsync_every = fsync_every
+        self.fsync_seconds = fsync_seconds
+        self.compact_every = compact_every
+
+        self.seq = 0                 # último trade registrado
+        self.totals = _empty_counters()
+        self.by_symbol = {}          # símbolo → contadores
+        self.by_reason = {}          # "Take Profit" / "Stop Loss"... → nº de trades
+        self.last_update = None
+
+        self._journal = None         # archivo abierto en append (perezoso)
+        self._journal_records = 0    # registros en el journal desde el snapshot
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+        self._keep_snapshot = False  # snapshot ilegible (o sin respaldo): no se reescribe
+        if path:
+            self._load()
+            atexit.register(self.close)
+
+    # ---------- lectura ----------
+    @property
+    def total_trades(self):
+        return self.totals["total"]
+
+    @property
+    def total_profit(self):
+        return round(self.totals["profit"], 2)
+
+    @property
+    def win_rate(self):
+        total = self.totals["total"]
+        return round(self.totals["wins"] / total * 100, 2) if total else 0.0
+
+    def symbol_stats(self, symbol):
+        c = self.by_symbol.get(symbol) or _empty_counters()
+        return {"total": c["total"], "wins": c["wins"], "profit": round(c["profit"], 2),
+                "win_rate": round(c["wins"] / c["total"] * 100, 2) if c["total"] else 0.0}
+
+    def as_dict(self):
+        """Snapshot serializable (lo que va a disco y lo que se muestra)."""
+        return {
+            "version": 2, "seq": self.seq,
+            "win_rate": self.win_rate, "total_profit": self.total_profit,
+            "totals": dict(self.totals),
+            "by_symbol": {s: dict(c) for s, c in self.by_symbol.items()},
+            "by_reason": dict(self.by_reason),
+            "last_update": self.last_update,
+        }
+
+    # ---------- escritura ----------
+    def record(self, symbol, profit, reason="", when=None):
+        """Registra un trade cerrado: O(1) en memoria + una línea en el journal."""
+        when = when or datetime.now().isoformat()
+        with self._lock:
+            self.seq += 1
+            entry = {"seq": self.seq, "time": when, "symbol": symbol,
+                     "profit": float(profit), "reason": reason}
+            self._apply(entry)
+            if self.journal_path:
+                self._append(entry)
+                if self._journal_records >= self.compact_every:
+                    self._compact()
+        return entry
+
+    def _apply(self, entry):
+        profit = entry["profit"]
+        for c in (self.totals, self.by_symbol.setdefault(entry["symbol"] or "?", _empty_counters())):
+            c["total"] += 1
+            c["profit"] += profit
+            if profit > 0:
+                c["wins"] += 1
+                c["gross_win"] += profit
+            else:
+                c["gross_loss"] -= profit
+        reason = entry.get("reason") or "?"
+        self.by_reason[reason] = self.by_reason.get(reason, 0) + 1
+        self.last_update = entry["time"]
+
+    def _append(self, entry):
+        if self._journal is None:
+            os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._journal.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._journal.flush()                      # al SO en cada trade
+        self._journal_records += 1
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_seconds:
+            self._sync()
+
+    def _sync(self):
+        if self._journal is not None and self._unsynced:
+            os.fsync(self._journal.fileno())      # al disco por lotes
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._sync()
+
+    def compact(self):
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        """Pliega el journal en el snapshot (escritura atómica) y lo vacía."""
+        if not self.path or self._keep_snapshot:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.as_dict(), f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        # si se corta aquí, el journal viejo se relee y se ignora por seq
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        open(self.journal_path, "w", encoding="utf-8").close()
+        self._journal_records = 0
+        self._unsynced = 0
+
+    def close(self):
+        with self._lock:
+            if self._journal is not None or self._journal_records:
+                self._sync()
+                self._compact()
+
+    # ---------- arranque ----------
+    def _load(self):
+        t0 = time.perf_counter()
+        snapshot = None
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError) as e:
+                if os.path.getsize(self.path):     # vacío = nada que perder
+                    logger.error("No pude leer %s: %s. Arranco de cero sin reescribirlo "
+                                 "(los trades nuevos quedan en %s)", self.path, e, self.journal_path)
+                    self._backup()
+                    self._keep_snapshot = True
+
+        migrated = False
+        if snapshot and snapshot.get("version") == 2:
+            self.seq = int(snapshot.get("seq", 0))
+            self.totals.update(snapshot.get("totals", {}))
+            for sym, c in snapshot.get("by_symbol", {}).items():
+                self.by_symbol[sym] = {**_empty_counters(), **c}
+            self.by_reason.update(snapshot.get("by_reason", {}))
+            self.last_update = snapshot.get("last_update")
+        elif snapshot and isinstance(snapshot.get("trades"), list):
+            # formato anterior: lista completa de trades → contadores
+            for t in snapshot["trades"]:
+                self.seq += 1
+                self._apply({"seq": self.seq, "time": t.get("time") or snapshot.get("last_update"),
+                             "symbol": t.get("symbol"), "profit": float(t.get("profit", 0.0)),
+                             "reason": t.get("reason")})
+            migrated = self._backup()             # sin respaldo no se reescribe
+            self._keep_snapshot = not migrated
+
+        replayed = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue           # última línea a medio escribir
+                    if entry.get("seq", 0) <= self.seq:
+                        continue
+                    self.seq = entry["seq"]
+                    self._apply(entry)
+                    replayed += 1
+        self._journal_records = replayed
+
+        if migrated or replayed >= self.compact_every:
+            self._compact()
+        logger.info("Stats %s: %d trades (%d del journal) en %.1f ms", os.path.basename(self.path),
+                    self.total_trades, replayed, (time.perf_counter() - t0) * 1000)
+
+    def _backup(self):
+        """Copia el snapshot que no se puede conservar tal cual a <nombre>.json.v1.bak
+        (si ya hay una copia, se deja la primera)."""
+        backup = self.path + ".v1.bak"
+        try:
+            if not os.path.exists(backup):
+                shutil.copy2(self.path, backup)
+            return True
+        except OSError as e:
+            logger.error("No pude respaldar %s en %s: %s", self.path, backup, e)
+            return False
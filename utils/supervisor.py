@@ -0,0 +1,147 @@
+# utils/supervisor.py
+# Varios bots en UN proceso: una sola sesión MT5, un solo caché de velas/ticks
+# (SharedFeed) y un solo notificador/listener de Telegram (ya son únicos por
+# proceso). Cada bot corre en su hilo; si revienta, se registra, se avisa por
+# Telegram y se relanza con backoff, sin tocar a los demás. Un /stop del bot
+# (running=False) lo deja parado.
+#
+#   py -3.11 main.py mark2_ai mark3_ai
+#   py -3.11 main.py all
+import time
+import logging
+import importlib
+import threading
+
+from utils.mt5_connector import mt5_shutdown
+from utils.session import get_session
+from utils.feed_selector import SharedFeed
+from utils.telegram_notifier import notify_error
+from utils.metrics import start_exporters, stop_exporters
+from utils.settings_manager import get_settings
+
+logger = logging.getLogger("supervisor")
+
+# nombre → (módulo, clase, archivo de settings)
+BOTS = {
+    "mark2_ai": ("bots.mark2_ai", "Mark2AIPro", "settings_mark2.json"),
+    "mark3_ai": ("bots.mark3_ai", "Mark3Pro", "settings_mark3.json"),
+}
+
+
+class BotSupervisor:
+    """Lanza y vigila varios bots compartiendo sesión y feed."""
+
+    def __init__(self, bot_names, restart_delay=10, max_restart_delay=300, feed=None):
+        unknown = [name for name in bot_names if name not in BOTS]
+        if unknown:
+            raise ValueError(f"Bots no soportados: {unknown} (disponibles: {list(BOTS)})")
+        self.bot_names = list(dict.fromkeys(bot_names))
+        self._check_magics()
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.feed = feed or SharedFeed()
+        self.bots = {}               # nombre → instancia actual
+        self.restarts = {name: 0 for name in self.bot_names}
+        self.threads = {}
+        self.running = False
+        self._stop_event = threading.Event()
+
+    # ---------- ciclo de vida ----------
+    def start(self):
+        session = get_session().start()          # la sesión que reutilizan todos los bots
+        while not session.wait(15):              # reintenta sola, con backoff
+            logger.error("Sin conexión a MT5, sigo esperando")
+            if self._stop_event.is_set():
+                return
+        self.running = True
+        start_exporters("supervisor")            # antes que los bots: un solo /metrics para todos
+        for name in self.bot_names:
+            thread = threading.Thread(target=self._supervise, args=(name,), name=f"bot-{name}", daemon=True)
+            self.threads[name] = thread
+            thread.start()
+        logger.info("Supervisor iniciado con %s", ", ".join(self.bot_names))
+
+    def stop(self, timeout=15):
+        self.running = False
+        self._stop_event.set()
+        for bot in list(self.bots.values()):
+            bot.stop()
+        for thread in self.threads.values():
+            thread.join(timeout)
+        self.feed.stop()
+        stop_exporters()
+        logger.info("Supervisor detenido | feed %s", self.feed.stats())
+
+    def run(self):
+        """Bloquea hasta Ctrl+C o hasta que todos los bots se detengan solos."""
+        self.start()
+        try:
+            while self.running and any(t.is_alive() for t in self.threads.values()):
+                time.sleep(1)
+        except KeyboardInterrupt:
+            logger.info("Detenido por usuario")
+        finally:
+            self.stop()
+            mt5_shutdown()
+
+    def _check_magics(self):
+        """Con el mismo MAGIC_NUMBER cada bot tomaría como suyas las posiciones
+        del otro (cierres, MAX_POSITIONS, reportes). Lo mismo si uno usa un
+        magic de antes (LEGACY_MAGICS) que otro adopta, o si dos adoptan el
+        mismo magic de antes en pares comunes."""
+        seen, legacy = {}, {}        # magic → bot; magic de antes → [(bot, pares)]
+        for name in self.bot_names:
+            module_name, _, settings_file = BOTS[name]
+            settings = get_settings(settings_file)
+            module = importlib.import_module(module_name)
+            magic = int(settings.get("MAGIC_NUMBER") or module.MAGIC_NUMBER)
+            if magic in seen:
+                raise ValueError(f"{seen[magic]} y {name} usan el mismo MAGIC_NUMBER ({magic}): cada bot necesita el suyo")
+            seen[magic] = name
+            pairs = set(settings.get("PAIRS", []))
+            for old in settings.get("LEGACY_MAGICS", getattr(module, "LEGACY_MAGICS", ())):
+                for other, other_pairs in legacy.get(int(old), []):
+                    common = pairs & other_pairs
+                    if common:
+                        raise ValueError(f"{other} y {name} adoptan el mismo magic de antes ({old}) en "
+                                         f"{sorted(common)}: LEGACY_MAGICS solo en uno de los dos")
+                legacy.setdefault(int(old), []).append((name, pairs))
+        shared = [f"{name} ({magic})" for magic, name in seen.items() if magic in legacy]
+        if shared:
+            raise ValueError(f"MAGIC_NUMBER de antes (LEGACY_MAGICS) en uso: {', '.join(shared)}: cada bot necesita uno propio")
+
+    # ---------- un bot ----------
+    def _create(self, name):
+        module_name, class_name, _ = BOTS[name]
+        module = importlib.import_module(module_name)
+        return getattr(module, class_name)(feed=self.feed)
+
+    def _supervise(self, name):
+        delay = self.restart_delay
+        while self.running:
+            started = time.monotonic()
+            try:
+                bot = self._create(name)
+                self.bots[name] = bot
+                entry = getattr(bot, "run_forever", None) or bot.run
+                entry()
+                if not bot.running:
+                    logger.info("%s detenido", name)
+                    return
+                error = "terminó sin que nadie lo detuviera"
+            except Exception as e:
+                error = repr(e)
+                logger.exception("%s se cayó", name)
+            if not self.running:
+                return
+            if time.monotonic() - started > self.max_restart_delay:
+                delay = self.restart_delay       # estuvo sano un buen rato → backoff desde cero
+            self.restarts[name] += 1
+            notify_error(f"{name} se cayó ({error}); reinicio #{self.restarts[name]} en {delay}s")
+            if self._stop_event.wait(delay):
+                return
+            delay = min(delay * 2, self.max_restart_delay)
+
+    def status(self):
+        return {name: {"alive": self.threads[name].is_alive() if name in self.threads else False,
+                       "restarts": self.restarts[name]} for name in self.bot_names}
@@ -0,0 +1,312 @@
+# utils/sweep.py
+# Barrido de parámetros de Mark2/Mark3 (grid o aleatorio) en todos los núcleos,
+# con las reglas vectorizadas de utils.signals en lugar del bot completo.
+#
+# Las velas se preparan UNA vez (timeframe del bot, armado desde la serie
+# base) y se escriben como .npy en una carpeta temporal; cada proceso del pool
+# las abre con mmap al arrancar, así que ninguna tarea lleva precios en el
+# pickle (solo el dict de parámetros) y el SO comparte las páginas.
+#
+#   py -3.11 -m utils.sweep mark3_ai --data historico/ --grid EMA_FAST=10,20,30 \
+#       --grid EMA_SLOW=50,100 --grid ATR_MULT_SL=1:2:0.25 --grid ATR_MULT_TP=2:4:0.5 --out sweep.csv
+#   py -3.11 -m utils.sweep mark2_ai --data historico/ --grid SUBIDA_PIPS=1:4:0.2 \
+#       --grid STOP_LOSS_PIPS=30,35,40 --random 50 --seed 7
+#   py -3.11 -m utils.sweep export sweep.csv 1 bots/settings_mark3_tuned.json
+#
+# Tabla: ranking por profit (o --sort), con trades, win rate, drawdown y
+# profit factor; `export` vuelca la fila N sobre el settings_*.json del bot.
+# Mismo modelo que utils.signals: lote fijo 0.01, una posición por símbolo,
+# spread fijo por símbolo (mediana del histórico).
+import os
+import sys
+import csv
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import itertools
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Como en el backtester: el barrido nunca necesita el terminal real
+os.environ.setdefault("MT5_BACKEND", "sim")
+
+from utils import signals as sg  # noqa: E402
+from utils.candle_cache import TIMEFRAME_SECONDS, aggregate  # noqa: E402
+from utils.sim_terminal import _to_epoch, default_symbol_spec, load_data_dir  # noqa: E402
+from utils.supervisor import BOTS  # noqa: E402
+
+logger = logging.getLogger("sweep")
+
+# clave del settings → argumento de la regla en utils.signals
+PARAMS = {
+    "mark2_ai": {"SUBIDA_PIPS": "pips", "STOP_LOSS_PIPS": "sl_pips", "STOP_WIN_PIPS": "tp_pips"},
+    "mark3_ai": {"EMA_FAST": "ema_fast", "EMA_SLOW": "ema_slow",
+                 "ATR_MULT_SL": "atr_mult_sl", "ATR_MULT_TP": "atr_mult_tp"},
+}
+INT_PARAMS = ("EMA_FAST", "EMA_SLOW")
+METRICS = ("trades", "win_rate", "profit", "max_drawdown", "profit_factor", "avg_points")
+ASCENDING = ("max_drawdown",)           # el resto se ordena de mayor a menor
+COLUMNS = ("time", "open", "high", "low", "close")
+
+
+# ======================================================================
+# DATOS COMPARTIDOS (mmap)
+# ======================================================================
+def prepare_data(data, timeframe_minutes, out_dir, start=None, end=None):
+    """{símbolo: (velas_base, tf)} → .npy (5 × velas: time, o, h, l, c) en out_dir.
+    Devuelve {símbolo: {"path", "point", "spread", "contract_size"}}."""
+    tf_seconds = int(timeframe_minutes) * 60
+    start, end = _to_epoch(start), _to_epoch(end)
+    meta = {}
+    for symbol, (bars, base_tf) in sorted(data.items()):
+        base_seconds = TIMEFRAME_SECONDS[base_tf]
+        if tf_seconds % base_seconds:
+            raise ValueError(f"{symbol}: no se arma M{timeframe_minutes} con velas de {base_seconds // 60} min")
+        if start is not None:
+            bars = bars[bars["time"] >= start]
+        if end is not None:
+            bars = bars[bars["time"] < end]
+        if tf_seconds != base_seconds:
+            bars = aggregate(bars, tf_seconds)
+        if len(bars) < 2:
+            logger.warning("%s: sin velas suficientes, se omite", symbol)
+            continue
+        path = os.path.join(out_dir, f"{symbol}.npy")
+        np.save(path, np.vstack([bars[c].astype(np.float64) for c in COLUMNS]))
+        spec = default_symbol_spec(symbol)
+        spreads = bars["spread"][bars["spread"] > 0]
+        meta[symbol] = {"path": path, "point": spec["point"], "contract_size": spec["contract_size"],
+                        "spread": float(np.median(spreads)) if len(spreads) else float(spec["spread_points"])}
+    return meta
+
+
+_worker_data = {}
+
+
+def _init_worker(meta):
+    """Una vez por proceso: abre las velas con mmap (sin copiarlas)."""
+    _worker_data.clear()
+    for symbol, info in meta.items():
+        _worker_data[symbol] = (np.load(info["path"], mmap_mode="r"), info)
+
+
+# ======================================================================
+# EVALUACIÓN DE UNA COMBINACIÓN
+# ======================================================================
+def evaluate(bot_name, params):
+    """params (claves del settings) → (params, métricas) sobre todos los símbolos."""
+    mapping = PARAMS[bot_name]
+    kwargs = {mapping[k]: v for k, v in params.items()}
+    trades, exit_times = [], []
+    for symbol, (bars, info) in _worker_data.items():
+        t, o, h, l, c = bars
+        if bot_name == "mark2_ai":
+            signals = sg.mark2_signals(o, h, l, info["point"], spread=info["spread"], **kwargs)
+        else:
+            signals = sg.mark3_signals(o, h, l, c, info["point"], spread=info["spread"], **kwargs)
+        result = sg.simulate(signals, o, h, l, c, info["point"], spread=info["spread"],
+                             contract_size=info["contract_size"])
+        trades.append(result)
+        exit_times.append(t[result["exit_bar"]])
+    if not trades:
+        return params, sg.summary(np.zeros(0, dtype=sg.TRADE_DTYPE))
+    merged = np.concatenate(trades)
+    merged = merged[np.argsort(np.concatenate(exit_times), kind="stable")]   # equity en orden de salida
+    return params, sg.summary(merged)
+
+
+def _evaluate_task(task):
+    return evaluate(*task)
+
+
+# ======================================================================
+# COMBINACIONES
+# ======================================================================
+def parse_values(key, raw):
+    """"10,20,30" o "inicio:fin:paso" (fin incluido) → lista de valores."""
+    cast = int if key in INT_PARAMS else float
+    if ":" in raw:
+        start, stop, step = (float(x) for x in raw.split(":"))
+        count = int(round((stop - start) / step)) + 1
+        return [cast(round(start + i * step, 10)) for i in range(count)]
+    return [cast(x) for x in raw.split(",") if x.strip()]
+
+
+def combinations(bot_name, grid, sample=None, seed=None):
+    """Producto del grid (o `sample` combinaciones al azar) como dicts.
+    Descarta EMA_FAST >= EMA_SLOW."""
+    unknown = [k for k in grid if k not in PARAMS[bot_name]]
+    if unknown:
+        raise ValueError(f"Parámetros no barribles para {bot_name}: {unknown} (hay: {list(PARAMS[bot_name])})")
+    keys = list(grid)
+    combos = [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+    combos = [c for c in combos if c.get("EMA_FAST", 0) < c.get("EMA_SLOW", float("inf"))]
+    if sample and sample < len(combos):
+        combos = random.Random(seed).sample(combos, sample)
+    return combos
+
+
+# ======================================================================
+# BARRIDO
+# ======================================================================
+def run_sweep(bot_name, data, grid, timeframe=None, workers=None, sample=None, seed=None,
+              start=None, end=None, base_settings=None):
+    """Evalúa las combinaciones en un pool de procesos → filas sin ordenar."""
+    settings = base_settings if base_settings is not None else _base_settings(bot_name)
+    timeframe = timeframe or int(settings.get("TIMEFRAME", 60))
+    fixed = {k: settings[k] for k in PARAMS[bot_name] if k in settings and k not in grid}
+    combos = [{**fixed, **c} for c in combinations(bot_name, grid, sample, seed)]
+    combos = [{k: c[k] for k in PARAMS[bot_name] if k in c} for c in combos]   # columnas en orden fijo
+    workers = max(1, int(workers or os.cpu_count() or 1))
+
+    tmp = tempfile.mkdtemp(prefix="sweep_")
+    try:
+        meta = prepare_data(data, timeframe, tmp, start, end)
+        if not meta:
+            raise ValueError("Sin velas para barrer")
+        logger.info("Barrido %s: %d combinaciones × %d símbolos (M%s) en %d procesos",
+                    bot_name, len(combos), len(meta), timeframe, workers)
+        t0 = time.perf_counter()
+        tasks = [(bot_name, c) for c in combos]
+        if workers == 1:
+            _init_worker(meta)
+            results = [_evaluate_task(task) for task in tasks]
+        else:
+            chunk = max(1, len(tasks) // (workers * 4))
+            with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(meta,)) as pool:
+                results = list(pool.map(_evaluate_task, tasks, chunksize=chunk))
+        logger.info("Barrido terminado en %.1fs", time.perf_counter() - t0)
+    finally:
+        _worker_data.clear()                 # suelta los mmap antes de borrar (Windows)
+        shutil.rmtree(tmp, ignore_errors=True)
+    return [{"bot": bot_name, **params, **stats} for params, stats in results]
+
+
+def rank(rows, sort="profit", min_trades=0):
+    """Filtra por trades mínimos, ordena y numera (rank 1 = mejor)."""
+    rows = [r for r in rows if r["trades"] >= min_trades]
+    rows.sort(key=lambda r: r[sort], reverse=sort not in ASCENDING)
+    return [{"rank": i, **r} for i, r in enumerate(rows, 1)]
+
+
+def format_table(rows, limit=20):
+    if not rows:
+        return "(sin resultados)"
+    keys = [k for k in rows[0] if k != "bot"]
+    lines = [" ".join(f"{k:>13s}" for k in keys)]
+    for row in rows[:limit]:
+        lines.append(" ".join(f"{row[k]:>13}" if not isinstance(row[k], float) else f"{row[k]:>13.4g}"
+                              for k in keys))
+    return "\n".join(lines)
+
+
+def to_csv(rows, path):
+    if not rows:
+        return
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+# ======================================================================
+# VUELTA A SETTINGS
+# ======================================================================
+def _settings_path(bot_name):
+    from utils.settings_manager import BASE_DIR
+    return os.path.join(BASE_DIR, BOTS[bot_name][2])
+
+
+def _base_settings(bot_name):
+    from utils.settings_manager import get_settings
+    return get_settings(BOTS[bot_name][2])
+
+
+def export_settings(csv_path, rank_number, out_path):
+    """Fila `rank_number` del CSV del barrido → settings_*.json del bot con esos
+    parámetros (el resto se conserva tal cual)."""
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    row = next((r for r in rows if int(r["rank"]) == int(rank_number)), None)
+    if row is None:
+        raise ValueError(f"No hay rank {rank_number} en {csv_path}")
+    bot_name = row["bot"]
+    settings = {}
+    source = _settings_path(bot_name)
+    if os.path.exists(source):
+        with open(source, encoding="utf-8") as f:
+            settings = json.load(f)
+    for key in PARAMS[bot_name]:
+        if row.get(key) not in (None, ""):
+            value = float(row[key])
+            settings[key] = int(value) if key in INT_PARAMS or value.is_integer() else value
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(settings, f, indent=2, ensure_ascii=False)
+    return out_path
+
+
+# ======================================================================
+# CLI
+# ======================================================================
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "export":
+        p = argparse.ArgumentParser(prog="sweep export")
+        p.add_argument("csv")
+        p.add_argument("rank", type=int)
+        p.add_argument("out")
+        a = p.parse_args(argv[1:])
+        print(export_settings(a.csv, a.rank, a.out))
+        return
+
+    p = argparse.ArgumentParser(prog="sweep", description="Barrido de parámetros de Mark2/Mark3")
+    p.add_argument("bot", choices=sorted(PARAMS))
+    p.add_argument("--data", required=True, help="carpeta con <SIMBOLO>_<TF>.csv|npy")
+    p.add_argument("--symbols", nargs="*")
+    p.add_argument("--from", dest="start")
+    p.add_argument("--to", dest="end")
+    p.add_argument("--timeframe", type=int, help="minutos (defecto: TIMEFRAME del settings)")
+    p.add_argument("--grid", action="append", default=[], metavar="CLAVE=v1,v2|ini:fin:paso")
+    p.add_argument("--random", type=int, help="N combinaciones al azar del grid")
+    p.add_argument("--seed", type=int)
+    p.add_argument("--workers", type=int, help="procesos (defecto: todos los núcleos)")
+    p.add_argument("--sort", default="profit", choices=METRICS)
+    p.add_argument("--min-trades", type=int, default=0)
+    p.add_argument("--top", type=int, default=20)
+    p.add_argument("--out", help="CSV con la tabla completa")
+    p.add_argument("--export", help="settings .json con la combinación rank 1")
+    a = p.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    grid = {}
+    for item in a.grid:
+        key, _, raw = item.partition("=")
+        grid[key.strip()] = parse_values(key.strip(), raw.strip())
+    data = load_data_dir(a.data, a.symbols)
+    if not data:
+        sys.exit(f"No hay datos en {a.data}")
+
+    rows = rank(run_sweep(a.bot, data, grid, a.timeframe, a.workers, a.random, a.seed, a.start, a.end),
+                a.sort, a.min_trades)
+    print(format_table(rows, a.top))
+    if a.out:
+        to_csv(rows, a.out)
+        if a.export:
+            print(export_settings(a.out, 1, a.export))
+    elif a.export and rows:
+        tmp = tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False)
+        tmp.close()
+        try:
+            to_csv(rows, tmp.name)
+            print(export_settings(tmp.name, 1, a.export))
+        finally:
+            os.remove(tmp.name)
+
+
+if __name__ == "__main__":
+    main()
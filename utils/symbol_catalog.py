@@ -0,0 +1,90 @@
+# utils/symbol_catalog.py
+# Catálogo de especificaciones de símbolos: se pide al broker UNA vez por
+# sesión (symbol_select + symbol_info) y se reutiliza en feed, señales y
+# ejecución. Se refresca al vencer el TTL o cuando alguien avisa de un
+# error (invalidate), p. ej. una orden rechazada por volumen o filling.
+import os
+import time
+import logging
+import threading
+from collections import namedtuple
+
+from utils.broker import mt5
+
+logger = logging.getLogger("symbol_catalog")
+
+SYMBOL_CATALOG_TTL = float(os.getenv("SYMBOL_CATALOG_TTL", "3600"))
+
+SymbolSpec = namedtuple("SymbolSpec", [
+    "name", "point", "digits", "tick_value", "tick_size", "contract_size",
+    "volume_min", "volume_max", "volume_step", "filling_mode", "trade_mode",
+    "stops_level", "visible", "loaded_at",
+])
+
+
+class SymbolCatalog:
+    """símbolo → SymbolSpec, con TTL."""
+
+    def __init__(self, ttl=SYMBOL_CATALOG_TTL):
+        self.ttl = ttl
+        self.specs = {}
+        self.loads = 0           # llamadas reales al broker (para medir)
+        self._lock = threading.Lock()
+
+    def get(self, symbol):
+        """Spec del símbolo (None si el broker no lo conoce)."""
+        spec = self.specs.get(symbol)
+        if spec is not None and time.monotonic() - spec.loaded_at < self.ttl:
+            return spec
+        with self._lock:
+            fresh = self._load(symbol)
+        if fresh is None and spec is not None:
+            logger.warning("No se pudo refrescar %s, uso la spec anterior", symbol)
+            return spec
+        return fresh
+
+    def point(self, symbol, default=None):
+        spec = self.get(symbol)
+        return spec.point if spec else default
+
+    def is_tradeable(self, symbol):
+        spec = self.get(symbol)
+        return bool(spec and spec.visible and spec.trade_mode != mt5.SYMBOL_TRADE_MODE_DISABLED)
+
+    def preload(self, symbols):
+        for symbol in symbols:
+            self.get(symbol)
+
+    def invalidate(self, symbol=None):
+        """Fuerza recarga en el próximo get (todo el catálogo si symbol es None)."""
+        with self._lock:
+            if symbol is None:
+                self.specs.clear()
+            else:
+                self.specs.pop(symbol, None)
+
+    def _load(self, symbol):
+        self.loads += 1
+        if not mt5.symbol_select(symbol, True):
+            logger.warning("No se pudo seleccionar %s", symbol)
+            return None
+        info = mt5.symbol_info(symbol)
+        if info is None:
+            logger.warning("Sin symbol_info para %s: %s", symbol, mt5.last_error())
+            return None
+        spec = SymbolSpec(
+            info.name, info.point, info.digits, info.trade_tick_value, info.trade_tick_size,
+            info.trade_contract_size, info.volume_min, info.volume_max, info.volume_step,
+            info.filling_mode, info.trade_mode, info.trade_stops_level, info.visible,
+            time.monotonic(),
+        )
+        self.specs[symbol] = spec
+        return spec
+
+
+_catalog = SymbolCatalog()
+
+
+def get_catalog():
+    """Catálogo compartido del proceso."""
+    return _catalog
@@ -1,35 +1,192 @@
 # utils/telegram_notifier.py
 import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+
 import requests
 from dotenv import load_dotenv
-import MetaTrader5 as mt5
+
+from utils.metrics import get_metrics
 
 load_dotenv()
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 BOT_COMMANDS_ENABLED = os.getenv("BOT_COMMANDS_ENABLED", "true").lower() == "true"
+# Se puede apuntar a un servidor HTTP local para pruebas
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+TELEGRAM_QUEUE_SIZE = int(os.getenv("TELEGRAM_QUEUE_SIZE", "100"))
+
+TELEGRAM_MAX_LENGTH = 4096      # límite de Telegram por mensaje
+TELEGRAM_MIN_INTERVAL = 1.0     # Telegram: ~1 mensaje/segundo por chat
+
+logger = logging.getLogger("telegram")
+
+
+class TelegramSender:
+    """Envío en segundo plano: el bucle de trading solo encola (nunca espera a la red).
+
+    - cola acotada: si Telegram no responde se descartan mensajes (contador `dropped`)
+    - requests.Session: reutiliza la conexión HTTPS (keep-alive)
+    - como mucho un envío cada `min_interval` s; respeta el retry_after de los 429
+    - los mensajes que se juntan mientras tanto (p. ej. varios cierres en el mismo
+      ciclo) salen en UN solo mensaje de hasta 4096 caracteres
+    """
+
+    def __init__(self, token, chat_id, api_url=TELEGRAM_API_URL, maxsize=TELEGRAM_QUEUE_SIZE,
+                 min_interval=TELEGRAM_MIN_INTERVAL, coalesce_window=0.3, timeout=10, max_retries=3):
+        self.url = f"{api_url.rstrip('/')}/bot{token}/sendMessage"
+        self.chat_id = chat_id
+        self.queue = queue.Queue(maxsize)
+        self.session = requests.Session()
+        self.min_interval = min_interval
+        self.coalesce_window = coalesce_window
+        self.timeout = timeout
+        self.max_retries = max_retries
+        # contadores
+        self.sent = 0          # mensajes HTTP enviados con éxito
+        self.delivered = 0     # notificaciones entregadas (varias por mensaje si se juntaron)
+        self.merged = 0        # notificaciones que viajaron dentro de otro mensaje
+        self.dropped = 0       # descartadas por cola llena
+        self.failed = 0        # perdidas por error de red/API tras reintentos
+        self._carry = None     # notificación que no cupo en el último mensaje
+        self._next_send = 0.0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    # ---------- lado del bot ----------
+    def send(self, text):
+        """Encola sin bloquear. False si la cola está llena (se descarta)."""
+        self._ensure_thread()
+        try:
+            self.queue.put_nowait(text[:TELEGRAM_MAX_LENGTH])
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+    @property
+    def depth(self):
+        return self.queue.qsize() + (1 if self._carry is not None else 0)
+
+    def stats(self):
+        return {"queued": self.depth, "sent": self.sent, "delivered": self.delivered,
+                "merged": self.merged, "dropped": self.dropped, "failed": self.failed}
+
+    def flush(self, timeout=5.0):
+        """Espera (máx. `timeout` s) a que la cola se vacíe. True si se vació."""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return not self.queue.unfinished_tasks
+
+    def close(self, timeout=5.0):
+        self.flush(timeout)
+        self._stop.set()
+        self.session.close()
+
+    # ---------- hilo de envío ----------
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="telegram-sender", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self._carry is not None:
+                first, self._carry = self._carry, None
+            else:
+                try:
+                    first = self.queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+            # ventana para juntar la ráfaga y, de paso, esperar el turno del rate limit
+            time.sleep(max(self.coalesce_window, self._next_send - time.monotonic()))
+            parts = self._collect(first)
+            self._deliver("\n\n".join(parts), len(parts))
+            for _ in parts:
+                self.queue.task_done()
+
+    def _collect(self, first):
+        """Junta lo que haya en cola mientras quepa en un mensaje."""
+        parts, size = [first], len(first)
+        while True:
+            try:
+                text = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if size + 2 + len(text) > TELEGRAM_MAX_LENGTH:
+                self._carry = text      # va primero en el siguiente mensaje
+                break
+            parts.append(text)
+            size += 2 + len(text)
+        return parts
+
+    def _deliver(self, text, count):
+        payload = {"chat_id": self.chat_id, "text": text, "parse_mode": "HTML",
+                   "disable_web_page_preview": True}
+        for _ in range(self.max_retries):
+            wait = self.min_interval
+            try:
+                t0 = time.perf_counter()
+                r = self.session.post(self.url, json=payload, timeout=self.timeout)
+                get_metrics().stage("telegram", time.perf_counter() - t0)
+                if r.status_code == 200:
+                    self._next_send = time.monotonic() + self.min_interval
+                    with self._lock:
+                        self.sent += 1
+                        self.delivered += count
+                        self.merged += count - 1
+                    return True
+                if r.status_code == 429:
+                    # {"parameters": {"retry_after": N}}
+                    try:
+                        wait = float(r.json().get("parameters", {}).get("retry_after", wait))
+                    except ValueError:
+                        pass
+                elif r.status_code < 500:
+                    logger.warning("Telegram rechazó el mensaje: %s %s", r.status_code, r.text[:200])
+                    break
+            except requests.RequestException as e:
+                logger.warning("Error Telegram: %s", e)
+            time.sleep(wait)
+        self._next_send = time.monotonic() + self.min_interval
+        with self._lock:
+            self.failed += count
+        return False
 
-def send_telegram_message(text: str):
-    """Envía mensaje a Telegram."""
+
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def get_sender():
+    """Sender compartido del proceso (None si Telegram no está configurado)."""
+    global _sender
     if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
-        print("⚠️ Telegram no configurado")
-        return False
+        return None
+    with _sender_lock:
+        if _sender is None:
+            _sender = TelegramSender(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID)
+            atexit.register(_sender.close)   # que salga el "BOT DETENIDO"
+    return _sender
 
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    payload = {
-        "chat_id": TELEGRAM_CHAT_ID,
-        "text": text,
-        "parse_mode": "HTML",
-        "disable_web_page_preview": True
-    }
-
-    try:
-        response = requests.post(url, json=payload, timeout=10)
-        return response.status_code == 200
-    except Exception as e:
-        print(f"⚠️ Error Telegram: {e}")
+
+def send_telegram_message(text: str):
+    """Encola un mensaje para Telegram (no bloquea)."""
+    sender = get_sender()
+    if sender is None:
+        print("⚠️ Telegram no configurado")
         return False
+    return sender.send(text)
 
 
 def notify_bot_started(balance, stop_win, stop_loss, pairs, bot_name="BOT WITH NOT NAME"):
@@ -111,16 +268,16 @@ def notify_open_positions(report_text: str):
 
 
 def handle_telegram_command(command: str):
-    """Maneja todos los comandos de Telegram."""
+    """Traduce el texto del comando a una acción ("status", "stop", "posiciones")
+    o al texto de ayuda. Nunca consulta al broker."""
     if not BOT_COMMANDS_ENABLED:
         return "Comandos deshabilitados"
 
-    cmd = command.strip().lower()
+    parts = command.strip().lower().split()
+    cmd = parts[0].split("@")[0] if parts else ""     # /status@MiBot → /status
 
     if cmd in ["/start", "/status"]:
-        account = mt5.account_info()
-        balance = account.balance if account else 0.0
-        return f"status {balance:.2f}"
+        return "status"
 
     elif cmd == "/stop":
         return "stop"
@@ -132,4 +289,152 @@ def handle_telegram_command(command: str):
         return ("<b>Comandos disponibles:</b>\n"
                 "/status → Balance y estadísticas\n"
                 "/posiciones → Ver trades abiertos ahora mismo\n"
-                "/stop → Detener el bot")
\ No newline at end of file
+                "/stop → Detener el bot\n"
+                "<i>Opcional: nombre del bot, p. ej. /stop mark3</i>")
+
+
+# ==================== ESCUCHA DE COMANDOS (long polling) ====================
+TELEGRAM_OFFSET_FILE = os.getenv("TELEGRAM_OFFSET_FILE") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bots", "data", "telegram_offset.json")
+
+
+class TelegramCommandListener:
+    """Un solo hilo por proceso lee los comandos con getUpdates en long polling
+    y los reparte a los bots registrados.
+
+    - el offset (último update_id + 1) se guarda en disco: cada comando se
+      procesa una vez, también tras reiniciar, y confirmarlo no cuesta otra llamada
+    - solo se atiende al chat configurado
+    - las respuestas salen del snapshot que cada bot refresca en su ciclo
+      (telegram_status() / get_open_positions_report()), nunca del broker
+
+    Un bot registrado debe tener: telegram_status() → (balance, win_rate,
+    total_profit, total_trades), get_open_positions_report() → str y stop().
+    """
+
+    def __init__(self, token, chat_id, api_url=TELEGRAM_API_URL, offset_file=TELEGRAM_OFFSET_FILE,
+                 poll_timeout=25):
+        self.url = f"{api_url.rstrip('/')}/bot{token}/getUpdates"
+        self.chat_id = str(chat_id)
+        self.offset_file = offset_file
+        self.poll_timeout = poll_timeout
+        self.session = requests.Session()
+        self.bots = {}           # nombre → bot
+        self.offset = self._load_offset()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def register(self, name, bot):
+        self.bots[name.lower()] = bot
+        self.start()
+
+    def unregister(self, name):
+        self.bots.pop(name.lower(), None)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="telegram-commands", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    # ---------- offset ----------
+    def _load_offset(self):
+        try:
+            with open(self.offset_file, "r", encoding="utf-8") as f:
+                return int(json.load(f)["offset"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _save_offset(self):
+        tmp = self.offset_file + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.offset_file), exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"offset": self.offset}, f)
+            os.replace(tmp, self.offset_file)
+        except OSError as e:
+            logger.warning("No se pudo guardar el offset de Telegram: %s", e)
+
+    # ---------- polling ----------
+    def _get_updates(self, offset, timeout):
+        params = {"timeout": timeout, "allowed_updates": '["message"]'}
+        if offset is not None:
+            params["offset"] = offset
+        r = self.session.get(self.url, params=params, timeout=timeout + 10)
+        r.raise_for_status()
+        return r.json().get("result", [])
+
+    def _run(self):
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                if self.offset is None:
+                    # primer arranque: no ejecutar comandos viejos (un /stop de ayer)
+                    last = self._get_updates(-1, 0)
+                    self.offset = last[-1]["update_id"] + 1 if last else 0
+                    self._save_offset()
+                updates = self._get_updates(self.offset, self.poll_timeout)
+                backoff = 1
+            except (requests.RequestException, ValueError) as e:
+                logger.warning("Error leyendo comandos de Telegram: %s", e)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 60)
+                continue
+
+            for u in updates:
+                self.offset = max(self.offset, u["update_id"] + 1)
+                message = u.get("message") or {}
+                if str(message.get("chat", {}).get("id")) != self.chat_id:
+                    continue
+                text = (message.get("text") or "").strip()
+                if text.startswith("/"):
+                    try:
+                        self.dispatch(text)
+                    except Exception as e:
+                        logger.error("Error atendiendo %s: %s", text, e, exc_info=True)
+            if updates:
+                self._save_offset()
+
+    def dispatch(self, text):
+        """Ejecuta un comando sobre los bots registrados (o el nombrado: /stop mark3)."""
+        action = handle_telegram_command(text)
+        parts = text.split()
+        target = parts[1].lower() if len(parts) > 1 else None
+        bots = [(n, b) for n, b in self.bots.items() if target is None or n == target]
+        if action not in ("status", "stop", "posiciones"):
+            send_telegram_message(action)
+            return
+        if not bots:
+            send_telegram_message(f"Bot no registrado: {target} (hay: {', '.join(self.bots) or 'ninguno'})")
+            return
+        for name, bot in bots:
+            if action == "status":
+                notify_status(*bot.telegram_status())
+            elif action == "posiciones":
+                notify_open_positions(bot.get_open_positions_report())
+            elif action == "stop":
+                logger.info("COMANDO /stop → deteniendo %s", name)
+                bot.stop()
+
+
+_listener = None
+
+
+def register_bot(name, bot):
+    """Registra un bot en la escucha de comandos compartida (si Telegram está configurado)."""
+    global _listener
+    if not BOT_COMMANDS_ENABLED or not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
+        return None
+    with _sender_lock:
+        if _listener is None:
+            _listener = TelegramCommandListener(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID)
+    _listener.register(name, bot)
+    return _listener
+
+
+def unregister_bot(name):
+    if _listener is not None:
+        _listener.unregister(name)
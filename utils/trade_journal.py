@@ -0,0 +1,299 @@
+# utils/trade_journal.py
+# Diario de operaciones compartido por todos los bots: SQLite en modo WAL,
+# una fila por ticket (apertura y cierre en la misma fila).
+#
+#   - un solo esquema para Mark2 y Mark3 (antes cada uno su CSV)
+#   - escritura en un hilo propio por lotes (el bot solo encola)
+#   - el cierre se une a la apertura con un único UPSERT por ticket, que
+#     también calcula pips y duración
+#   - índices por símbolo/fecha y por fecha de cierre → consultas por
+#     símbolo o por día rápidas aunque haya cientos de miles de filas
+#   - el CSV sigue disponible como export:
+#       py -3.11 -m utils.trade_journal export trades.csv [--symbol EURUSD] [--from 2025-01-01]
+#       py -3.11 -m utils.trade_journal summary [--from 2025-11-01]
+#       py -3.11 -m utils.trade_journal import-csv bots/logs/mark2_trades.csv mark2
+import os
+import csv
+import time
+import queue
+import atexit
+import sqlite3
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+logger = logging.getLogger("trade_journal")
+
+DEFAULT_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bots", "data", "trades.db")
+
+COLUMNS = (
+    "ticket", "bot", "symbol", "direction", "lots", "entry_price", "exit_price", "sl", "tp",
+    "profit", "profit_pips", "open_time", "close_time", "duration_min", "open_reason", "close_reason",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    ticket        INTEGER PRIMARY KEY,
+    bot           TEXT,
+    symbol        TEXT,
+    direction     TEXT,
+    lots          REAL,
+    entry_price   REAL,
+    exit_price    REAL,
+    sl            REAL,
+    tp            REAL,
+    point         REAL,
+    profit        REAL,
+    profit_pips   REAL,
+    open_time     REAL,      -- epoch (s)
+    close_time    REAL,
+    duration_min  REAL,
+    open_reason   TEXT,
+    close_reason  TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_trades_symbol_open ON trades(symbol, open_time);
+CREATE INDEX IF NOT EXISTS idx_trades_close ON trades(close_time);
+CREATE INDEX IF NOT EXISTS idx_trades_bot_close ON trades(bot, close_time);
+"""
+
+SQL_OPEN = """
+INSERT INTO trades (ticket, bot, symbol, direction, lots, entry_price, sl, tp, point, open_time, open_reason)
+VALUES (:ticket, :bot, :symbol, :direction, :lots, :entry_price, :sl, :tp, :point, :time, :reason)
+ON CONFLICT(ticket) DO UPDATE SET
+    bot = excluded.bot, symbol = excluded.symbol, direction = excluded.direction,
+    lots = excluded.lots, entry_price = excluded.entry_price, sl = excluded.sl, tp = excluded.tp,
+    point = excluded.point, open_time = excluded.open_time, open_reason = excluded.open_reason
+"""
+
+# Cierre: una sola sentencia que se une a la fila de apertura
+SQL_CLOSE = """
+INSERT INTO trades (ticket, bot, symbol, direction, lots, entry_price, exit_price, profit, close_time, close_reason)
+VALUES (:ticket, :bot, :symbol, :direction, :lots, :entry_price, :exit_price, :profit, :time, :reason)
+ON CONFLICT(ticket) DO UPDATE SET
+    exit_price = excluded.exit_price,
+    profit = excluded.profit,
+    close_time = excluded.close_time,
+    close_reason = excluded.close_reason,
+    direction = coalesce(trades.direction, excluded.direction),
+    lots = coalesce(trades.lots, excluded.lots),
+    entry_price = coalesce(trades.entry_price, excluded.entry_price),
+    profit_pips = CASE WHEN trades.point > 0 AND trades.entry_price IS NOT NULL AND excluded.exit_price IS NOT NULL
+        THEN round((CASE coalesce(trades.direction, excluded.direction)
+                    WHEN 'BUY' THEN excluded.exit_price - trades.entry_price
+                    ELSE trades.entry_price - excluded.exit_price END) / trades.point, 1) END,
+    duration_min = CASE WHEN trades.open_time IS NOT NULL
+        THEN round((excluded.close_time - trades.open_time) / 60.0, 1) END
+"""
+
+
+def _epoch(value):
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.timestamp()
+
+
+def _iso(epoch):
+    return datetime.fromtimestamp(epoch).strftime("%Y-%m-%d %H:%M:%S") if epoch is not None else ""
+
+
+class TradeJournal:
+    """Escritor en segundo plano + consultas sobre la base de operaciones.
+
+    La base se abre al primer uso (construirlo no crea archivos)."""
+
+    def __init__(self, path=DEFAULT_DB, batch_size=200, flush_seconds=1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue = queue.Queue()
+        self.written = 0
+        self.errors = 0
+        self._reader = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")     # con WAL: durable al checkpoint, sin fsync por commit
+        conn.executescript(SCHEMA)
+        return conn
+
+    # ---------- escritura (desde el bot: solo encola) ----------
+    def log_open(self, bot, ticket, symbol, direction, lots, entry_price, sl=None, tp=None,
+                 point=None, reason="OPEN", when=None):
+        self._put(SQL_OPEN, {"ticket": int(ticket), "bot": bot, "symbol": symbol, "direction": direction,
+                             "lots": lots, "entry_price": entry_price, "sl": sl, "tp": tp, "point": point,
+                             "time": _epoch(when), "reason": reason})
+
+    def log_close(self, bot, ticket, symbol, exit_price, profit, reason, direction=None, lots=None,
+                  entry_price=None, when=None):
+        self._put(SQL_CLOSE, {"ticket": int(ticket), "bot": bot, "symbol": symbol, "direction": direction,
+                              "lots": lots, "entry_price": entry_price, "exit_price": exit_price,
+                              "profit": profit, "time": _epoch(when), "reason": reason})
+
+    def _put(self, sql, params):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="trade-journal", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush)
+        self.queue.put((sql, params))
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                with conn:                       # una transacción por lote
+                    for sql, params in batch:
+                        conn.execute(sql, params)
+                self.written += len(batch)
+            except sqlite3.Error as e:
+                self.errors += len(batch)
+                logger.error("Error escribiendo %d eventos en %s: %s", len(batch), self.path, e)
+            for _ in batch:
+                self.queue.task_done()
+
+    def flush(self, timeout=10.0):
+        """Espera a que lo encolado esté en la base."""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.02)
+        return not self.queue.unfinished_tasks
+
+    # ---------- consultas ----------
+    def _query(self, sql, params=()):
+        if self._reader is None:
+            self._reader = self._connect()
+            self._reader.row_factory = sqlite3.Row
+        return [dict(r) for r in self._reader.execute(sql, params)]
+
+    def get(self, ticket):
+        rows = self._query("SELECT * FROM trades WHERE ticket = ?", (int(ticket),))
+        return rows[0] if rows else None
+
+    def trades(self, symbol=None, bot=None, date_from=None, date_to=None, closed_only=False):
+        """Operaciones filtradas (por fecha de apertura), usando los índices."""
+        where, params = [], []
+        if symbol:
+            where.append("symbol = ?"); params.append(symbol)
+        if bot:
+            where.append("bot = ?"); params.append(bot)
+        if date_from is not None:
+            where.append("open_time >= ?"); params.append(_epoch(date_from))
+        if date_to is not None:
+            where.append("open_time < ?"); params.append(_epoch(date_to))
+        if closed_only:
+            where.append("close_time IS NOT NULL")
+        sql = "SELECT * FROM trades" + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY open_time"
+        return self._query(sql, params)
+
+    def daily_summary(self, date_from=None, date_to=None, bot=None):
+        """Por día de cierre: nº de trades, ganadoras y profit."""
+        where, params = ["close_time IS NOT NULL"], []
+        if date_from is not None:
+            where.append("close_time >= ?"); params.append(_epoch(date_from))
+        if date_to is not None:
+            where.append("close_time < ?"); params.append(_epoch(date_to))
+        if bot:
+            where.append("bot = ?"); params.append(bot)
+        return self._query(
+            "SELECT date(close_time, 'unixepoch', 'localtime') AS day, count(*) AS trades, "
+            "sum(profit > 0) AS wins, round(sum(profit), 2) AS profit "
+            "FROM trades WHERE " + " AND ".join(where) + " GROUP BY day ORDER BY day", params)
+
+    def export_csv(self, path, **filters):
+        """CSV con el esquema común (una fila por ticket)."""
+        self.flush()
+        rows = self.trades(**filters)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(COLUMNS)
+            for r in rows:
+                r["open_time"], r["close_time"] = _iso(r["open_time"]), _iso(r["close_time"])
+                w.writerow(["" if r[c] is None else r[c] for c in COLUMNS])
+        return len(rows)
+
+    def import_csv(self, path, bot):
+        """Carga un CSV antiguo de mark2/mark3 (filas de apertura y de cierre)."""
+        alias = {"lot_size": "lots", "entry": "entry_price", "exit": "exit_price",
+                 "profit_usd": "profit", "dir": "direction"}
+        n = 0
+        with open(path, newline="", encoding="utf-8") as f:
+            for raw in csv.DictReader(f):
+                row = {alias.get(k, k): (v if v not in ("", "?") else None) for k, v in raw.items()}
+                if not row.get("ticket"):
+                    continue
+                num = {k: float(row[k]) if row.get(k) is not None else None
+                       for k in ("lots", "entry_price", "exit_price", "sl", "tp", "profit")}
+                when = datetime.strptime(row["timestamp"], "%Y-%m-%d %H:%M:%S")
+                if num["profit"] is None and num["exit_price"] is None:
+                    self.log_open(bot, row["ticket"], row["symbol"], row.get("direction"), num["lots"],
+                                  num["entry_price"], num["sl"], num["tp"], reason=row.get("reason") or "OPEN",
+                                  when=when)
+                else:
+                    self.log_close(bot, row["ticket"], row["symbol"], num["exit_price"], num["profit"],
+                                   row.get("reason"), direction=row.get("direction"), lots=num["lots"], when=when)
+                n += 1
+        self.flush()
+        return n
+
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def get_journal(path=DEFAULT_DB):
+    """Un TradeJournal (un hilo escritor) por base y proceso, compartido por los bots."""
+    with _journals_lock:
+        journal = _journals.get(path)
+        if journal is None:
+            journal = _journals[path] = TradeJournal(path)
+        return journal
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diario de operaciones (SQLite)")
+    parser.add_argument("--db", default=DEFAULT_DB)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_exp = sub.add_parser("export", help="exporta a CSV")
+    p_exp.add_argument("out")
+    p_sum = sub.add_parser("summary", help="resumen por día")
+    for p in (p_exp, p_sum):
+        p.add_argument("--bot")
+        p.add_argument("--from", dest="date_from")
+        p.add_argument("--to", dest="date_to")
+    p_exp.add_argument("--symbol")
+    p_imp = sub.add_parser("import-csv", help="importa un CSV antiguo de un bot")
+    p_imp.add_argument("csv")
+    p_imp.add_argument("bot")
+    a = parser.parse_args()
+
+    journal = TradeJournal(a.db)
+    if a.cmd == "export":
+        n = journal.export_csv(a.out, symbol=a.symbol, bot=a.bot, date_from=a.date_from, date_to=a.date_to)
+        print(f"{n} operaciones → {a.out}")
+    elif a.cmd == "summary":
+        for r in journal.daily_summary(a.date_from, a.date_to, a.bot):
+            print(f"{r['day']}  trades {r['trades']:4d}  ganadoras {r['wins']:4d}  profit {r['profit']:+10.2f}")
+    elif a.cmd == "import-csv":
+        print(f"{journal.import_csv(a.csv, a.bot)} filas importadas de {a.csv}")
+
+
+if __name__ == "__main__":
+    main()